@@ -0,0 +1,143 @@
+"""
+bench_hybrid_ttft.py — Full-prefix vs hybrid (core + retrieved) knowledge
+
+GPU mode (default) starts CAGSystemFreshSession once per knowledge_mode and,
+for each probe question, measures prompt tokens and time to the first
+streamed token (TTFT).  Every turn starts from a fresh session, the way the
+voice gateway uses /chat/ws.
+
+  full    : the whole packed knowledge base in front of every query
+  hybrid  : core_knowledge_tokens of it + retrieval_top_k matches per query
+
+--retrieval-only skips the model: it writes a synthetic catalog (--entries)
+and reports BM25 build time, per-query search latency and the knowledge
+tokens each mode would put in the prompt (len // 4 stand-in tokenizer).
+
+Usage (from stt_tts/cag/):
+    python bench_hybrid_ttft.py --retrieval-only --entries 50000
+    CAG_PRESET=fast python bench_hybrid_ttft.py --rounds 3
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PROBES = [
+    "Our invoices keep getting lost between teams, what can help?",
+    "We spend hours every week reconciling payroll.",
+    "Leads from the website never reach sales in time.",
+    "How do I stay compliant with data retention rules?",
+    "Customers churn after onboarding, any ideas?",
+    "Inventory counts never match what the system says.",
+]
+
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def retrieval_only(args):
+    from bench_knowledge_load import _Tokenizer, _write_catalog
+    from knowledge_store import SolutionKnowledgeStore
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "solutions.json")
+        _write_catalog(path, args.entries, "json")
+        config = SimpleNamespace(solutions_json_path=path, max_context_tokens=args.full_tokens,
+                                 cache_truncation_buffer=50, max_knowledge_entries=50_000)
+        rows = []
+        for mode in ("full", "hybrid"):
+            store = SolutionKnowledgeStore(_Tokenizer(), config)
+            with contextlib.redirect_stdout(io.StringIO()):
+                store.load_from_sources()
+                if mode == "full":
+                    store.build_knowledge_text()
+                else:
+                    store.build_knowledge_text(budget=args.core_tokens)
+                    store.build_retriever()
+            core = store.get_token_count()
+            if mode == "full":
+                rows.append((mode, core, 0, 0.0, 0.0))
+                continue
+            lat, extra = [], []
+            for _ in range(args.rounds):
+                for q in PROBES:
+                    t0 = time.perf_counter()
+                    text = store.retrieve_text(q, top_k=args.top_k, max_tokens=args.retrieval_tokens)
+                    lat.append((time.perf_counter() - t0) * 1000)
+                    extra.append(len(text) // 4)
+            print(f"BM25 over {len(store.retriever):,} entries built in "
+                  f"{store.retriever.build_ms:.0f} ms, {store.retriever.stats()['terms']:,} terms")
+            rows.append((mode, core, statistics.mean(extra), _pct(lat, 50), _pct(lat, 99)))
+
+    print(f"\n{'mode':<8} {'core tok':>9} {'retrieved':>10} {'search p50':>11} {'p99':>8}")
+    for mode, core, extra, p50, p99 in rows:
+        print(f"{mode:<8} {core:>9,} {extra:>10.0f} {p50:>9.2f}ms {p99:>6.2f}ms")
+
+
+def ttft(args):
+    from cag_config import CAGConfig
+    from cag_system import CAGSystemFreshSession
+
+    results = {}
+    for mode in ("full", "hybrid"):
+        config = CAGConfig.from_env()
+        config.knowledge_mode = mode
+        config.core_knowledge_tokens = args.core_tokens
+        config.retrieval_top_k = args.top_k
+        config.retrieval_max_tokens = args.retrieval_tokens
+        config.verbose = False
+        system = CAGSystemFreshSession(config)
+        with contextlib.redirect_stdout(io.StringIO()):
+            system.initialize()
+            for _ in system.stream_query("warm up"):    # allocator / kernels
+                pass
+
+        ttfts, prompt_tokens = [], []
+        for _ in range(args.rounds):
+            for q in PROBES:
+                system._fast_reset()
+                system.memory.add_message("user", q)
+                prompt_tokens.append(len(system.tokenizer(system._build_full_prompt()).input_ids))
+                system.memory.messages.clear()
+                t0 = time.perf_counter()
+                stream = system.stream_query(q)
+                next(stream)
+                ttfts.append((time.perf_counter() - t0) * 1000)
+                for _ in stream:
+                    pass
+        results[mode] = (statistics.mean(prompt_tokens), _pct(ttfts, 50), _pct(ttfts, 90))
+        with contextlib.redirect_stdout(io.StringIO()):
+            system.cleanup()
+
+    print(f"\n{'mode':<8} {'prompt tok':>11} {'TTFT p50':>10} {'p90':>8}")
+    for mode, (tokens, p50, p90) in results.items():
+        print(f"{mode:<8} {tokens:>11.0f} {p50:>8.0f}ms {p90:>6.0f}ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--retrieval-only", action="store_true")
+    ap.add_argument("--entries", type=int, default=50_000)
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--full-tokens", type=int, default=4096, help="max_context_tokens (full mode)")
+    ap.add_argument("--core-tokens", type=int, default=1024)
+    ap.add_argument("--top-k", type=int, default=8)
+    ap.add_argument("--retrieval-tokens", type=int, default=600)
+    args = ap.parse_args()
+    if args.retrieval_only:
+        retrieval_only(args)
+    else:
+        ttft(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+bench_knowledge_load.py — Knowledge base startup time and peak memory
+
+Writes a synthetic solutions catalog (--entries, default 50k) and times
+load_from_sources() + build_knowledge_text() three ways:
+
+  legacy   : json.load of the whole file, a SolutionEntry per item, dedup and
+             pack over the in-memory list (the loader before KnowledgeIndex)
+  cold     : streaming parse into a KnowledgeIndex, index written to <file>.idx
+  warm     : KnowledgeIndex read back from <file>.idx, no parsing
+
+Peak Python memory is measured with tracemalloc.  The tokenizer is a
+stand-in (len // 4), so the numbers exclude the final tokenizer.encode();
+exact_token_packing is off so all three modes select the same entries.
+
+Usage (from stt_tts/cag/):
+    python bench_knowledge_load.py
+    python bench_knowledge_load.py --entries 50000 --format jsonl --budget 4096
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from knowledge_store import SolutionEntry, SolutionKnowledgeStore  # noqa: E402
+
+
+class _Tokenizer:
+    def encode(self, text, add_special_tokens=True):
+        return range(len(text) // 4)
+
+
+def _write_catalog(path: str, n: int, fmt: str):
+    rnd = random.Random(0)
+    words = "billing churn onboarding latency compliance payroll inventory leads".split()
+
+    def item(i):
+        kw = f"{rnd.choice(words)}-{i % 5000}"
+        return {
+            "user_problem": f"Our {kw} process is slow and error prone " * rnd.randint(1, 4),
+            "problem_keywords": [kw, rnd.choice(words)],
+            "solution_name": f"Solution {i}",
+            "solution_description": "Automates the workflow end to end. " * rnd.randint(1, 6),
+            "key_benefits": ["Saves time", "Fewer errors", "Audit trail", "Scales"],
+            "pricing_model": f"${rnd.randint(1, 99)}0/month",
+            "implementation_time": f"{rnd.randint(1, 12)} weeks",
+            "target_industries": [rnd.choice(["SaaS", "Retail", "Finance", "Health"])],
+        }
+
+    with open(path, "w", encoding="utf-8") as f:
+        if fmt == "jsonl":
+            for i in range(n):
+                f.write(json.dumps(item(i)) + "\n")
+        else:
+            f.write("[\n")
+            for i in range(n):
+                f.write(("," if i else "") + json.dumps(item(i)) + "\n")
+            f.write("]\n")
+
+
+def _legacy(path: str, config) -> str:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            data = [json.loads(line) for line in f if line.strip()]
+        else:
+            data = json.load(f)
+    entries = []
+    for idx, item in enumerate(data):
+        entries.append(SolutionEntry(
+            user_problem=item["user_problem"].strip(),
+            problem_keywords=item.get("problem_keywords", []),
+            solution_name=item["solution_name"].strip(),
+            solution_description=item["solution_description"].strip(),
+            key_benefits=item.get("key_benefits", []),
+            pricing_model=item.get("pricing_model", "Contact for pricing"),
+            implementation_time=item.get("implementation_time", "Varies"),
+            target_industries=item.get("target_industries", []),
+            metadata={"source": "json", "index": idx},
+        ))
+    seen = {}
+    for e in entries:
+        seen.setdefault(e.category(), e)
+    available = max(500, config.max_context_tokens - 500)
+    parts, current = [], 0.0
+    for e in sorted(seen.values(), key=lambda e: len(e.user_problem) + len(e.solution_description)):
+        s = e.to_compact_string()
+        est = (len(s) + 1) / 4.0
+        if current + est > available:
+            break
+        parts.append(s)
+        current += est
+    return "\n\n".join(parts)
+
+
+def _indexed(path: str, config) -> str:
+    store = SolutionKnowledgeStore(_Tokenizer(), config)
+    store.load_from_sources()
+    return store.build_knowledge_text()
+
+
+def _measure(fn, *args):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        text = fn(*args)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, text
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--entries", type=int, default=50_000)
+    ap.add_argument("--format", choices=["json", "jsonl"], default="json")
+    ap.add_argument("--budget", type=int, default=4096, help="max_context_tokens")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"solutions.{args.format}")
+        _write_catalog(path, args.entries, args.format)
+        config = SimpleNamespace(solutions_json_path=path, max_context_tokens=args.budget,
+                                 cache_truncation_buffer=50, max_knowledge_entries=50_000,
+                                 exact_token_packing=False)
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"{args.entries:,} entries, {size_mb:.1f} MB {args.format}, budget {args.budget} tokens\n")
+
+        results = [
+            ("legacy",) + _measure(_legacy, path, config),
+            ("cold",)   + _measure(_indexed, path, config),
+            ("warm",)   + _measure(_indexed, path, config),
+        ]
+        baseline = results[0][3]
+        print(f"{'mode':<8} {'startup':>10} {'peak mem':>10}  same text")
+        for name, elapsed, peak, text in results:
+            print(f"{name:<8} {elapsed * 1000:>8.0f}ms {peak / 1e6:>8.1f}MB  {text == baseline}")
+
+
+if __name__ == "__main__":
+    main()
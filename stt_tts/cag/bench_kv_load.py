@@ -0,0 +1,115 @@
+"""
+bench_kv_load.py — KV cache file size and cold-start load time
+
+Builds a synthetic knowledge-prefix KV cache shaped like Llama 3.2-3B
+(28 layers, 8 KV heads, head dim 128, fp16), saves it through CacheManager
+in each persistence format and times CacheManager.load_cache():
+
+  torch    : legacy torch.save pickle, torch.load + DynamicCache.update
+  native   : .kvf, mmap'd and copied into preallocated device tensors
+  int8     : .kvf with int8 KV + per-channel / per-token scales
+  fp8      : .kvf with float8_e4m3fn KV + scales
+
+"cold" drops the file from the page cache first (fsync + POSIX_FADV_DONTNEED,
+Linux only), "warm" loads it again straight away.  err is the max absolute
+difference from the original KV after the round trip.
+
+Usage (from stt_tts/cag/):
+    python bench_kv_load.py
+    python bench_kv_load.py --tokens 7500 --device cuda --rounds 5
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import torch  # noqa: E402
+from transformers import DynamicCache  # noqa: E402
+
+from cache_manager import CacheManager, CacheState  # noqa: E402
+
+
+class _Tokenizer:
+    name_or_path = "bench"
+
+
+def _drop_page_cache(path: str):
+    if not hasattr(os, "posix_fadvise"):
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def _sync(device):
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tokens", type=int, default=4096)
+    ap.add_argument("--layers", type=int, default=28)
+    ap.add_argument("--heads", type=int, default=8)
+    ap.add_argument("--head-dim", type=int, default=128)
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    args = ap.parse_args()
+    device = torch.device(args.device)
+
+    shape = (1, args.heads, args.tokens, args.head_dim)
+    layers = [(torch.randn(shape, dtype=torch.float16, device=device),
+               torch.randn(shape, dtype=torch.float16, device=device))
+              for _ in range(args.layers)]
+    input_ids = torch.randint(0, 128_000, (1, args.tokens), device=device)
+    print(f"{args.layers} layers × {shape}, fp16, {args.tokens:,} tokens on {device}\n")
+
+    print(f"{'format':<8} {'size':>9} {'cold':>9} {'warm':>9} {'err':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt, storage in (("torch", "native"), ("kvf", "native"), ("kvf", "int8"), ("kvf", "fp8")):
+            config = SimpleNamespace(
+                model_id="bench", verbose=False, kv_cache_format=fmt, kv_cache_storage=storage,
+                cache_file_path=os.path.join(tmp, f"kv_{storage}.pt"),
+            )
+            manager = CacheManager(None, _Tokenizer(), device, config)
+            pkv = DynamicCache()
+            for i, (k, v) in enumerate(layers):
+                pkv.update(k, v, i)
+            manager.cache_state = CacheState(input_ids, args.tokens, args.tokens, pkv)
+            manager.save_cache()
+            path = manager._kvf_path(config.cache_file_path) or config.cache_file_path
+
+            cold, warm = [], []
+            for _ in range(args.rounds):
+                for times, drop in ((cold, True), (warm, False)):
+                    manager.cache_state = None
+                    if drop:
+                        _drop_page_cache(path)
+                    t0 = time.perf_counter()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        assert manager.load_cache()
+                    _sync(device)
+                    times.append((time.perf_counter() - t0) * 1000)
+
+            err = max(
+                (k2.float() - k.float()).abs().max().item()
+                for (k, _), (k2, _) in zip(layers, manager.cache_state.past_key_values)
+            )
+            size_mb = os.path.getsize(path) / 1e6
+            name = fmt if fmt == "torch" else storage
+            print(f"{name:<8} {size_mb:>7.0f}MB {statistics.median(cold):>7.0f}ms "
+                  f"{statistics.median(warm):>7.0f}ms {err:>8.4f}")
+
+
+if __name__ == "__main__":
+    main()
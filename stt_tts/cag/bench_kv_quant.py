@@ -0,0 +1,132 @@
+"""
+bench_kv_quant.py — fp16 vs int8 vs int4 KV cache (config.kv_cache_quant)
+
+Starts CAGSystemFreshSession once per KV mode and, for each probe question,
+measures time to the first streamed token (TTFT), peak GPU memory during the
+turn and the streamed answer.  Every turn starts from a fresh session, the
+way the voice gateway uses /chat/ws.
+
+  prefix MB : device memory of the stored knowledge prefix(es)
+  peak MB   : torch.cuda.max_memory_allocated() over a turn
+  exact     : answers identical to the fp16 run
+  agree     : mean shared leading words with the fp16 answer, as a fraction
+
+--synthetic skips the model: it quantizes random Llama 3.2-3B shaped KV
+(28 layers, 8 KV heads, head dim 128) and reports stored size and max /
+mean absolute reconstruction error per mode.
+
+Usage (from stt_tts/cag/):
+    python bench_kv_quant.py --synthetic --tokens 7500
+    CAG_PRESET=default python bench_kv_quant.py --rounds 2
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import torch  # noqa: E402
+
+from bench_hybrid_ttft import PROBES, _pct  # noqa: E402
+
+MODES = ("none", "int8", "int4")
+
+
+def synthetic(args):
+    from kv_file import dequantize_layers, quantize_layers
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    shape = (1, 8, args.tokens, 128)
+    layers = [(torch.randn(shape, dtype=torch.float16, device=device),
+               torch.randn(shape, dtype=torch.float16, device=device))
+              for _ in range(28)]
+    print(f"28 layers × {shape}, fp16, {args.tokens:,} tokens on {device}\n")
+
+    print(f"{'mode':<6} {'stored':>9} {'max err':>9} {'mean err':>9}")
+    for mode in MODES:
+        stored = quantize_layers(layers, "native" if mode == "none" else mode)
+        size_mb = sum(t.numel() * t.element_size() for pair in stored for t in pair) / 1e6
+        restored = dequantize_layers(stored)
+        diffs = [(r.float() - o.float()).abs()
+                 for pair_o, pair_r in zip(layers, restored) for o, r in zip(pair_o, pair_r)]
+        print(f"{mode:<6} {size_mb:>7.0f}MB {max(d.max().item() for d in diffs):>9.4f} "
+              f"{statistics.mean(d.mean().item() for d in diffs):>9.4f}")
+
+
+def _agreement(a: str, b: str) -> float:
+    wa, wb = a.split(), b.split()
+    shared = 0
+    for x, y in zip(wa, wb):
+        if x != y:
+            break
+        shared += 1
+    return shared / max(len(wa), len(wb), 1)
+
+
+def ttft(args):
+    from cag_config import CAGConfig
+    from cag_system import CAGSystemFreshSession
+
+    results, answers = {}, {}
+    for mode in MODES:
+        config = CAGConfig.from_env()
+        config.kv_cache_quant = mode
+        config.verbose = False
+        system = CAGSystemFreshSession(config)
+        with contextlib.redirect_stdout(io.StringIO()):
+            system.initialize()
+            for _ in system.stream_query("warm up"):    # allocator / kernels
+                pass
+
+        ttfts, peaks, answers[mode] = [], [], []
+        for _ in range(args.rounds):
+            for q in PROBES:
+                system._fast_reset()
+                torch.cuda.reset_peak_memory_stats()
+                t0 = time.perf_counter()
+                stream = system.stream_query(q)
+                parts = [next(stream)]
+                ttfts.append((time.perf_counter() - t0) * 1000)
+                parts.extend(stream)
+                peaks.append(torch.cuda.max_memory_allocated() / 1024 ** 2)
+                answers[mode].append("".join(parts).strip())
+        results[mode] = (
+            system.prefix_store.stats()["device_mb"],
+            max(peaks),
+            _pct(ttfts, 50),
+            _pct(ttfts, 90),
+            system.model_loader.kv_cache_kwargs.get("cache_config", {}).get("backend", "-"),
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            system.cleanup()
+        del system
+        torch.cuda.empty_cache()
+
+    print(f"\n{'mode':<6} {'backend':<8} {'prefix MB':>10} {'peak MB':>9} {'TTFT p50':>10} "
+          f"{'p90':>8} {'exact':>6} {'agree':>6}")
+    for mode, (prefix_mb, peak, p50, p90, backend) in results.items():
+        ref = answers["none"]
+        exact = sum(a == b for a, b in zip(answers[mode], ref)) / len(ref)
+        agree = statistics.mean(_agreement(a, b) for a, b in zip(answers[mode], ref))
+        print(f"{mode:<6} {backend:<8} {prefix_mb:>10.0f} {peak:>9.0f} {p50:>8.0f}ms "
+              f"{p90:>6.0f}ms {exact:>6.0%} {agree:>6.0%}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--synthetic", action="store_true")
+    ap.add_argument("--tokens", type=int, default=4096)
+    ap.add_argument("--rounds", type=int, default=2)
+    args = ap.parse_args()
+    if args.synthetic:
+        synthetic(args)
+    else:
+        ttft(args)
+
+
+if __name__ == "__main__":
+    main()
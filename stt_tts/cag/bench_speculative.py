@@ -0,0 +1,96 @@
+"""
+bench_speculative.py — greedy vs assisted decoding (config.speculative_mode)
+
+For each preset and speculative mode, starts CAGSystemFreshSession and
+streams every probe question from a fresh session:
+
+  TTFT p50   : time to the first streamed token
+  tok/s      : decode throughput, prompt forward excluded (DecodeMeter)
+  tok/step   : tokens per main-model forward — 1.0 for plain greedy
+  accept     : accepted / proposed draft tokens (ngram counts what it
+               actually proposed; the others assume k per step)
+  exact      : answers identical to the greedy run (greedy verification
+               should keep this at 100 %; anything less is numerics)
+
+Speculative decoding needs an fp16 generation cache, so every run uses
+kv_cache_quant="none" — the baseline included — to compare like with like.
+
+Usage (from stt_tts/cag/):
+    python bench_speculative.py --presets fast safe
+    python bench_speculative.py --modes none prompt_lookup --draft-tokens 3 5 8
+    python bench_speculative.py --modes none ngram --draft-tokens 4 8 12
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import torch  # noqa: E402
+
+from bench_hybrid_ttft import PROBES, _pct  # noqa: E402
+from cag_config import SPECULATIVE_MODES, get_config_preset  # noqa: E402
+
+
+def run(preset, mode, draft_tokens, rounds):
+    from cag_system import CAGSystemFreshSession
+
+    config = get_config_preset(preset, kv_cache_quant="none", speculative_mode=mode,
+                               num_draft_tokens=draft_tokens)
+    config.verbose = False
+    system = CAGSystemFreshSession(config)
+    with contextlib.redirect_stdout(io.StringIO()):
+        system.initialize()
+        for _ in system.stream_query("warm up"):    # allocator / kernels
+            pass
+    for key in system.decode_totals:
+        system.decode_totals[key] = 0
+
+    ttfts, answers = [], []
+    for _ in range(rounds):
+        for q in PROBES:
+            system._fast_reset()
+            t0 = time.perf_counter()
+            stream = system.stream_query(q)
+            parts = [next(stream)]
+            ttfts.append((time.perf_counter() - t0) * 1000)
+            parts.extend(stream)
+            answers.append("".join(parts).strip())
+    stats = system.get_decode_stats()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        system.cleanup()
+    del system
+    torch.cuda.empty_cache()
+    return _pct(ttfts, 50), stats, answers
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--presets", nargs="+", default=["fast"])
+    ap.add_argument("--modes", nargs="+", default=list(SPECULATIVE_MODES), choices=SPECULATIVE_MODES)
+    ap.add_argument("--draft-tokens", nargs="+", type=int, default=[5])
+    ap.add_argument("--rounds", type=int, default=2)
+    args = ap.parse_args()
+
+    print(f"{'preset':<8} {'mode':<14} {'k':>3} {'TTFT p50':>10} {'tok/s':>7} "
+          f"{'tok/step':>9} {'accept':>7} {'exact':>6}")
+    for preset in args.presets:
+        baseline = None
+        for mode in args.modes:
+            for k in (args.draft_tokens if mode != "none" else [args.draft_tokens[0]]):
+                p50, stats, answers = run(preset, mode, k, args.rounds)
+                if baseline is None and mode == "none":
+                    baseline = answers
+                exact = (f"{sum(a == b for a, b in zip(answers, baseline)) / len(baseline):>6.0%}"
+                         if baseline else f"{'-':>6}")
+                accept = f"{stats['acceptance_rate']:>7.0%}" if "acceptance_rate" in stats else f"{'-':>7}"
+                print(f"{preset:<8} {stats['mode']:<14} {stats['draft_tokens'] or '-':>3} {p50:>8.0f}ms "
+                      f"{stats['decode_tok_s']:>7.1f} {stats['tokens_per_step']:>9.2f} {accept} {exact}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+bench_token_stream.py — Per-token streaming overhead, old path vs AsyncTokenStreamer
+
+Replays a fixed answer through both streaming paths with a stand-in
+generation thread (no model), so only the streaming machinery is timed:
+
+  queue   : TextIteratorStreamer-style put() → queue.Queue → worker thread
+            iterating it → loop.call_soon_threadsafe per token →
+            asyncio.Queue → one json.dumps per token
+  direct  : AsyncTokenStreamer.put() → one wake-up per batch →
+            frames() → one json.dumps per frame
+
+put µs   : time spent in put() on the generation thread (blocks decoding)
+cpu µs   : process CPU time per token, whole pipeline
+lag p50  : token produced → JSON frame ready on the loop (the queue path
+           holds partial words back, TextStreamer-style)
+frames   : frames sent for the answer
+
+--rate emulates decode speed (tokens/s); 0 pushes tokens back to back,
+which shows the raw per-token cost.  --tokenizer uses a real HF tokenizer
+when transformers is installed (default: a byte-level stand-in).
+
+Usage (from stt_tts/cag/):
+    python bench_token_stream.py
+    python bench_token_stream.py --rate 40 --tokens 120
+    python bench_token_stream.py --tokenizer unsloth/Llama-3.2-3B-Instruct
+"""
+import argparse
+import asyncio
+import json
+import os
+import queue
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from token_streamer import AsyncTokenStreamer  # noqa: E402
+
+ANSWER = (
+    "Our Smart Invoice Hub routes every invoice to the right approver automatically, "
+    "so nothing gets lost between teams. Plans start at forty nine dollars a month, "
+    "and most customers cut approval time by half in the first quarter. "
+)
+
+
+class _ByteTokenizer:
+    """Three-byte tokens — enough to exercise incremental decoding"""
+
+    def __init__(self):
+        self.pieces = []
+
+    def encode(self, text):
+        data = text.encode()
+        ids = []
+        for i in range(0, len(data), 3):
+            ids.append(len(self.pieces))
+            self.pieces.append(data[i:i + 3])
+        return ids
+
+    def decode(self, ids, skip_special_tokens=False):
+        return b"".join(self.pieces[i] for i in ids).decode("utf-8", errors="replace")
+
+
+class _QueueStreamer:
+    """The TextIteratorStreamer / TextStreamer decode + queue hop"""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.token_cache, self.print_len = [], 0
+        self.q = queue.Queue()
+        self.decode_s = 0.0
+        self.held_ns = None                    # oldest token not yet emitted
+        self.next_is_prompt = True
+
+    def put(self, ids):
+        if self.next_is_prompt:                # skip_prompt
+            self.next_is_prompt = False
+            return
+        t0 = time.perf_counter()
+        if self.held_ns is None:
+            self.held_ns = time.perf_counter_ns()
+        self.token_cache.extend(ids)
+        text = self.tokenizer.decode(self.token_cache, skip_special_tokens=True)
+        if text.endswith("\n"):
+            printable, self.token_cache, self.print_len = text[self.print_len:], [], 0
+        elif text and text[-1] == " ":
+            printable = text[self.print_len:]
+            self.print_len += len(printable)
+        else:
+            printable = text[self.print_len:text.rfind(" ") + 1]
+            self.print_len += len(printable)
+        self.decode_s += time.perf_counter() - t0
+        if printable:
+            self.q.put((printable, self.held_ns))
+            self.held_ns = None
+
+    def end(self):
+        text = self.tokenizer.decode(self.token_cache, skip_special_tokens=True)
+        if text[self.print_len:]:
+            self.q.put((text[self.print_len:], time.perf_counter_ns()))
+        self.q.put(None)
+
+
+def _generate(streamer, ids, rate):
+    streamer.put([ids[0]] * 8)                 # prompt
+    gap = 1.0 / rate if rate else 0.0
+    for i in ids:
+        if gap:
+            time.sleep(gap)
+        streamer.put([i])
+    streamer.end()
+
+
+async def run_queue(tokenizer, ids, rate):
+    loop = asyncio.get_running_loop()
+    streamer = _QueueStreamer(tokenizer)
+    aq: asyncio.Queue = asyncio.Queue()
+    gen = threading.Thread(target=_generate, args=(streamer, ids, rate))
+
+    def _producer():
+        while True:
+            item = streamer.q.get()
+            if item is None:
+                loop.call_soon_threadsafe(aq.put_nowait, None)
+                return
+            loop.call_soon_threadsafe(aq.put_nowait, item)
+
+    cpu0 = time.process_time()
+    gen.start()
+    producer = loop.run_in_executor(None, _producer)
+    lags, frames = [], 0
+    while True:
+        item = await aq.get()
+        if item is None:
+            break
+        text, put_ns = item
+        json.dumps({"type": "token", "token": text, "turn_id": "t"})
+        lags.append((time.perf_counter_ns() - put_ns) / 1e6)
+        frames += 1
+    await producer
+    gen.join()
+    return streamer.decode_s, time.process_time() - cpu0, lags, frames
+
+
+async def run_direct(tokenizer, ids, rate, coalesce_ms):
+    loop = asyncio.get_running_loop()
+    streamer = AsyncTokenStreamer(tokenizer, loop, coalesce_ms=coalesce_ms)
+
+    def _gen():
+        _generate(streamer, ids, rate)
+        streamer.close()
+
+    cpu0 = time.process_time()
+    gen = threading.Thread(target=_gen)
+    gen.start()
+    async for text, _ in streamer.frames(timeout=10.0):
+        json.dumps({"type": "token", "token": text, "turn_id": "t"})
+    gen.join()
+    return streamer.decode_s, time.process_time() - cpu0, streamer.lag_ms, streamer.frames_sent
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tokens", type=int, default=200, help="answer length (repeats the sample text)")
+    ap.add_argument("--rate", type=float, default=0.0, help="tokens/s, 0 = back to back")
+    ap.add_argument("--coalesce-ms", type=float, default=5.0)
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--tokenizer", default=None)
+    args = ap.parse_args()
+
+    if args.tokenizer:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+        ids = tokenizer.encode(ANSWER * 20, add_special_tokens=False)
+    else:
+        tokenizer = _ByteTokenizer()
+        ids = tokenizer.encode(ANSWER * 20)
+    ids = ids[:args.tokens]
+    n = len(ids)
+    print(f"{n} tokens, rate={'max' if not args.rate else f'{args.rate:g}/s'}, "
+          f"coalesce={args.coalesce_ms:g} ms, {args.rounds} rounds\n")
+
+    print(f"{'path':<8} {'put µs':>8} {'cpu µs':>8} {'lag p50':>9} {'lag max':>9} {'frames':>7}")
+    for name in ("queue", "direct"):
+        put_us, cpu_us, lag50, lagmax, frames = [], [], [], [], []
+        for _ in range(args.rounds):
+            if name == "queue":
+                d, c, lags, f = asyncio.run(run_queue(tokenizer, ids, args.rate))
+            else:
+                d, c, lags, f = asyncio.run(run_direct(tokenizer, ids, args.rate, args.coalesce_ms))
+            lags = sorted(lags)
+            put_us.append(d / n * 1e6)
+            cpu_us.append(c / n * 1e6)
+            lag50.append(lags[len(lags) // 2])
+            lagmax.append(lags[-1])
+            frames.append(f)
+        print(f"{name:<8} {statistics.median(put_us):>8.1f} {statistics.median(cpu_us):>8.1f} "
+              f"{statistics.median(lag50):>7.3f}ms {statistics.median(lagmax):>7.3f}ms "
+              f"{statistics.median(frames):>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,14 +11,57 @@ IMPROVEMENTS v4 (Transformers 5.x compatibility):
     • cache.update(k, v, layer_idx)       ← rebuild from saved tensors
 - key_cache / value_cache attributes are NOT accessed directly.
 - No synchronize() or gc.collect() on the hot-path (per-query truncate).
+
+Multi-prefix:
+- With a PrefixCacheStore attached, every precomputed / loaded prefix is
+  registered under its PrefixKey and activate(key) switches cache_state to
+  another one, so a single model serves several knowledge bases.
+
+Persistence v5:
+- kv_cache_format="kvf" (default) writes the memory-mapped format in
+  kv_file.py next to the configured path (<name>.kvf), optionally with int8 /
+  fp8 KV (kv_cache_storage).  The header fingerprint (model, tokenizer,
+  prompt hash) must match or the cache is rebuilt.  Legacy torch.save files
+  are still read when no .kvf exists.
+- load_cache(allow_stale=True) keeps serving a cache built from older
+  knowledge; build_prefix() computes the replacement into the store without
+  disturbing the active prefix, and degraded_prefix() serves the knowledge
+  prompt without KV when no usable cache exists at all.
+- build_prefix(lock=...) tokenizes and prefills in rebuild_chunk_tokens
+  slices under the turns' model lock, after a free-memory check
+  (rebuild_min_free_mb), so a rebuild never runs beside a generate().
+- kv_cache_quant="int8" / "int4" keeps stored prefixes quantized (QuantizedKV,
+  per-channel K / per-token V scales); activate() dequantizes the one in use.
+
+Personas:
+- The system lines cached ahead of the knowledge are per prefix (`persona`,
+  default DEFAULT_PERSONA), so they are part of the prompt hash and a
+  tenant's prefix never carries another tenant's receptionist persona.
 """
 
 import torch
 import gc
 import os
-from typing import Dict, Any, Optional
+from contextlib import nullcontext
+from typing import Dict, Any, Optional, Tuple
 from dataclasses import dataclass, asdict
 
+from kv_file import KVFileError, dequantize_layers, load_kv_file, quantize_layers, save_kv_file
+from prefix_cache import PrefixCacheStore, PrefixKey, prompt_hash
+from token_budget import tokenizer_id
+
+# Cached ahead of the knowledge when a prefix names no persona of its own
+DEFAULT_PERSONA = (
+    "You are the AI receptionist for Ask Novation, a business solutions company.\n"
+    "You are warm, professional, and conversational."
+)
+# Tenant prefixes without a configured prompt — no company name
+TENANT_PERSONA = "You are an AI receptionist.\nYou are warm, professional, and conversational."
+
+
+class PrefixMemoryError(RuntimeError):
+    """A background prefix build stopped because too little GPU memory is free"""
+
 
 @dataclass
 class CacheState:
@@ -48,47 +91,211 @@ class CacheManager:
     2. Truncate cache after each query (reset to knowledge_token_count)
     3. Persist and load cache from disk
     4. Handle cache overflow according to policy
+    5. Register prefixes in a PrefixCacheStore and switch between them
     """
 
-    def __init__(self, model, tokenizer, device, config):
+    def __init__(self, model, tokenizer, device, config,
+                 store: Optional[PrefixCacheStore] = None):
         self.model     = model
         self.tokenizer = tokenizer
+        self.tokenizer_id = tokenizer_id(tokenizer)   # once — keys are built off the turn's lock
         self.device    = device
         self.config    = config
+        self.store     = store
 
         self.cache_state: Optional[CacheState] = None
+        self.active_key: Optional[PrefixKey]   = None
         self.is_initialized = False
 
     # ──────────────────────────────────────────────────────────────────────────
     # Pre-compute
     # ──────────────────────────────────────────────────────────────────────────
 
-    def precompute_cache(self, knowledge_text: str) -> CacheState:
+    def precompute_cache(self, knowledge_text: str, label: str = "",
+                         persona: Optional[str] = None) -> CacheState:
         """Pre-compute KV cache from solution knowledge base."""
+        key = self.prefix_key(knowledge_text, persona)
+        if self.activate(key):
+            print(f"♻️  Prefix {label or key.prompt_hash} already cached — reusing")
+            return self.cache_state
+
         print("\n" + "=" * 60)
         print("🎯 PRECOMPUTING KV CACHE")
         print("=" * 60)
 
-        self._cleanup_memory()
-        free_before = torch.cuda.mem_get_info()[0] // 1024 ** 2
-        print(f"📊 Free memory before cache: {free_before} MB")
+        self.cache_state    = self._compute_state(knowledge_text, persona=persona)
+        self.is_initialized = True
+        self._register(key, label)
+        return self.cache_state
+
+    def build_prefix(self, knowledge_text: str, label: str = "",
+                     base_key: Optional[PrefixKey] = None,
+                     persona: Optional[str] = None,
+                     lock=None) -> Tuple[PrefixKey, int]:
+        """
+        Precompute a prefix straight into the store without touching the
+        active cache_state, so it can run in a background thread while turns
+        are served.  No gc / synchronize here — a running turn shares the GPU.
+
+        With base_key (the prefix being replaced) still in the store, the KV
+        of the longest common token prefix is reused and only the tokens
+        after the first difference go through the model.
+
+        lock is the lock turns hold for tokenization and generate(): the
+        prompt is tokenized and each config.rebuild_chunk_tokens slice of
+        the prefill runs under it, so the rebuild never shares the GPU or
+        the tokenizer with a turn and turns only wait for one chunk.  Before
+        each chunk less than config.rebuild_min_free_mb free GPU memory
+        raises PrefixMemoryError.
+
+        Returns (key, reused_tokens).
+        """
+        if self.store is None:
+            raise ValueError("build_prefix() needs a PrefixCacheStore")
+        lock = lock if lock is not None else nullcontext()
+        key  = self.prefix_key(knowledge_text, persona)
+        existing = self.store.peek(key)
+        if existing is not None and existing.layers:
+            return key, existing.knowledge_token_count
+
+        with lock:
+            input_ids = self._tokenize_prompt(knowledge_text, persona)
+        base = self.store.peek(base_key) if base_key is not None else None
+        state, reused = None, 0
+        if base is not None and base.layers:
+            state, reused = self._extend_state(base, input_ids, lock=lock)
+        if state is None:
+            from transformers import DynamicCache
+            past_key_values = self._prefill(input_ids, DynamicCache(), 0, lock)
+            N = input_ids.shape[-1]
+            print(f"✅ KV Cache rebuilt  |  {N} tokens")
+            state = self._new_state(input_ids, past_key_values)
+        with lock:                               # quantizing for the store allocates on the GPU
+            self._store_state(key, state, label)
+        return key, reused
+
+    def _extend_state(self, base, input_ids: torch.Tensor, min_reuse: int = 64, lock=None):
+        """
+        (CacheState, reused tokens) built on the KV of base's longest common
+        token prefix with the new prompt, or (None, 0) when too little is
+        shared or the incremental forward fails.
+
+        Causal attention makes the KV of identical leading tokens identical,
+        so only input_ids[L:] needs a forward pass.  DynamicCache.update()
+        concatenates into new tensors, so the stored base is never modified.
+        """
+        old = base.input_ids[0].to(input_ids.device)
+        new = input_ids[0]
+        n = min(old.shape[-1], new.shape[-1])
+        mismatch = (old[:n] != new[:n]).nonzero()
+        L = int(mismatch[0]) if len(mismatch) else n
+        L = min(L, new.shape[-1] - 1)           # the forward needs at least one token
+        if L < min_reuse:
+            return None, 0
+
+        lock = lock if lock is not None else nullcontext()
+        try:
+            from transformers import DynamicCache
+            past_key_values = DynamicCache()
+            with lock:
+                for layer_idx, (k, v) in enumerate(dequantize_layers(base.layers)):
+                    past_key_values.update(
+                        k[:, :, :L].to(self.device), v[:, :, :L].to(self.device), layer_idx
+                    )
+            past_key_values = self._prefill(input_ids, past_key_values, L, lock)
+        except PrefixMemoryError:
+            raise
+        except RuntimeError as e:
+            print(f"⚠️  Incremental prefix rebuild failed ({e}) — recomputing in full")
+            return None, 0
+
+        N = new.shape[-1]
+        print(f"✅ KV Cache extended  |  {N} tokens  |  {L} reused, {N - L} computed")
+        return self._new_state(input_ids, past_key_values), L
+
+    def _prefill(self, input_ids: torch.Tensor, past_key_values, start: int, lock):
+        """
+        Forward input_ids[start:] onto past_key_values in
+        config.rebuild_chunk_tokens slices, each under lock after the free
+        memory check.  Returns the extended cache.
+        """
+        chunk = self.config.rebuild_chunk_tokens
+        for i in range(start, input_ids.shape[-1], chunk):
+            with lock:
+                free_mb = torch.cuda.mem_get_info()[0] // 1024 ** 2
+                if free_mb < self.config.rebuild_min_free_mb:
+                    raise PrefixMemoryError(
+                        f"only {free_mb} MB GPU memory free "
+                        f"(rebuild_min_free_mb={self.config.rebuild_min_free_mb})"
+                    )
+                with torch.no_grad():
+                    with torch.amp.autocast("cuda"):
+                        outputs = self.model(
+                            input_ids[:, i:i + chunk], past_key_values=past_key_values,
+                            use_cache=True, return_dict=True,
+                        )
+                past_key_values = outputs.past_key_values
+                del outputs
+        return past_key_values
+
+    @staticmethod
+    def _new_state(input_ids: torch.Tensor, past_key_values) -> CacheState:
+        N = input_ids.shape[-1]
+        return CacheState(
+            input_ids             = input_ids,
+            token_count           = N,
+            knowledge_token_count = N,
+            past_key_values       = past_key_values,
+            timestamp             = None,
+            metadata              = {"source": "solution_knowledge_base", "type": "recommendations"},
+        )
 
-        prompt = self._build_cache_prompt(knowledge_text)
+    def degraded_prefix(self, knowledge_text: str, label: str = "",
+                        persona: Optional[str] = None) -> PrefixKey:
+        """
+        Activate the knowledge prompt without KV tensors — tokenize only, no
+        forward pass.  The query path rebuilds the full prompt from input_ids
+        every turn, so answers stay correct while build_prefix() runs.
+        """
+        key = self.prefix_key(knowledge_text, persona)
+        key = PrefixKey(key.model_id, key.tokenizer_id, f"{key.prompt_hash}-nokv")
+        input_ids = self._tokenize_prompt(knowledge_text, persona)
+        N = input_ids.shape[-1]
+        metadata = {"source": "solution_knowledge_base", "degraded": True,
+                    "prefix": key.prompt_hash, "label": label}
+        if self.store is not None:
+            self.store.put(key, input_ids, [], knowledge_token_count=N,
+                           label=label, metadata=metadata)
+        self.cache_state    = CacheState(input_ids, N, N, past_key_values=None, metadata=metadata)
+        self.active_key     = key
+        self.is_initialized = True
+        return key
+
+    def _tokenize_prompt(self, knowledge_text: str, persona: Optional[str] = None) -> torch.Tensor:
+        prompt = self._build_cache_prompt(knowledge_text, persona)
         input_ids = self.tokenizer(
             prompt,
             return_tensors="pt",
             truncation=True,
             max_length=self.config.max_context_tokens,
         ).input_ids.to(self.device)
+        if input_ids.shape[-1] > self.config.max_context_tokens:
+            print(f"⚠️  Truncating to {self.config.max_context_tokens} tokens")
+            input_ids = input_ids[:, :self.config.max_context_tokens]
+        return input_ids
 
+    def _compute_state(self, knowledge_text: str, cleanup: bool = True,
+                       persona: Optional[str] = None) -> CacheState:
+        """One forward pass over the cache prompt → CacheState with its DynamicCache"""
+        if cleanup:
+            self._cleanup_memory()
+        free_before = torch.cuda.mem_get_info()[0] // 1024 ** 2
+        print(f"📊 Free memory before cache: {free_before} MB")
+
+        input_ids   = self._tokenize_prompt(knowledge_text, persona)
         token_count = input_ids.shape[-1]
         print(f"📝 Knowledge base tokens: {token_count}")
 
-        if token_count > self.config.max_context_tokens:
-            print(f"⚠️  Truncating to {self.config.max_context_tokens} tokens")
-            input_ids   = input_ids[:, :self.config.max_context_tokens]
-            token_count = input_ids.shape[-1]
-
         try:
             with torch.no_grad():
                 with torch.amp.autocast("cuda"):
@@ -113,14 +320,12 @@ class CacheManager:
             )
 
             del outputs
-            self._cleanup_memory()
+            if cleanup:
+                self._cleanup_memory()
 
             free_after  = torch.cuda.mem_get_info()[0] // 1024 ** 2
             memory_used = free_before - free_after
             print(f"✅ KV Cache pre-computed  |  {token_count} tokens  |  ~{memory_used} MB used")
-
-            self.cache_state    = cache_state
-            self.is_initialized = True
             return cache_state
 
         except RuntimeError as e:
@@ -175,32 +380,65 @@ class CacheManager:
     # Persistence
     # ──────────────────────────────────────────────────────────────────────────
 
-    def save_cache(self, path: Optional[str] = None):
+    def save_cache(self, path: Optional[str] = None, key: Optional[PrefixKey] = None):
         """
-        Serialise the DynamicCache to disk.
+        Serialise the DynamicCache to disk — the active one, or the stored
+        prefix `key` (used by background rebuilds).
 
         Uses __iter__ on DynamicCache which yields (keys, values) per layer —
         the only stable way to extract tensors in Transformers 5.x without
         accessing private attributes.
         """
-        if self.cache_state is None:
-            raise ValueError("No cache to save")
-
         path = path or self.config.cache_file_path
 
-        layers_cpu = None
-        if self.cache_state.past_key_values is not None:
-            # __iter__ yields (key_tensor, value_tensor) for each layer
-            layers_cpu = [
-                (k.cpu(), v.cpu())
-                for k, v in self.cache_state.past_key_values
-            ]
+        if key is not None:
+            entry = self.store.peek(key) if self.store is not None else None
+            if entry is None:
+                raise ValueError(f"Prefix {key.prompt_hash} is not in the store")
+            N        = entry.knowledge_token_count
+            layers   = dequantize_layers(entry.layers)
+            metadata = {"token_count": N, "knowledge_token_count": N,
+                        "timestamp": None, "metadata": entry.metadata}
+            input_ids = entry.input_ids
+        else:
+            if self.cache_state is None:
+                raise ValueError("No cache to save")
+            key      = self.active_key
+            N        = self.cache_state.knowledge_token_count
+            metadata = self.cache_state.to_dict()
+            input_ids = self.cache_state.input_ids
+            layers   = None
+            if self.cache_state.past_key_values is not None:
+                # __iter__ yields (key_tensor, value_tensor) for each layer
+                layers = [(k[:, :, :N], v[:, :, :N]) for k, v in self.cache_state.past_key_values]
+
+        fingerprint = asdict(key) if key is not None else self._base_fingerprint()
+
+        kvf_path = self._kvf_path(path)
+        if kvf_path and layers is not None:
+            storage = getattr(self.config, "kv_cache_storage", "native")
+            save_kv_file(
+                kvf_path,
+                input_ids[:, :N],
+                layers,
+                fingerprint           = fingerprint,
+                knowledge_token_count = N,
+                storage               = storage,
+                metadata              = metadata,
+            )
+            if self.config.verbose:
+                size_mb = os.path.getsize(kvf_path) / 1024 ** 2
+                print(f"💾 Cache saved → {kvf_path}  ({storage}, {size_mb:.0f} MB)")
+            return
+
+        layers_cpu = [(k.cpu(), v.cpu()) for k, v in layers] if layers is not None else None
 
         torch.save(
             {
-                "input_ids":    self.cache_state.input_ids.cpu(),
+                "input_ids":    input_ids[:, :N].cpu(),
                 "cache_layers": layers_cpu,          # list of (k, v) tuples
-                "metadata":     self.cache_state.to_dict(),
+                "metadata":     metadata,
+                "fingerprint":  fingerprint,
             },
             path,
         )
@@ -208,13 +446,30 @@ class CacheManager:
         if self.config.verbose:
             print(f"💾 Cache saved → {path}  ({len(layers_cpu) if layers_cpu else 0} layers)")
 
-    def load_cache(self, path: Optional[str] = None) -> bool:
+    def cache_file_exists(self, path: Optional[str] = None) -> bool:
+        path = path or self.config.cache_file_path
+        kvf_path = self._kvf_path(path)
+        return bool(kvf_path and os.path.exists(kvf_path)) or os.path.exists(path)
+
+    def load_cache(self, path: Optional[str] = None, knowledge_text: Optional[str] = None,
+                   label: str = "", allow_stale: bool = False,
+                   persona: Optional[str] = None) -> bool:
         """
         Load a saved cache from disk and reconstruct a DynamicCache via
         cache.update() — the only stable write API in Transformers 5.x.
+
+        With knowledge_text given, the file's fingerprint must match the
+        prefix that text would produce.  A cache for the same model and
+        tokenizer but older knowledge is rejected, or — allow_stale=True —
+        loaded under its own key so it can serve until a rebuild replaces it
+        (active_key then differs from prefix_key(knowledge_text, persona)).
         """
         path = path or self.config.cache_file_path
 
+        kvf_path = self._kvf_path(path)
+        if kvf_path and os.path.exists(kvf_path):
+            return self._load_kv_file(kvf_path, knowledge_text, label, allow_stale, persona)
+
         if not os.path.exists(path):
             return False
 
@@ -249,7 +504,7 @@ class CacheManager:
                     layer_idx,
                 )
 
-            self.cache_state = CacheState(
+            state = CacheState(
                 input_ids             = cache_data["input_ids"].to(self.device),
                 token_count           = metadata["token_count"],
                 knowledge_token_count = metadata["knowledge_token_count"],
@@ -257,7 +512,9 @@ class CacheManager:
                 timestamp             = metadata.get("timestamp"),
                 metadata              = metadata.get("metadata"),
             )
-            self.is_initialized = True
+            if not self._accept_loaded(state, cache_data.get("fingerprint"),
+                                       knowledge_text, label, allow_stale, persona):
+                return False
 
             layer_count = len(layers_raw)
             print(f"✅ Cache loaded ← {path}  ({layer_count} layers)")
@@ -267,6 +524,147 @@ class CacheManager:
             print(f"❌ Failed to load cache: {e}")
             return False
 
+    def _kvf_path(self, path: str) -> Optional[str]:
+        if getattr(self.config, "kv_cache_format", "kvf") != "kvf":
+            return None
+        return os.path.splitext(path)[0] + ".kvf"
+
+    def _base_fingerprint(self) -> Dict[str, str]:
+        return {"model_id": self.config.model_id, "tokenizer_id": self.tokenizer_id}
+
+    def _load_kv_file(self, path: str, knowledge_text: Optional[str], label: str,
+                      allow_stale: bool, persona: Optional[str] = None) -> bool:
+        """mmap a .kvf file straight into device tensors; foreign files → rebuild"""
+        expected = self._base_fingerprint()
+        if knowledge_text is not None and not allow_stale:
+            expected = asdict(self.prefix_key(knowledge_text, persona))   # fail before reading tensors
+        try:
+            header, input_ids, layers = load_kv_file(path, self.device, expected)
+        except (KVFileError, OSError) as e:
+            print(f"⚠️  Cache file {path} unusable ({e}) — rebuilding...")
+            return False
+
+        from transformers import DynamicCache
+        past_key_values = DynamicCache()
+        for layer_idx, (k, v) in enumerate(layers):
+            past_key_values.update(k, v, layer_idx)
+
+        metadata = header.get("metadata") or {}
+        state = CacheState(
+            input_ids             = input_ids,
+            token_count           = header["token_count"],
+            knowledge_token_count = header["knowledge_token_count"],
+            past_key_values       = past_key_values,
+            timestamp             = metadata.get("timestamp"),
+            metadata              = metadata.get("metadata"),
+        )
+        if not self._accept_loaded(state, header.get("fingerprint"), knowledge_text, label,
+                                   allow_stale, persona):
+            return False
+
+        print(f"✅ Cache loaded ← {path}  ({len(layers)} layers, "
+              f"{header['storage']}, {header['load_ms']:.0f} ms)")
+        return True
+
+    def _accept_loaded(self, state: CacheState, fingerprint: Optional[Dict[str, str]],
+                       knowledge_text: Optional[str], label: str, allow_stale: bool,
+                       persona: Optional[str] = None) -> bool:
+        """Check a loaded cache against the expected prefix and make it current"""
+        if knowledge_text is None:
+            self.cache_state    = state
+            self.active_key     = None
+            self.is_initialized = True
+            return True
+
+        key = self.prefix_key(knowledge_text, persona)
+        fp  = fingerprint or {}         # legacy files carry none
+        if fp.get("model_id", key.model_id) != key.model_id \
+                or fp.get("tokenizer_id", key.tokenizer_id) != key.tokenizer_id:
+            print("⚠️  Cache was built for another model / tokenizer — rebuilding...")
+            return False
+
+        file_key = PrefixKey(key.model_id, key.tokenizer_id, fp.get("prompt_hash") or "unverified")
+        if file_key != key:
+            if not allow_stale:
+                print("⚠️  Cache is stale (knowledge or prompt changed) — rebuilding...")
+                return False
+            print("⚠️  Cache is stale — serving it until the background rebuild finishes")
+
+        self.cache_state    = state
+        self.is_initialized = True
+        self._register(file_key, label)
+        return True
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Prefix store
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def prefix_key(self, knowledge_text: str, persona: Optional[str] = None) -> PrefixKey:
+        """Store key of the prefix precompute_cache() builds for knowledge_text and persona"""
+        return PrefixKey(
+            model_id     = self.config.model_id,
+            tokenizer_id = self.tokenizer_id,
+            prompt_hash  = prompt_hash(self._build_cache_prompt(knowledge_text, persona)),
+        )
+
+    def activate(self, key: PrefixKey) -> bool:
+        """
+        Make a stored prefix the current cache_state.  Returns False when there
+        is no store or the prefix was never added / has been evicted.
+
+        The DynamicCache is a fresh wrapper around the stored tensors, so the
+        crop() in truncate_to_knowledge() never touches the store's copy.  A
+        quantized prefix is dequantized here; the store keeps it compressed.
+        """
+        if self.store is None:
+            return False
+        entry = self.store.get(key)
+        if entry is None:
+            return False
+        if self.active_key == key and self.cache_state is not None:
+            return True     # already active — keep the current wrapper
+
+        from transformers import DynamicCache
+        past_key_values = DynamicCache()
+        for layer_idx, (k, v) in enumerate(dequantize_layers(entry.layers)):
+            past_key_values.update(k, v, layer_idx)
+
+        self.cache_state = CacheState(
+            input_ids             = entry.input_ids,
+            token_count           = entry.knowledge_token_count,
+            knowledge_token_count = entry.knowledge_token_count,
+            past_key_values       = past_key_values,
+            timestamp             = None,
+            metadata              = dict(entry.metadata),
+        )
+        self.active_key     = key
+        self.is_initialized = True
+        return True
+
+    def _register(self, key: PrefixKey, label: str):
+        """Hand the current cache_state to the store and re-activate it from there"""
+        self.active_key = key
+        if self.store is None or self.cache_state is None \
+                or self.cache_state.past_key_values is None:
+            return
+        self._store_state(key, self.cache_state, label)
+        self.cache_state = None
+        self.active_key  = None
+        self.activate(key)
+
+    def _store_state(self, key: PrefixKey, state: CacheState, label: str):
+        N = state.knowledge_token_count
+        quant = getattr(self.config, "kv_cache_quant", "none")
+        layers = [(k[:, :, :N], v[:, :, :N]) for k, v in state.past_key_values]
+        self.store.put(
+            key,
+            state.input_ids[:, :N],
+            quantize_layers(layers, "native" if quant == "none" else quant),
+            knowledge_token_count = N,
+            label                 = label,
+            metadata              = dict(state.metadata or {}, prefix=key.prompt_hash, label=label),
+        )
+
     # ──────────────────────────────────────────────────────────────────────────
     # Info
     # ──────────────────────────────────────────────────────────────────────────
@@ -274,22 +672,24 @@ class CacheManager:
     def get_cache_info(self) -> Dict[str, Any]:
         if self.cache_state is None:
             return {"initialized": False}
-        return {
+        info = {
             "initialized":      self.is_initialized,
             "token_count":      self.cache_state.token_count,
             "knowledge_tokens": self.cache_state.knowledge_token_count,
             "metadata":         self.cache_state.metadata,
         }
+        if self.store is not None:
+            info["prefix_store"] = self.store.stats()
+        return info
 
     # ──────────────────────────────────────────────────────────────────────────
     # Prompt builder
     # ──────────────────────────────────────────────────────────────────────────
 
-    def _build_cache_prompt(self, knowledge_text: str) -> str:
+    def _build_cache_prompt(self, knowledge_text: str, persona: Optional[str] = None) -> str:
         prompt = (
             "<|begin_of_text|><|start_header_id|>system<|end_header_id|>\n"
-            "You are the AI receptionist for Ask Novation, a business solutions company.\n"
-            "You are warm, professional, and conversational.\n"
+            f"{(persona or DEFAULT_PERSONA).strip()}\n"
             "Use the knowledge base below to answer user questions accurately.\n"
             "\n"
             "=== KNOWLEDGE BASE ===\n"
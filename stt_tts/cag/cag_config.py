@@ -16,7 +16,19 @@ import os
 base_dir = os.path.dirname(__file__)
 
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import Dict, Optional
+
+# Llama 3.2-3B KV: 28 layers × 8 KV heads × 128 head dim, keys and values
+KV_ELEMENTS_PER_TOKEN = 28 * 8 * 128 * 2
+
+# Bytes per KV element, scales included (per-channel / per-group fp32 scales ≈ 3 %)
+KV_BYTES_PER_ELEMENT = {"none": 2.0, "int8": 1.03, "int4": 0.53}
+
+# Llama 3.2-1B draft model: ~0.9 GB 4-bit weights; 16 layers × 8 KV heads × 64 head dim
+DRAFT_MODEL_MB = 900
+DRAFT_KV_ELEMENTS_PER_TOKEN = 16 * 8 * 64 * 2
+
+SPECULATIVE_MODES = ("none", "draft", "prompt_lookup", "ngram")
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -63,10 +75,55 @@ class CAGConfig:
     cache_file_path: str      = "commercial_kv_cache_7500.pt"
     cache_metadata_path: str  = "cache_metadata_7500.json"
     enable_cache_persistence: bool = True
+    kv_cache_format: str      = "kvf"      # "kvf" (mmap, kv_file.py) | "torch" (legacy torch.save)
+    kv_cache_storage: str     = "native"   # kvf only: "native" | "int8" | "fp8"
+    background_cache_rebuild: bool = True   # stale cache: serve it, rebuild in a thread
+    rebuild_chunk_tokens: int = 512         # rebuild prefill per model-lock hold — turns run in between
+    rebuild_min_free_mb: int  = 768         # rebuild gives up when less GPU memory than this is free
 
     # ── Knowledge base ───────────────────────────────────────────────────────
     knowledge_jsonl_path: str      = os.path.join(base_dir, ".\\data\\cache_metadata.json")
     max_knowledge_entries: int     = 50_000
+    knowledge_index_path: Optional[str] = None   # None → <knowledge file>.idx
+    persist_knowledge_index: bool  = True
+    exact_token_packing: bool      = True   # pack on real token counts, not chars / 4
+    token_count_cache_path: Optional[str] = None   # None → <knowledge file>.tokens-<tokenizer>
+    tokenize_batch_size: int       = 512
+    knowledge_watch_interval_s: float = 0.0   # > 0 → poll knowledge files, hot-reload on change
+
+    # ── Hybrid knowledge: small cached core + per-query retrieval ────────────
+    knowledge_mode: str            = "full"   # "full" | "hybrid"
+    core_knowledge_tokens: int     = 1024     # hybrid: knowledge tokens in the cached prefix
+    retrieval_top_k: int           = 8
+    retrieval_max_tokens: int      = 600      # hybrid: per-query retrieved block budget
+
+    # ── Prefix cache: several knowledge prefixes on one model ────────────────
+    # ~112 KB of KV per token for Llama 3.2-3B fp16 → one 4k prefix ≈ 450 MB
+    prefix_cache_gpu_mb: int       = 1024     # LRU prefixes past this spill to CPU
+    prefix_cache_cpu_mb: int       = 4096     # LRU spilled prefixes past this are dropped
+    prefix_cache_pin_memory: bool  = True     # pinned host copies → fast promote
+    tenant_knowledge_paths: Dict[str, str] = field(default_factory=dict)   # prefix name → knowledge file
+    # prefix name → system prompt file ("default" included).  The prompt is
+    # cached at the head of that prefix; prefixes without one use
+    # system_prompt per turn and a neutral cached persona (tenants) or the
+    # built-in receptionist persona ("default")
+    tenant_system_prompts: Dict[str, str] = field(default_factory=dict)
+
+    # ── KV quantization: stored prefixes + the per-session generation cache ──
+    kv_cache_quant: str            = "none"   # "none" | "int8" | "int4"
+    kv_quant_residual_tokens: int  = 128      # generation: newest tokens kept in fp16
+
+    # ── Assisted (speculative) decoding ──────────────────────────────────────
+    # "draft": a small model with the same tokenizer proposes tokens;
+    # "prompt_lookup": continuations of the last n-gram found in the prompt
+    # (knowledge + conversation) — no extra model;  "ngram": the same from a
+    # per-prefix n-gram index that also covers the answer so far
+    # (ngram_lookup.py, streaming paths).  The main model verifies every
+    # proposal in one forward pass, so greedy output is unchanged.
+    speculative_mode: str          = "none"   # "none" | "draft" | "prompt_lookup" | "ngram"
+    draft_model_id: str            = "unsloth/Llama-3.2-1B-Instruct"
+    num_draft_tokens: int          = 5        # tokens proposed per verification step
+    prompt_lookup_max_ngram: int   = 3        # prompt_lookup / ngram: longest n-gram matched
 
     # ── Quantization (4-bit for 6 GB GPU) ────────────────────────────────────
     use_4bit: bool           = True
@@ -127,6 +184,55 @@ class CAGConfig:
                 f"Must be one of {valid_policies}"
             )
 
+        if self.knowledge_mode not in ("full", "hybrid"):
+            raise ValueError(
+                f"Invalid knowledge_mode: '{self.knowledge_mode}'. Must be 'full' or 'hybrid'"
+            )
+
+        if self.kv_cache_format not in ("kvf", "torch"):
+            raise ValueError(
+                f"Invalid kv_cache_format: '{self.kv_cache_format}'. Must be 'kvf' or 'torch'"
+            )
+
+        if self.kv_cache_storage not in ("native", "int8", "int4", "fp8"):
+            raise ValueError(
+                f"Invalid kv_cache_storage: '{self.kv_cache_storage}'. "
+                "Must be 'native', 'int8', 'int4' or 'fp8'"
+            )
+
+        if self.rebuild_chunk_tokens < 1 or self.rebuild_min_free_mb < 0:
+            raise ValueError("rebuild_chunk_tokens must be >= 1 and rebuild_min_free_mb >= 0")
+
+        if self.kv_cache_quant not in KV_BYTES_PER_ELEMENT:
+            raise ValueError(
+                f"Invalid kv_cache_quant: '{self.kv_cache_quant}'. "
+                "Must be 'none', 'int8' or 'int4'"
+            )
+
+        if self.speculative_mode not in SPECULATIVE_MODES:
+            raise ValueError(
+                f"Invalid speculative_mode: '{self.speculative_mode}'. "
+                "Must be 'none', 'draft', 'prompt_lookup' or 'ngram'"
+            )
+
+        if self.speculative_mode != "none":
+            if self.num_draft_tokens < 1 or self.prompt_lookup_max_ngram < 1:
+                raise ValueError("num_draft_tokens and prompt_lookup_max_ngram must be >= 1")
+            # Rejected draft tokens are cropped from the KV cache after each
+            # step — a quantized cache cannot be cropped
+            if self.kv_cache_quant != "none":
+                raise ValueError(
+                    f"speculative_mode '{self.speculative_mode}' needs kv_cache_quant='none' "
+                    f"(got '{self.kv_cache_quant}')"
+                )
+
+        unknown = set(self.tenant_system_prompts) - set(self.tenant_knowledge_paths) - {"default"}
+        if unknown:
+            raise ValueError(
+                f"tenant_system_prompts for unknown prefixes: {sorted(unknown)}. "
+                "Add them to tenant_knowledge_paths (CAG_TENANTS)"
+            )
+
         if self.max_new_tokens < 50:
             print(
                 f"⚠️  WARNING: max_new_tokens ({self.max_new_tokens}) is low — "
@@ -149,16 +255,41 @@ class CAGConfig:
         # Allow a preset name as shortcut
         preset = os.getenv("CAG_PRESET", "").strip()
         if preset:
-            return get_config_preset(preset)
+            overrides = {}
+            if os.getenv("CAG_KV_QUANT"):
+                overrides["kv_cache_quant"] = os.getenv("CAG_KV_QUANT")
+            if os.getenv("CAG_SPECULATIVE"):
+                overrides["speculative_mode"] = os.getenv("CAG_SPECULATIVE")
+            if os.getenv("CAG_DRAFT_MODEL_ID"):
+                overrides["draft_model_id"] = os.getenv("CAG_DRAFT_MODEL_ID")
+            if os.getenv("CAG_DRAFT_TOKENS"):
+                overrides["num_draft_tokens"] = int(os.getenv("CAG_DRAFT_TOKENS"))
+            # Speculative decoding needs an fp16 KV cache; presets may quantize it
+            if overrides.get("speculative_mode", "none") != "none" and "kv_cache_quant" not in overrides:
+                overrides["kv_cache_quant"] = "none"
+            return get_config_preset(preset, **overrides)
 
         return cls(
             model_id            = os.getenv("CAG_MODEL_ID",            cls.model_id),
             max_context_tokens  = int(os.getenv("CAG_MAX_CONTEXT_TOKENS", cls.max_context_tokens)),
             max_new_tokens      = int(os.getenv("CAG_MAX_NEW_TOKENS",     cls.max_new_tokens)),
             cache_file_path     = os.getenv("CAG_CACHE_FILE",          cls.cache_file_path),
+            kv_cache_storage    = os.getenv("CAG_KV_STORAGE",          cls.kv_cache_storage),
+            kv_cache_quant      = os.getenv("CAG_KV_QUANT",            cls.kv_cache_quant),
+            speculative_mode    = os.getenv("CAG_SPECULATIVE",         cls.speculative_mode),
+            draft_model_id      = os.getenv("CAG_DRAFT_MODEL_ID",      cls.draft_model_id),
+            num_draft_tokens    = int(os.getenv("CAG_DRAFT_TOKENS",       cls.num_draft_tokens)),
+            background_cache_rebuild = os.getenv("CAG_BACKGROUND_REBUILD", "true").lower() == "true",
             verbose             = os.getenv("CAG_VERBOSE", "true").lower() == "true",
             debug_mode          = os.getenv("CAG_DEBUG",   "false").lower() == "true",
             use_flash_attention = os.getenv("CAG_FLASH_ATTN", "true").lower() == "true",
+            knowledge_mode      = os.getenv("CAG_KNOWLEDGE_MODE",     cls.knowledge_mode),
+            retrieval_top_k     = int(os.getenv("CAG_RETRIEVAL_TOP_K",    cls.retrieval_top_k)),
+            prefix_cache_gpu_mb = int(os.getenv("CAG_PREFIX_GPU_MB",      cls.prefix_cache_gpu_mb)),
+            prefix_cache_cpu_mb = int(os.getenv("CAG_PREFIX_CPU_MB",      cls.prefix_cache_cpu_mb)),
+            tenant_knowledge_paths = parse_tenants(os.getenv("CAG_TENANTS", "")),
+            tenant_system_prompts  = parse_tenants(os.getenv("CAG_TENANT_PROMPTS", ""), "CAG_TENANT_PROMPTS"),
+            knowledge_watch_interval_s = float(os.getenv("CAG_KNOWLEDGE_WATCH_S", 0.0)),
         )
 
     def get_pytorch_alloc_config(self) -> str:
@@ -184,8 +315,45 @@ class CAGConfig:
         }
         if self.no_repeat_ngram_size > 0:
             cfg["no_repeat_ngram_size"] = self.no_repeat_ngram_size
+        cfg.update(self.get_kv_cache_kwargs())
+        if self.speculative_mode == "prompt_lookup":
+            cfg.update(self.get_prompt_lookup_kwargs())
         return cfg
 
+    def get_prompt_lookup_kwargs(self) -> dict:
+        """generate() kwargs for prompt-lookup drafting (transformers PromptLookupCandidateGenerator)"""
+        return {
+            "prompt_lookup_num_tokens": self.num_draft_tokens,
+            "max_matching_ngram_size":  self.prompt_lookup_max_ngram,
+        }
+
+    def get_kv_cache_kwargs(self) -> dict:
+        """generate() kwargs for a quantized per-session KV cache (transformers QuantizedCache)"""
+        if self.kv_cache_quant == "none":
+            return {}
+        # quanto handles 2 / 4 bits, HQQ also 8
+        backend, nbits = {"int8": ("HQQ", 8), "int4": ("quanto", 4)}[self.kv_cache_quant]
+        return {
+            "cache_implementation": "quantized",
+            "cache_config": {
+                "backend":         backend,
+                "nbits":           nbits,
+                "residual_length": self.kv_quant_residual_tokens,
+            },
+        }
+
+    def kv_cache_mb(self, tokens: Optional[int] = None) -> float:
+        """KV memory for `tokens` (default max_context_tokens) at kv_cache_quant"""
+        tokens = self.max_context_tokens if tokens is None else tokens
+        return tokens * KV_ELEMENTS_PER_TOKEN * KV_BYTES_PER_ELEMENT[self.kv_cache_quant] / (1024 * 1024)
+
+    def draft_model_mb(self) -> float:
+        """Draft model weights + its fp16 KV over max_context_tokens (0 unless speculative_mode='draft')"""
+        if self.speculative_mode != "draft":
+            return 0.0
+        kv = (self.max_context_tokens + self.max_new_tokens) * DRAFT_KV_ELEMENTS_PER_TOKEN * 2
+        return DRAFT_MODEL_MB + kv / (1024 * 1024)
+
     def print_config_summary(self):
         print("\n" + "=" * 70)
         print("⚙️  CAG CONFIGURATION SUMMARY")
@@ -197,9 +365,23 @@ class CAGConfig:
         print(f"   4-bit quant:         {self.use_4bit}  ({self.quant_type})")
         print(f"   GPU memory fraction: {self.gpu_memory_fraction}")
         print(f"   Cache persistence:   {self.enable_cache_persistence}")
-        print(f"   Cache file:          {self.cache_file_path}")
+        print(f"   Cache file:          {self.cache_file_path}  ({self.kv_cache_format}, {self.kv_cache_storage})")
+        print(f"   KV quantization:     {self.kv_cache_quant}")
+        if self.speculative_mode == "draft":
+            print(f"   Speculative:         draft {self.draft_model_id}  ({self.num_draft_tokens} tokens/step)")
+        elif self.speculative_mode in ("prompt_lookup", "ngram"):
+            print(f"   Speculative:         {self.speculative_mode.replace('_', ' ')}  "
+                  f"({self.num_draft_tokens} tokens/step, ≤{self.prompt_lookup_max_ngram}-gram)")
         print(f"   Conversation history:{self.max_conversation_history} turns")
         print(f"   Max KB entries:      {self.max_knowledge_entries:,}")
+        print(f"   Knowledge mode:      {self.knowledge_mode}")
+        if self.knowledge_watch_interval_s > 0:
+            print(f"   Knowledge watch:     every {self.knowledge_watch_interval_s:g}s")
+        print(f"   Prefix cache:        {self.prefix_cache_gpu_mb} MB GPU / {self.prefix_cache_cpu_mb} MB CPU")
+        if self.tenant_knowledge_paths:
+            print(f"   Tenant prefixes:     {', '.join(sorted(self.tenant_knowledge_paths))}")
+        if self.tenant_system_prompts:
+            print(f"   Prefix prompts:      {', '.join(sorted(self.tenant_system_prompts))}")
         print("=" * 70)
 
     def print_memory_estimate(self):
@@ -207,12 +389,15 @@ class CAGConfig:
         print("📊 MEMORY ESTIMATION  (RTX 4050 — 6 GB)")
         print("=" * 70)
         model_size_mb  = 1_200
-        kv_cache_mb    = (self.max_context_tokens * 16 * 28) / (1024 * 1024)
+        kv_cache_mb    = self.kv_cache_mb()
         activation_mb  = 800
-        total_mb       = model_size_mb + kv_cache_mb + activation_mb
+        draft_mb       = self.draft_model_mb()
+        total_mb       = model_size_mb + kv_cache_mb + activation_mb + draft_mb
         vram           = 6_140
         print(f"   Model (4-bit):    ~{model_size_mb} MB")
-        print(f"   KV Cache:         ~{kv_cache_mb:.0f} MB  ({self.max_context_tokens:,} tokens)")
+        print(f"   KV Cache:         ~{kv_cache_mb:.0f} MB  ({self.max_context_tokens:,} tokens, {self.kv_cache_quant})")
+        if draft_mb:
+            print(f"   Draft model:      ~{draft_mb:.0f} MB  (weights + KV)")
         print(f"   Activations:      ~{activation_mb} MB")
         print(f"   ──────────────────────────────")
         print(f"   Total estimated:  ~{total_mb:.0f} MB")
@@ -224,9 +409,9 @@ class CAGConfig:
 
     def validate_for_gpu(self, gpu_memory_mb: int = 6_140):
         model_size  = 1_200
-        kv_cache    = (self.max_context_tokens * 16 * 28) / (1024 * 1024)
+        kv_cache    = self.kv_cache_mb()
         activation  = 800
-        total       = model_size + kv_cache + activation
+        total       = model_size + kv_cache + activation + self.draft_model_mb()
         if total > gpu_memory_mb * 0.95:
             raise ValueError(
                 f"Configuration requires ~{total:.0f} MB but GPU only has {gpu_memory_mb} MB! "
@@ -235,42 +420,66 @@ class CAGConfig:
         return True
 
 
+def parse_tenants(spec: str, var: str = "CAG_TENANTS") -> Dict[str, str]:
+    """
+    CAG_TENANTS="acme=/data/acme.json,globex=/data/globex.jsonl" → {name: path}.
+    CAG_TENANT_PROMPTS uses the same syntax (name=prompt file).
+    """
+    tenants: Dict[str, str] = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, sep, path = item.partition("=")
+        if not sep or not name.strip() or not path.strip():
+            raise ValueError(f"Invalid {var} entry: '{item}'. Expected name=path")
+        tenants[name.strip()] = path.strip()
+    return tenants
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # Preset configurations  (all sized for RTX 4050 6 GB + Llama 3.2-3B 4-bit)
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def get_config_preset(preset_name: str) -> CAGConfig:
+def get_config_preset(preset_name: str, **overrides) -> CAGConfig:
     """
     Return a named preset configuration.
 
     Presets:
-      default   — balanced  (7 500 ctx, 256 gen)
-      large     — max gen   (6 000 ctx, 512 gen)
-      fast      — low TTFT  (5 000 ctx, 256 gen)
-      safe      — most stable (4 000 ctx, 256 gen)
+      default   — balanced  (7 500 ctx, 256 gen, int8 KV)
+      large     — max gen   (6 000 ctx, 512 gen, int8 KV)
+      fast      — low TTFT  (5 000 ctx, 256 gen, fp16 KV)
+      safe      — most stable (4 000 ctx, 256 gen, fp16 KV)
+
+    Keyword overrides (e.g. kv_cache_quant="int4") replace preset fields.
     """
+    # Field dicts, not instances — only the chosen preset is built and validated
     presets = {
-        "default": CAGConfig(
+        "default": dict(
             max_context_tokens = 7_500,
             max_new_tokens     = 256,
+            model_max_tokens   = 8_000,
+            kv_cache_quant     = "int8",
             cache_file_path    = "commercial_kv_cache_7500.pt",
             cache_metadata_path= "cache_metadata_7500.json",
         ),
-        "large": CAGConfig(
+        "large": dict(
             max_context_tokens = 6_000,
             max_new_tokens     = 512,
+            kv_cache_quant     = "int8",
             cache_file_path    = "commercial_kv_cache_6k.pt",
             cache_metadata_path= "cache_metadata_6k.json",
         ),
-        "fast": CAGConfig(
+        "fast": dict(
             max_context_tokens = 5_000,
             max_new_tokens     = 256,
+            kv_cache_quant     = "none",
             cache_file_path    = "commercial_kv_cache_5k.pt",
             cache_metadata_path= "cache_metadata_5k.json",
         ),
-        "safe": CAGConfig(
+        "safe": dict(
             max_context_tokens = 4_000,
             max_new_tokens     = 256,
+            kv_cache_quant     = "none",
             cache_file_path    = "commercial_kv_cache_4k.pt",
             cache_metadata_path= "cache_metadata_4k.json",
         ),
@@ -280,7 +489,7 @@ def get_config_preset(preset_name: str) -> CAGConfig:
         raise ValueError(
             f"Unknown preset: '{preset_name}'. Available: {list(presets.keys())}"
         )
-    return presets[preset_name]
+    return CAGConfig(**dict(presets[preset_name], **overrides))
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -299,11 +508,16 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="CAG Configuration Tool")
     parser.add_argument("--preset",   choices=["default", "large", "fast", "safe"])
+    parser.add_argument("--kv-quant", choices=["none", "int8", "int4"])
+    parser.add_argument("--speculative", choices=list(SPECULATIVE_MODES))
     parser.add_argument("--estimate", action="store_true")
     parser.add_argument("--validate", action="store_true")
     args = parser.parse_args()
 
-    cfg = get_config_preset(args.preset) if args.preset else CAGConfig()
+    overrides = {"kv_cache_quant": args.kv_quant} if args.kv_quant else {}
+    if args.speculative:
+        overrides["speculative_mode"] = args.speculative
+    cfg = get_config_preset(args.preset, **overrides) if args.preset else CAGConfig(**overrides)
     cfg.print_config_summary()
 
     if args.estimate:
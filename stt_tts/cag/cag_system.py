@@ -20,11 +20,67 @@ IMPROVEMENTS v2:
 FIX v3:
 - Added Event to threading import (was causing NameError: name 'threading'
   is not defined when stream_query() called threading.Event()).
+
+MULTI-PREFIX:
+- Knowledge prefixes live in a PrefixCacheStore.  The built-in knowledge base
+  is the "default" prefix; config.tenant_knowledge_paths (or add_prefix())
+  adds more, and query() / stream_query() take the prefix name to answer
+  from, so one loaded model serves several tenants.
+- A prefix's system prompt (config.tenant_system_prompts, or add_prefix())
+  is cached at its head as the persona, so it is part of the prefix hash
+  and not repeated per turn.  Tenants without one cache a neutral persona.
+
+STALE CACHES:
+- A cache whose fingerprint no longer matches its knowledge (or an
+  unverifiable legacy file) keeps serving at startup, or — when it belongs
+  to another model / tokenizer — the knowledge prompt is served without KV.
+  A background thread builds the current prefix and it is swapped in at the
+  start of the next turn (config.background_cache_rebuild).
+
+HOT RELOAD:
+- reload_prefix() re-reads a prefix's knowledge file on the same background
+  path: the new KV prefix extends the serving one where the token streams
+  agree, is built while turns keep running on the old one, and is swapped in
+  when the next turn starts.  get_reload_status() reports build time and the
+  swap latency.
+- Rebuilds run one at a time, load knowledge with their own tokenizer, and
+  prefill in config.rebuild_chunk_tokens chunks under the lock each turn
+  holds from tokenization to the end of generate(), so a rebuild forward
+  never overlaps a turn's; too little free GPU memory fails the rebuild
+  (config.rebuild_min_free_mb) and the old prefix keeps serving.  config.knowledge_watch_interval_s > 0 also watches the
+  knowledge files and reloads on change.
+
+ASYNC STREAMING:
+- start_stream() feeds generate() into an AsyncTokenStreamer that the
+  WebSocket handler reads on its event loop — no TextIteratorStreamer queue
+  or per-token call_soon_threadsafe, and tokens arriving together leave as
+  one frame.  stream_query() stays for the blocking / SSE callers.
+
+CANCELLATION:
+- Every streaming turn passes a CancelCriteria stopping criterion to
+  generate(), so setting the turn's cancel event (gateway barge-in, client
+  gone, token timeout) ends generation at the next decode step instead of
+  running to max_new_tokens while the GPU lock is held.  A turn cancelled
+  before generate() starts skips it.  stream_query() cancels its own turn
+  when the consumer stops iterating.
+
+SPECULATIVE DECODING:
+- config.speculative_mode adds ModelLoader.assisted_kwargs (draft model or
+  prompt lookup) to every generate() call.  Streaming turns also carry a
+  DecodeMeter criterion; get_stats()["decoding"] reports tokens per
+  verification step, draft acceptance rate and decode tokens/s.
+- speculative_mode="ngram" drafts from an n-gram index instead
+  (ngram_lookup.py): the knowledge prefix is indexed once per prefix key,
+  each streaming turn overlays the rest of its prompt and the answer as it
+  grows, and lookup_generate() verifies each draft in one forward pass.
 """
 
 import os
 import gc
+import time
+import dataclasses
 import torch
+from dataclasses import dataclass
 from typing import Optional, Dict, Any, Generator
 from datetime import datetime
 
@@ -32,10 +88,34 @@ from cag_config import CAGConfig, COMPRESSED_SYSTEM_PROMPT
 from gpu import free_gpu_smart, force_gpu, get_gpu_memory_info
 from model_loader import ModelLoader
 from knowledge_store import SolutionKnowledgeStore as KnowledgeStore
-from cache_manager import CacheManager
+from cache_manager import CacheManager, TENANT_PERSONA
+from knowledge_watcher import KnowledgeWatcher
+from token_streamer import AsyncTokenStreamer, CancelCriteria, DecodeMeter, decode_summary
+from ngram_lookup import NgramIndex, lookup_generate
+from prefix_cache import MB, PrefixCacheStore, PrefixKey
 from conversation_memory import ConversationMemory
-from transformers import TextIteratorStreamer
-from threading import Thread, Event          # ← FIX: added Event
+from transformers import TextIteratorStreamer, StoppingCriteriaList
+from threading import Thread, Event, Lock    # ← FIX: added Event
+
+DEFAULT_PREFIX = "default"
+
+
+@dataclass
+class KnowledgePrefix:
+    """A knowledge base the model can answer from — one entry in the prefix store"""
+    name: str
+    knowledge_store: KnowledgeStore
+    knowledge_text: str
+    key: PrefixKey
+    cache_path: str
+    system_prompt: Optional[str] = None    # None → the session's system prompt
+    persona: Optional[str] = None          # cached ahead of the knowledge; None → DEFAULT_PERSONA
+    serving_key: Optional[PrefixKey] = None   # what turns use; != key while stale
+    rebuild: Optional[Thread] = None
+
+    @property
+    def stale(self) -> bool:
+        return self.serving_key != self.key
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -64,6 +144,21 @@ class CAGSystemFreshSession:
         self.model_loader    = None
         self.knowledge_store = None
         self.cache_manager   = None
+        self.prefix_store: Optional[PrefixCacheStore] = None
+        self.prefixes: Dict[str, KnowledgePrefix]     = {}
+        self.active_prefix: Optional[KnowledgePrefix] = None
+        self.reload_status: Dict[str, Dict[str, Any]] = {}
+        self.knowledge_watcher: Optional[KnowledgeWatcher] = None
+        self._rebuild_lock = Lock()
+        # Held from tokenization to the end of generate() by every turn, and
+        # by prefix rebuilds per prefill chunk — one model forward and one
+        # user of the shared tokenizer at a time
+        self._model_lock = Lock()
+        self._rebuild_run_lock = Lock()     # one background rebuild at a time
+        self.decode_totals: Dict[str, float] = {
+            "turns": 0, "steps": 0, "tokens": 0, "decode_tokens": 0, "decode_s": 0.0, "proposed": 0,
+        }
+        self.ngram_indexes: Dict[PrefixKey, NgramIndex] = {}   # speculative_mode="ngram"
 
         # In-memory conversation — no disk persistence
         self.memory = ConversationMemory(
@@ -117,6 +212,7 @@ class CAGSystemFreshSession:
         self._load_model()
         self._load_knowledge()
         self._precompute_cache(force_rebuild=force_cache_rebuild)
+        self._start_knowledge_watcher()
 
         self.is_initialized = True
         print("\n✅ CAG SYSTEM READY")
@@ -147,80 +243,373 @@ class CAGSystemFreshSession:
 
     def _precompute_cache(self, force_rebuild: bool = False):
         print("\n🎯 PHASE 4: CACHE PRECOMPUTATION")
-        knowledge_text = self.knowledge_store.build_knowledge_text(use_compact=True)
+        self.prefix_store = PrefixCacheStore(
+            self.device,
+            gpu_budget_bytes = self.config.prefix_cache_gpu_mb * MB,
+            cpu_budget_bytes = self.config.prefix_cache_cpu_mb * MB,
+            pin_memory       = self.config.prefix_cache_pin_memory,
+        )
         self.cache_manager = CacheManager(
-            self.model, self.tokenizer, self.device, self.config
+            self.model, self.tokenizer, self.device, self.config, store=self.prefix_store
         )
-        cache_loaded = False
-        if not force_rebuild and self.config.enable_cache_persistence:
-            cache_loaded = self.cache_manager.load_cache()
-        if not cache_loaded:
-            self.cache_manager.precompute_cache(knowledge_text)
-            if self.config.enable_cache_persistence:
-                self.cache_manager.save_cache()
-                self.knowledge_store.save_metadata()
+        self.add_prefix(DEFAULT_PREFIX, self.knowledge_store,
+                        system_prompt=self._load_prefix_prompt(DEFAULT_PREFIX),
+                        force_rebuild=force_rebuild)
+        for name, path in self.config.tenant_knowledge_paths.items():
+            self.add_prefix(name, self._load_tenant_knowledge(path),
+                            system_prompt=self._load_prefix_prompt(name),
+                            force_rebuild=force_rebuild)
+        self._select_prefix(DEFAULT_PREFIX)
         print("✅ Cache ready")
 
+    def add_prefix(self, name: str, knowledge_store: KnowledgeStore,
+                   system_prompt: Optional[str] = None,
+                   force_rebuild: bool = False) -> KnowledgePrefix:
+        """
+        Build (or load) the cached prefix for a loaded knowledge store and make
+        it selectable as `name` in query() / stream_query().  `system_prompt`
+        is cached at the head of the prefix (see _prefix_persona()).
+        """
+        knowledge_text = self._prefix_text(knowledge_store)
+        persona        = self._prefix_persona(name, system_prompt)
+
+        cache_path = self._kv_cache_path(name)
+        persist    = self.config.enable_cache_persistence
+        background = self.config.background_cache_rebuild and persist and not force_rebuild
+        target     = self.cache_manager.prefix_key(knowledge_text, persona)
+
+        if persist and not force_rebuild and self.cache_manager.load_cache(
+                cache_path, knowledge_text, name, allow_stale=background, persona=persona):
+            serving = self.cache_manager.active_key
+        elif background and self.cache_manager.cache_file_exists(cache_path):
+            print(f"⚠️  Prefix '{name}': no usable cache — serving without KV until rebuilt")
+            serving = self.cache_manager.degraded_prefix(knowledge_text, name, persona)
+        else:
+            self.cache_manager.precompute_cache(knowledge_text, name, persona)
+            if persist:
+                self.cache_manager.save_cache(cache_path)
+                if name == DEFAULT_PREFIX:
+                    knowledge_store.save_metadata()
+            serving = target
+
+        prefix = KnowledgePrefix(
+            name            = name,
+            knowledge_store = knowledge_store,
+            knowledge_text  = knowledge_text,
+            key             = target,
+            cache_path      = cache_path,
+            system_prompt   = system_prompt,
+            persona         = persona,
+            serving_key     = serving,
+        )
+        self.prefixes[name] = prefix
+        print(f"✅ Prefix '{name}' ready  |  {knowledge_store.get_token_count():,} knowledge tokens")
+        if prefix.stale:
+            self._start_rebuild(prefix, trigger="stale")
+        return prefix
+
+    @staticmethod
+    def _prefix_persona(name: str, system_prompt: Optional[str]) -> Optional[str]:
+        """
+        Persona cached ahead of a prefix's knowledge: its own system prompt,
+        else the built-in receptionist (default prefix) or a neutral one —
+        never another tenant's company.
+        """
+        if system_prompt:
+            return system_prompt
+        return None if name == DEFAULT_PREFIX else TENANT_PERSONA
+
+    def _load_prefix_prompt(self, name: str) -> Optional[str]:
+        """System prompt file configured for a prefix (config.tenant_system_prompts)"""
+        path = self.config.tenant_system_prompts.get(name)
+        if not path:
+            return None
+        with open(path, encoding="utf-8") as f:
+            prompt = f.read().strip()
+        print(f"📝 Prefix '{name}' system prompt ← {path}")
+        return prompt or None
+
+    def _prefix_text(self, knowledge_store: KnowledgeStore) -> str:
+        """Knowledge text cached for a store — core-only (plus a retriever) in hybrid mode"""
+        hybrid = self.config.knowledge_mode == "hybrid"
+        knowledge_text = knowledge_store.build_knowledge_text(
+            use_compact=True,
+            budget=self.config.core_knowledge_tokens if hybrid else None,
+        )
+        if hybrid:
+            knowledge_store.build_retriever()
+        return knowledge_text
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Background rebuild / hot reload
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def reload_prefix(self, name: Optional[str] = None, trigger: str = "admin",
+                      wait: bool = False) -> Dict[str, Any]:
+        """
+        Re-read a prefix's knowledge file and rebuild its KV prefix off the
+        request path.  Turns keep using the current prefix until the new one
+        is ready; the next turn after that picks it up.
+
+        Returns the prefix's reload status (see get_reload_status()); its
+        "state" is "busy" when a rebuild of this prefix is already running.
+        """
+        prefix = self.prefixes.get(name or DEFAULT_PREFIX)
+        if prefix is None:
+            raise ValueError(
+                f"Unknown knowledge prefix: '{name}'. Available: {sorted(self.prefixes)}"
+            )
+        if not self._start_rebuild(prefix, trigger=trigger, reload=True):
+            return dict(self.reload_status.get(prefix.name, {}), state="busy")
+        if wait:
+            prefix.rebuild.join()
+        return dict(self.reload_status[prefix.name])
+
+    def get_reload_status(self) -> Dict[str, Dict[str, Any]]:
+        """Last rebuild per prefix: state, timings and — once swapped — swap latency"""
+        return {name: dict(status) for name, status in self.reload_status.items()}
+
+    def _start_rebuild(self, prefix: KnowledgePrefix, trigger: str,
+                       reload: bool = False) -> bool:
+        """Start a rebuild thread for the prefix; False if one is already running"""
+        with self._rebuild_lock:
+            if prefix.rebuild is not None and prefix.rebuild.is_alive():
+                return False
+            self.reload_status[prefix.name] = {
+                "state":      "running",
+                "trigger":    trigger,
+                "started_at": time.time(),
+            }
+            prefix.rebuild = Thread(target=self._rebuild_prefix, args=(prefix, reload),
+                                    name=f"cag-rebuild-{prefix.name}", daemon=True)
+            prefix.rebuild.start()
+            return True
+
+    def _rebuild_prefix(self, prefix: KnowledgePrefix, reload: bool):
+        """
+        Background thread: (re)load the knowledge, compute its prefix into the
+        store — extending the serving prefix's KV where the token streams
+        agree — persist it, then publish it.
+
+        Publishing is a single assignment (prefix.serving_key for a stale
+        prefix, self.prefixes[name] for a reload) read by _select_prefix()
+        when the next turn starts, so a turn in flight finishes on the old
+        prefix.
+
+        Rebuilds run one at a time.  The knowledge is loaded with a tokenizer
+        of its own, and the prompt tokenization and prefill run in chunks
+        under _model_lock (CacheManager.build_prefix), so the rebuild never
+        runs a forward pass or touches the shared tokenizer during a turn.
+        """
+        with self._rebuild_run_lock:
+            self._run_rebuild(prefix, reload)
+
+    def _run_rebuild(self, prefix: KnowledgePrefix, reload: bool):
+        status = self.reload_status[prefix.name]
+        print(f"🔄 Rebuilding prefix '{prefix.name}' in the background...")
+        t0 = time.perf_counter()
+        try:
+            store, text = prefix.knowledge_store, prefix.knowledge_text
+            system_prompt, persona = prefix.system_prompt, prefix.persona
+            if reload:
+                store = KnowledgeStore(self.model_loader.new_tokenizer(), prefix.knowledge_store.config)
+                store.load_from_sources()
+                text = self._prefix_text(store)
+                if prefix.name in self.config.tenant_system_prompts:
+                    system_prompt = self._load_prefix_prompt(prefix.name)
+                    persona       = self._prefix_persona(prefix.name, system_prompt)
+            t1 = time.perf_counter()
+            status["load_ms"] = round((t1 - t0) * 1000, 1)
+
+            target = self.cache_manager.prefix_key(text, persona)
+            if target == prefix.serving_key:
+                status.update(state="unchanged", total_ms=status["load_ms"])
+                print(f"✅ Prefix '{prefix.name}': knowledge unchanged — nothing to swap")
+                return
+
+            key, reused = self.cache_manager.build_prefix(
+                text, prefix.name, base_key=prefix.serving_key, persona=persona,
+                lock=self._model_lock,
+            )
+            status["kv_ms"] = round((time.perf_counter() - t1) * 1000, 1)
+            if self.config.enable_cache_persistence:
+                self.cache_manager.save_cache(prefix.cache_path, key=key)
+                if prefix.name == DEFAULT_PREFIX:
+                    store.save_metadata()
+        except Exception as e:
+            status.update(state="failed", error=str(e))
+            print(f"❌ Background rebuild of prefix '{prefix.name}' failed: {e}")
+            return
+
+        old = prefix.serving_key
+        if reload:
+            store.tokenizer = self.tokenizer    # turns retrieve under _model_lock with the shared one
+            current = dataclasses.replace(
+                prefix, knowledge_store=store, knowledge_text=text, key=key, serving_key=key,
+                system_prompt=system_prompt, persona=persona,
+            )
+            self.prefixes[prefix.name] = current
+            if prefix.name == DEFAULT_PREFIX:
+                self.knowledge_store = store
+        else:
+            prefix.serving_key = key
+        if old is not None and old != key and not any(
+                p.serving_key == old for p in self.prefixes.values()):
+            self.prefix_store.discard(old)
+
+        total = time.perf_counter() - t0
+        status.update(
+            state         = "ready",
+            tokens        = store.get_token_count(),
+            reused_tokens = reused,
+            total_ms      = round(total * 1000, 1),
+            ready_at      = time.time(),
+            hash          = key.prompt_hash,
+        )
+        print(f"✅ Prefix '{prefix.name}' rebuilt in {total:.1f}s "
+              f"({reused:,} KV tokens reused) — swapped in for the next turn")
+
+    def wait_for_rebuilds(self, timeout: Optional[float] = None) -> bool:
+        """Block until background prefix rebuilds finish; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for prefix in list(self.prefixes.values()):
+            if prefix.rebuild is not None:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                prefix.rebuild.join(remaining)
+                if prefix.rebuild.is_alive():
+                    return False
+        return True
+
+    def _start_knowledge_watcher(self):
+        interval = self.config.knowledge_watch_interval_s
+        if interval <= 0:
+            return
+        paths = {
+            name: p.knowledge_store.index.source_path
+            for name, p in self.prefixes.items() if p.knowledge_store.index is not None
+        }
+        self.knowledge_watcher = KnowledgeWatcher(
+            paths, lambda name: self.reload_prefix(name, trigger="watcher"), interval_s=interval
+        )
+        self.knowledge_watcher.start()
+
+    def _load_tenant_knowledge(self, path: str) -> KnowledgeStore:
+        print(f"\n📚 Tenant knowledge: {path}")
+        tenant_config = dataclasses.replace(
+            self.config,
+            knowledge_jsonl_path   = path,
+            knowledge_index_path   = None,   # derived from the tenant file
+            token_count_cache_path = None,
+        )
+        store = KnowledgeStore(self.tokenizer, tenant_config)
+        store.load_from_sources()
+        return store
+
+    def _select_prefix(self, name: Optional[str]) -> KnowledgePrefix:
+        """
+        Point the cache manager at the prefix for this query.  A prefix the
+        store has evicted is reloaded from disk, or recomputed as a last resort.
+        """
+        prefix = self.prefixes.get(name or DEFAULT_PREFIX)
+        if prefix is None:
+            raise ValueError(
+                f"Unknown knowledge prefix: '{name}'. Available: {sorted(self.prefixes)}"
+            )
+        swapping = self.cache_manager.active_key != prefix.serving_key
+        t0 = time.perf_counter()
+        if not self.cache_manager.activate(prefix.serving_key):
+            loaded = self.config.enable_cache_persistence and self.cache_manager.load_cache(
+                prefix.cache_path, prefix.knowledge_text, prefix.name, persona=prefix.persona
+            )
+            if not loaded:
+                self.cache_manager.precompute_cache(prefix.knowledge_text, prefix.name, prefix.persona)
+            prefix.serving_key = prefix.key
+        if swapping:
+            self._record_swap(prefix, time.perf_counter() - t0)
+        self.active_prefix = prefix
+        return prefix
+
+    def _record_swap(self, prefix: KnowledgePrefix, elapsed: float):
+        """First turn on a freshly rebuilt prefix: note how long the swap took"""
+        status = self.reload_status.get(prefix.name)
+        if (not status or status.get("state") != "ready"
+                or status.get("hash") != prefix.serving_key.prompt_hash):
+            return
+        status.update(
+            state       = "swapped",
+            swap_ms     = round(elapsed * 1000, 2),
+            swap_wait_s = round(time.time() - status["ready_at"], 1),
+        )
+        print(f"🔁 Prefix '{prefix.name}' swapped in ({status['swap_ms']} ms, "
+              f"{status['swap_wait_s']}s after it was ready)")
+
+    def _kv_cache_path(self, name: str = DEFAULT_PREFIX) -> str:
+        """Hybrid mode caches a core-only prefix — keep it apart from the full one.
+        Tenant prefixes get their own file next to the default one."""
+        path = self.config.cache_file_path
+        root, ext = os.path.splitext(path)
+        if name != DEFAULT_PREFIX:
+            root = f"{root}.{name}"
+        if self.config.knowledge_mode == "hybrid":
+            root = f"{root}.hybrid"
+        return f"{root}{ext}"
+
     # ──────────────────────────────────────────────────────────────────────────
     # Core query path
     # ──────────────────────────────────────────────────────────────────────────
 
-    def query(self, user_message: str) -> Dict[str, Any]:
+    def query(self, user_message: str, prefix: Optional[str] = None) -> Dict[str, Any]:
         """
         Process a single query by building the full prompt (knowledge prefix +
         conversation history + current question) and running a standard
         model.generate() call — no past_key_values injection.
 
+        `prefix` names the knowledge base to answer from (None → default).
+
         This is robust against quantized-model cache-mutation bugs and avoids
         the index-out-of-bounds errors that arise when DynamicCache is passed
         directly into generate() with 4-bit models.
         """
-        if not self.is_initialized:
-            raise ValueError("System not initialized. Call initialize() first.")
-
-        self.total_queries += 1
-
-        if not self.memory.user_profile.name:
-            name = self.memory.extract_name_from_response(user_message)
-            if name:
-                self.memory.set_user_name(name)
-
-        self.memory.add_message("user", user_message)
+        self._begin_turn(user_message)
 
         try:
-            full_prompt = self._build_full_prompt()
-
-            inputs = self.tokenizer(
-                full_prompt,
-                return_tensors="pt",
-                truncation=True,
-                max_length=self.config.max_context_tokens,
-            )
-            input_ids      = inputs.input_ids.to(self.device)
-            attention_mask = inputs.attention_mask.to(self.device)
-            prompt_len     = input_ids.shape[-1]
-
-            with torch.no_grad():
-                with torch.amp.autocast("cuda"):
-                    output_ids = self.model.generate(
-                        input_ids=input_ids,
-                        attention_mask=attention_mask,
-                        max_new_tokens=self.config.max_new_tokens,
-                        do_sample=False,
-                        pad_token_id=self.tokenizer.eos_token_id,
-                        eos_token_id=self.tokenizer.eos_token_id,
-                        use_cache=True,
-                        num_beams=1,
-                        repetition_penalty=1.0,
-                        # temperature and top_p intentionally omitted:
-                        # passing None with do_sample=False triggers a
-                        # transformers warning and is a no-op anyway.
-                    )
-
-            answer = self.tokenizer.decode(
-                output_ids[0][prompt_len:],
-                skip_special_tokens=True,
-            ).strip()
+            with self._model_lock:                  # no prefix rebuild chunk runs beside this
+                self._select_prefix(prefix)
+                full_prompt = self._build_full_prompt()
+
+                inputs = self.tokenizer(
+                    full_prompt,
+                    return_tensors="pt",
+                    truncation=True,
+                    max_length=self.config.max_context_tokens,
+                )
+                input_ids      = inputs.input_ids.to(self.device)
+                attention_mask = inputs.attention_mask.to(self.device)
+                prompt_len     = input_ids.shape[-1]
+
+                with torch.no_grad():
+                    with torch.amp.autocast("cuda"):
+                        output_ids = self.model.generate(
+                            input_ids=input_ids,
+                            attention_mask=attention_mask,
+                            max_new_tokens=self.config.max_new_tokens,
+                            do_sample=False,
+                            pad_token_id=self.tokenizer.eos_token_id,
+                            eos_token_id=self.tokenizer.eos_token_id,
+                            use_cache=True,
+                            num_beams=1,
+                            repetition_penalty=1.0,
+                            # temperature and top_p intentionally omitted:
+                            # passing None with do_sample=False triggers a
+                            # transformers warning and is a no-op anyway.
+                            **self.model_loader.kv_cache_kwargs,
+                            **self.model_loader.assisted_kwargs,
+                        )
+
+                answer = self.tokenizer.decode(
+                    output_ids[0][prompt_len:],
+                    skip_special_tokens=True,
+                ).strip()
 
             self.memory.add_message("assistant", answer)
             del input_ids, attention_mask, output_ids, inputs
@@ -241,66 +630,48 @@ class CAGSystemFreshSession:
                 "error":        str(e),
             }
 
-    def stream_query(self, user_message: str) -> Generator[str, None, None]:
+    def stream_query(self, user_message: str, prefix: Optional[str] = None,
+                     cancel_event: Optional[Event] = None) -> Generator[str, None, None]:
         """
-        Stream response token-by-token.
+        Stream response token-by-token from the knowledge prefix `prefix`.
 
         Builds the complete prompt (system + knowledge base + conversation
         history + current message) and streams using TextIteratorStreamer +
         a daemon Thread.  No past_key_values injection — avoids the
         DynamicCache mutation / index-out-of-bounds bug with 4-bit models.
-        """
-        if not self.is_initialized:
-            raise ValueError("System not initialized. Call initialize() first.")
 
-        self.total_queries += 1
-
-        if not self.memory.user_profile.name:
-            name = self.memory.extract_name_from_response(user_message)
-            if name:
-                self.memory.set_user_name(name)
-
-        self.memory.add_message("user", user_message)
+        Setting `cancel_event` stops generation at the next decode step;
+        closing the generator early does the same.
+        """
+        self._begin_turn(user_message)
+        cancel_event = cancel_event or Event()
 
         try:
-            full_prompt = self._build_full_prompt()
-
-            inputs = self.tokenizer(
-                full_prompt,
-                return_tensors="pt",
-                truncation=True,
-                max_length=self.config.max_context_tokens,
-            )
-            input_ids      = inputs.input_ids.to(self.device)
-            attention_mask = inputs.attention_mask.to(self.device)
-
-            streamer = TextIteratorStreamer(
-                self.tokenizer,
-                skip_prompt=True,
-                skip_special_tokens=True,
-                timeout=None,
-            )
-
-            gen_kwargs = {
-                "input_ids":          input_ids,
-                "attention_mask":     attention_mask,
-                "max_new_tokens":     self.config.max_new_tokens,
-                "streamer":           streamer,
-                "do_sample":          False,
-                "pad_token_id":       self.tokenizer.eos_token_id,
-                "eos_token_id":       self.tokenizer.eos_token_id,
-                "use_cache":          True,
-                "num_beams":          1,
-                "repetition_penalty": 1.0,
-            }
+            self._model_lock.acquire()      # released by the generation thread
+            try:
+                self._select_prefix(prefix)
+                streamer = TextIteratorStreamer(
+                    self.tokenizer,
+                    skip_prompt=True,
+                    skip_special_tokens=True,
+                    timeout=None,
+                )
+                meter      = DecodeMeter()
+                gen_kwargs = self._stream_kwargs(streamer, cancel_event, meter)
+            except BaseException:
+                self._model_lock.release()
+                raise
 
             done_event = Event()
 
             def _gen_thread():
                 try:
+                    if cancel_event.is_set():
+                        streamer.end()
+                        return
                     with torch.no_grad():
                         with torch.amp.autocast("cuda"):
-                            self.model.generate(**gen_kwargs)
+                            self._generate(gen_kwargs)
                 except Exception as e:
                     print(f"\n❌ Generation thread error: {e}")
                     try:
@@ -308,6 +679,9 @@ class CAGSystemFreshSession:
                     except Exception:
                         pass
                 finally:
+                    self._record_decode(meter, gen_kwargs.get("drafter"))
+                    gen_kwargs.clear()      # drop this turn's input tensors now
+                    self._model_lock.release()
                     done_event.set()
 
             thread = Thread(target=_gen_thread, daemon=True)
@@ -322,11 +696,11 @@ class CAGSystemFreshSession:
             except Exception as e:
                 print(f"\n❌ Streaming error: {e}")
             finally:
+                cancel_event.set()          # no-op when generation already ended
                 done_event.wait(timeout=120.0)
                 thread.join(timeout=5.0)
                 if response_text:
                     self.memory.add_message("assistant", response_text.strip())
-                del input_ids, attention_mask, inputs
 
         except RuntimeError as e:
             if "out of memory" in str(e).lower():
@@ -337,7 +711,171 @@ class CAGSystemFreshSession:
         except Exception as e:
             yield f"\n[Error: {e}]"
 
-    def stream_chunks(self, user_message: str) -> Generator[str, None, None]:
+    def start_stream(self, user_message: str, loop, prefix: Optional[str] = None,
+                     coalesce_ms: float = 5.0,
+                     cancel_event: Optional[Event] = None) -> AsyncTokenStreamer:
+        """
+        Start answering from `prefix` and return an AsyncTokenStreamer to read
+        the answer from the event loop `loop` — the WebSocket path.
+
+        Unlike stream_query() there is no TextIteratorStreamer queue or
+        blocking iterator between generate() and the loop, and tokens that
+        arrive together are delivered as one frame (see token_streamer.py).
+
+        Blocks while the prompt is built and tokenized, so call it from a
+        worker thread.  Raises on an unknown prefix; a generation error
+        closes the stream with streamer.error set.
+
+        Setting `cancel_event` (or calling streamer.cancel()) stops
+        generation at the next decode step; streamer.closed_at marks when
+        the generation thread let go of the GPU.
+        """
+        self._begin_turn(user_message)
+        self._model_lock.acquire()          # released by the generation thread
+        try:
+            self._select_prefix(prefix)
+            streamer   = AsyncTokenStreamer(self.tokenizer, loop, coalesce_ms=coalesce_ms,
+                                            cancel_event=cancel_event)
+            meter      = DecodeMeter()
+            gen_kwargs = self._stream_kwargs(streamer, streamer.cancel_event, meter)
+        except BaseException:
+            self._model_lock.release()
+            raise
+
+        def _gen_thread():
+            error = None
+            try:
+                if not streamer.cancel_event.is_set():     # barge-in during tokenization
+                    with torch.no_grad():
+                        with torch.amp.autocast("cuda"):
+                            self._generate(gen_kwargs)
+            except Exception as e:
+                print(f"\n❌ Generation thread error: {e}")
+                error = str(e)
+            finally:
+                try:
+                    streamer.decode_stats = self._record_decode(meter, gen_kwargs.get("drafter"))
+                    gen_kwargs.clear()      # drop this turn's input tensors before the lock is released
+                    answer = streamer.generated_text().strip()
+                    if answer:
+                        self.memory.add_message("assistant", answer)
+                    streamer.close(error)   # flushes the decoder tail — still needs the tokenizer
+                finally:
+                    self._model_lock.release()
+
+        Thread(target=_gen_thread, name="cag-generate", daemon=True).start()
+        return streamer
+
+    def _begin_turn(self, user_message: str):
+        if not self.is_initialized:
+            raise ValueError("System not initialized. Call initialize() first.")
+
+        self.total_queries += 1
+
+        if not self.memory.user_profile.name:
+            name = self.memory.extract_name_from_response(user_message)
+            if name:
+                self.memory.set_user_name(name)
+
+        self.memory.add_message("user", user_message)
+
+    def _stream_kwargs(self, streamer, cancel_event: Event, meter: DecodeMeter) -> Dict[str, Any]:
+        """
+        generate() kwargs for the current conversation, streaming into
+        `streamer`, stopping once `cancel_event` is set and counting steps
+        in `meter`
+        """
+        inputs = self.tokenizer(
+            self._build_full_prompt(),
+            return_tensors="pt",
+            truncation=True,
+            max_length=self.config.max_context_tokens,
+        )
+        meter.prompt_tokens = inputs.input_ids.shape[-1]
+        drafter = {}
+        if self.config.speculative_mode == "ngram":
+            drafter = {
+                "drafter":          self._ngram_drafter(inputs.input_ids[0].tolist()),
+                "num_draft_tokens": self.config.num_draft_tokens,
+            }
+        return {
+            "input_ids":          inputs.input_ids.to(self.device),
+            "attention_mask":     inputs.attention_mask.to(self.device),
+            "max_new_tokens":     self.config.max_new_tokens,
+            "streamer":           streamer,
+            "do_sample":          False,
+            "pad_token_id":       self.tokenizer.eos_token_id,
+            "eos_token_id":       self.tokenizer.eos_token_id,
+            "use_cache":          True,
+            "num_beams":          1,
+            "repetition_penalty": 1.0,
+            "stopping_criteria":  StoppingCriteriaList([CancelCriteria(cancel_event), meter]),
+            **self.model_loader.kv_cache_kwargs,
+            **self.model_loader.assisted_kwargs,
+            **drafter,
+        }
+
+    def _generate(self, gen_kwargs: Dict[str, Any]):
+        """model.generate(), or lookup_generate() when _stream_kwargs() added an n-gram drafter"""
+        if "drafter" not in gen_kwargs:
+            return self.model.generate(**gen_kwargs)
+        return lookup_generate(self.model, **gen_kwargs)
+
+    def _ngram_drafter(self, prompt_ids) -> NgramIndex:
+        """
+        This turn's drafter: an overlay over the prompt past the knowledge
+        prefix (retrieved entries, history, the question) on the active
+        prefix's index, built on the first turn that uses the prefix.
+        """
+        key   = self.cache_manager.active_key
+        index = self.ngram_indexes.get(key)
+        if index is None:
+            serving = {p.serving_key for p in self.prefixes.values()}
+            for old in [k for k in self.ngram_indexes if k not in serving]:
+                del self.ngram_indexes[old]
+            t0 = time.perf_counter()
+            index = NgramIndex(self.cache_manager.cache_state.input_ids[0].tolist(),
+                               max_ngram=self.config.prompt_lookup_max_ngram)
+            self.ngram_indexes[key] = index
+            print(f"🔎 N-gram index: {len(index):,} knowledge tokens in "
+                  f"{(time.perf_counter() - t0) * 1000:.0f} ms")
+        # The knowledge sits inside the prompt; indexing a little of it twice is harmless
+        tail = max(len(prompt_ids) - len(index), 0)
+        return index.overlay(prompt_ids[len(prompt_ids) - tail:])
+
+    def _record_decode(self, meter: DecodeMeter, drafter: Optional[NgramIndex] = None) -> Dict[str, Any]:
+        """Add a finished turn to decode_totals; returns its own stats"""
+        draft_tokens = self._draft_tokens()
+        proposed = drafter.proposed if drafter is not None else meter.steps * draft_tokens
+        if meter.steps:
+            totals = self.decode_totals
+            totals["turns"]         += 1
+            totals["steps"]         += meter.steps
+            totals["tokens"]        += meter.tokens
+            totals["decode_tokens"] += meter.decode_tokens
+            totals["decode_s"]      += meter.decode_s
+            totals["proposed"]      += proposed
+        return meter.stats(proposed if draft_tokens else None)
+
+    def _draft_tokens(self) -> int:
+        """Tokens proposed per step, 0 when speculative decoding is off"""
+        active = self.config.speculative_mode == "ngram" or self.model_loader.assisted_kwargs
+        return self.config.num_draft_tokens if active else 0
+
+    def get_decode_stats(self) -> Dict[str, Any]:
+        """Speculative-decoding effectiveness over all streamed turns so far"""
+        t = self.decode_totals
+        draft_tokens = self._draft_tokens()
+        return {
+            "mode":         self.config.speculative_mode if draft_tokens else "none",
+            "draft_tokens": draft_tokens,
+            "turns":        t["turns"],
+            **decode_summary(t["steps"], t["tokens"], t["decode_tokens"], t["decode_s"],
+                             t["proposed"] if draft_tokens else None),
+        }
+
+    def stream_chunks(self, user_message: str, prefix: Optional[str] = None,
+                      cancel_event: Optional[Event] = None) -> Generator[str, None, None]:
         """
         Stream response as complete, TTS-ready sentence chunks.
 
@@ -348,139 +886,41 @@ class CAGSystemFreshSession:
         Each yielded string is a complete utterance the TTS engine can speak
         immediately — no further accumulation needed in the gateway.
 
-        Chunking rules (mirrors gateway TonalAccumulator):
-          1. First chunk fires as soon as FIRST_CHUNK_CHARS (≥30) chars are ready
-             and a word boundary exists — minimises time-to-first-audio.
-          2. Sentence-ending punctuation (.!?) → flush immediately.
-          3. Clause break (,;:—) → flush if chunk ≥ MIN_TTS_CHARS (20) and
-             remainder ≥ 3 chars.
-          4. Hard cap at LOGIC_MAX_CHARS (160) — split at last word boundary.
-          5. Tail flush at end of stream (remaining buffer).
-        """
-        # ── chunking constants (match gateway TonalAccumulator) ──────────────
-        import re as _re
-
-        _RE_SENTENCE_END = _re.compile(r'(?<=[^\d])([.!?]+["\']?)(?=\s|$)')
-        _RE_CLAUSE_BREAK = _re.compile(r'([,;:—–])\s')
-        _RE_STARTS_PUNCT = _re.compile(r'^[\s,\.!?;:\)\]\}\'\"\\u2019\\u2018\\u201c\\u201d\-]')
-
-        FIRST_CHUNK_CHARS = 30   # ~5-6 words — minimum first chunk
-        MIN_TTS_CHARS     = 20   # minimum chars to bother sending to TTS
-        TONE_MAX_CHARS    = 60   # short = tone chunk (question/exclamation)
-        LOGIC_MAX_CHARS   = 160  # hard cap per chunk
-
-        def _try_flush(buf: str, first_sent: bool):
-            """
-            Try to extract one or more chunks from buf.
-            Returns list of (chunk_text, new_buf, new_first_sent).
-            """
-            results = []
-            while True:
-                # 1. First-chunk early fire
-                if first_sent and len(buf) >= FIRST_CHUNK_CHARS:
-                    split = buf.rfind(" ")
-                    if split >= MIN_TTS_CHARS:
-                        candidate = buf[:split].strip()
-                        remainder = buf[split:].lstrip()
-                        if candidate:
-                            results.append((candidate, remainder, False))
-                            buf        = remainder
-                            first_sent = False
-                            continue
-                # 2. Short chunk or hard cap when not first
-                elif not first_sent and len(buf) >= TONE_MAX_CHARS:
-                    candidate = buf[:TONE_MAX_CHARS].strip()
-                    remainder = buf[TONE_MAX_CHARS:].lstrip()
-                    if candidate:
-                        results.append((candidate, remainder, False))
-                        buf = remainder
-                        continue
-
-                # 3. Sentence boundary
-                m = _RE_SENTENCE_END.search(buf)
-                if m:
-                    candidate = buf[:m.end()].strip()
-                    remainder = buf[m.end():].lstrip()
-                    if candidate:
-                        results.append((candidate, remainder, False))
-                        buf        = remainder
-                        first_sent = False
-                        continue
-                    break
-
-                # 4. Clause break
-                m = _RE_CLAUSE_BREAK.search(buf)
-                if m:
-                    candidate = buf[:m.start() + 1].strip()
-                    remainder = buf[m.end():].lstrip()
-                    if len(candidate) >= MIN_TTS_CHARS and len(remainder) >= 3:
-                        results.append((candidate, remainder, False))
-                        buf        = remainder
-                        first_sent = False
-                        continue
-                    break
-
-                # 5. Hard length cap
-                max_cap = LOGIC_MAX_CHARS if not first_sent else TONE_MAX_CHARS
-                if len(buf) > max_cap:
-                    split = buf[:max_cap].rfind(" ")
-                    if split <= MIN_TTS_CHARS:
-                        split = max_cap
-                    candidate = buf[:split].strip()
-                    remainder = buf[split:].lstrip()
-                    if candidate:
-                        results.append((candidate, remainder, False))
-                        buf        = remainder
-                        first_sent = False
-                        continue
-                    break
-                break
-
-            return results, buf, first_sent
-
-        # ── stream raw tokens and accumulate ─────────────────────────────────
-        buf        = ""
-        first_sent = True
-
-        for raw_token in self.stream_query(user_message):
-            if not raw_token:
-                continue
-
-            # normalise spacing
-            if raw_token.startswith(" "):
-                if buf and buf[-1] == " ":
-                    raw_token = raw_token.lstrip(" ")
-            else:
-                if buf and not buf[-1].isspace() and not _RE_STARTS_PUNCT.match(raw_token):
-                    raw_token = " " + raw_token
+        Chunking is the gateway's TonalAccumulator (shared/speech_chunker.py),
+        so SSE chunks and /chat/ws "chunks" frames split exactly as the
+        gateway would.
 
-            buf += raw_token
+        `cancel_event` is passed through to stream_query().
+        """
+        from shared.speech_chunker import TonalAccumulator   # stt_tts/ is on sys.path (main.py)
 
-            chunks, buf, first_sent = _try_flush(buf, first_sent)
-            for chunk_text, _, _ in chunks:
-                if chunk_text:
-                    yield chunk_text
+        acc = TonalAccumulator()
+        for raw_token in self.stream_query(user_message, prefix, cancel_event):
+            # TextIteratorStreamer text keeps the decoder's own spacing
+            for chunk in acc.feed(raw_token, exact=True):
+                yield chunk.text
 
-        # ── tail flush ────────────────────────────────────────────────────────
-        tail = buf.strip()
-        if len(tail) >= 1:
-            yield tail
+        tail = acc.flush()
+        if tail:
+            yield tail.text
 
-    def reset_and_query(self, user_message: str) -> Dict[str, Any]:
+    def reset_and_query(self, user_message: str,
+                        prefix: Optional[str] = None) -> Dict[str, Any]:
         """
         Clear session history then run a batch query in a single call.
         Saves one full HTTP round-trip vs. POST /reset → POST /chat.
         """
         self._fast_reset()
-        return self.query(user_message)
+        return self.query(user_message, prefix)
 
-    def reset_and_stream(self, user_message: str) -> Generator[str, None, None]:
+    def reset_and_stream(self, user_message: str,
+                         prefix: Optional[str] = None) -> Generator[str, None, None]:
         """
         Clear session history then stream a response in a single call.
         Saves one full HTTP round-trip vs. POST /reset → POST /chat/stream.
         """
         self._fast_reset()
-        yield from self.stream_query(user_message)
+        yield from self.stream_query(user_message, prefix)
 
     def _fast_reset(self):
         """
@@ -515,6 +955,22 @@ class CAGSystemFreshSession:
             cache_state.input_ids[0], skip_special_tokens=True
         )
 
+        # ── Hybrid mode: entries matching this turn, after the cached core ──
+        prefix          = self.active_prefix
+        knowledge_store = prefix.knowledge_store if prefix else self.knowledge_store
+        # A prefix's own system prompt is its cached persona — already at the
+        # head of knowledge_text, so it is not sent twice
+        system_prompt   = "" if prefix and prefix.system_prompt else self.system_prompt
+        retrieved_block = ""
+        if self.config.knowledge_mode == "hybrid":
+            retrieved = knowledge_store.retrieve_text(
+                self._retrieval_query(),
+                top_k=self.config.retrieval_top_k,
+                max_tokens=self.config.retrieval_max_tokens,
+            )
+            if retrieved:
+                retrieved_block = "\n\n══ MATCHING SOLUTIONS FOR THIS QUESTION ══\n" + retrieved
+
         # ── User-provided data block (HIGHEST priority) ────────────────────
         # Summarise everything the user has told us so the LLM never has to
         # guess — this section is placed BEFORE the knowledge base so it wins
@@ -537,10 +993,11 @@ class CAGSystemFreshSession:
         parts = [
             "<|begin_of_text|>"
             "<|start_header_id|>system<|end_header_id|>\n"
-            + self.system_prompt
+            + system_prompt
             + user_data_block
             + "\n\n══ KNOWLEDGE BASE (use when user data doesn't already answer the question) ══\n"
             + knowledge_text
+            + retrieved_block
             + "<|eot_id|>"
         ]
 
@@ -574,6 +1031,12 @@ class CAGSystemFreshSession:
 
         return "\n".join(parts)
 
+    def _retrieval_query(self) -> str:
+        """Current user message plus the previous one, so follow-ups like
+        "how much is it?" still match the product being discussed."""
+        user_turns = [m.content for m in self.memory.messages if m.role == "user"]
+        return " ".join(user_turns[-2:])
+
     def reset_conversation(self):
         """Full reset: clears history, memory, and runs heavy GPU cleanup."""
         if self.cache_manager:
@@ -599,13 +1062,27 @@ class CAGSystemFreshSession:
             "knowledge": {
                 "entries": self.knowledge_store.get_entry_count(),
                 "tokens":  self.knowledge_store.get_token_count(),
+                "mode":    self.config.knowledge_mode,
+                "retrieval": (
+                    self.knowledge_store.retriever.stats()
+                    if self.knowledge_store.retriever else None
+                ),
             },
             "cache":   self.cache_manager.get_cache_info(),
+            "prefixes": {
+                "available": sorted(self.prefixes),
+                "active":    self.active_prefix.name if self.active_prefix else None,
+                "stale":     sorted(n for n, p in self.prefixes.items() if p.stale),
+                "reloads":   self.get_reload_status(),
+            },
             "config": {
                 "max_context_tokens": self.config.max_context_tokens,
                 "max_new_tokens":     self.config.max_new_tokens,
                 "flash_attention":    self.config.use_flash_attention,
+                "kv_cache_quant":     self.config.kv_cache_quant,
+                "speculative_mode":   self.config.speculative_mode,
             },
+            "decoding":     self.get_decode_stats(),
             "gpu_memory":   get_gpu_memory_info(),
             "session_mode": "fresh_session_no_persistence",
             "memory":       self.memory.get_stats(),
@@ -640,30 +1117,31 @@ class CAGSystemFreshSession:
         )
 
         try:
-            inputs = self.tokenizer(
-                summary_prompt,
-                return_tensors="pt",
-                truncation=True,
-                max_length=self.config.max_context_tokens,
-            )
-            input_ids      = inputs.input_ids.to(self.device)
-            attention_mask = inputs.attention_mask.to(self.device)
-
-            with torch.no_grad():
-                with torch.amp.autocast("cuda"):
-                    output_ids = self.model.generate(
-                        input_ids=input_ids,
-                        attention_mask=attention_mask,
-                        max_new_tokens=120,
-                        do_sample=False,
-                        pad_token_id=self.tokenizer.eos_token_id,
-                        use_cache=True,
-                        num_beams=1,
-                    )
-
-            raw = self.tokenizer.decode(
-                output_ids[0][input_ids.shape[-1]:], skip_special_tokens=True
-            ).strip()
+            with self._model_lock:
+                inputs = self.tokenizer(
+                    summary_prompt,
+                    return_tensors="pt",
+                    truncation=True,
+                    max_length=self.config.max_context_tokens,
+                )
+                input_ids      = inputs.input_ids.to(self.device)
+                attention_mask = inputs.attention_mask.to(self.device)
+
+                with torch.no_grad():
+                    with torch.amp.autocast("cuda"):
+                        output_ids = self.model.generate(
+                            input_ids=input_ids,
+                            attention_mask=attention_mask,
+                            max_new_tokens=120,
+                            do_sample=False,
+                            pad_token_id=self.tokenizer.eos_token_id,
+                            use_cache=True,
+                            num_beams=1,
+                        )
+
+                raw = self.tokenizer.decode(
+                    output_ids[0][input_ids.shape[-1]:], skip_special_tokens=True
+                ).strip()
 
             del input_ids, output_ids, attention_mask, inputs
             self._aggressive_cleanup()   # cold path — synchronize OK
@@ -696,6 +1174,10 @@ class CAGSystemFreshSession:
     # ──────────────────────────────────────────────────────────────────────────
 
     def cleanup(self):
+        if self.knowledge_watcher is not None:
+            self.knowledge_watcher.stop()
+        if not self.wait_for_rebuilds(timeout=30.0):
+            print("⚠️  A background prefix rebuild is still running")
         if self.model is not None:
             del self.model
         if self.tokenizer is not None:
@@ -1,13 +1,40 @@
 """
 CAG Architecture - Solution Recommendation Knowledge Store Module
 Maps user problems to commercial solutions with maximum token efficiency
+
+Loading is streaming and memory-bounded: the solutions file is parsed one
+entry at a time into a KnowledgeIndex — columns of byte offsets, lengths,
+category ids and formatted sizes, no text.  build_knowledge_text() packs
+from the index and reads back only the entries that fit the token budget.
+The index is saved next to the source (<file>.idx) and reused while the
+source's size and mtime are unchanged, so a warm start skips parsing.
+
+With exact_token_packing the packer works on real per-entry token counts
+(token_budget.py), cached on disk by entry hash and tokenizer id.
+
+In knowledge_mode="hybrid" the packed text is only a small core prefix and
+retrieve_text() adds the entries matching each query (retriever.py).
 """
 
+import hashlib
 import json
 import os
-from typing import List, Dict, Any, Optional
+import re
+import sys
+from array import array
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set, Tuple
 from dataclasses import dataclass
 
+from retriever import BM25Retriever
+from token_budget import (
+    DEFAULT_BATCH_SIZE, TokenCountCache, cache_path_for, count_tokens,
+    pack_by_tokens, tokenizer_id,
+)
+
+CHARS_PER_TOKEN_EST = 4.0
+REQUIRED_FIELDS = ('user_problem', 'solution_name', 'solution_description')
+_POSITION_KEY = {'json': 'index', 'jsonl': 'line_number'}   # metadata key per source format
+
 
 @dataclass
 class SolutionEntry:
@@ -21,7 +48,7 @@ class SolutionEntry:
     implementation_time: str
     target_industries: List[str]
     metadata: Optional[Dict[str, Any]] = None
-    
+
     def to_compact_string(self) -> str:
         """
         Convert to ULTRA-COMPACT format for maximum token efficiency
@@ -29,7 +56,7 @@ class SolutionEntry:
         """
         problem = self.user_problem.strip().replace('\n', ' ').replace('  ', ' ')
         benefits_str = "; ".join(self.key_benefits[:3])  # Top 3 benefits only
-        
+
         return (
             f"PROBLEM:{problem}|"
             f"SOLUTION:{self.solution_name}|"
@@ -39,25 +66,300 @@ class SolutionEntry:
             f"TIME:{self.implementation_time}"
         )
 
+    def to_structured_string(self) -> str:
+        """Multi-line Problem:/Solution: format (use_compact=False)"""
+        return (
+            f"Problem: {self.user_problem}\n"
+            f"Solution: {self.solution_name}\n"
+            f"Description: {self.solution_description}\n"
+            f"Benefits: {', '.join(self.key_benefits[:3])}\n"
+            f"Pricing: {self.pricing_model}\n"
+            f"Time: {self.implementation_time}"
+        )
+
+    def category(self) -> str:
+        """Dedup key: first keyword, else the first three words of the problem"""
+        if self.problem_keywords:
+            return self.problem_keywords[0].lower()
+        return " ".join(self.user_problem.lower().split()[:3])
+
+
+def _entry_from_item(item: Any, source: str, position: int) -> Optional[SolutionEntry]:
+    """SolutionEntry for a parsed JSON object, or None if required fields are missing"""
+    if not isinstance(item, dict) or not all(item.get(field) for field in REQUIRED_FIELDS):
+        return None
+    return SolutionEntry(
+        user_problem=item['user_problem'].strip(),
+        problem_keywords=item.get('problem_keywords', []),
+        solution_name=item['solution_name'].strip(),
+        solution_description=item['solution_description'].strip(),
+        key_benefits=item.get('key_benefits', []),
+        pricing_model=item.get('pricing_model', 'Contact for pricing'),
+        implementation_time=item.get('implementation_time', 'Varies'),
+        target_industries=item.get('target_industries', []),
+        metadata={
+            'source': source,
+            _POSITION_KEY[source]: position
+        }
+    )
+
+
+def _text_hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# Streaming JSON array reader
+# ═══════════════════════════════════════════════════════════════════════════════
+
+_NON_WS = re.compile(r'[^ \t\r\n]')
+
+
+class _JsonArrayStream:
+    """
+    Incremental reader for a top-level JSON array, or the "solutions" array
+    of a top-level object.  Yields (byte_offset, byte_length, item) per
+    element while holding at most one read chunk plus one element in memory.
+    """
+
+    def __init__(self, f, chunk_chars: int = 1 << 20):
+        self._f = f                 # text mode, newline='' (no \r\n folding)
+        self._chunk = chunk_chars
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self.byte_pos = 0           # byte offset of _buf[_pos] in the file
+
+    def _fill(self) -> bool:
+        if self._pos:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        chunk = self._f.read(self._chunk)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf += chunk
+        return True
+
+    def _advance(self, end: int):
+        self.byte_pos += len(self._buf[self._pos:end].encode('utf-8'))
+        self._pos = end
+
+    def _peek(self) -> str:
+        while True:
+            m = _NON_WS.search(self._buf, self._pos)
+            if m:
+                self._advance(m.start())
+                return self._buf[self._pos]
+            self._advance(len(self._buf))
+            if not self._fill():
+                return ""
+
+    def _expect(self, ch: str):
+        if self._peek() != ch:
+            raise ValueError(f"Invalid JSON: expected {ch!r} at byte {self.byte_pos}")
+        self._advance(self._pos + 1)
+
+    def _value(self) -> Tuple[int, int, Any]:
+        self._peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self._buf, self._pos)
+                # A value ending flush with the buffer may be a truncated number.
+                if end < len(self._buf) or self._eof:
+                    start = self.byte_pos
+                    self._advance(end)
+                    return start, self.byte_pos - start, obj
+            except json.JSONDecodeError as e:
+                if self._eof:
+                    raise ValueError(f"Invalid JSON near byte {self.byte_pos}: {e.msg}") from e
+            self._fill()
+
+    def _array(self) -> Iterator[Tuple[int, int, Any]]:
+        self._expect('[')
+        if self._peek() == ']':
+            self._advance(self._pos + 1)
+            return
+        while True:
+            yield self._value()
+            if self._peek() == ',':
+                self._advance(self._pos + 1)
+                continue
+            self._expect(']')
+            return
+
+    def __iter__(self) -> Iterator[Tuple[int, int, Any]]:
+        if self._peek() != '{':
+            yield from self._array()
+            return
+        self._expect('{')
+        while self._peek() not in ('}', ''):
+            _, _, key = self._value()
+            self._expect(':')
+            if key == 'solutions':
+                yield from self._array()
+            else:
+                self._value()
+            if self._peek() == ',':
+                self._advance(self._pos + 1)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# Columnar index
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class KnowledgeIndex:
+    """
+    Text-free index over a solutions file, one row per valid entry.
+
+    Columns (array.array):
+        offset, length     — byte span of the entry in the source file
+        position           — array index (JSON) or line number (JSONL)
+        category           — id into `categories` (dedup key)
+        sort_chars         — len(user_problem) + len(solution_description)
+        compact_chars      — len(to_compact_string())
+        structured_chars   — len(to_structured_string())
+        compact_hash,      — 64-bit hash of each formatted string, the key
+        structured_hash      for cached exact token counts (token_budget.py)
+
+    Estimated tokens for a row are (chars + 1) / CHARS_PER_TOKEN_EST.
+    """
+
+    VERSION = 2
+    COLUMNS = (
+        ("offset", "q"), ("length", "I"), ("position", "I"), ("category", "I"),
+        ("sort_chars", "I"), ("compact_chars", "I"), ("structured_chars", "I"),
+        ("compact_hash", "Q"), ("structured_hash", "Q"),
+    )
+
+    def __init__(self, source_path: str, fmt: str):
+        self.source_path = source_path
+        self.format = fmt                       # "json" | "jsonl"
+        self.columns: Dict[str, array] = {name: array(code) for name, code in self.COLUMNS}
+        self.categories: List[str] = []
+        self.industries: set = set()
+        self.skipped = 0
+        self._category_ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.columns["offset"])
+
+    def add(self, offset: int, length: int, entry: SolutionEntry):
+        category = entry.category()
+        cat_id = self._category_ids.get(category)
+        if cat_id is None:
+            cat_id = self._category_ids[category] = len(self.categories)
+            self.categories.append(category)
+        position = entry.metadata[_POSITION_KEY[self.format]]
+        cols = self.columns
+        cols["offset"].append(offset)
+        cols["length"].append(length)
+        cols["position"].append(position)
+        cols["category"].append(cat_id)
+        cols["sort_chars"].append(len(entry.user_problem) + len(entry.solution_description))
+        compact, structured = entry.to_compact_string(), entry.to_structured_string()
+        cols["compact_chars"].append(len(compact))
+        cols["structured_chars"].append(len(structured))
+        cols["compact_hash"].append(_text_hash(compact))
+        cols["structured_hash"].append(_text_hash(structured))
+        self.industries.update(entry.target_industries)
+
+    def estimated_tokens(self, row: int, use_compact: bool = True) -> float:
+        chars = self.columns["compact_chars" if use_compact else "structured_chars"][row]
+        return (chars + 1) / CHARS_PER_TOKEN_EST
+
+    def iter_entries(self, rows: Iterable[int]) -> Iterator[Tuple[int, SolutionEntry]]:
+        """(row, SolutionEntry) for each row, read back from the source file in the given order"""
+        offsets, lengths, positions = (self.columns[c] for c in ("offset", "length", "position"))
+        with open(self.source_path, 'rb') as f:
+            for row in rows:
+                f.seek(offsets[row])
+                item = json.loads(f.read(lengths[row]))
+                yield row, _entry_from_item(item, self.format, positions[row])
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+    # <header JSON>\n then each column's raw bytes in COLUMNS order.
+
+    def _signature(self) -> Dict[str, Any]:
+        st = os.stat(self.source_path)
+        return {
+            'version': self.VERSION,
+            'source_size': st.st_size,
+            'source_mtime_ns': st.st_mtime_ns,
+            'byteorder': sys.byteorder,
+            'itemsizes': [array(code).itemsize for _, code in self.COLUMNS],
+        }
+
+    def save(self, path: str):
+        header = dict(self._signature(), format=self.format, rows=len(self),
+                      skipped=self.skipped, categories=self.categories,
+                      industries=sorted(self.industries))
+        tmp = f"{path}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(json.dumps(header, ensure_ascii=False).encode('utf-8') + b"\n")
+            for name, _ in self.COLUMNS:
+                self.columns[name].tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, source_path: str) -> Optional["KnowledgeIndex"]:
+        """Saved index for source_path, or None if missing, stale or unreadable"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                header = json.loads(f.readline())
+                index = cls(source_path, header['format'])
+                if any(header.get(k) != v for k, v in index._signature().items()):
+                    return None
+                rows = header['rows']
+                for name, _ in cls.COLUMNS:
+                    index.columns[name].fromfile(f, rows)
+        except (OSError, ValueError, KeyError, EOFError):
+            return None
+        index.categories = header['categories']
+        index._category_ids = {c: i for i, c in enumerate(index.categories)}
+        index.industries = set(header['industries'])
+        index.skipped = header['skipped']
+        return index
+
 
 class SolutionKnowledgeStore:
     """
     Solution Knowledge Store - Maps user problems to commercial solutions
-    
+
     Efficiently loads problem-solution pairs into context window for chatbot matching
     """
-    
+
     def __init__(self, tokenizer, config):
         self.tokenizer = tokenizer
         self.config = config
-        self.entries: List[SolutionEntry] = []
+        self.index: Optional[KnowledgeIndex] = None
         self.knowledge_text: Optional[str] = None
         self.token_count: int = 0
-        
+        self.core_rows: Set[int] = set()         # rows packed into knowledge_text
+        self.retriever: Optional[BM25Retriever] = None
+
+    @property
+    def entries(self) -> List[SolutionEntry]:
+        """
+        Every entry, read back from the source file.  Materializes the whole
+        catalog — prefer iter_entries() or the index for large files.
+        """
+        return [entry for _, entry in self.iter_entries()]
+
+    def iter_entries(self, limit: Optional[int] = None) -> Iterator[Tuple[int, SolutionEntry]]:
+        """(row, SolutionEntry) in file order, one at a time"""
+        if self.index is None:
+            return iter(())
+        rows = range(len(self.index) if limit is None else min(limit, len(self.index)))
+        return self.index.iter_entries(rows)
+
     def load_from_sources(self) -> int:
         """
         Load ALL solution entries from JSON
-        
+
         Returns:
             Number of entries loaded
         """
@@ -69,219 +371,168 @@ class SolutionKnowledgeStore:
             json_path = self.config.knowledge_jsonl_path
         else:
             raise ValueError("Config must have 'solutions_json_path' or 'knowledge_jsonl_path'")
-        
+
         if not os.path.exists(json_path):
             raise ValueError(f"Solutions file not found: {json_path}")
-        
+
         print(f"\n📂 Loading solutions from: {json_path}")
-        
-        # Detect file format based on extension
-        if json_path.endswith('.jsonl'):
-            loaded_count = self._load_from_jsonl(json_path)
+
+        persist = getattr(self.config, 'persist_knowledge_index', True)
+        index_path = getattr(self.config, 'knowledge_index_path', None) or f"{json_path}.idx"
+
+        self.index = KnowledgeIndex.load(index_path, json_path) if persist else None
+        if self.index is not None:
+            loaded_count = len(self.index)
+            print(f"📇 Reusing knowledge index: {index_path}")
         else:
-            loaded_count = self._load_from_json(json_path)
-        
+            # Detect file format based on extension
+            if json_path.endswith('.jsonl'):
+                loaded_count = self._load_from_jsonl(json_path)
+            else:
+                loaded_count = self._load_from_json(json_path)
+            if persist and loaded_count:
+                try:
+                    self.index.save(index_path)
+                except OSError as e:
+                    print(f"⚠️  Could not save knowledge index to {index_path}: {e}")
+
         print(f"✅ Loaded {loaded_count:,} solution entries")
-        
+
         if loaded_count == 0:
             raise ValueError("No solution data found in file!")
-        
+
         return loaded_count
-    
+
     def _load_from_json(self, path: str) -> int:
         """
-        Load ALL solution entries from JSON array
+        Index ALL solution entries from a JSON array (or {"solutions": [...]}),
+        parsing one element at a time
         """
-        count = 0
-        skipped = 0
-        
         print("📖 Reading solutions JSON...")
-        
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            
-            # Handle both array and object with 'solutions' key
-            solutions = data if isinstance(data, list) else data.get('solutions', [])
-            
-            for idx, item in enumerate(solutions):
-                try:
-                    # Validation
-                    required_fields = ['user_problem', 'solution_name', 'solution_description']
-                    if not all(item.get(field) for field in required_fields):
-                        skipped += 1
-                        continue
-                    
-                    entry = SolutionEntry(
-                        user_problem=item['user_problem'].strip(),
-                        problem_keywords=item.get('problem_keywords', []),
-                        solution_name=item['solution_name'].strip(),
-                        solution_description=item['solution_description'].strip(),
-                        key_benefits=item.get('key_benefits', []),
-                        pricing_model=item.get('pricing_model', 'Contact for pricing'),
-                        implementation_time=item.get('implementation_time', 'Varies'),
-                        target_industries=item.get('target_industries', []),
-                        metadata={
-                            'source': 'json',
-                            'index': idx
-                        }
-                    )
-                    self.entries.append(entry)
-                    count += 1
-                    
-                    # Progress indicator every 100 entries
-                    if count % 100 == 0:
-                        print(f"   Loaded {count:,} solutions...")
-                    
-                except (KeyError, ValueError) as e:
-                    skipped += 1
-                    if count < 10:  # Only show first 10 errors
-                        print(f"⚠️  Skipped entry {idx}: {str(e)}")
-                    continue
-        
-        if skipped > 0:
-            print(f"⚠️  Skipped {skipped:,} invalid entries")
-        
-        return count
-    
+
+        self.index = KnowledgeIndex(path, 'json')
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            items = ((off, length, idx, item)
+                     for idx, (off, length, item) in enumerate(_JsonArrayStream(f)))
+            return self._index_items(items, 'entry')
+
     def _load_from_jsonl(self, path: str) -> int:
         """
-        Load solution entries from JSONL format (one JSON object per line)
+        Index solution entries from JSONL format (one JSON object per line)
         """
-        count = 0
-        skipped = 0
-        
         print("📖 Reading solutions JSONL...")
-        
-        with open(path, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                if not line.strip():
-                    continue
-                
-                try:
-                    item = json.loads(line)
-                    
-                    # Validation
-                    required_fields = ['user_problem', 'solution_name', 'solution_description']
-                    if not all(item.get(field) for field in required_fields):
-                        skipped += 1
+
+        self.index = KnowledgeIndex(path, 'jsonl')
+
+        def items():
+            offset = 0
+            with open(path, 'rb') as f:
+                for line_num, line in enumerate(f, 1):
+                    start, offset = offset, offset + len(line)
+                    if not line.strip():
                         continue
-                    
-                    entry = SolutionEntry(
-                        user_problem=item['user_problem'].strip(),
-                        problem_keywords=item.get('problem_keywords', []),
-                        solution_name=item['solution_name'].strip(),
-                        solution_description=item['solution_description'].strip(),
-                        key_benefits=item.get('key_benefits', []),
-                        pricing_model=item.get('pricing_model', 'Contact for pricing'),
-                        implementation_time=item.get('implementation_time', 'Varies'),
-                        target_industries=item.get('target_industries', []),
-                        metadata={
-                            'source': 'jsonl',
-                            'line_number': line_num
-                        }
-                    )
-                    self.entries.append(entry)
-                    count += 1
-                    
-                    # Progress indicator
-                    if count % 100 == 0:
-                        print(f"   Loaded {count:,} solutions...")
-                    
-                except json.JSONDecodeError as e:
-                    skipped += 1
-                    if count < 10:
-                        print(f"⚠️  Skipped line {line_num}: Invalid JSON")
-                    continue
-                except (KeyError, ValueError) as e:
-                    skipped += 1
-                    if count < 10:
-                        print(f"⚠️  Skipped line {line_num}: {str(e)}")
-                    continue
-        
+                    try:
+                        yield start, len(line), line_num, json.loads(line)
+                    except json.JSONDecodeError:
+                        yield start, len(line), line_num, None
+
+        return self._index_items(items(), 'line')
+
+    def _index_items(self, items: Iterable[Tuple[int, int, int, Any]], unit: str) -> int:
+        count = 0
+        skipped = 0
+        for offset, length, position, item in items:
+            try:
+                entry = _entry_from_item(item, self.index.format, position)
+            except (KeyError, ValueError, AttributeError) as e:
+                entry = None
+                if count < 10:  # Only show first 10 errors
+                    print(f"⚠️  Skipped {unit} {position}: {str(e)}")
+            if entry is None:
+                skipped += 1
+                continue
+
+            self.index.add(offset, length, entry)
+            count += 1
+
+            # Progress indicator
+            if count % 10_000 == 0:
+                print(f"   Loaded {count:,} solutions...")
+
+        self.index.skipped = skipped
         if skipped > 0:
             print(f"⚠️  Skipped {skipped:,} invalid entries")
-        
+
         return count
-    
-    def build_knowledge_text(self, max_tokens: Optional[int] = None, use_compact: bool = True) -> str:
+
+    def build_knowledge_text(self, max_tokens: Optional[int] = None, use_compact: bool = True,
+                             budget: Optional[int] = None) -> str:
         """
         Build solution knowledge text within the token budget.
-        
+
+        Selection runs on the index alone; only the chosen entries are read
+        back from the source file and formatted.
+
         Args:
             max_tokens: Maximum tokens for knowledge base (from config if None)
             use_compact: Use compact PROBLEM:|SOLUTION: format (recommended)
+            budget: Knowledge token budget as-is, skipping the reserve below
+                    (the hybrid-mode core prefix)
         """
         if max_tokens is None:
             max_tokens = self.config.max_context_tokens
 
         # Reserve tokens for system prompt, query, and generation buffer
         reserved = 150 + 200 + 100 + getattr(self.config, 'cache_truncation_buffer', 100)
-        available_tokens = max(500, max_tokens - reserved)
+        available_tokens = budget if budget is not None else max(500, max_tokens - reserved)
+        total = self.get_entry_count()
 
         print(f"\n🔨 Building solution knowledge base...")
         print(f"   max_context_tokens = {max_tokens:,}")
         print(f"   Knowledge token budget = {available_tokens:,}")
-        print(f"   Total solutions available: {len(self.entries):,}")
+        print(f"   Total solutions available: {total:,}")
 
-        # Deduplication by problem category
-        seen_categories = {}
-        for entry in self.entries:
-            if entry.problem_keywords:
-                category = entry.problem_keywords[0].lower()
-            else:
-                words = entry.user_problem.lower().split()
-                category = " ".join(words[:3])
-            
-            if category not in seen_categories:
-                seen_categories[category] = entry
+        # Deduplication by problem category — first entry per category wins
+        first_row: Dict[int, int] = {}
+        if self.index is not None:
+            for row, cat_id in enumerate(self.index.columns["category"]):
+                if cat_id not in first_row:
+                    first_row[cat_id] = row
 
-        deduplicated = list(seen_categories.values())
-        print(f"   After dedup:             {len(deduplicated):,} unique solution categories")
+        print(f"   After dedup:             {len(first_row):,} unique solution categories")
 
         # Pack entries shortest-first to maximize count
-        sorted_entries = sorted(
-            deduplicated,
-            key=lambda e: len(e.user_problem) + len(e.solution_description)
-        )
-
-        knowledge_parts = []
-        current_tokens = 0
-        entries_included = 0
-        CHARS_PER_TOKEN_EST = 4.0
-
+        candidates = sorted(first_row.values(),
+                            key=lambda row: self.index.columns["sort_chars"][row])
         max_entries = getattr(self.config, 'max_knowledge_entries', 10000)
+        exact = getattr(self.config, 'exact_token_packing', True) and bool(candidates)
 
-        for entry in sorted_entries:
-            if use_compact:
-                formatted = entry.to_compact_string()
-            else:
-                formatted = f"Problem: {entry.user_problem}\nSolution: {entry.solution_name}\nDescription: {entry.solution_description}\nBenefits: {', '.join(entry.key_benefits[:3])}\nPricing: {entry.pricing_model}\nTime: {entry.implementation_time}"
-
-            entry_tokens_est = (len(formatted) + 1) / CHARS_PER_TOKEN_EST
-
-            if current_tokens + entry_tokens_est > available_tokens:
-                break
-
-            knowledge_parts.append(formatted)
-            current_tokens += entry_tokens_est
-            entries_included += 1
-
-            if entries_included >= max_entries:
-                print(f"   ⚠️  Hit max_knowledge_entries cap ({max_entries:,})")
-                break
+        if exact:
+            selected = self._select_exact(candidates, available_tokens, use_compact, max_entries)
+        else:
+            selected = self._select_estimated(candidates, available_tokens, use_compact, max_entries)
 
-        self.knowledge_text = "\n\n".join(knowledge_parts)
+        knowledge_parts = self.format_rows(selected, use_compact)
+        self.knowledge_text = "\n\n".join(knowledge_parts[row] for row in selected)
 
         # Accurate token count
         self.token_count = len(self.tokenizer.encode(self.knowledge_text))
 
-        coverage_pct = (entries_included / len(self.entries) * 100) if self.entries else 0
+        # Per-entry counts can miss a merge across the "\n\n" joins — trim to fit
+        while exact and selected and self.token_count > available_tokens:
+            selected.pop()
+            self.knowledge_text = "\n\n".join(knowledge_parts[row] for row in selected)
+            self.token_count = len(self.tokenizer.encode(self.knowledge_text))
+
+        entries_included = len(selected)
+        self.core_rows = set(selected)
+        coverage_pct = (entries_included / total * 100) if total else 0
         efficiency = (entries_included / self.token_count) if self.token_count > 0 else 0
 
         print(f"\n📊 SOLUTION KNOWLEDGE BASE STATISTICS:")
         print(f"   {'='*60}")
-        print(f"   Total solutions available:   {len(self.entries):,}")
-        print(f"   Unique categories:           {len(deduplicated):,}")
+        print(f"   Total solutions available:   {total:,}")
+        print(f"   Unique categories:           {len(first_row):,}")
         print(f"   Solutions included:          {entries_included:,} ({coverage_pct:.1f}%)")
         print(f"   {'─'*60}")
         print(f"   Tokens used:                 {self.token_count:,}")
@@ -295,34 +546,152 @@ class SolutionKnowledgeStore:
         print(f"   {'='*60}")
 
         return self.knowledge_text
-    
+
+    def _select_estimated(self, candidates: List[int], budget: int,
+                          use_compact: bool, max_entries: int) -> List[int]:
+        """Greedy shortest-first on (chars + 1) / CHARS_PER_TOKEN_EST"""
+        selected: List[int] = []
+        current_tokens = 0
+
+        for row in candidates:
+            entry_tokens_est = self.index.estimated_tokens(row, use_compact)
+
+            if current_tokens + entry_tokens_est > budget:
+                break
+
+            selected.append(row)
+            current_tokens += entry_tokens_est
+
+            if len(selected) >= max_entries:
+                print(f"   ⚠️  Hit max_knowledge_entries cap ({max_entries:,})")
+                break
+
+        return selected
+
+    def _select_exact(self, candidates: List[int], budget: int,
+                      use_compact: bool, max_entries: int) -> List[int]:
+        """
+        Knapsack on exact per-entry token counts.  Counts are cached on disk
+        by entry hash and tokenizer id; only new or edited entries are read
+        back and batch-tokenized.
+        """
+        hashes = self.index.columns["compact_hash" if use_compact else "structured_hash"]
+        tid = tokenizer_id(self.tokenizer)
+        cache = TokenCountCache.open(self._token_cache_path(tid), tid)
+
+        counts: Dict[int, int] = {}
+        missing: List[int] = []
+        for row in candidates:
+            count = cache.get(hashes[row])
+            if count is None:
+                missing.append(row)
+            else:
+                counts[row] = count
+
+        missing.sort()
+        batch_size = getattr(self.config, 'tokenize_batch_size', DEFAULT_BATCH_SIZE)
+        for start in range(0, len(missing), batch_size):
+            rows = missing[start:start + batch_size]
+            texts = self.format_rows(rows, use_compact)
+            for row, count in zip(rows, count_tokens(self.tokenizer, [texts[r] for r in rows], batch_size)):
+                counts[row] = count
+                cache.put(hashes[row], count)
+
+        try:
+            cache.save()
+        except OSError as e:
+            print(f"⚠️  Could not save token counts to {cache.path}: {e}")
+        print(f"   Exact token counts:      {cache.hits:,} cached, {len(missing):,} tokenized")
+
+        # Entries are joined with "\n\n"; the tokenizer may add BOS to the whole text
+        sep = len(self.tokenizer.encode("\n\n", add_special_tokens=False))
+        overhead = len(self.tokenizer.encode(""))
+        weights = {row: counts[row] + sep for row in candidates}
+        selected = pack_by_tokens(candidates, weights, budget - overhead + sep, max_entries)
+        if len(selected) >= max_entries:
+            print(f"   ⚠️  Hit max_knowledge_entries cap ({max_entries:,})")
+        return selected
+
+    def _token_cache_path(self, tid: str) -> Optional[str]:
+        base = getattr(self.config, 'token_count_cache_path', None)
+        if base is None and getattr(self.config, 'persist_knowledge_index', True):
+            base = self.index.source_path
+        return cache_path_for(base, tid) if base else None
+
+    def format_rows(self, rows: List[int], use_compact: bool) -> Dict[int, str]:
+        """{row: formatted entry}, read back from the source in file order"""
+        return {
+            row: entry.to_compact_string() if use_compact else entry.to_structured_string()
+            for row, entry in self.index.iter_entries(sorted(rows))
+        }
+
+    # ── Per-query retrieval (knowledge_mode="hybrid") ─────────────────────────
+
+    def build_retriever(self) -> BM25Retriever:
+        """BM25 index over every loaded entry, not just the packed core"""
+        self.retriever = BM25Retriever.build(self.iter_entries())
+        stats = self.retriever.stats()
+        print(f"🔎 Retrieval index: {stats['documents']:,} entries, "
+              f"{stats['terms']:,} terms in {stats['build_ms']:.0f} ms")
+        return self.retriever
+
+    def retrieve_rows(self, query: str, top_k: int, max_tokens: int,
+                      use_compact: bool = True) -> List[int]:
+        """
+        Best-matching rows outside the core prefix, one per category, best
+        first, stopping at top_k or when max_tokens (estimated) is spent.
+        """
+        if self.retriever is None or top_k <= 0:
+            return []
+        categories = self.index.columns["category"]
+        seen = {categories[row] for row in self.core_rows}
+        rows: List[int] = []
+        used = 0.0
+        for row, _ in self.retriever.search(query, k=top_k * 4, exclude=self.core_rows):
+            if categories[row] in seen:
+                continue
+            cost = self.index.estimated_tokens(row, use_compact)
+            if used + cost > max_tokens:
+                break
+            seen.add(categories[row])
+            rows.append(row)
+            used += cost
+            if len(rows) >= top_k:
+                break
+        return rows
+
+    def retrieve_text(self, query: str, top_k: int, max_tokens: int,
+                      use_compact: bool = True) -> str:
+        """retrieve_rows() formatted like the knowledge text"""
+        rows = self.retrieve_rows(query, top_k, max_tokens, use_compact)
+        parts = self.format_rows(rows, use_compact)
+        return "\n\n".join(parts[row] for row in rows)
+
     def get_knowledge_text(self) -> str:
         """Get the built knowledge text"""
         if self.knowledge_text is None:
             raise ValueError("Knowledge text not built. Call build_knowledge_text() first.")
         return self.knowledge_text
-    
+
     def get_token_count(self) -> int:
         """Get the token count of knowledge base"""
         return self.token_count
-    
+
     def get_entry_count(self) -> int:
         """Get total number of loaded entries"""
-        return len(self.entries)
-    
+        return len(self.index) if self.index is not None else 0
+
     def get_coverage_stats(self) -> Dict[str, Any]:
         """Get statistics about solution coverage"""
+        total = self.get_entry_count()
         if not self.knowledge_text:
-            return {'coverage': 0, 'included': 0, 'total': len(self.entries)}
-        
+            return {'coverage': 0, 'included': 0, 'total': total}
+
         included = len([block for block in self.knowledge_text.split('\n\n') if block.strip()])
-        total = len(self.entries)
         coverage = (included / total * 100) if total > 0 else 0
-        
-        industries = set()
-        for entry in self.entries:
-            industries.update(entry.target_industries)
-        
+
+        industries = self.index.industries if self.index is not None else set()
+
         return {
             'total_solutions': total,
             'included_solutions': included,
@@ -334,16 +703,16 @@ class SolutionKnowledgeStore:
             'unique_industries': len(industries),
             'industries_list': sorted(industries)
         }
-    
+
     def save_metadata(self, path: Optional[str] = None):
         """Save comprehensive solution knowledge base metadata"""
         if path is None:
             path = getattr(self.config, 'cache_metadata_path', 'cache_metadata.json')
-        
+
         coverage = self.get_coverage_stats()
-        
+
         metadata = {
-            'total_solutions': len(self.entries),
+            'total_solutions': self.get_entry_count(),
             'included_solutions': coverage['included_solutions'],
             'excluded_solutions': coverage['excluded_solutions'],
             'coverage_percent': coverage['coverage_percent'],
@@ -354,42 +723,42 @@ class SolutionKnowledgeStore:
             'unique_industries': coverage['unique_industries'],
             'industries': coverage['industries_list']
         }
-        
+
         with open(path, 'w') as f:
             json.dump(metadata, f, indent=2)
-        
+
         if getattr(self.config, 'verbose', False):
             print(f"💾 Metadata saved to {path}")
-    
+
     def load_metadata(self, path: Optional[str] = None) -> Dict[str, Any]:
         """Load solution knowledge base metadata"""
         if path is None:
             path = getattr(self.config, 'cache_metadata_path', 'cache_metadata.json')
-        
+
         if not os.path.exists(path):
             return {}
-        
+
         with open(path, 'r') as f:
             return json.load(f)
-    
+
     def preview_entries(self, n: int = 3):
         """Preview first N solutions for debugging"""
-        print(f"\n📋 Preview of first {min(n, len(self.entries))} solutions:")
+        print(f"\n📋 Preview of first {min(n, self.get_entry_count())} solutions:")
         print("=" * 80)
-        
-        for i, entry in enumerate(self.entries[:n], 1):
+
+        for i, (_, entry) in enumerate(self.iter_entries(limit=n), 1):
             print(f"\nSolution {i}:")
             print(f"PROBLEM: {entry.user_problem[:100]}...")
             print(f"SOLUTION: {entry.solution_name}")
             print(f"BENEFITS: {', '.join(entry.key_benefits[:2])}...")
             print(f"PRICING: {entry.pricing_model}")
-            
+
             compact = entry.to_compact_string()
             tokens = len(self.tokenizer.encode(compact))
             print(f"Tokens: {tokens}")
-        
+
         print("=" * 80)
 
 
 # For backward compatibility - alias to original name
-KnowledgeStore = SolutionKnowledgeStore
\ No newline at end of file
+KnowledgeStore = SolutionKnowledgeStore
@@ -0,0 +1,89 @@
+"""
+CAG Architecture - Knowledge file watcher
+
+Polls the knowledge files behind each prefix and calls on_change(name) once
+a changed file has stopped changing (same size and mtime on two consecutive
+polls), so a reload never starts on a half-written file.  Polling keeps it
+dependency-free and works on bind mounts / network volumes where inotify
+events do not arrive.
+
+An on_change that returns {"state": "busy"} (reload_prefix() while a rebuild
+of that prefix is running) did not take the change; it is retried on every
+poll until the reload starts.
+
+Usage:
+    watcher = KnowledgeWatcher({"default": path}, cag.reload_prefix, interval_s=2.0)
+    watcher.start()
+    ...
+    watcher.stop()
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+_Stat = Optional[Tuple[int, int]]      # (mtime_ns, size); None while the file is missing
+
+
+def _stat(path: str) -> _Stat:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class KnowledgeWatcher:
+    """Debounced mtime/size polling of {prefix name: knowledge file}"""
+
+    def __init__(self, paths: Dict[str, str], on_change: Callable[[str], Any],
+                 interval_s: float = 2.0):
+        self.paths = dict(paths)
+        self.on_change = on_change
+        self.interval_s = interval_s
+        self._seen: Dict[str, _Stat] = {name: _stat(p) for name, p in self.paths.items()}
+        self._pending: Dict[str, _Stat] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, name: str, path: str):
+        self.paths[name] = path
+        self._seen[name] = _stat(path)
+        self._pending.pop(name, None)
+
+    def poll(self):
+        """One polling pass — fires on_change for files that changed and settled"""
+        for name, path in list(self.paths.items()):
+            current = _stat(path)
+            if current == self._seen.get(name):
+                self._pending.pop(name, None)
+                continue
+            if current is None or self._pending.get(name) != current:
+                self._pending[name] = current       # changed (or still changing) — wait a poll
+                continue
+            try:
+                result = self.on_change(name)
+            except Exception as e:
+                print(f"❌ Knowledge reload for '{name}' failed to start: {e}")
+                result = None
+            if isinstance(result, dict) and result.get("state") == "busy":
+                continue                            # a rebuild is running — retry next poll
+            self._pending.pop(name)
+            self._seen[name] = current
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="cag-knowledge-watcher", daemon=True)
+        self._thread.start()
+        print(f"👀 Watching {len(self.paths)} knowledge file(s) every {self.interval_s:g}s")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_s + 1.0)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.poll()
@@ -0,0 +1,320 @@
+"""
+CAG Architecture - Memory-mapped KV cache file (.kvf)
+
+The legacy cache file is a torch.save pickle of .cpu() copies: loading reads
+the whole file into RAM, unpickles it, copies to the device and then copies
+again while rebuilding the DynamicCache.  This format is flat, so the loader
+can mmap it and copy each tensor straight from the page cache into a
+preallocated device tensor.
+
+Layout (safetensors-style):
+  8 bytes     little-endian u64 — header length H
+  H bytes     UTF-8 JSON header, space padded so the data starts 64-byte aligned
+  data        tensors back to back, each at a 64-byte aligned offset
+
+Header:
+  format, version
+  fingerprint       {model_id, tokenizer_id, prompt_hash} — the PrefixKey
+  storage           "native" | "int8" | "int4" | "fp8"
+  dtype             dtype the KV is restored to (the model's cache dtype)
+  layers, token_count, knowledge_token_count, metadata
+  tensors           {name: {dtype, shape, offset, nbytes}}  offsets are
+                    relative to the start of the data section
+
+Tensor names: "input_ids", "<layer>.k", "<layer>.v" and, for quantized
+storage, "<layer>.k.scale" / "<layer>.v.scale".  Quantized keys are scaled
+per channel (absmax over tokens), values per token (absmax over head dim).
+int4 packs two values per uint8 along the head dim.
+
+QuantizedKV holds the same (q, scale) pair in memory, so the prefix store
+can keep int8 / int4 prefixes resident and dequantize on activation.
+
+The header helpers and QuantizedKV's bookkeeping are plain Python; torch is
+only imported to (de)quantize and by save_kv_file() / load_kv_file().
+"""
+
+import json
+import math
+import mmap
+import os
+import struct
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+FORMAT = "cag-kv"
+VERSION = 1
+ALIGN = 64
+STORAGES = ("native", "int8", "int4", "fp8")
+
+DTYPE_SIZES = {
+    "float32": 4, "float16": 2, "bfloat16": 2, "float8_e4m3fn": 1,
+    "int64": 8, "int32": 4, "int8": 1, "uint8": 1,
+}
+
+_FP8_MAX = 448.0        # largest finite float8_e4m3fn
+
+
+class KVFileError(ValueError):
+    """Unreadable, truncated or mismatched KV cache file"""
+
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Raw layout (no torch)
+# ──────────────────────────────────────────────────────────────────────────────
+
+def write_raw(path: str, meta: Dict[str, Any],
+              tensors: Sequence[Tuple[str, str, Sequence[int], Any]]):
+    """
+    Write (name, dtype, shape, buffer) records after a JSON header built from
+    `meta`.  Written to a temp file and renamed, so readers never see a
+    partial file.
+    """
+    table: Dict[str, Dict[str, Any]] = {}
+    offset = 0
+    for name, dtype, shape, buf in tensors:
+        nbytes = memoryview(buf).nbytes
+        expected = math.prod(shape) * DTYPE_SIZES[dtype]
+        if nbytes != expected:
+            raise KVFileError(f"{name}: {nbytes} bytes for {dtype}{list(shape)} ({expected} expected)")
+        table[name] = {'dtype': dtype, 'shape': list(shape), 'offset': offset, 'nbytes': nbytes}
+        offset = _align(offset + nbytes)
+
+    header = json.dumps(dict(meta, format=FORMAT, version=VERSION, tensors=table)).encode('utf-8')
+    header += b' ' * (_align(8 + len(header)) - 8 - len(header))
+
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        pos = 0
+        for name, _, _, buf in tensors:
+            start = table[name]['offset']
+            f.write(b'\0' * (start - pos))
+            f.write(memoryview(buf).cast('B'))
+            pos = start + table[name]['nbytes']
+    os.replace(tmp, path)
+
+
+def read_header(f) -> Tuple[Dict[str, Any], int]:
+    """(header, data start) of an open binary file; validates the tensor table"""
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    raw = f.read(8)
+    if len(raw) < 8:
+        raise KVFileError("file too short")
+    (length,) = struct.unpack('<Q', raw)
+    if 8 + length > size:
+        raise KVFileError("header length past end of file")
+    try:
+        header = json.loads(f.read(length))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise KVFileError(f"bad header: {e}") from None
+    if header.get('format') != FORMAT:
+        raise KVFileError(f"not a {FORMAT} file")
+    if header.get('version') != VERSION:
+        raise KVFileError(f"unsupported version {header.get('version')}")
+
+    data_start = 8 + length
+    for name, t in header.get('tensors', {}).items():
+        if t.get('dtype') not in DTYPE_SIZES:
+            raise KVFileError(f"{name}: unknown dtype {t.get('dtype')}")
+        if t['nbytes'] != math.prod(t['shape']) * DTYPE_SIZES[t['dtype']]:
+            raise KVFileError(f"{name}: size does not match shape")
+        if data_start + t['offset'] + t['nbytes'] > size:
+            raise KVFileError(f"{name}: truncated")
+    return header, data_start
+
+
+def check_fingerprint(header: Dict[str, Any], expected: Optional[Dict[str, str]]):
+    """Raise KVFileError when the file was built for another model / tokenizer / prompt"""
+    if expected is None:
+        return
+    found = header.get('fingerprint') or {}
+    diff = [k for k, v in expected.items() if found.get(k) != v]
+    if diff:
+        raise KVFileError(f"fingerprint mismatch ({', '.join(diff)})")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Quantization
+# ──────────────────────────────────────────────────────────────────────────────
+
+# Keys: per channel (reduce over tokens).  Values: per token (reduce over head dim).
+_SCALE_DIM = {'k': -2, 'v': -1}
+
+
+def quantize(x, storage: str, dim: int):
+    """(q, scale) with scale the absmax over `dim` — dequantize() inverts it"""
+    import torch
+    amax = x.abs().amax(dim=dim, keepdim=True).float().clamp(min=1e-8)
+    if storage == "int8":
+        scale = amax / 127.0
+        q = (x.float() / scale).round_().clamp_(-127, 127).to(torch.int8)
+    elif storage == "int4":
+        scale = amax / 7.0
+        q = ((x.float() / scale).round_().clamp_(-7, 7) + 8).to(torch.uint8)
+        q = q[..., 0::2] | (q[..., 1::2] << 4)      # two nibbles per byte
+    elif storage == "fp8":
+        scale = amax / _FP8_MAX
+        q = (x.float() / scale).to(torch.float8_e4m3fn)
+    else:
+        raise ValueError(f"Invalid KV storage: '{storage}'. Must be one of {STORAGES}")
+    return q, scale
+
+
+def dequantize(q, scale, dtype):
+    import torch
+    if q.dtype == torch.uint8:                      # packed int4
+        q = torch.stack((q & 0xF, q >> 4), dim=-1).flatten(-2).to(torch.int8) - 8
+    return (q.to(scale.dtype) * scale).to(dtype)
+
+
+class QuantizedKV:
+    """
+    One key or value tensor held as (q, scale).
+
+    Quacks like a tensor for PrefixCacheStore: to() / pin_memory() move both
+    parts, and numel() * element_size() is the compressed size in bytes, so
+    store budgets count what is actually resident.
+    """
+
+    def __init__(self, q, scale, dtype):
+        self.q = q
+        self.scale = scale
+        self.dtype = dtype      # restored on dequantize()
+
+    @classmethod
+    def from_tensor(cls, x, storage: str, kind: str) -> "QuantizedKV":
+        q, scale = quantize(x, storage, _SCALE_DIM[kind])
+        return cls(q, scale, x.dtype)
+
+    def to(self, device, non_blocking: bool = False) -> "QuantizedKV":
+        return QuantizedKV(self.q.to(device, non_blocking=non_blocking),
+                           self.scale.to(device, non_blocking=non_blocking), self.dtype)
+
+    def pin_memory(self) -> "QuantizedKV":
+        return QuantizedKV(self.q.pin_memory(), self.scale.pin_memory(), self.dtype)
+
+    def numel(self) -> int:
+        return self.q.numel() * self.q.element_size() + self.scale.numel() * self.scale.element_size()
+
+    def element_size(self) -> int:
+        return 1
+
+    def dequantize(self):
+        return dequantize(self.q, self.scale, self.dtype)
+
+
+def quantize_layers(layers: List[Tuple[Any, Any]], storage: str) -> List[Tuple[Any, Any]]:
+    """Per-layer (keys, values) as QuantizedKV pairs; "native" returns them unchanged"""
+    if storage == "native":
+        return layers
+    return [(QuantizedKV.from_tensor(k, storage, 'k'), QuantizedKV.from_tensor(v, storage, 'v'))
+            for k, v in layers]
+
+
+def dequantize_layers(layers: List[Tuple[Any, Any]]) -> List[Tuple[Any, Any]]:
+    """Inverse of quantize_layers(); plain tensors pass through"""
+    return [tuple(t.dequantize() if isinstance(t, QuantizedKV) else t for t in pair)
+            for pair in layers]
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# torch I/O
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _dtype_name(t) -> str:
+    return str(t.dtype).replace('torch.', '')
+
+
+def _as_bytes(t):
+    import torch
+    t = t.detach().contiguous().cpu()
+    return t.reshape(-1).view(torch.uint8).numpy()
+
+
+def save_kv_file(path: str, input_ids, layers: List[Tuple[Any, Any]],
+                 fingerprint: Dict[str, str], knowledge_token_count: int,
+                 storage: str = "native", metadata: Optional[Dict[str, Any]] = None):
+    """Write input_ids and per-layer (keys, values) as a .kvf file"""
+    if storage not in STORAGES:
+        raise ValueError(f"Invalid KV storage: '{storage}'. Must be one of {STORAGES}")
+
+    records = [("input_ids", _dtype_name(input_ids), input_ids.shape, _as_bytes(input_ids))]
+    for i, (k, v) in enumerate(layers):
+        for kind, t in (('k', k), ('v', v)):
+            if storage == "native":
+                records.append((f"{i}.{kind}", _dtype_name(t), t.shape, _as_bytes(t)))
+                continue
+            q, scale = quantize(t, storage, _SCALE_DIM[kind])
+            records.append((f"{i}.{kind}", _dtype_name(q), q.shape, _as_bytes(q)))
+            records.append((f"{i}.{kind}.scale", _dtype_name(scale), scale.shape, _as_bytes(scale)))
+
+    write_raw(path, {
+        'fingerprint':           fingerprint,
+        'storage':               storage,
+        'dtype':                 _dtype_name(layers[0][0]) if layers else "float16",
+        'layers':                len(layers),
+        'token_count':           input_ids.shape[-1],
+        'knowledge_token_count': knowledge_token_count,
+        'metadata':              metadata or {},
+    }, records)
+
+
+def load_kv_file(path: str, device, expected_fingerprint: Optional[Dict[str, str]] = None):
+    """
+    (header, input_ids, layers) with tensors on `device`.
+
+    Each tensor is a zero-copy view of the mmap'd file copied into a
+    preallocated device tensor; quantized layers are dequantized on the device.
+    header['load_ms'] is the wall time of the whole load.
+    """
+    import torch
+    t0 = time.perf_counter()
+    with open(path, 'rb') as f:
+        header, data_start = read_header(f)
+        check_fingerprint(header, expected_fingerprint)
+        # ACCESS_COPY: private copy-on-write pages — writable for frombuffer,
+        # never written back, nothing copied unless written
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    table = header['tensors']
+
+    def _read(name, dtype=None):
+        t = table[name]
+        src_dtype = getattr(torch, t['dtype'])
+        count = t['nbytes'] // DTYPE_SIZES[t['dtype']]
+        src = torch.frombuffer(mm, dtype=src_dtype, count=count,
+                               offset=data_start + t['offset']).view(t['shape'])
+        dst = torch.empty(t['shape'], dtype=src_dtype, device=device)
+        dst.copy_(src)
+        return dst
+
+    try:
+        restore = getattr(torch, header['dtype'])
+        input_ids = _read("input_ids")
+        layers = []
+        for i in range(header['layers']):
+            pair = []
+            for kind in ('k', 'v'):
+                name = f"{i}.{kind}"
+                if header['storage'] == "native":
+                    pair.append(_read(name))
+                else:
+                    pair.append(dequantize(_read(name), _read(f"{name}.scale"), restore))
+            layers.append(tuple(pair))
+    except KeyError as e:
+        raise KVFileError(f"missing tensor {e}") from None
+    finally:
+        try:
+            mm.close()
+        except BufferError:
+            pass        # a failed read still holds a view; the GC unmaps it
+
+    header['load_ms'] = (time.perf_counter() - t0) * 1000
+    return header, input_ids, layers
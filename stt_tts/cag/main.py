@@ -10,9 +10,10 @@ NEW in v5.0
   The gateway prefers the WS endpoint for minimal framing overhead.
 
   Protocol:
-    → {"type": "query", "turn_id": "...", "message": "...", "reset": bool}
+    → {"type": "query", "turn_id": "...", "message": "...", "reset": bool,
+       "prefix": "..."}                            (optional knowledge prefix)
     ← {"type": "turn_id",  "turn_id": "..."}        (first frame — routing confirm)
-    ← {"type": "token",    "token": "...", "turn_id": "..."}
+    ← {"type": "token",    "token": "...", "turn_id": "..."}   (text of ≥1 tokens)
     ← {"type": "done",     "turn_id": "..."}
     ← {"type": "error",    "detail": "...", "turn_id": "..."}
     ← {"type": "timeout",  "turn_id": "..."}
@@ -20,6 +21,35 @@ NEW in v5.0
   Multiple concurrent sessions are each tracked by their own turn_id.
   The GPU lock serializes inference; if another turn arrives while inference
   is running, it waits in a per-connection queue.
+
+  Speech-boundary chunks
+  ──────────────────────
+  A query with "stream": "chunks" gets TTS-ready chunk frames instead of
+  token frames, split by the gateway's own chunker (shared/speech_chunker.py)
+  as tokens arrive:
+    ← {"type": "turn_id", "turn_id": "...", "stream": "chunks"}   (mode ack)
+    ← {"type": "chunk",   "text": "...", "tone": "tone"|"logic",
+       "boundary": "first"|"sentence"|"clause"|"cap"|"end",
+       "provisional": bool, "turn_id": "..."}
+  The first chunk is provisional: it is cut at a word boundary as soon as
+  FIRST_CHUNK_CHARS are buffered, so TTS starts before the first clause
+  ends.  Older servers omit "stream" in the ack, meaning tokens.
+
+  Knowledge prefixes
+  ──────────────────
+  Requests may name a knowledge prefix ("prefix" field, default "default");
+  the model answers from that tenant's knowledge base.  GET /prefixes lists
+  them with the prefix-cache tiers and hit counters.
+
+  Knowledge hot reload
+  ────────────────────
+  POST /admin/knowledge/reload {"prefix": "...", "wait": bool} re-reads a
+  prefix's knowledge file and rebuilds its KV prefix in the background;
+  turns keep answering from the old prefix until the next turn after the
+  rebuild.  GET /admin/knowledge/status reports build time and swap latency
+  per prefix.  Both need an X-Admin-Token header matching CAG_ADMIN_TOKEN,
+  and answer 403 while it is unset.
+  CAG_KNOWLEDGE_WATCH_S > 0 reloads automatically when a file changes.
 """
 
 from __future__ import annotations
@@ -27,6 +57,7 @@ from __future__ import annotations
 import asyncio
 import collections
 import hashlib
+import hmac
 import logging
 import os
 import threading
@@ -49,6 +80,7 @@ from cag_system import CAGSystemFreshSession
 import sys as _sys
 _sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 from monitoring.metrics import instrument_app
+from shared.speech_chunker import TonalAccumulator
 
 # ── Logging ───────────────────────────────────────────────────────────────────
 
@@ -67,6 +99,12 @@ DEDUP_CACHE_SIZE = 4
 # Max queries to hold per WebSocket connection before dropping
 WS_QUERY_QUEUE_MAX = int(os.getenv("WS_QUERY_QUEUE_MAX", "4"))
 
+# Tokens arriving within this window of the previous frame share one WS frame
+WS_COALESCE_MS = float(os.getenv("WS_COALESCE_MS", "5.0"))
+
+# Shared secret for /admin/* — unset disables them (403)
+ADMIN_TOKEN = os.getenv("CAG_ADMIN_TOKEN", "")
+
 
 # ── Metrics ───────────────────────────────────────────────────────────────────
 
@@ -196,6 +234,32 @@ def _assert_ready():
         )
 
 
+def _unknown_prefix(name: Optional[str]) -> bool:
+    return name is not None and name not in svc.cag.prefixes
+
+
+def _assert_prefix(name: Optional[str]):
+    if _unknown_prefix(name):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "unknown_prefix", "available": sorted(svc.cag.prefixes)},
+        )
+
+
+def _assert_admin(request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="admin endpoints disabled — set CAG_ADMIN_TOKEN",
+        )
+    supplied = request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="admin token required",
+        )
+
+
 svc = ServiceState()
 
 
@@ -239,6 +303,29 @@ CAG_INFERENCE_LATENCY = _safe_metric(
 )
 CAG_TOKENS_GENERATED = _safe_metric(PCounter, "cag_tokens_generated_total", "Total tokens generated", _REG)
 CAG_WS_CONNECTIONS = _safe_metric(PGauge, "cag_ws_connections", "Active WebSocket connections", _REG)
+CAG_WS_FRAMES = _safe_metric(PCounter, "cag_ws_token_frames_total", "Token frames sent over /chat/ws", _REG)
+CAG_WS_CHUNK_FRAMES = _safe_metric(
+    PCounter, "cag_ws_chunk_frames_total", "Speech-boundary chunk frames sent over /chat/ws", _REG)
+CAG_TOKEN_DECODE_US = _safe_metric(
+    PHistogram, "cag_token_decode_microseconds", "Per-token detokenize + enqueue cost on the generation thread", _REG,
+    buckets=[5, 10, 25, 50, 100, 250, 500, 1000],
+)
+CAG_FRAME_LAG = _safe_metric(
+    PHistogram, "cag_token_frame_lag_seconds", "Token produced → frame handed to the WebSocket (p50 per turn)", _REG,
+    buckets=[0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05],
+)
+CAG_CANCEL_TO_GPU_FREE = _safe_metric(
+    PHistogram, "cag_cancel_to_gpu_free_seconds", "Barge-in cancel frame → generation thread finished (GPU free)", _REG,
+    buckets=[0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0],
+)
+CAG_DECODE_TPS = _safe_metric(
+    PHistogram, "cag_decode_tokens_per_second", "Decode throughput per turn, prompt forward excluded", _REG,
+    buckets=[10, 20, 30, 40, 60, 80, 120, 160, 240],
+)
+CAG_SPEC_ACCEPTANCE = _safe_metric(
+    PHistogram, "cag_speculative_acceptance_rate", "Accepted / proposed draft tokens per turn (speculative decoding)", _REG,
+    buckets=[0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0],
+)
 
 import subprocess as _sp
 def _update_gpu_gauges():
@@ -265,6 +352,12 @@ class ChatRequest(BaseModel):
     message:       str           = Field(..., min_length=1, max_length=4096)
     reset_session: bool          = Field(default=True)
     turn_id:       Optional[str] = Field(default=None)
+    prefix:        Optional[str] = Field(default=None, max_length=64)
+
+
+class ReloadRequest(BaseModel):
+    prefix: Optional[str] = Field(default=None, max_length=64)
+    wait:   bool          = Field(default=False)   # block until the new prefix is built
 
 
 class ChatResponse(BaseModel):
@@ -321,6 +414,47 @@ async def prometheus_metrics():
     return "\n".join(lines) + "\n"
 
 
+@app.get("/prefixes", tags=["system"])
+async def list_prefixes():
+    _assert_ready()
+    return {
+        "prefixes": sorted(svc.cag.prefixes),
+        "active":   svc.cag.active_prefix.name if svc.cag.active_prefix else None,
+        "store":    svc.cag.prefix_store.stats() if svc.cag.prefix_store else None,
+    }
+
+
+@app.post("/admin/knowledge/reload", tags=["admin"])
+async def reload_knowledge(request: Request, req: ReloadRequest):
+    _assert_admin(request)
+    _assert_ready()
+    _assert_prefix(req.prefix)
+    result = await asyncio.get_event_loop().run_in_executor(
+        None, lambda: svc.cag.reload_prefix(req.prefix, trigger="admin", wait=req.wait)
+    )
+    name = req.prefix or "default"
+    if result.get("state") == "busy":
+        return JSONResponse(
+            status_code=status.HTTP_409_CONFLICT,
+            content={"error": "reload_in_progress", "prefix": name, "status": result},
+        )
+    log.info("Knowledge reload of prefix '%s' via admin API: %s", name, result.get("state"))
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if req.wait else status.HTTP_202_ACCEPTED,
+        content={"prefix": name, "status": result},
+    )
+
+
+@app.get("/admin/knowledge/status", tags=["admin"])
+async def knowledge_status(request: Request):
+    _assert_admin(request)
+    _assert_ready()
+    return {
+        "reloads":  svc.cag.get_reload_status(),
+        "watching": svc.cag.knowledge_watcher.paths if svc.cag.knowledge_watcher else {},
+    }
+
+
 @app.post("/reset", tags=["chat"])
 async def reset_session():
     _assert_ready()
@@ -336,6 +470,7 @@ async def reset_session():
 @app.post("/chat", response_model=ChatResponse, tags=["chat"])
 async def chat(req: ChatRequest):
     _assert_ready()
+    _assert_prefix(req.prefix)
     turn_id = _make_turn_id(req.turn_id)
 
     if dedup.is_duplicate(req.message):
@@ -351,7 +486,7 @@ async def chat(req: ChatRequest):
             if req.reset_session:
                 await asyncio.get_event_loop().run_in_executor(None, svc.reset_session)
             result = await asyncio.get_event_loop().run_in_executor(
-                None, svc.cag.query, req.message
+                None, svc.cag.query, req.message, req.prefix
             )
 
         if not result.get("success"):
@@ -393,6 +528,7 @@ async def chat_stream(req: ChatRequest):
     Timeout signal:  data: [TIMEOUT]\\n\\n
     """
     _assert_ready()
+    _assert_prefix(req.prefix)
     turn_id = _make_turn_id(req.turn_id)
 
     if dedup.is_duplicate(req.message):
@@ -416,7 +552,7 @@ async def chat_stream(req: ChatRequest):
                 if req.reset_session:
                     svc.reset_session()
                 # stream_chunks() yields complete TTS-ready sentence chunks
-                for chunk in svc.cag.stream_chunks(req.message):
+                for chunk in svc.cag.stream_chunks(req.message, req.prefix, cancel_event):
                     if cancel_event.is_set():
                         log.info(f"[turn:{turn_id}] stream cancelled by client")
                         break
@@ -491,17 +627,26 @@ async def chat_ws(ws: WebSocket):
     Persistent WebSocket endpoint for low-latency streaming inference.
 
     Each message from the gateway is a JSON query frame:
-      {"type": "query", "turn_id": "...", "message": "...", "reset": bool}
-
-    Each response token is a JSON frame:
-      {"type": "turn_id", "turn_id": "..."}     ← first frame, routing confirm
+      {"type": "query", "turn_id": "...", "message": "...", "reset": bool,
+       "prefix": "...", "stream": "tokens"|"chunks"}
+
+    Response text arrives in token frames; tokens generated within
+    WS_COALESCE_MS of the previous frame are merged into one.  With
+    "stream": "chunks" the text is cut at speech boundaries here and sent
+    as chunk frames instead (the first one provisional):
+      {"type": "turn_id", "turn_id": "...", "stream": "..."}   ← first frame, routing + mode confirm
       {"type": "token",   "token":  "...", "turn_id": "..."}
+      {"type": "chunk",   "text": "...", "tone": "...", "boundary": "...",
+       "provisional": bool, "turn_id": "..."}
       {"type": "done",    "turn_id": "..."}
       {"type": "error",   "detail": "...", "turn_id": "..."}
       {"type": "timeout", "turn_id": "..."}
 
     Advantages over SSE:
-      • Full-duplex: gateway can send barge-in cancel while tokens are flowing
+      • Full-duplex: gateway can send barge-in cancel while tokens are flowing;
+        {"type": "cancel"} (or the next query) stops generation at the next
+        decode step, and cancel → GPU free is exported as
+        cag_cancel_to_gpu_free_seconds
       • Lower per-frame overhead: no HTTP chunked encoding / SSE data prefix
       • Single TCP connection per session vs one per query with SSE
     """
@@ -514,9 +659,18 @@ async def chat_ws(ws: WebSocket):
     # Per-connection query queue — allows pipelining when GPU is busy
     query_q: asyncio.Queue = asyncio.Queue(maxsize=WS_QUERY_QUEUE_MAX)
 
-    # Shared cancel event — _receiver sets it on cancel frames,
-    # _processor checks it during generation
+    # Shared cancel event — _receiver sets it on cancel frames, the
+    # generation thread's stopping criterion and _processor check it
     current_cancel: list[Optional[threading.Event]] = [None]
+    cancel_at: list[Optional[float]] = [None]     # when the gateway cancelled the current turn
+
+    def _cancel_current():
+        ce = current_cancel[0]
+        if ce is None or ce.is_set():
+            return False
+        cancel_at[0] = time.monotonic()
+        ce.set()
+        return True
 
     async def _receiver():
         """Read query frames from the gateway and enqueue them."""
@@ -529,10 +683,8 @@ async def chat_ws(ws: WebSocket):
                 ftype = frame.get("type", "")
 
                 if ftype == "cancel":
-                    # Barge-in: kill current generation immediately
-                    ce = current_cancel[0]
-                    if ce is not None:
-                        ce.set()
+                    # Barge-in: generation stops at its next decode step
+                    if _cancel_current():
                         log.info(f"[ws:{conn_id}] cancel received — generation aborted")
                     continue
 
@@ -542,9 +694,7 @@ async def chat_ws(ws: WebSocket):
                 if not msg:
                     continue
                 # Cancel any in-flight generation before queuing new query
-                ce = current_cancel[0]
-                if ce is not None:
-                    ce.set()
+                _cancel_current()
                 if query_q.full():
                     log.warning(f"[ws:{conn_id}] query queue full — dropping oldest")
                     try:
@@ -573,10 +723,20 @@ async def chat_ws(ws: WebSocket):
             turn_id  = frame.get("turn_id") or str(uuid.uuid4())
             message  = frame.get("message", "").strip()
             do_reset = frame.get("reset", False)
+            prefix   = frame.get("prefix")
+            chunked  = frame.get("stream") == "chunks"
 
             if not message:
                 continue
 
+            if _unknown_prefix(prefix):
+                if ws_alive:
+                    try:
+                        await ws.send_json({"type": "error", "detail": "unknown_prefix", "turn_id": turn_id})
+                    except Exception:
+                        ws_alive = False
+                continue
+
             if dedup.is_duplicate(message):
                 if ws_alive:
                     try:
@@ -591,37 +751,31 @@ async def chat_ws(ws: WebSocket):
             if not ws_alive:
                 break
             try:
-                await ws.send_json({"type": "turn_id", "turn_id": turn_id})
+                await ws.send_json({"type": "turn_id", "turn_id": turn_id,
+                                    "stream": "chunks" if chunked else "tokens"})
             except Exception:
                 ws_alive = False
                 break
 
             loop         = asyncio.get_event_loop()
-            q            : asyncio.Queue = asyncio.Queue()
             cancel_event = threading.Event()
+            cancel_at[0] = None
             current_cancel[0] = cancel_event      # expose to _receiver for barge-in
             t0           = time.monotonic()
             token_count  = [0]
             error_flag   = [False]
+            streamer     = None
+            chunker      = TonalAccumulator() if chunked else None
+            chunk_count  = 0
 
-            def _producer():
-                try:
-                    if do_reset:
-                        svc.reset_session()
-                    # stream_query() yields raw sub-word tokens for lowest
-                    # latency — the gateway TonalAccumulator handles sentence
-                    # chunking for TTS dispatch.
-                    for token in svc.cag.stream_query(message):
-                        if cancel_event.is_set():
-                            break
-                        if token:
-                            token_count[0] += 1
-                            loop.call_soon_threadsafe(q.put_nowait, ("token", token))
-                except Exception as exc:
-                    error_flag[0] = True
-                    loop.call_soon_threadsafe(q.put_nowait, ("error", str(exc)))
-                finally:
-                    loop.call_soon_threadsafe(q.put_nowait, ("done", None))
+            def _start():
+                if do_reset:
+                    svc.reset_session()
+                # Raw sub-word tokens (coalesced per frame) for lowest
+                # latency — in "chunks" mode the shared TonalAccumulator
+                # cuts them into TTS chunks below, otherwise the gateway does.
+                return svc.cag.start_stream(message, loop, prefix, coalesce_ms=WS_COALESCE_MS,
+                                            cancel_event=cancel_event)
 
             # send_ws helper — marks ws_alive=False on any failure so we
             # never attempt another send after the connection is gone
@@ -636,40 +790,50 @@ async def chat_ws(ws: WebSocket):
                     ws_alive = False
                     return False
 
+            async def _send_chunk(c) -> bool:
+                nonlocal chunk_count
+                chunk_count += 1
+                return await _send({"type": "chunk", "text": c.text, "tone": c.tone.value,
+                                    "boundary": c.boundary, "provisional": c.provisional,
+                                    "turn_id": turn_id})
+
             try:
                 async with svc._gpu_lock:
-                    producer_future = loop.run_in_executor(None, _producer)
+                    streamer = await loop.run_in_executor(None, _start)
                     try:
-                        while True:
-                            try:
-                                kind, value = await asyncio.wait_for(
-                                    q.get(), timeout=TOKEN_TIMEOUT_S
-                                )
-                            except asyncio.TimeoutError:
-                                log.warning(f"[ws:{conn_id}] turn:{turn_id} token timeout")
-                                cancel_event.set()
-                                error_flag[0] = True
-                                await _send({"type": "timeout", "turn_id": turn_id})
+                        async for text, n in streamer.frames(timeout=TOKEN_TIMEOUT_S):
+                            token_count[0] += n
+                            if cancel_event.is_set():
                                 break
-
-                            if kind == "token":
-                                if not await _send({"type": "token", "token": value, "turn_id": turn_id}):
-                                    cancel_event.set()
-                                    break
-                            elif kind == "error":
-                                log.error(f"[ws:{conn_id}] turn:{turn_id} producer error: {value}")
-                                await _send({"type": "error", "detail": value, "turn_id": turn_id})
-                                error_flag[0] = True
-                                break
-                            else:  # done
+                            if chunker is None:
+                                sent = await _send({"type": "token", "token": text, "turn_id": turn_id})
+                            else:
+                                # frame text is exact decoder output — spacing included
+                                sent = True
+                                for c in chunker.feed(text, exact=True):
+                                    sent = await _send_chunk(c)
+                                    if not sent:
+                                        break
+                            if not sent:
+                                cancel_event.set()
                                 break
-
+                        if chunker is not None and not cancel_event.is_set() and not streamer.error:
+                            tail = chunker.flush()
+                            if tail:
+                                await _send_chunk(tail)
+                        if streamer.error:
+                            log.error(f"[ws:{conn_id}] turn:{turn_id} generation error: {streamer.error}")
+                            await _send({"type": "error", "detail": streamer.error, "turn_id": turn_id})
+                            error_flag[0] = True
+                    except asyncio.TimeoutError:
+                        log.warning(f"[ws:{conn_id}] turn:{turn_id} token timeout")
+                        cancel_event.set()
+                        error_flag[0] = True
+                        await _send({"type": "timeout", "turn_id": turn_id})
                     finally:
                         cancel_event.set()
-                        try:
-                            await asyncio.wait_for(asyncio.wrap_future(producer_future), timeout=10.0)
-                        except Exception:
-                            pass
+                        streamer.cancel()
+                        await streamer.wait_finished(timeout=10.0)
 
             except WebSocketDisconnect:
                 ws_alive = False
@@ -687,9 +851,35 @@ async def chat_ws(ws: WebSocket):
                 CAG_INFERENCE_LATENCY.observe(lat_ms / 1000.0)
                 CAG_TOKENS_GENERATED.inc(token_count[0])
                 _update_gpu_gauges()
+                stream_stats = streamer.stats() if streamer is not None else {}
+                if chunk_count:
+                    CAG_WS_CHUNK_FRAMES.inc(chunk_count)
+                if stream_stats.get("tokens"):
+                    if chunker is None:
+                        CAG_WS_FRAMES.inc(stream_stats["frames"])
+                    CAG_TOKEN_DECODE_US.observe(stream_stats["decode_us_per_token"])
+                    CAG_FRAME_LAG.observe(stream_stats["lag_ms_p50"] / 1000.0)
+                decode_stats = streamer.decode_stats if streamer is not None else {}
+                if decode_stats.get("decode_tok_s"):
+                    CAG_DECODE_TPS.observe(decode_stats["decode_tok_s"])
+                if "acceptance_rate" in decode_stats:
+                    CAG_SPEC_ACCEPTANCE.observe(decode_stats["acceptance_rate"])
+                # Only cancels that landed while generate() was still running
+                cancel_ms = None
+                closed_at = streamer.closed_at if streamer is not None else None
+                if cancel_at[0] is not None and closed_at is not None and closed_at >= cancel_at[0]:
+                    cancel_ms = (closed_at - cancel_at[0]) * 1000
+                    CAG_CANCEL_TO_GPU_FREE.observe(cancel_ms / 1000.0)
                 log.info(
                     f"[ws:{conn_id}] turn:{turn_id} done "
-                    f"tokens={token_count[0]} lat={round(lat_ms)}ms"
+                    f"tokens={token_count[0]} frames={stream_stats.get('frames', 0)} "
+                    f"decode={stream_stats.get('decode_us_per_token', 0)}us/tok "
+                    f"lag_p50={stream_stats.get('lag_ms_p50', 0)}ms lat={round(lat_ms)}ms "
+                    f"gen={decode_stats.get('decode_tok_s', 0)}tok/s "
+                    f"tok/step={decode_stats.get('tokens_per_step', 0)}"
+                    + (f" accept={decode_stats['acceptance_rate']}" if "acceptance_rate" in decode_stats else "")
+                    + (f" chunks={chunk_count}" if chunker is not None else "")
+                    + (f" cancel_to_free={round(cancel_ms)}ms" if cancel_ms is not None else "")
                 )
 
             # Send done frame only if the connection is still alive
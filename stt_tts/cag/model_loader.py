@@ -9,11 +9,20 @@ IMPROVEMENTS v2:
 - Greedy decoding enforced (do_sample=False, num_beams=1, repetition_penalty=1.0)
   → consistent, fastest generation for a business receptionist
 - Async streaming uses proper thread-pool bridge (no O(n²) token loop)
+- config.kv_cache_quant → quantized generation KV cache (transformers
+  QuantizedCache); kv_cache_kwargs is {} when the backend is not installed
+- config.speculative_mode → assisted generation: a 4-bit draft model
+  (assistant_model) or prompt-lookup drafting; assisted_kwargs is {} when
+  off, when the draft model cannot be used, or for "ngram" (CAGSystem runs
+  that mode itself — ngram_lookup.py)
+- new_tokenizer() gives background prefix rebuilds their own tokenizer
+  instance, so they never share the fast tokenizer with a running turn
 """
 
 import torch
 import gc
 import asyncio
+import importlib.util
 from threading import Thread
 from transformers import (
     AutoTokenizer,
@@ -36,6 +45,9 @@ class ModelLoader:
         self.model     = None
         self.tokenizer = None
         self.device    = None
+        self.kv_cache_kwargs: dict = {}   # extra generate() kwargs — see _resolve_kv_cache()
+        self.draft_model = None
+        self.assisted_kwargs: dict = {}   # extra generate() kwargs — see _resolve_assisted()
 
     # ──────────────────────────────────────────────────────────────────────────
     # Public: load
@@ -59,6 +71,8 @@ class ModelLoader:
         self.tokenizer = self._load_tokenizer()
         self.model     = self._load_model()
         self._apply_model_optimizations()
+        self.kv_cache_kwargs = self._resolve_kv_cache()
+        self.assisted_kwargs = self._resolve_assisted()
 
         torch.cuda.empty_cache()
         gc.collect()
@@ -69,20 +83,30 @@ class ModelLoader:
 
         return self.model, self.tokenizer
 
+    def new_tokenizer(self):
+        """
+        A separate instance of the model's tokenizer.  The fast (Rust)
+        tokenizer is not safe to share across threads — calls with different
+        truncation settings race and raise "Already borrowed" — so a
+        background rebuild tokenizes its knowledge with its own instance.
+        """
+        tokenizer = AutoTokenizer.from_pretrained(self.config.model_id)
+        tokenizer.padding_side = "left"
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        return tokenizer
+
     # ──────────────────────────────────────────────────────────────────────────
     # Private: load helpers
     # ──────────────────────────────────────────────────────────────────────────
 
     def _load_tokenizer(self):
         print("\n🔤 Loading tokenizer...")
-        tokenizer = AutoTokenizer.from_pretrained(self.config.model_id)
-        tokenizer.padding_side = "left"
-        if tokenizer.pad_token is None:
-            tokenizer.pad_token = tokenizer.eos_token
+        tokenizer = self.new_tokenizer()
         print("✅ Tokenizer loaded")
         return tokenizer
 
-    def _load_model(self):
+    def _load_model(self, model_id=None):
         """
         Load model with 4-bit quantization.
 
@@ -90,6 +114,7 @@ class ModelLoader:
         Lovelace architecture).  Falls back to "eager" if FA2 is not installed
         so the service always starts — just slightly slower.
         """
+        model_id = model_id or self.config.model_id
         print("\n🔧 Loading model with quantization...")
 
         bnb_config = BitsAndBytesConfig(
@@ -104,7 +129,7 @@ class ModelLoader:
 
         try:
             model = AutoModelForCausalLM.from_pretrained(
-                self.config.model_id,
+                model_id,
                 device_map={"": 0},
                 quantization_config=bnb_config,
                 torch_dtype=torch.float16,
@@ -117,7 +142,7 @@ class ModelLoader:
             if attn_impl == "flash_attention_2":
                 print(f"⚠️  Flash Attention 2 unavailable ({exc}) — falling back to eager")
                 model = AutoModelForCausalLM.from_pretrained(
-                    self.config.model_id,
+                    model_id,
                     device_map={"": 0},
                     quantization_config=bnb_config,
                     torch_dtype=torch.float16,
@@ -152,6 +177,59 @@ class ModelLoader:
         )
         print(f"   ✅ GPU memory fraction: {self.config.gpu_memory_fraction}")
 
+    def _resolve_kv_cache(self) -> dict:
+        """Quantized KV cache kwargs, or {} (fp16 cache) when off or the backend is missing"""
+        kwargs = self.config.get_kv_cache_kwargs()
+        if not kwargs:
+            return {}
+        backend = kwargs["cache_config"]["backend"]
+        module  = {"quanto": "optimum.quanto", "HQQ": "hqq"}[backend]
+        try:
+            found = importlib.util.find_spec(module) is not None
+        except ImportError:
+            found = False
+        if not found:
+            print(f"   ⚠️  {self.config.kv_cache_quant} KV cache needs {module} — using fp16 KV")
+            return {}
+        print(f"   ✅ KV cache: {self.config.kv_cache_quant} ({backend})")
+        return kwargs
+
+    def _resolve_assisted(self) -> dict:
+        """
+        Assisted-generation kwargs for config.speculative_mode, or {} (plain
+        greedy decoding) when off or the draft model is unusable
+        """
+        mode = self.config.speculative_mode
+        if mode == "prompt_lookup":
+            print(f"   ✅ Speculative: prompt lookup ({self.config.num_draft_tokens} tokens/step)")
+            return self.config.get_prompt_lookup_kwargs()
+        if mode == "ngram":
+            print(f"   ✅ Speculative: n-gram index lookup ({self.config.num_draft_tokens} tokens/step)")
+            return {}
+        if mode != "draft":
+            return {}
+
+        print(f"\n📥 Draft model: {self.config.draft_model_id}")
+        try:
+            draft = self._load_model(self.config.draft_model_id)
+        except Exception as exc:
+            print(f"   ⚠️  Draft model failed to load ({exc}) — speculative decoding off")
+            return {}
+        # Draft tokens are verified by id — the vocabularies must match
+        if draft.config.vocab_size != self.model.config.vocab_size:
+            print(f"   ⚠️  Draft vocab {draft.config.vocab_size} ≠ model vocab "
+                  f"{self.model.config.vocab_size} — speculative decoding off")
+            del draft
+            return {}
+        draft.eval()
+        # Fixed draft length per step: num_draft_tokens is the tuning knob
+        # and the acceptance rate is measured against it
+        draft.generation_config.num_assistant_tokens = self.config.num_draft_tokens
+        draft.generation_config.num_assistant_tokens_schedule = "constant"
+        self.draft_model = draft
+        print(f"   ✅ Speculative: draft model ({self.config.num_draft_tokens} tokens/step)")
+        return {"assistant_model": draft}
+
     def _get_compute_dtype(self):
         if self.config.compute_dtype == "bfloat16":
             return torch.bfloat16
@@ -203,6 +281,8 @@ class ModelLoader:
         }
         if attention_mask is not None:
             gen_kwargs["attention_mask"] = attention_mask
+        gen_kwargs.update(self.kv_cache_kwargs)
+        gen_kwargs.update(self.assisted_kwargs)
 
         def _generate():
             with torch.no_grad():
@@ -307,6 +387,10 @@ class ModelLoader:
         if self.model is not None:
             del self.model
             self.model = None
+        if self.draft_model is not None:
+            self.assisted_kwargs = {}
+            del self.draft_model
+            self.draft_model = None
         if self.tokenizer is not None:
             del self.tokenizer
             self.tokenizer = None
@@ -0,0 +1,152 @@
+"""
+CAG Architecture - N-gram lookup drafting (speculative_mode="ngram")
+
+Receptionist answers quote solution names, prices and benefit phrases
+verbatim from the knowledge prefix, so the next few tokens of an answer
+are often already sitting in the prompt.  lookup_generate() drafts them
+from an n-gram index instead of a draft model and verifies the whole
+draft in one forward pass of the main model:
+
+  index   : NgramIndex maps every 1..max_ngram token sequence to the
+            position that follows its latest occurrence.  The knowledge
+            prefix is indexed once per prefix; each turn layers a small
+            overlay on top (retrieved entries, conversation, the answer
+            so far), so lookups prefer the most recent context.
+  draft   : the last n generated tokens (longest n first) are looked up
+            and the tokens that followed them are proposed.
+  verify  : [last token] + draft go through the model as one forward;
+            the greedy prediction at each position accepts the matching
+            prefix of the draft plus one token of the model's own.  The
+            rejected tail is cropped from the KV cache.
+
+Greedy output is identical to plain decoding; a miss costs one forward
+of 1 + k tokens, which at batch 1 costs about the same as a single token.
+
+NgramIndex is pure Python; torch / transformers are only imported by
+lookup_generate().
+"""
+
+import inspect
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class NgramIndex:
+    """
+    n-gram → next position over a token sequence, optionally layered on a
+    `base` index (looked up after this one).  An n-gram is indexed once a
+    token follows it, so the sequence tail never matches itself.
+    """
+
+    def __init__(self, ids: Iterable[int] = (), max_ngram: int = 3, min_ngram: int = 1,
+                 base: Optional["NgramIndex"] = None):
+        self.max_ngram = max_ngram
+        self.min_ngram = min_ngram
+        self.base = base
+        self.ids: List[int] = []
+        self._next: Dict[Tuple[int, ...], int] = {}
+        self.proposed = 0               # draft tokens handed out by propose()
+        self.accepted = 0               # of those, accepted by the model (lookup_generate)
+        self.extend(ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def extend(self, ids: Iterable[int]):
+        seq, table = self.ids, self._next
+        start = len(seq)
+        seq.extend(ids)
+        # n-grams ending just before position p, for every p that now has a token
+        for p in range(max(start, 1), len(seq)):
+            for n in range(self.min_ngram, min(self.max_ngram, p) + 1):
+                table[tuple(seq[p - n:p])] = p
+
+    def lookup(self, key: Tuple[int, ...], k: int) -> List[int]:
+        """Up to k tokens that followed the latest occurrence of `key`, here or in base"""
+        p = self._next.get(key)
+        if p is not None:
+            return self.ids[p:p + k]
+        return self.base.lookup(key, k) if self.base is not None else []
+
+    def propose(self, k: int) -> List[int]:
+        """Draft up to k tokens continuing this sequence — [] when nothing matches"""
+        if k <= 0:
+            return []
+        seq = self.ids
+        for n in range(min(self.max_ngram, len(seq)), self.min_ngram - 1, -1):
+            draft = self.lookup(tuple(seq[-n:]), k)
+            if draft:
+                self.proposed += len(draft)
+                return draft
+        return []
+
+    def overlay(self, ids: Iterable[int] = ()) -> "NgramIndex":
+        """A per-turn index over `ids` that falls back to this one"""
+        return NgramIndex(ids, self.max_ngram, self.min_ngram, base=self)
+
+
+def _logits_to_keep_kwarg(model) -> dict:
+    """Prefill only needs the last position's logits — not prompt × vocab"""
+    params = inspect.signature(model.forward).parameters
+    for name in ("logits_to_keep", "num_logits_to_keep"):    # transformers ≥ 4.50 / older
+        if name in params:
+            return {name: 1}
+    return {}
+
+
+def lookup_generate(model, drafter: NgramIndex, input_ids, attention_mask=None,
+                    max_new_tokens: int = 256, eos_token_id=None, streamer=None,
+                    stopping_criteria=None, num_draft_tokens: int = 5, **_):
+    """
+    Greedy generation with drafts from `drafter` (the turn's overlay index,
+    extended with every accepted token).  Takes the generate() kwargs the
+    streaming paths build — streamer put() / end() and stopping criteria
+    behave as in model.generate(); other sampling kwargs are ignored.
+    Returns prompt + generated ids.
+    """
+    import torch
+    from transformers import DynamicCache
+
+    eos = {eos_token_id} if isinstance(eos_token_id, int) else set(eos_token_id or ())
+    criteria = list(stopping_criteria or ())
+    device, dtype = input_ids.device, input_ids.dtype
+
+    if streamer is not None:
+        streamer.put(input_ids.cpu())
+    cache = DynamicCache()
+    out = model(input_ids=input_ids, attention_mask=attention_mask, past_key_values=cache,
+                use_cache=True, **_logits_to_keep_kwarg(model))
+    pending = [int(out.logits[0, -1].argmax())]
+    del out
+
+    seq, generated = input_ids, 0
+    while True:
+        # emit the tokens accepted by the last step
+        generated += len(pending)
+        drafter.extend(pending)
+        step_ids = torch.tensor([pending], dtype=dtype)
+        seq = torch.cat([seq, step_ids.to(device)], dim=-1)
+        if streamer is not None:
+            streamer.put(step_ids)
+        stop = [bool(c(seq, None)) for c in criteria]       # every criterion sees every step
+        if any(stop) or pending[-1] in eos or generated >= max_new_tokens:
+            break
+
+        last  = pending[-1]
+        draft = drafter.propose(min(num_draft_tokens, max_new_tokens - generated - 1))
+        past  = cache.get_seq_length()
+        out = model(input_ids=torch.tensor([[last] + draft], dtype=dtype, device=device),
+                    past_key_values=cache, use_cache=True)
+        preds = out.logits[0].argmax(-1).tolist()           # preds[i] follows [last] + draft[:i]
+        del out
+
+        n = 0
+        while n < len(draft) and draft[n] == preds[n] and draft[n] not in eos:
+            n += 1
+        drafter.accepted += n
+        if n < len(draft):
+            cache.crop(past + 1 + n)                        # drop KV of the rejected draft tail
+        pending = (draft[:n] + [preds[n]])[:max_new_tokens - generated]
+
+    if streamer is not None:
+        streamer.end()
+    return seq
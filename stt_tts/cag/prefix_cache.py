@@ -0,0 +1,249 @@
+"""
+CAG Architecture - Multi-prefix KV cache store
+
+CacheManager used to hold exactly one precomputed knowledge prefix, so one
+loaded model could only ever serve one knowledge base.  This store keeps
+several prefixes side by side, keyed by (model, tokenizer, prompt hash), and
+lets each query pick the one it needs.
+
+Memory is managed in two tiers, least recently used first:
+
+  device  : tensors on the model device, up to gpu_budget_bytes
+  host    : tensors spilled to (pinned) CPU memory, up to cpu_budget_bytes
+
+Going over the device budget spills LRU prefixes to the host tier; going over
+the host budget drops them.  get() on a spilled prefix copies it back to the
+device (pinned memory makes that a fast DMA) and makes it most recent.
+
+The store only moves (key, value) tensors around — building a DynamicCache
+from them is CacheManager's job — so it needs nothing beyond the tensor
+.to() / .pin_memory() / .numel() / .element_size() methods.
+
+Usage:
+    store = PrefixCacheStore("cuda:0", gpu_budget_bytes=1 << 30, cpu_budget_bytes=4 << 30)
+    store.put(key, input_ids, layers, knowledge_token_count=n)
+    entry = store.get(key)          # None once evicted
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+MB = 1024 * 1024
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class PrefixKey:
+    """Identity of a precomputed prefix — any change means different KV tensors"""
+    model_id: str
+    tokenizer_id: str
+    prompt_hash: str
+
+
+@dataclass
+class PrefixEntry:
+    key: PrefixKey
+    input_ids: Any
+    layers: List[Tuple[Any, Any]]          # (keys, values) per layer
+    knowledge_token_count: int
+    nbytes: int
+    on_host: bool = False
+    label: str = ""
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    last_used: float = 0.0
+    hits: int = 0
+
+
+def _tensor_bytes(t) -> int:
+    return t.numel() * t.element_size()
+
+
+class PrefixCacheStore:
+    """
+    LRU store of precomputed knowledge prefixes under a device and host budget.
+
+    Thread-safe: the service selects prefixes from executor threads.
+    """
+
+    def __init__(self, device, gpu_budget_bytes: int, cpu_budget_bytes: int,
+                 pin_memory: bool = True):
+        self.device = device
+        self.gpu_budget_bytes = gpu_budget_bytes
+        self.cpu_budget_bytes = cpu_budget_bytes
+        self.pin_memory = pin_memory
+        # No separate host tier when the model itself runs on the CPU
+        self.can_spill = str(device) != "cpu" and cpu_budget_bytes > 0
+
+        self._entries: "OrderedDict[PrefixKey, PrefixEntry]" = OrderedDict()   # oldest first
+        self._lock = threading.RLock()
+        self.device_bytes = 0
+        self.host_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.spills = 0
+        self.promotions = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: PrefixKey) -> bool:
+        return key in self._entries
+
+    def keys(self) -> List[PrefixKey]:
+        """Most recently used last"""
+        with self._lock:
+            return list(self._entries)
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Insert / lookup
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def put(self, key: PrefixKey, input_ids, layers, knowledge_token_count: int,
+            label: str = "", metadata: Optional[Dict[str, Any]] = None) -> PrefixEntry:
+        """Store a prefix on the device as most recently used, then rebalance"""
+        layers = [(k.to(self.device), v.to(self.device)) for k, v in layers]
+        entry = PrefixEntry(
+            key=key,
+            input_ids=input_ids.to(self.device),
+            layers=layers,
+            knowledge_token_count=knowledge_token_count,
+            nbytes=sum(_tensor_bytes(k) + _tensor_bytes(v) for k, v in layers),
+            label=label,
+            metadata=dict(metadata or {}),
+            last_used=time.monotonic(),
+        )
+        with self._lock:
+            self.discard(key)
+            self._entries[key] = entry
+            self.device_bytes += entry.nbytes
+            if entry.nbytes > self.gpu_budget_bytes:
+                print(f"⚠️  Prefix {label or key.prompt_hash} ({entry.nbytes / MB:.0f} MB) "
+                      f"exceeds the prefix GPU budget ({self.gpu_budget_bytes / MB:.0f} MB)")
+            self._rebalance(keep=key)
+        return entry
+
+    def get(self, key: PrefixKey) -> Optional[PrefixEntry]:
+        """The prefix with its tensors on the device, or None if not stored"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            entry.last_used = time.monotonic()
+            entry.hits += 1
+            self.hits += 1
+            if entry.on_host:
+                self._promote(entry)
+                self._rebalance(keep=key)
+            return entry
+
+    def peek(self, key: PrefixKey) -> Optional[PrefixEntry]:
+        """The entry on whichever tier it is, without touching LRU order or counters"""
+        with self._lock:
+            return self._entries.get(key)
+
+    def discard(self, key: PrefixKey) -> bool:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False
+            if entry.on_host:
+                self.host_bytes -= entry.nbytes
+            else:
+                self.device_bytes -= entry.nbytes
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.device_bytes = 0
+            self.host_bytes = 0
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Tier moves
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def _rebalance(self, keep: PrefixKey):
+        """Spill LRU device entries past the GPU budget, drop LRU host entries
+        past the CPU budget.  `keep` (the entry being served) never moves."""
+        for key, entry in list(self._entries.items()):
+            if self.device_bytes <= self.gpu_budget_bytes:
+                break
+            if key == keep or entry.on_host:
+                continue
+            if self.can_spill:
+                self._spill(entry)
+            else:
+                self._evict(key)
+        for key, entry in list(self._entries.items()):
+            if self.host_bytes <= self.cpu_budget_bytes:
+                break
+            if key != keep and entry.on_host:
+                self._evict(key)
+
+    def _spill(self, entry: PrefixEntry):
+        entry.layers = [(self._to_host(k), self._to_host(v)) for k, v in entry.layers]
+        entry.input_ids = entry.input_ids.to("cpu")
+        entry.on_host = True
+        self.device_bytes -= entry.nbytes
+        self.host_bytes += entry.nbytes
+        self.spills += 1
+
+    def _promote(self, entry: PrefixEntry):
+        entry.layers = [
+            (k.to(self.device, non_blocking=True), v.to(self.device, non_blocking=True))
+            for k, v in entry.layers
+        ]
+        entry.input_ids = entry.input_ids.to(self.device)
+        entry.on_host = False
+        self.host_bytes -= entry.nbytes
+        self.device_bytes += entry.nbytes
+        self.promotions += 1
+
+    def _evict(self, key: PrefixKey):
+        self.discard(key)
+        self.evictions += 1
+
+    def _to_host(self, t):
+        t = t.to("cpu")
+        if self.pin_memory:
+            try:
+                t = t.pin_memory()
+            except RuntimeError:
+                pass        # no CUDA driver / pinned pool exhausted — pageable is fine
+        return t
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Info
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'prefixes': len(self._entries),
+                'on_device': sum(1 for e in self._entries.values() if not e.on_host),
+                'device_mb': round(self.device_bytes / MB, 1),
+                'host_mb': round(self.host_bytes / MB, 1),
+                'gpu_budget_mb': round(self.gpu_budget_bytes / MB, 1),
+                'cpu_budget_mb': round(self.cpu_budget_bytes / MB, 1),
+                'hits': self.hits,
+                'misses': self.misses,
+                'spills': self.spills,
+                'promotions': self.promotions,
+                'evictions': self.evictions,
+                'entries': [
+                    {'label': e.label, 'hash': e.key.prompt_hash,
+                     'tokens': e.knowledge_token_count, 'mb': round(e.nbytes / MB, 1),
+                     'tier': 'host' if e.on_host else 'device', 'hits': e.hits}
+                    for e in reversed(self._entries.values())
+                ],
+            }
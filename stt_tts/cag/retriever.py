@@ -0,0 +1,102 @@
+"""
+CAG Architecture - Per-query retrieval over the whole knowledge catalog
+
+In knowledge_mode="hybrid" the cached prefix only holds a small core of the
+catalog (core_knowledge_tokens) and each query adds the top-k entries that
+match it.  This module is the in-process BM25 index behind that lookup.
+
+Documents are an entry's problem_keywords (counted twice — they are the
+curated signal) plus its user_problem.  Postings are array columns (row ids
+and term frequencies), so a 50k-entry catalog indexes in a few MB.
+
+Usage:
+    retriever = BM25Retriever.build(store.iter_entries())
+    for row, score in retriever.search("invoices keep getting lost", k=8):
+        ...
+"""
+
+import heapq
+import math
+import re
+import time
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in is it
+its me my no not of on or our so that the their them there they this to too
+us was we what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+class BM25Retriever:
+    """Okapi BM25 over knowledge-index rows"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, max_df: float = 0.5):
+        self.k1 = k1
+        self.b = b
+        self.max_df = max_df        # skip terms in more than this share of entries
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._doc_len = array('I')
+        self._avgdl = 0.0
+        self.build_ms = 0.0
+
+    @classmethod
+    def build(cls, entries: Iterable, k1: float = 1.5, b: float = 0.75) -> "BM25Retriever":
+        """Index (row, SolutionEntry) pairs; rows must be 0..n-1 in order"""
+        t0 = time.perf_counter()
+        self = cls(k1, b)
+        rows: Dict[str, array] = defaultdict(lambda: array('I'))
+        tfs: Dict[str, array] = defaultdict(lambda: array('H'))
+        for row, entry in entries:
+            terms = tokenize(" ".join(entry.problem_keywords)) * 2 + tokenize(entry.user_problem)
+            self._doc_len.append(len(terms))
+            for term, tf in Counter(terms).items():
+                rows[term].append(row)
+                tfs[term].append(min(tf, 0xFFFF))
+        self._postings = {term: (rows[term], tfs[term]) for term in rows}
+        self._avgdl = (sum(self._doc_len) / len(self._doc_len)) if self._doc_len else 0.0
+        self.build_ms = (time.perf_counter() - t0) * 1000
+        return self
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def search(self, query: str, k: int = 8,
+               exclude: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        """Top-k (row, score), best first; rows in `exclude` are skipped"""
+        n = len(self._doc_len)
+        if not n or k <= 0:
+            return []
+        k1, b, avgdl, doc_len = self.k1, self.b, self._avgdl or 1.0, self._doc_len
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            rows, tfs = posting
+            if len(rows) > n * self.max_df:
+                continue            # near-zero idf, but the longest posting lists
+            idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            for row, tf in zip(rows, tfs):
+                norm = k1 * (1 - b + b * doc_len[row] / avgdl)
+                scores[row] += idf * tf * (k1 + 1) / (tf + norm)
+        if exclude:
+            for row in exclude:
+                scores.pop(row, None)
+        return heapq.nlargest(k, scores.items(), key=lambda kv: (kv[1], -kv[0]))
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'documents': len(self),
+            'terms': len(self._postings),
+            'avg_doc_len': round(self._avgdl, 1),
+            'build_ms': round(self.build_ms, 1),
+        }
@@ -0,0 +1,172 @@
+"""
+CAG Architecture - Exact token budgeting for the knowledge prefix
+
+build_knowledge_text() used to pack on len(text) / 4 and only learn the real
+size after tokenizing the joined result, so the cache was routinely over- or
+under-filled.  This module provides the pieces for packing on exact counts:
+
+  tokenizer_id()       stable identity of a tokenizer (name, vocab, class)
+  count_tokens()       batched encode — one fast-tokenizer call per batch
+  TokenCountCache      {entry hash: token count} per tokenizer, on disk, so a
+                       restart only tokenizes entries that changed
+  pack_by_tokens()     0/1 knapsack with unit values: the most entries that
+                       fit, then swaps that use up the leftover budget
+"""
+
+import bisect
+import hashlib
+import json
+import os
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence
+
+DEFAULT_BATCH_SIZE = 512
+
+
+def tokenizer_id(tokenizer) -> str:
+    """Identity used to key cached counts — any change to it invalidates them"""
+    name = getattr(tokenizer, 'name_or_path', '') or ''
+    try:
+        vocab = len(tokenizer)
+    except TypeError:
+        vocab = getattr(tokenizer, 'vocab_size', '')
+    return f"{type(tokenizer).__name__}|{name}|{vocab}"
+
+
+def count_tokens(tokenizer, texts: Sequence[str], batch_size: int = DEFAULT_BATCH_SIZE) -> List[int]:
+    """Token count per text, without special tokens, batch-encoded when supported"""
+    counts: List[int] = []
+    batched = callable(tokenizer)
+    for start in range(0, len(texts), batch_size):
+        batch = list(texts[start:start + batch_size])
+        if batched:
+            try:
+                ids = tokenizer(batch, add_special_tokens=False,
+                                return_attention_mask=False)['input_ids']
+                counts.extend(len(x) for x in ids)
+                continue
+            except (TypeError, KeyError):
+                batched = False
+        counts.extend(len(tokenizer.encode(t, add_special_tokens=False)) for t in batch)
+    return counts
+
+
+class TokenCountCache:
+    """
+    Token counts for one tokenizer, keyed by a 64-bit entry hash.
+
+    File format: a JSON header line, then the hashes (uint64) and counts
+    (uint32) as packed arrays.  A file written for another tokenizer id is
+    ignored.  save() keeps only the hashes used since load, so the file
+    tracks the current catalog instead of growing with every revision.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: Optional[str], tokenizer_id: str):
+        self.path = path
+        self.tokenizer_id = tokenizer_id
+        self._counts: Dict[int, int] = {}
+        self._used: set = set()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def open(cls, path: Optional[str], tokenizer_id: str) -> "TokenCountCache":
+        cache = cls(path, tokenizer_id)
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    header = json.loads(f.readline())
+                    if header.get('version') == cls.VERSION and header.get('tokenizer_id') == tokenizer_id:
+                        hashes, counts = array('Q'), array('I')
+                        hashes.fromfile(f, header['n'])
+                        counts.fromfile(f, header['n'])
+                        cache._counts = dict(zip(hashes, counts))
+            except (OSError, ValueError, KeyError, EOFError) as e:
+                print(f"⚠️  Ignoring unreadable token count cache {path}: {e}")
+        return cache
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def get(self, key: int) -> Optional[int]:
+        count = self._counts.get(key)
+        if count is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._used.add(key)
+        return count
+
+    def put(self, key: int, count: int):
+        self._counts[key] = count
+        self._used.add(key)
+        self._dirty = True
+
+    def save(self):
+        if not self.path:
+            return
+        stale = len(self._counts) - len(self._used)
+        if not self._dirty and not stale:
+            return
+        keys = [k for k in self._counts if k in self._used]
+        header = {'version': self.VERSION, 'tokenizer_id': self.tokenizer_id, 'n': len(keys)}
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(json.dumps(header).encode('utf-8') + b"\n")
+            array('Q', keys).tofile(f)
+            array('I', (self._counts[k] for k in keys)).tofile(f)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+
+def cache_path_for(base_path: str, tokenizer_id: str) -> str:
+    """<base>.tokens-<digest>: one count file per tokenizer"""
+    digest = hashlib.blake2b(tokenizer_id.encode('utf-8'), digest_size=6).hexdigest()
+    return f"{base_path}.tokens-{digest}"
+
+
+def pack_by_tokens(rows: Iterable[int], weights: Dict[int, int], budget: int,
+                   max_items: Optional[int] = None) -> List[int]:
+    """
+    Rows to include so that sum(weights) <= budget, maximizing the number of
+    rows, then the tokens used.
+
+    Every row is worth the same, so taking the lightest rows first is the
+    optimal knapsack for the count.  The leftover budget is then spent by
+    swapping a chosen row for a heavier unchosen one whenever the difference
+    fits, which keeps the count and fills the cache closer to the budget.
+    Ties keep the order of `rows`.  Returns rows lightest-first.
+    """
+    ranked = sorted(rows, key=weights.__getitem__)
+    limit = len(ranked) if max_items is None else max(0, max_items)
+
+    chosen: List[int] = []
+    used = 0
+    for row in ranked:
+        if len(chosen) >= limit or used + weights[row] > budget:
+            break
+        chosen.append(row)
+        used += weights[row]
+
+    rest = ranked[len(chosen):]
+    rest_w = [weights[r] for r in rest]
+    taken = [False] * len(rest)
+    residual = budget - used
+    for i, row in enumerate(chosen):
+        if residual <= 0:
+            break
+        w = weights[row]
+        j = bisect.bisect_right(rest_w, w + residual) - 1
+        while j >= 0 and taken[j]:
+            j -= 1
+        if j < 0 or rest_w[j] <= w:
+            continue
+        taken[j] = True
+        residual -= rest_w[j] - w
+        chosen[i] = rest[j]
+
+    position = {row: i for i, row in enumerate(ranked)}
+    return sorted(chosen, key=position.__getitem__)
@@ -0,0 +1,322 @@
+"""
+CAG Architecture - Direct async token streamer
+
+TextIteratorStreamer hands every token through a queue.Queue to a blocking
+iterator; the WebSocket handler then re-posts each token into the event loop
+with call_soon_threadsafe and sends one JSON frame per token.  That is three
+thread / queue hops and a JSON encode per sub-word.
+
+AsyncTokenStreamer is passed to model.generate(streamer=...) directly:
+
+  generation thread : put() decodes incrementally (prefix / read offsets, so
+                      each step decodes a few tokens, not the whole answer)
+                      and appends the new text to a pending list; only the
+                      first piece of a batch schedules a wake-up on the loop
+  event loop        : frames() yields everything pending as one string
+
+Pieces that arrive while the loop is busy, or within coalesce_ms of the
+previous frame, go out together; the first frame is never held back.
+
+Cancellation: streamer.cancel() (or setting streamer.cancel_event from any
+thread) drops pending text, and CancelCriteria on the same event, passed as
+a generate() stopping criterion, ends generation at the next decode step so
+the GPU is free for the next turn instead of running to max_new_tokens.
+
+DecodeMeter is a second, measuring-only criterion: generate() calls the
+criteria once per main-model forward pass, so it counts verification steps
+and the tokens they produced — tokens per step, draft acceptance rate and
+decode tokens/s with or without assisted (speculative) decoding.
+
+Usage:
+    streamer = AsyncTokenStreamer(tokenizer, loop, coalesce_ms=5)
+
+    def run():                          # generation thread
+        try:
+            model.generate(..., streamer=streamer, stopping_criteria=StoppingCriteriaList(
+                [CancelCriteria(streamer.cancel_event)]))
+        finally:
+            streamer.close()
+
+    Thread(target=run).start()
+    async for text, n_tokens in streamer.frames(timeout=15.0):
+        await ws.send_json({"type": "token", "token": text})
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+
+class CancelCriteria:
+    """
+    generate() stopping criterion that ends generation once `event` is set.
+
+    Checked once per decode step on the generation thread — an Event.is_set()
+    read, no device sync.  Returns a plain bool, which StoppingCriteriaList
+    ORs into its per-sequence done mask.
+    """
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+        self.steps = 0
+        self.stopped_at: Optional[float] = None     # time.monotonic() of the step that saw the cancel
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        self.steps += 1
+        if not self.event.is_set():
+            return False
+        if self.stopped_at is None:
+            self.stopped_at = time.monotonic()
+        return True
+
+
+class DecodeMeter:
+    """
+    generate() stopping criterion that never stops — it records how many
+    main-model steps produced how many tokens.  Plain greedy decoding makes
+    one token per step; assisted decoding makes 1 + accepted draft tokens.
+    """
+
+    def __init__(self, prompt_tokens: int = 0):
+        self.prompt_tokens = prompt_tokens
+        self.steps = 0
+        self._first: Optional[Tuple[float, int]] = None    # (perf_counter, length) after the first step
+        self._last: Optional[Tuple[float, int]] = None
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        mark = (time.perf_counter(), input_ids.shape[-1])
+        if self._first is None:
+            self._first = mark
+        self._last = mark
+        self.steps += 1
+        return False
+
+    @property
+    def tokens(self) -> int:
+        return self._last[1] - self.prompt_tokens if self._last else 0
+
+    @property
+    def decode_tokens(self) -> int:
+        """Tokens after the first step"""
+        return self._last[1] - self._first[1] if self._last else 0
+
+    @property
+    def decode_s(self) -> float:
+        return self._last[0] - self._first[0] if self._last else 0.0
+
+    def stats(self, proposed: Optional[int] = None) -> dict:
+        """
+        tokens_per_step and decode_tok_s (first step — which includes the
+        prompt forward — excluded).  With `proposed` (draft tokens offered
+        to the model this turn) also acceptance_rate.
+        """
+        return decode_summary(self.steps, self.tokens, self.decode_tokens, self.decode_s, proposed)
+
+
+def decode_summary(steps: int, tokens: int, decode_tokens: int, decode_s: float,
+                   proposed: Optional[int] = None) -> dict:
+    """DecodeMeter.stats() for one turn or totals summed over many"""
+    out = {
+        'steps':           steps,
+        'tokens':          tokens,
+        'tokens_per_step': round(tokens / steps, 3) if steps else 0.0,
+        'decode_tok_s':    round(decode_tokens / decode_s, 1) if decode_s > 0 else 0.0,
+    }
+    if proposed is not None:
+        # every step adds exactly one token of the main model's own
+        out['acceptance_rate'] = round((tokens - steps) / proposed, 3) if proposed else 0.0
+    return out
+
+
+class AsyncTokenStreamer:
+    """transformers streamer (put / end) that feeds an asyncio consumer"""
+
+    def __init__(self, tokenizer, loop: asyncio.AbstractEventLoop,
+                 coalesce_ms: float = 5.0, skip_prompt: bool = True,
+                 cancel_event: Optional[threading.Event] = None):
+        self.tokenizer = tokenizer
+        self.loop = loop
+        self.coalesce_s = coalesce_ms / 1000.0
+        self.skip_prompt = skip_prompt
+        # Set by cancel(); a stopping criterion on the same event ends generate()
+        self.cancel_event = cancel_event or threading.Event()
+
+        # generation-thread state
+        self._ids: List[int] = []
+        self._prefix_offset = 0
+        self._read_offset = 0
+        self._undecoded = 0             # tokens not yet part of pushed text
+        self._prompt_seen = not skip_prompt
+
+        # shared state, guarded by _lock
+        self._lock = threading.Lock()
+        self._pending: List[str] = []
+        self._pending_tokens = 0
+        self._first_put_ns: Optional[int] = None
+        self._wake_scheduled = False
+        self._done = False
+        self.cancelled = False
+        self.error: Optional[str] = None
+        self.closed_at: Optional[float] = None      # time.monotonic() of close() — generation thread done
+        self.decode_stats: dict = {}                # DecodeMeter stats, set by the generation thread
+
+        # event-loop state
+        self._ready = asyncio.Event()
+        self._last_frame = 0.0
+
+        self.text = ""                  # everything emitted so far
+        self.tokens = 0
+        self.frames_sent = 0
+        self.decode_s = 0.0             # time spent in put() — the per-token cost on the GPU thread
+        self.lag_ms: List[float] = []   # first token of a frame → frame handed to the consumer
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Generation thread (BaseStreamer interface)
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def put(self, value: Any):
+        if not self._prompt_seen:
+            self._prompt_seen = True
+            return
+        if self.cancelled:
+            return
+        t0 = time.perf_counter()
+        ids = value.tolist() if hasattr(value, "tolist") else list(value)
+        if ids and isinstance(ids[0], list):
+            ids = ids[0]                # batch of one
+        self._ids.extend(ids)
+        self._undecoded += len(ids)
+        text = self._decode_new()
+        self.decode_s += time.perf_counter() - t0
+        if text:
+            self._push(text, self._undecoded)
+            self._undecoded = 0
+
+    def end(self):
+        """generate() finished — flush the decoder tail.  The stream stays open until close()."""
+        tail = ""
+        if self._read_offset < len(self._ids):
+            full = self.tokenizer.decode(self._ids[self._prefix_offset:], skip_special_tokens=True)
+            prev = self.tokenizer.decode(self._ids[self._prefix_offset:self._read_offset],
+                                         skip_special_tokens=True)
+            tail = full[len(prev):]
+            self._read_offset = len(self._ids)
+        if tail:
+            self._push(tail, self._undecoded)
+            self._undecoded = 0
+
+    def close(self, error: Optional[str] = None):
+        """
+        End the stream for the consumer — called by the thread that ran
+        generate() once its own bookkeeping is done, also on errors.
+        """
+        self.end()
+        with self._lock:
+            self.error = error
+            self._done = True
+            self.closed_at = time.monotonic()
+            self._wake_scheduled = True
+        self._wake()
+
+    def generated_text(self) -> str:
+        """The whole answer so far, decoded in one pass (generation thread)"""
+        return self.tokenizer.decode(self._ids, skip_special_tokens=True)
+
+    def cancel(self):
+        """Stop delivering tokens and signal cancel_event so generation stops too"""
+        with self._lock:
+            self.cancelled = True
+            self._pending.clear()
+            self._pending_tokens = 0
+        self.cancel_event.set()
+
+    def _decode_new(self) -> str:
+        """Text the newest tokens add, or "" while a multi-byte character is incomplete"""
+        full = self.tokenizer.decode(self._ids[self._prefix_offset:], skip_special_tokens=True)
+        prev = self.tokenizer.decode(self._ids[self._prefix_offset:self._read_offset],
+                                     skip_special_tokens=True)
+        if len(full) <= len(prev) or full.endswith("\ufffd"):
+            return ""
+        self._prefix_offset = self._read_offset
+        self._read_offset = len(self._ids)
+        return full[len(prev):]
+
+    def _push(self, text: str, n_tokens: int):
+        with self._lock:
+            if self.cancelled:
+                return
+            self._pending.append(text)
+            self._pending_tokens += n_tokens
+            if self._first_put_ns is None:
+                self._first_put_ns = time.perf_counter_ns()
+            if self._wake_scheduled:
+                return              # the loop will pick this up with the rest
+            self._wake_scheduled = True
+        self._wake()
+
+    def _wake(self):
+        try:
+            self.loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            pass                    # loop closed — nobody is listening any more
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Event loop
+    # ──────────────────────────────────────────────────────────────────────────
+
+    async def frames(self, timeout: Optional[float] = None) -> AsyncIterator[Tuple[str, int]]:
+        """
+        (text, token count) per frame until the stream ends.  Raises
+        asyncio.TimeoutError when nothing arrives for `timeout` seconds.
+        """
+        while True:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+            since = time.monotonic() - self._last_frame
+            if self.frames_sent and since < self.coalesce_s and not self._done:
+                await asyncio.sleep(self.coalesce_s - since)
+            with self._lock:
+                self._ready.clear()
+                self._wake_scheduled = False
+                pieces, self._pending = self._pending, []
+                n, self._pending_tokens = self._pending_tokens, 0
+                first_ns, self._first_put_ns = self._first_put_ns, None
+                done = self._done
+            if pieces:
+                text = "".join(pieces)
+                self.text += text
+                self.tokens += n
+                self.frames_sent += 1
+                self._last_frame = time.monotonic()
+                if first_ns is not None:
+                    self.lag_ms.append((time.perf_counter_ns() - first_ns) / 1e6)
+                yield text, n
+            if done:
+                return
+
+    async def wait_finished(self, timeout: Optional[float] = None) -> bool:
+        """Wait for end(); False on timeout"""
+        if self._done:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._done:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            self._ready.clear()
+            remaining = None if deadline is None else deadline - time.monotonic()
+            try:
+                await asyncio.wait_for(self._ready.wait(), remaining)
+            except asyncio.TimeoutError:
+                return self._done
+        return True
+
+    def stats(self) -> dict:
+        lag = sorted(self.lag_ms)
+        return {
+            'tokens': self.tokens,
+            'frames': self.frames_sent,
+            'tokens_per_frame': round(self.tokens / self.frames_sent, 2) if self.frames_sent else 0.0,
+            'decode_us_per_token': round(self.decode_s / self.tokens * 1e6, 1) if self.tokens else 0.0,
+            'lag_ms_p50': round(lag[len(lag) // 2], 3) if lag else 0.0,
+            'lag_ms_max': round(lag[-1], 3) if lag else 0.0,
+        }
@@ -0,0 +1,279 @@
+"""
+auth_local.py — In-process JWT verification for WebSocket connects
+
+Without this, every connect costs a POST to user_auth /auth/verify-token,
+which decodes the JWT and then loads the user from Postgres.  Here the
+gateway verifies the signature itself with the shared signing key and keeps
+two small pieces of state:
+
+  • UserStatusCache   — user_id → is_active, USER_STATUS_TTL_S seconds,
+                        filled from user_auth /users/{id}/status on a miss
+                        (concurrent misses for one user share one request)
+  • RevocationFeed    — revoked jtis (until their exp) + user events, from
+                        Redis: snapshot of the `auth:revoked_jtis` sorted set
+                        on subscribe, then live `auth:revocations` messages
+
+Local verification is used only while it can be trusted: a signing key is
+configured, python-jose is installed and — unless AUTH_LOCAL_REQUIRE_FEED=0 —
+the revocation feed is subscribed.  Otherwise `enabled` is False and the
+gateway keeps using the remote /auth/verify-token call.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+log = logging.getLogger("gateway")
+
+# ─── Configuration ────────────────────────────────────────────────────────────
+
+JWT_SECRET_KEY          = os.getenv("JWT_SECRET_KEY", os.getenv("SECRET_KEY", ""))
+JWT_ALGORITHM           = os.getenv("JWT_ALGORITHM", "HS256")
+AUTH_LOCAL_VERIFY       = os.getenv("AUTH_LOCAL_VERIFY", "1").strip() in ("1", "true", "yes")
+AUTH_LOCAL_REQUIRE_FEED = os.getenv("AUTH_LOCAL_REQUIRE_FEED", "1").strip() in ("1", "true", "yes")
+USER_STATUS_TTL_S       = float(os.getenv("USER_STATUS_TTL_S", "30"))
+REDIS_URL               = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+REVOCATION_CHANNEL = "auth:revocations"
+REVOKED_JTI_ZSET   = "auth:revoked_jtis"
+
+try:
+    from jose import JWTError, jwt
+except ImportError:
+    jwt = None
+    JWTError = Exception
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+
+# ─── Prometheus (safe lookup — metric registered in gateway.py) ──────────────
+
+class _Noop:
+    def labels(self, *a, **kw): return self
+    def inc(self, *a, **kw): pass
+
+
+def _get(name):
+    try:
+        from prometheus_client import REGISTRY
+        return REGISTRY._names_to_collectors.get(name) or _Noop()
+    except Exception:
+        return _Noop()
+
+
+# ─── User status cache ────────────────────────────────────────────────────────
+
+# fetch_status(user_id) → True (active) / False (inactive or unknown user)
+FetchStatusFn = Callable[[str], Awaitable[bool]]
+
+
+class UserStatusCache:
+    """Short-TTL user_id → is_active, with single-flight fetches on a miss."""
+
+    def __init__(self, fetch_status: FetchStatusFn,
+                 ttl_s: float = USER_STATUS_TTL_S, clock=time.monotonic):
+        self._fetch   = fetch_status
+        self.ttl_s    = ttl_s
+        self._clock   = clock
+        self._entries: dict[str, tuple[bool, float]] = {}
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.hits     = 0
+        self.misses   = 0
+
+    async def is_active(self, user_id: str) -> bool:
+        entry = self._entries.get(user_id)
+        if entry is not None and self._clock() < entry[1]:
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+
+        fut = self._inflight.get(user_id)
+        if fut is not None:
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[user_id] = fut
+        try:
+            active = await self._fetch(user_id)
+            self._entries[user_id] = (active, self._clock() + self.ttl_s)
+            fut.set_result(active)
+            return active
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()          # mark retrieved when nobody else waits
+            raise
+        finally:
+            self._inflight.pop(user_id, None)
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# ─── Revocation feed ──────────────────────────────────────────────────────────
+
+class RevocationFeed:
+    """Revoked jtis + user events, kept in sync from Redis."""
+
+    def __init__(self, status_cache: UserStatusCache, url: str = REDIS_URL,
+                 reconnect_s: float = 2.0, clock=time.time):
+        self.status_cache = status_cache
+        self.url          = url
+        self.reconnect_s  = reconnect_s
+        self._clock       = clock
+        self._revoked: dict[str, float] = {}     # jti → exp (unix seconds)
+        self._task: Optional[asyncio.Task] = None
+        self.live         = False
+
+    # ── State ─────────────────────────────────────────────────────────────────
+
+    def apply(self, event: dict):
+        kind = event.get("type")
+        if kind == "token" and event.get("jti"):
+            self._revoked[event["jti"]] = float(event.get("exp") or 0)
+        elif kind == "user" and event.get("user_id"):
+            self.status_cache.invalidate(event["user_id"])
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        if not jti or jti not in self._revoked:
+            return False
+        if self._clock() >= self._revoked[jti]:
+            del self._revoked[jti]           # token has expired anyway
+            return False
+        return True
+
+    def _prune(self):
+        now = self._clock()
+        for jti in [j for j, exp in self._revoked.items() if exp <= now]:
+            del self._revoked[jti]
+
+    # ── Subscription ──────────────────────────────────────────────────────────
+
+    def start(self):
+        if aioredis is None:
+            log.info("[auth] redis not installed — no revocation feed")
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="revocation_feed")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.live = False
+
+    async def _run(self):
+        delay = self.reconnect_s
+        while True:
+            client = aioredis.from_url(self.url, decode_responses=True)
+            try:
+                async with client.pubsub() as pubsub:
+                    # Subscribe before the snapshot so nothing falls in between.
+                    await pubsub.subscribe(REVOCATION_CHANNEL)
+                    snapshot = await client.zrangebyscore(
+                        REVOKED_JTI_ZSET, self._clock(), "+inf", withscores=True
+                    )
+                    for jti, exp in snapshot:
+                        self._revoked[jti] = exp
+                    self._prune()
+                    self.status_cache.clear()    # user events may have been missed
+                    self.live = True
+                    delay = self.reconnect_s
+                    log.info(f"[auth] revocation feed live ({len(snapshot)} revoked tokens)")
+                    async for msg in pubsub.listen():
+                        if msg.get("type") != "message":
+                            continue
+                        try:
+                            self.apply(json.loads(msg["data"]))
+                        except (ValueError, TypeError):
+                            pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.live or delay == self.reconnect_s:
+                    log.warning(f"[auth] revocation feed down ({e}) — remote verification")
+            finally:
+                self.live = False
+                await client.aclose()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+
+# ─── Verifier ─────────────────────────────────────────────────────────────────
+
+class LocalTokenVerifier:
+    """Verify access tokens in-process; see module docstring for when it applies."""
+
+    def __init__(self, fetch_status: FetchStatusFn,
+                 secret: str = JWT_SECRET_KEY, algorithm: str = JWT_ALGORITHM,
+                 require_feed: bool = AUTH_LOCAL_REQUIRE_FEED,
+                 status_ttl_s: float = USER_STATUS_TTL_S,
+                 redis_url: str = REDIS_URL):
+        self.secret       = secret
+        self.algorithm    = algorithm
+        self.require_feed = require_feed
+        self.status       = UserStatusCache(fetch_status, ttl_s=status_ttl_s)
+        self.feed         = RevocationFeed(self.status, url=redis_url)
+
+    @property
+    def enabled(self) -> bool:
+        if not (AUTH_LOCAL_VERIFY and self.secret and jwt is not None):
+            return False
+        return self.feed.live or not self.require_feed
+
+    async def verify(self, token: str) -> Optional[dict]:
+        """User info for a valid, unrevoked access token of an active user; else None."""
+        try:
+            payload = jwt.decode(token, self.secret, algorithms=[self.algorithm])
+        except JWTError:
+            _get("gateway_auth_verifications_total").labels(path="local", result="invalid").inc()
+            return None
+
+        user_id = payload.get("sub")
+        if payload.get("type") != "access" or not user_id:
+            _get("gateway_auth_verifications_total").labels(path="local", result="invalid").inc()
+            return None
+        if self.feed.is_revoked(payload.get("jti")):
+            _get("gateway_auth_verifications_total").labels(path="local", result="revoked").inc()
+            return None
+        if not await self.status.is_active(user_id):
+            _get("gateway_auth_verifications_total").labels(path="local", result="inactive").inc()
+            return None
+
+        _get("gateway_auth_verifications_total").labels(path="local", result="ok").inc()
+        return {
+            "id":        user_id,
+            "email":     payload.get("email"),
+            "roles":     payload.get("roles", []),
+            "is_active": True,
+        }
+
+    def start(self):
+        self.feed.start()
+
+    async def stop(self):
+        await self.feed.stop()
+
+    def stats(self) -> dict:
+        return {
+            "enabled":      self.enabled,
+            "feed_live":    self.feed.live,
+            "revoked_jtis": len(self.feed._revoked),
+            "user_status":  self.status.stats(),
+        }
@@ -0,0 +1,122 @@
+"""
+bench_connect_auth.py — WebSocket-connect auth latency: remote vs local JWT check
+
+remote : gateway → POST /auth/verify-token over a keep-alive pooled client.
+         The stand-in auth server decodes the JWT and then waits --db-ms to
+         model the Postgres get_user_by_id lookup.
+local  : LocalTokenVerifier — signature check in-process, user status from
+         the short-TTL cache (first connect per user misses and calls
+         /users/{id}/status on the same stand-in server).
+
+Usage (from stt_tts/):
+    python -m gateway.bench_connect_auth
+    python -m gateway.bench_connect_auth --connects 2000 --users 50 --db-ms 2
+"""
+import argparse
+import asyncio
+import socket
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import uvicorn
+from fastapi import FastAPI, Header, HTTPException
+from jose import jwt
+
+from gateway.auth_local import LocalTokenVerifier
+from gateway.http_pool import ServiceClient
+
+SECRET = "bench-secret"
+
+
+def _stub_auth(db_ms: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/auth/verify-token")
+    async def verify_token(authorization: str = Header(...)):
+        try:
+            payload = jwt.decode(authorization[7:], SECRET, algorithms=["HS256"])
+        except Exception:
+            raise HTTPException(401)
+        await asyncio.sleep(db_ms / 1000)
+        return {"id": payload["sub"], "email": payload.get("email"), "is_active": True}
+
+    @app.get("/users/{user_id}/status")
+    async def status(user_id: str):
+        await asyncio.sleep(db_ms / 1000)
+        return {"exists": True, "is_active": True}
+
+    return app
+
+
+def _token(user: str) -> str:
+    now = datetime.now(timezone.utc)
+    return jwt.encode({"sub": user, "email": f"{user}@x", "type": "access",
+                       "jti": str(uuid.uuid4()), "iat": now,
+                       "exp": now + timedelta(minutes=30)}, SECRET, algorithm="HS256")
+
+
+def _summary(name: str, samples: list) -> str:
+    ms = sorted(s * 1000 for s in samples)
+    p99 = ms[min(len(ms) - 1, int(len(ms) * 0.99))]
+    return (f"{name:<7} n={len(ms):5d}  p50={statistics.median(ms):7.3f} ms  "
+            f"p99={p99:7.3f} ms  mean={statistics.fmean(ms):7.3f} ms")
+
+
+async def _main(args):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(_stub_auth(args.db_ms), host="127.0.0.1",
+                                           port=port, log_level="warning"))
+    serve = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    auth = ServiceClient("auth", f"http://127.0.0.1:{port}")
+
+    async def fetch_status(user_id):
+        resp = await auth.get(f"/users/{user_id}/status")
+        return resp.json()["is_active"]
+
+    local = LocalTokenVerifier(fetch_status, secret=SECRET, require_feed=False)
+    tokens = [_token(f"user-{i % args.users}") for i in range(args.connects)]
+
+    try:
+        await auth.get("/users/warmup/status")          # open the keep-alive connection
+
+        remote = []
+        for tok in tokens:
+            t0 = time.perf_counter()
+            resp = await auth.post("/auth/verify-token", headers={"Authorization": f"Bearer {tok}"})
+            remote.append(time.perf_counter() - t0)
+            assert resp.status_code == 200
+
+        local_samples = []
+        for tok in tokens:
+            t0 = time.perf_counter()
+            user = await local.verify(tok)
+            local_samples.append(time.perf_counter() - t0)
+            assert user is not None
+    finally:
+        await auth.close()
+        server.should_exit = True
+        await serve
+
+    print(f"connects: {args.connects}   distinct users: {args.users}   simulated DB: {args.db_ms} ms")
+    print(_summary("remote", remote))
+    print(_summary("local", local_samples))
+    print(f"status-cache misses (remote calls on local path): {local.status.misses}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--connects", type=int,   default=1000)
+    ap.add_argument("--users",    type=int,   default=20)
+    ap.add_argument("--db-ms",    type=float, default=1.0, help="simulated user lookup cost")
+    asyncio.run(_main(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -25,6 +25,9 @@ Modules
   gateway.echo_gate — TimingEchoGate, AITextEchoFilter
   gateway.latency   — LatencyTracker, TurnLatency
   gateway.tonal     — TonalAccumulator, TonalChunk, classify_tone
+  gateway.http_pool — HTTPPool, ServiceClient, CircuitBreaker (keep-alive upstreams)
+  gateway.write_behind — MessageWriteBehind (batched message persistence)
+  gateway.auth_local — LocalTokenVerifier (in-process JWT checks + revocation feed)
   tts.azure_tts     — azure_tts_request, build_ssml
 """
 
@@ -48,6 +51,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 from gateway.session import GatewaySession, TEST_MODE
+from gateway.http_pool import http_pool
+from gateway.write_behind import MessageWriteBehind
+from gateway.auth_local import LocalTokenVerifier
 
 import sys as _sys
 _sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -103,71 +109,157 @@ GW_TTS_SYNTH_LATENCY = _safe_metric(
     Histogram, "gateway_tts_synth_seconds", "TTS synthesis latency per chunk", REGISTRY,
     buckets=[0.05, 0.1, 0.25, 0.5, 1.0, 2.0],
 )
+GW_UPSTREAM_CONNECTIONS = _safe_metric(
+    Counter, "gateway_upstream_connections_total",
+    "Upstream HTTP requests by connection kind (connect = new TCP, reuse = keep-alive)",
+    REGISTRY, labelnames=["service", "kind"],
+)
+GW_UPSTREAM_BREAKER_REJECTIONS = _safe_metric(
+    Counter, "gateway_upstream_breaker_rejections_total",
+    "Upstream calls rejected by an open circuit breaker", REGISTRY, labelnames=["service"],
+)
+GW_WB_PENDING = _safe_metric(
+    Gauge, "gateway_write_behind_pending", "Messages buffered for batched persistence", REGISTRY,
+)
+GW_WB_FLUSHES = _safe_metric(
+    Counter, "gateway_write_behind_flushes_total",
+    "Write-behind batch flushes by result (ok / retry)", REGISTRY, labelnames=["result"],
+)
+GW_AUTH_VERIFICATIONS = _safe_metric(
+    Counter, "gateway_auth_verifications_total",
+    "Token verifications on connect by path (local / remote) and result", REGISTRY,
+    labelnames=["path", "result"],
+)
+GW_AUTH_LATENCY = _safe_metric(
+    Histogram, "gateway_auth_verify_seconds", "Token verification latency on connect", REGISTRY,
+    labelnames=["path"], buckets=[0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25],
+)
 
 _session_latency_store: dict[str, dict] = {}
 
 
-# ─── App startup ──────────────────────────────────────────────────────────────
+# ─── Upstream HTTP pool ───────────────────────────────────────────────────────
+
+http_pool.register("auth",     USER_SERVICE_URL)
+http_pool.register("sessions", SESSION_SERVICE_URL)
+http_pool.register("messages", MESSAGE_SERVICE_URL)
+
+
+# ─── App startup / shutdown ───────────────────────────────────────────────────
 
 @app.on_event("startup")
 async def _gateway_startup():
     log.info("[startup] TimingEchoGate ready — no fingerprint file needed.")
+    await http_pool.start()
+    await write_behind.start()
+    local_auth.start()
+
+
+@app.on_event("shutdown")
+async def _gateway_shutdown():
+    await local_auth.stop()
+    await write_behind.stop()
+    await http_pool.close()
 
 
 # ─── Auth + Session helpers ───────────────────────────────────────────────────
 
+async def _fetch_user_status(user_id: str) -> bool:
+    """user_auth /users/{id}/status — only called on a user-status cache miss."""
+    resp = await http_pool["auth"].get(f"/users/{user_id}/status")
+    if resp.status_code >= 500:
+        resp.raise_for_status()             # don't cache an outage as "inactive"
+    return resp.status_code == 200 and bool(resp.json().get("is_active"))
+
+
+local_auth = LocalTokenVerifier(_fetch_user_status)
+
+
 async def _verify_token(token: str) -> dict | None:
-    """Call user_auth /auth/verify-token and return user info, or None."""
-    async with httpx.AsyncClient(timeout=5.0) as client:
+    """Return user info for a valid token, or None.
+
+    Verified in-process when LocalTokenVerifier is enabled (signing key set and
+    revocation feed live); otherwise via user_auth /auth/verify-token.
+    """
+    t0 = time.perf_counter()
+    if local_auth.enabled:
         try:
-            resp = await client.post(
-                f"{USER_SERVICE_URL}/auth/verify-token",
-                headers={"Authorization": f"Bearer {token}"},
-            )
-            if resp.status_code == 200:
-                return resp.json()
-        except httpx.RequestError:
-            pass
+            return await local_auth.verify(token)
+        except httpx.HTTPError:
+            GW_AUTH_VERIFICATIONS.labels(path="local", result="error").inc()
+            return None
+        finally:
+            GW_AUTH_LATENCY.labels(path="local").observe(time.perf_counter() - t0)
+
+    try:
+        resp = await http_pool["auth"].post(
+            "/auth/verify-token",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        if resp.status_code == 200:
+            GW_AUTH_VERIFICATIONS.labels(path="remote", result="ok").inc()
+            return resp.json()
+        GW_AUTH_VERIFICATIONS.labels(path="remote", result="invalid").inc()
+    except httpx.RequestError:
+        GW_AUTH_VERIFICATIONS.labels(path="remote", result="error").inc()
+    finally:
+        GW_AUTH_LATENCY.labels(path="remote").observe(time.perf_counter() - t0)
     return None
 
 
 async def _get_or_create_session(user_id: str, session_id: str | None) -> str | None:
     """Resume existing session or create a new one via session_chat service."""
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        if session_id:
-            try:
-                resp = await client.get(f"{SESSION_SERVICE_URL}/sessions/{session_id}")
-                if resp.status_code == 200:
-                    data = resp.json()
-                    if data.get("user_id") == user_id:
-                        return session_id
-            except httpx.RequestError:
-                pass
-
+    sessions = http_pool["sessions"]
+    if session_id:
         try:
-            resp = await client.post(
-                f"{SESSION_SERVICE_URL}/sessions",
-                json={"user_id": user_id},
-            )
-            if resp.status_code == 201:
-                return resp.json().get("id")
+            resp = await sessions.get(f"/sessions/{session_id}")
+            if resp.status_code == 200:
+                data = resp.json()
+                if data.get("user_id") == user_id:
+                    return session_id
         except httpx.RequestError:
             pass
+
+    try:
+        resp = await sessions.post("/sessions", json={"user_id": user_id})
+        if resp.status_code == 201:
+            return resp.json().get("id")
+    except httpx.RequestError:
+        pass
     return None
 
 
+async def _send_message_batch(session_id: str, items: list[dict]) -> bool:
+    """
+    Deliver one write-behind batch to the message service.
+
+    Returns True when the batch is settled — stored (2xx) or rejected for good
+    (4xx, e.g. the session was deleted) — and False when it should be retried.
+    """
+    try:
+        resp = await http_pool["messages"].post(
+            f"/sessions/{session_id}/messages:batch",
+            json={"messages": items},
+        )
+    except httpx.RequestError as e:
+        log.warning(f"Failed to save {len(items)} message(s): {e}")
+        return False
+    if resp.status_code >= 500:
+        log.warning(f"Message service {resp.status_code} on batch of {len(items)} — will retry")
+        return False
+    if resp.status_code >= 400:
+        log.warning(f"Message batch rejected ({resp.status_code}): {resp.text[:200]}")
+    return True
+
+
+write_behind = MessageWriteBehind(_send_message_batch)
+
+
 async def _save_message(session_id: str, role: str, content: str):
-    """Fire-and-forget: save a message to the message service."""
+    """Fire-and-forget: queue a message for batched persistence."""
     if not content.strip():
         return
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        try:
-            await client.post(
-                f"{MESSAGE_SERVICE_URL}/sessions/{session_id}/messages",
-                json={"role": role, "content": content},
-            )
-        except httpx.RequestError as e:
-            log.warning(f"Failed to save message: {e}")
+    write_behind.enqueue(session_id, role, content)
 
 
 async def _update_session_title(session_id: str, title: str):
@@ -175,28 +267,27 @@ async def _update_session_title(session_id: str, title: str):
     short = title[:80].strip()
     if not short:
         return
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        try:
-            await client.patch(
-                f"{SESSION_SERVICE_URL}/sessions/{session_id}/title",
-                json={"title": short},
-            )
-        except httpx.RequestError:
-            pass
+    try:
+        await http_pool["sessions"].patch(
+            f"/sessions/{session_id}/title",
+            json={"title": short},
+        )
+    except httpx.RequestError:
+        pass
 
 
 async def _load_history(session_id: str) -> list[dict]:
     """Fetch past messages for a session from the message service."""
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        try:
-            r = await client.get(
-                f"{MESSAGE_SERVICE_URL}/sessions/{session_id}/messages",
-                params={"limit": 50},
-            )
-            if r.status_code == 200:
-                return r.json()
-        except httpx.RequestError:
-            pass
+    await write_behind.flush(session_id)     # read-your-writes on quick resume
+    try:
+        r = await http_pool["messages"].get(
+            f"/sessions/{session_id}/messages",
+            params={"limit": 50},
+        )
+        if r.status_code == 200:
+            return r.json()
+    except httpx.RequestError:
+        pass
     return []
 
 
@@ -315,6 +406,10 @@ async def ws_endpoint(
         GW_ACTIVE_SESSIONS.dec()
         await session.stop(_session_latency_store)
         pipeline.cancel()
+        if chat_session_id:
+            # Awaited, not a bare task — the loop keeps only weak references to
+            # tasks.  A failed send stays queued for the background loop.
+            await write_behind.flush(chat_session_id)
 
 
 # ─── REST ─────────────────────────────────────────────────────────────────────
@@ -337,6 +432,18 @@ def list_sessions():
     return {"sessions": list(_session_latency_store.keys())}
 
 
+@app.get("/pool/stats")
+def pool_stats():
+    """Per-upstream connect-vs-reuse counts and circuit-breaker state."""
+    return {**http_pool.stats(), "write_behind": write_behind.stats()}
+
+
+@app.get("/auth/stats")
+def auth_stats():
+    """Local JWT verification state: enabled, revocation feed, user-status cache."""
+    return local_auth.stats()
+
+
 if __name__ == "__main__":
     uvicorn.run(
         "gateway.gateway:app",
@@ -0,0 +1,304 @@
+"""
+http_pool.py — Shared keep-alive HTTP clients for upstream services
+
+One httpx.AsyncClient per upstream (auth, sessions, messages, cag) instead of
+one per call, so auth / session / message traffic reuses warm TCP connections.
+
+Each ServiceClient has:
+  • its own connection limits + timeouts (per-service pool isolation)
+  • a CircuitBreaker — after N consecutive failures calls fail fast with
+    CircuitOpenError (an httpx.RequestError, so existing handlers still apply)
+  • connect-vs-reuse counters fed from httpx trace events
+
+The pool is owned by the gateway app: started on startup, closed on shutdown.
+Clients are built lazily, so modules may register services at import time.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import httpx
+
+log = logging.getLogger("gateway")
+
+# ─── Configuration ────────────────────────────────────────────────────────────
+
+POOL_MAX_CONNECTIONS   = int(os.getenv("POOL_MAX_CONNECTIONS",     "20"))
+POOL_MAX_KEEPALIVE     = int(os.getenv("POOL_MAX_KEEPALIVE",       "10"))
+POOL_KEEPALIVE_EXPIRY  = float(os.getenv("POOL_KEEPALIVE_EXPIRY",  "30.0"))
+POOL_CONNECT_TIMEOUT_S = float(os.getenv("POOL_CONNECT_TIMEOUT_S", "2.0"))
+POOL_READ_TIMEOUT_S    = float(os.getenv("POOL_READ_TIMEOUT_S",    "5.0"))
+POOL_HTTP2             = os.getenv("POOL_HTTP2", "0").strip() in ("1", "true", "yes")
+
+BREAKER_FAILURES       = int(os.getenv("BREAKER_FAILURES",         "5"))
+BREAKER_RESET_S        = float(os.getenv("BREAKER_RESET_S",        "10.0"))
+
+
+# ─── Prometheus (safe lookup — metric registered in gateway.py) ──────────────
+
+class _Noop:
+    def labels(self, *a, **kw): return self
+    def inc(self, *a, **kw): pass
+    def set(self, *a, **kw): pass
+
+
+def _get(name):
+    try:
+        from prometheus_client import REGISTRY
+        return REGISTRY._names_to_collectors.get(name) or _Noop()
+    except Exception:
+        return _Noop()
+
+
+# ─── Circuit breaker ──────────────────────────────────────────────────────────
+
+class CircuitOpenError(httpx.RequestError):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker.
+
+      closed    — calls pass; `failure_threshold` failures in a row → open
+      open      — calls rejected until `reset_timeout_s` has elapsed
+      half_open — one probe call allowed; success → closed, failure → open,
+                  no verdict (cancelled) → release_probe() lets the next call probe
+    """
+
+    CLOSED    = "closed"
+    OPEN      = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURES,
+                 reset_timeout_s: float = BREAKER_RESET_S, clock=time.monotonic):
+        self.name              = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout_s   = reset_timeout_s
+        self._clock            = clock
+        self._state            = self.CLOSED
+        self._failures         = 0
+        self._opened_at        = 0.0
+        self._probe_in_flight  = False
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout_s:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self._state           = self.CLOSED
+        self._failures        = 0
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """The probe ended without a result (cancelled / unexpected error) — let the next call probe"""
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                log.warning(f"[pool] circuit OPEN for {self.name} after {self._failures} failures")
+            self._state           = self.OPEN
+            self._opened_at       = self._clock()
+            self._probe_in_flight = False
+
+
+# ─── Per-service client ───────────────────────────────────────────────────────
+
+class ServiceClient:
+    """Keep-alive client + breaker + connection accounting for one upstream."""
+
+    def __init__(self, name: str, base_url: str,
+                 max_connections: int = POOL_MAX_CONNECTIONS,
+                 max_keepalive: int = POOL_MAX_KEEPALIVE,
+                 connect_timeout_s: float = POOL_CONNECT_TIMEOUT_S,
+                 read_timeout_s: Optional[float] = POOL_READ_TIMEOUT_S,
+                 http2: bool = POOL_HTTP2,
+                 breaker: Optional[CircuitBreaker] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.name     = name
+        self.base_url = base_url
+        self.breaker  = breaker or CircuitBreaker(name)
+        self.connects = 0
+        self.reuses   = 0
+        self.failures = 0
+        self._limits  = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+        )
+        self._timeout = httpx.Timeout(
+            connect=connect_timeout_s, read=read_timeout_s,
+            write=connect_timeout_s, pool=connect_timeout_s,
+        )
+        self._http2     = http2
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            http2 = self._http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    log.warning(f"[pool] {self.name}: h2 not installed — using HTTP/1.1")
+                    http2 = False
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self._limits,
+                timeout=self._timeout,
+                http2=http2,
+                transport=self._transport,
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ── Accounting ────────────────────────────────────────────────────────────
+
+    def _tracer(self):
+        """Return (trace_callback, state) — state['connected'] set on a new TCP connect."""
+        state = {"connected": False}
+
+        async def _trace(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.complete":
+                state["connected"] = True
+
+        return _trace, state
+
+    def _account(self, state: dict):
+        kind = "connect" if state["connected"] else "reuse"
+        if state["connected"]:
+            self.connects += 1
+        else:
+            self.reuses += 1
+        _get("gateway_upstream_connections_total").labels(service=self.name, kind=kind).inc()
+
+    def _check_breaker(self, method: str, url: str):
+        if not self.breaker.allow():
+            _get("gateway_upstream_breaker_rejections_total").labels(service=self.name).inc()
+            raise CircuitOpenError(f"circuit open for {self.name}: {method} {url}")
+
+    def _on_result(self, status_code: Optional[int]):
+        if status_code is None or status_code >= 500:
+            self.failures += 1
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    # ── Requests ──────────────────────────────────────────────────────────────
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        self._check_breaker(method, url)
+        trace, state = self._tracer()
+        kwargs.setdefault("extensions", {})["trace"] = trace
+        try:
+            resp = await self.client.request(method, url, **kwargs)
+        except httpx.RequestError:
+            self._on_result(None)
+            raise
+        except BaseException:
+            # Cancelled (wait_for, disconnect, shutdown) — no verdict on the upstream
+            self.breaker.release_probe()
+            raise
+        self._account(state)
+        self._on_result(resp.status_code)
+        return resp
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def patch(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("PATCH", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        self._check_breaker(method, url)
+        trace, state = self._tracer()
+        kwargs.setdefault("extensions", {})["trace"] = trace
+        settled = False
+        try:
+            async with self.client.stream(method, url, **kwargs) as resp:
+                self._account(state)
+                self._on_result(resp.status_code)
+                settled = True
+                yield resp
+        except httpx.RequestError:
+            self._on_result(None)
+            raise
+        except BaseException:
+            if not settled:
+                self.breaker.release_probe()
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "base_url": self.base_url,
+            "connects": self.connects,
+            "reuses":   self.reuses,
+            "failures": self.failures,
+            "breaker":  self.breaker.state,
+        }
+
+
+# ─── Pool registry ────────────────────────────────────────────────────────────
+
+class HTTPPool:
+    """Named registry of ServiceClients, started/closed with the app."""
+
+    def __init__(self):
+        self._services: dict[str, ServiceClient] = {}
+
+    def register(self, name: str, base_url: str, **kwargs) -> ServiceClient:
+        svc = self._services.get(name)
+        if svc is None or svc.base_url != base_url:
+            svc = ServiceClient(name, base_url, **kwargs)
+            self._services[name] = svc
+        return svc
+
+    def __getitem__(self, name: str) -> ServiceClient:
+        return self._services[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._services
+
+    async def start(self):
+        for svc in self._services.values():
+            svc.client   # build clients eagerly so the first call skips setup
+        log.info(f"[pool] started: {', '.join(self._services) or 'no services'}")
+
+    async def close(self):
+        for svc in self._services.values():
+            await svc.close()
+        log.info("[pool] closed")
+
+    def stats(self) -> dict:
+        return {name: svc.stats() for name, svc in self._services.items()}
+
+
+http_pool = HTTPPool()
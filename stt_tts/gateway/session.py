@@ -11,13 +11,12 @@ import time
 import uuid
 from typing import Optional, Callable, Awaitable
 
-import httpx
-
 from tts.azure_tts import azure_tts_request, azure_tts_stream
 from gateway.models import State, RepetitionGuard, drain_q, ws_connect
 from gateway.echo_gate import TimingEchoGate, AITextEchoFilter
 from gateway.latency import LatencyTracker
-from gateway.tonal import TonalAccumulator, TonalChunk, classify_tone
+from gateway.tonal import ChunkTone, TonalAccumulator, TonalChunk, classify_tone
+from gateway.http_pool import http_pool
 
 log = logging.getLogger("gateway")
 
@@ -42,6 +41,9 @@ def _get(name): return _safe_metric(name) or _Noop()
 STT_WS_URL          = os.getenv("STT_WS_URL",          "ws://localhost:8001/stream/mux")
 CAG_WS_URL          = os.getenv("CAG_WS_URL",          "ws://localhost:8000/chat/ws")
 CAG_HTTP_URL        = os.getenv("CAG_HTTP_URL",         "http://localhost:8000")
+# Ask CAG to cut speech chunks next to generation ("chunk" frames); a CAG
+# that doesn't acknowledge the mode keeps sending tokens, chunked here.
+CAG_CHUNK_FRAMES    = os.getenv("CAG_CHUNK_FRAMES", "1").strip() in ("1", "true", "yes")
 
 BARGE_IN_MIN_WORDS  = int(os.getenv("BARGE_IN_MIN_WORDS",    "1"))
 BARGE_IN_COOLDOWN_S = float(os.getenv("BARGE_IN_COOLDOWN_S", "0.2"))
@@ -63,6 +65,10 @@ TEST_MODE           = os.getenv("TEST_MODE", "0").strip() in ("1", "true", "yes"
 WS_PING_INTERVAL = 15
 WS_PING_TIMEOUT  = 20
 
+# CAG HTTP calls (/reset, /chat/stream fallback) share one keep-alive client.
+# read timeout is None — the fallback stream stays open for the whole turn.
+http_pool.register("cag", CAG_HTTP_URL, read_timeout_s=None)
+
 
 class GatewaySession:
     """Full voice pipeline session — one per WebSocket client."""
@@ -257,8 +263,7 @@ class GatewaySession:
                     and self.state == State.IDLE):
                 log.info(f"[{self.sid}] idle reset")
                 try:
-                    async with httpx.AsyncClient(base_url=CAG_HTTP_URL, timeout=5.0) as http:
-                        await http.post("/reset")
+                    await http_pool["cag"].post("/reset", timeout=5.0)
                 except Exception as e:
                     log.debug(f"[{self.sid}] idle /reset: {e}")
                 self._last_query_time = time.monotonic()
@@ -598,6 +603,7 @@ class GatewaySession:
                             "type": "query", "turn_id": turn_id,
                             "message": query_text,
                             "reset": self._cag_turn_count == 1,
+                            "stream": "chunks" if CAG_CHUNK_FRAMES else "tokens",
                         }))
                     except Exception as e:
                         log.error(f"[{self.sid}] CAG send error: {e}")
@@ -621,6 +627,7 @@ class GatewaySession:
         full_reply_parts: list[str] = []
         interrupted      = False
         stream_confirmed = False
+        chunk_mode       = False    # CAG acknowledged "stream": "chunks"
 
         try:
             while True:
@@ -651,6 +658,7 @@ class GatewaySession:
                         # Stale frame from a cancelled turn — skip it
                         continue
                     stream_confirmed = True
+                    chunk_mode       = frame.get("stream") == "chunks"
                     continue
 
                 # Skip frames from other turns (stale after barge-in cancel)
@@ -664,11 +672,27 @@ class GatewaySession:
                     await self._jsend({"type": "error", "detail": frame.get("detail", "CAG error")})
                     interrupted = True
                     break
-                if ftype != "token" or not stream_confirmed:
+                if not stream_confirmed:
                     continue
 
-                token = frame.get("token", "")
-                if not token:
+                if ftype == "chunk" and chunk_mode:
+                    # Already cut at a speech boundary by CAG — straight to TTS
+                    text = frame.get("text", "")
+                    if not text:
+                        continue
+                    tone = frame.get("tone", "")
+                    tc = TonalChunk(text=text,
+                                    tone=ChunkTone(tone) if tone in ("tone", "logic") else classify_tone(text),
+                                    boundary=frame.get("boundary", ""))
+                    token = (" " if full_reply_parts else "") + text
+                    chunks = [tc]
+                elif ftype == "token":
+                    token = frame.get("token", "")
+                    if not token:
+                        continue
+                    # Decoder deltas carry their own spacing — sub-word pieces join as-is
+                    chunks = acc.feed(token, exact=True)
+                else:
                     continue
 
                 self._lat.on_first_token()
@@ -676,19 +700,11 @@ class GatewaySession:
                 full_reply_parts.append(token)
                 await self._jsend({"type": "ai_token", "token": token})
 
-                for tc in acc.feed(token):
+                for tc in chunks:
                     if self._barge_in:
                         interrupted = True
                         break
-                    log.info(f"[{self.sid}] TTS← [{tc.tone}] {tc.text!r}")
-                    await self._jsend({"type": "ai_sentence", "text": tc.text, "tone": tc.tone})
-                    self._text_echo_filter.feed_ai_text(tc.text)
-                    if self.state != State.SPEAKING:
-                        self.state = State.SPEAKING
-                        # Notify STT immediately so barge-in detection activates
-                        await self._notify_stt_speaking(True)
-                    self._lat.on_tts_chunk_sent(tc.text)
-                    await self._tts_q.put(tc)
+                    await self._dispatch_tts_chunk(tc)
 
                 if interrupted:
                     break
@@ -711,7 +727,7 @@ class GatewaySession:
 
                 await self._tts_q.put(self._TURN_END)
 
-                full_text = " ".join(full_reply_parts).strip()
+                full_text = "".join(full_reply_parts).strip()
                 if full_text:
                     asyncio.create_task(self._persist("agent", full_text))
                     if self._stt_ws:
@@ -721,6 +737,17 @@ class GatewaySession:
                         except Exception:
                             pass
 
+    async def _dispatch_tts_chunk(self, tc: TonalChunk):
+        log.info(f"[{self.sid}] TTS← [{tc.tone}] {tc.text!r}")
+        await self._jsend({"type": "ai_sentence", "text": tc.text, "tone": tc.tone})
+        self._text_echo_filter.feed_ai_text(tc.text)
+        if self.state != State.SPEAKING:
+            self.state = State.SPEAKING
+            # Notify STT immediately so barge-in detection activates
+            await self._notify_stt_speaking(True)
+        self._lat.on_tts_chunk_sent(tc.text)
+        await self._tts_q.put(tc)
+
     async def _cag_loop_http_fallback(self):
         try:
             query = self._query_q.get_nowait()
@@ -749,73 +776,69 @@ class GatewaySession:
         interrupted      = False
         stream_confirmed = False
 
-        async with httpx.AsyncClient(
-            base_url=CAG_HTTP_URL,
-            timeout=httpx.Timeout(connect=5.0, read=None, write=5.0, pool=5.0),
-        ) as http:
-            try:
-                async with http.stream(
-                    "POST", "/chat/stream",
-                    json={"message": query_text, "reset_session": self._cag_turn_count == 1,
-                          "turn_id": turn_id},
-                    headers={"Accept": "text/event-stream"},
-                ) as resp:
-                    async for line in resp.aiter_lines():
-                        if self._barge_in:
+        try:
+            async with http_pool["cag"].stream(
+                "POST", "/chat/stream",
+                json={"message": query_text, "reset_session": self._cag_turn_count == 1,
+                      "turn_id": turn_id},
+                headers={"Accept": "text/event-stream"},
+            ) as resp:
+                async for line in resp.aiter_lines():
+                    if self._barge_in:
+                        interrupted = True
+                        break
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+
+                    if data.startswith("[TURN_ID]"):
+                        if data[9:].strip() != turn_id:
                             interrupted = True
                             break
-                        if not line.startswith("data:"):
-                            continue
-                        data = line[5:].strip()
+                        stream_confirmed = True
+                        continue
+                    if data == "[DONE]":
+                        break
+                    if data in ("[TIMEOUT]", "") or data.startswith("[ERROR]"):
+                        interrupted = True
+                        break
+                    if not stream_confirmed:
+                        continue
 
-                        if data.startswith("[TURN_ID]"):
-                            if data[9:].strip() != turn_id:
-                                interrupted = True
-                                break
-                            stream_confirmed = True
-                            continue
-                        if data == "[DONE]":
-                            break
-                        if data in ("[TIMEOUT]", "") or data.startswith("[ERROR]"):
+                    self._lat.on_first_token()
+                    self._lat.on_token()
+                    full_reply_parts.append(data)
+                    await self._jsend({"type": "ai_token", "token": data})
+
+                    for tc in acc.feed(data):
+                        if self._barge_in:
                             interrupted = True
                             break
-                        if not stream_confirmed:
-                            continue
+                        await self._jsend({"type": "ai_sentence", "text": tc.text, "tone": tc.tone})
+                        self.state = State.SPEAKING
+                        self._lat.on_tts_chunk_sent(tc.text)
+                        await self._tts_q.put(tc)
 
-                        self._lat.on_first_token()
-                        self._lat.on_token()
-                        full_reply_parts.append(data)
-                        await self._jsend({"type": "ai_token", "token": data})
-
-                        for tc in acc.feed(data):
-                            if self._barge_in:
-                                interrupted = True
-                                break
-                            await self._jsend({"type": "ai_sentence", "text": tc.text, "tone": tc.tone})
-                            self.state = State.SPEAKING
-                            self._lat.on_tts_chunk_sent(tc.text)
-                            await self._tts_q.put(tc)
-
-                        if interrupted:
-                            break
+                    if interrupted:
+                        break
 
-            except Exception as e:
-                log.error(f"[{self.sid}] CAG HTTP fallback error: {e}")
-                interrupted = True
-
-            finally:
-                if not interrupted and not self._barge_in:
-                    tail = acc.flush()
-                    if tail:
-                        await self._jsend({"type": "ai_sentence", "text": tail.text, "tone": tail.tone})
-                        self.state = State.SPEAKING
-                        self._lat.on_tts_chunk_sent(tail.text)
-                        await self._tts_q.put(tail)
-                    await self._tts_q.put(self._TURN_END)
+        except Exception as e:
+            log.error(f"[{self.sid}] CAG HTTP fallback error: {e}")
+            interrupted = True
 
-                    full_text = "".join(full_reply_parts).strip()
-                    if full_text:
-                        asyncio.create_task(self._persist("agent", full_text))
+        finally:
+            if not interrupted and not self._barge_in:
+                tail = acc.flush()
+                if tail:
+                    await self._jsend({"type": "ai_sentence", "text": tail.text, "tone": tail.tone})
+                    self.state = State.SPEAKING
+                    self._lat.on_tts_chunk_sent(tail.text)
+                    await self._tts_q.put(tail)
+                await self._tts_q.put(self._TURN_END)
+
+                full_text = "".join(full_reply_parts).strip()
+                if full_text:
+                    asyncio.create_task(self._persist("agent", full_text))
 
     # ─── Synth worker ─────────────────────────────────────────────────────────
 
@@ -0,0 +1,216 @@
+"""
+write_behind.py — Coalescing write-behind queue for chat message persistence
+
+Instead of one POST per message (each costing a session check, an INSERT +
+commit and a session touch in the message service), messages are buffered per
+chat session and flushed as one batch:
+
+  enqueue() ──► per-session buffer ──► flush on size (WB_MAX_BATCH)
+                                       or interval (WB_FLUSH_INTERVAL_S)
+                                       or explicit flush(session_id)
+                                              │
+                                              ▼
+                        send_batch(session_id, [ {id, role, content, created_at}, … ])
+
+Delivery is at-least-once: every message gets a client-side UUID when it is
+enqueued, and that id doubles as the idempotency key on the server.  A batch
+is only dropped from the buffer once send_batch() reports it delivered; on
+failure it stays queued (in order) and is retried on the next flush.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+log = logging.getLogger("gateway")
+
+# ─── Configuration ────────────────────────────────────────────────────────────
+
+WB_MAX_BATCH        = int(os.getenv("WB_MAX_BATCH",          "32"))
+WB_FLUSH_INTERVAL_S = float(os.getenv("WB_FLUSH_INTERVAL_S", "5.0"))
+WB_MAX_PENDING      = int(os.getenv("WB_MAX_PENDING",        "1000"))
+
+
+# ─── Prometheus (safe lookup — metrics registered in gateway.py) ─────────────
+
+class _Noop:
+    def labels(self, *a, **kw): return self
+    def inc(self, *a, **kw): pass
+    def set(self, *a, **kw): pass
+
+
+def _get(name):
+    try:
+        from prometheus_client import REGISTRY
+        return REGISTRY._names_to_collectors.get(name) or _Noop()
+    except Exception:
+        return _Noop()
+
+
+# ─── Types ────────────────────────────────────────────────────────────────────
+
+@dataclass
+class PendingMessage:
+    role:       str
+    content:    str
+    id:         str = field(default_factory=lambda: str(uuid.uuid4()))
+    created_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+
+    def to_dict(self) -> dict:
+        return {
+            "id":         self.id,
+            "role":       self.role,
+            "content":    self.content,
+            "created_at": self.created_at,
+        }
+
+
+# send_batch(session_id, items) → True when the batch is settled (stored, or
+# permanently rejected and safe to drop), False to keep it queued for retry.
+SendBatchFn = Callable[[str, list[dict]], Awaitable[bool]]
+
+
+# ─── Write-behind queue ───────────────────────────────────────────────────────
+
+class MessageWriteBehind:
+    """Per-session buffered, batched, at-least-once message writer."""
+
+    def __init__(self, send_batch: SendBatchFn,
+                 max_batch: int = WB_MAX_BATCH,
+                 flush_interval_s: float = WB_FLUSH_INTERVAL_S,
+                 max_pending: int = WB_MAX_PENDING):
+        self._send        = send_batch
+        self._max_batch   = max(1, max_batch)
+        self._interval    = flush_interval_s
+        self._max_pending = max(1, max_pending)
+
+        self._pending: dict[str, list[PendingMessage]] = {}
+        self._locks:   dict[str, asyncio.Lock]         = {}
+        self._lock_users: dict[str, int]               = {}   # flushes holding / awaiting the lock
+        self._wake     = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running  = False
+
+        self.flushes  = 0
+        self.failures = 0
+        self.dropped  = 0
+
+    # ── Producer side ─────────────────────────────────────────────────────────
+
+    def enqueue(self, session_id: str, role: str, content: str) -> str:
+        """Buffer one message; returns its idempotency id.  Never blocks."""
+        msg = PendingMessage(role=role, content=content)
+        buf = self._pending.setdefault(session_id, [])
+        buf.append(msg)
+        if len(buf) > self._max_pending:
+            buf.pop(0)
+            self.dropped += 1
+            log.warning(f"[write-behind] {session_id}: buffer full — dropped oldest message")
+        if len(buf) >= self._max_batch:
+            self._wake.set()
+        _get("gateway_write_behind_pending").set(self.pending_count())
+        return msg.id
+
+    def pending_count(self, session_id: Optional[str] = None) -> int:
+        if session_id is not None:
+            return len(self._pending.get(session_id, ()))
+        return sum(len(b) for b in self._pending.values())
+
+    # ── Flushing ──────────────────────────────────────────────────────────────
+
+    async def flush(self, session_id: Optional[str] = None) -> bool:
+        """Flush one session (or all).  Returns True if nothing is left pending."""
+        sids = [session_id] if session_id is not None else list(self._pending)
+        ok = True
+        for sid in sids:
+            ok = await self._flush_session(sid) and ok
+        _get("gateway_write_behind_pending").set(self.pending_count())
+        return ok
+
+    async def _flush_session(self, session_id: str) -> bool:
+        # The lock is dropped only once no flush holds or awaits it — a new
+        # lock next to a waited-on one would let two flushes send the same batch.
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        self._lock_users[session_id] = self._lock_users.get(session_id, 0) + 1
+        try:
+            async with lock:
+                return await self._drain(session_id)
+        finally:
+            self._lock_users[session_id] -= 1
+            if not self._lock_users[session_id]:
+                del self._lock_users[session_id]
+                del self._locks[session_id]
+
+    async def _drain(self, session_id: str) -> bool:
+        """Send the session's buffer batch by batch (caller holds its lock)"""
+        while True:
+            buf = self._pending.get(session_id)
+            if not buf:
+                self._pending.pop(session_id, None)
+                return True
+            batch = buf[:self._max_batch]
+            try:
+                delivered = await self._send(session_id, [m.to_dict() for m in batch])
+            except Exception as e:
+                log.warning(f"[write-behind] {session_id}: send failed ({e})")
+                delivered = False
+
+            if not delivered:
+                self.failures += 1
+                _get("gateway_write_behind_flushes_total").labels(result="retry").inc()
+                return False
+
+            # Remove exactly what was sent — new messages may have been
+            # appended while the request was in flight.
+            sent_ids = {m.id for m in batch}
+            self._pending[session_id] = [m for m in buf if m.id not in sent_ids]
+            self.flushes += 1
+            _get("gateway_write_behind_flushes_total").labels(result="ok").inc()
+
+    # ── Background loop ───────────────────────────────────────────────────────
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._running = True
+            self._task = asyncio.create_task(self._run(), name="write_behind")
+
+    async def stop(self):
+        """Stop the loop and make a final attempt to flush everything."""
+        self._running = False
+        self._wake.set()
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception:
+                pass
+            self._task = None
+        if not await self.flush():
+            log.warning(f"[write-behind] shutdown with {self.pending_count()} unsent messages")
+
+    async def _run(self):
+        while self._running:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self._interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if not self._running:
+                break
+            try:
+                await self.flush()
+            except Exception as e:
+                log.error(f"[write-behind] flush loop error: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "pending":  self.pending_count(),
+            "sessions": len(self._pending),
+            "flushes":  self.flushes,
+            "failures": self.failures,
+            "dropped":  self.dropped,
+        }
@@ -0,0 +1,96 @@
+"""
+bench_batch_insert.py — rows/s for single vs batch message writes
+
+Compares MessageCRUD.create (one INSERT + commit + refresh per row) with
+MessageCRUD.create_many (one multi-row INSERT ... RETURNING per batch).
+
+Runs against a throwaway SQLite file (aiosqlite) by default; pass --url to
+point it at a scratch Postgres database instead (the table is created if
+missing).
+
+Usage:
+    python bench_batch_insert.py
+    python bench_batch_insert.py --rows 5000 --batch 50
+    python bench_batch_insert.py --url postgresql+asyncpg://postgres:pw@localhost/message_bench
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from models import Base      # noqa: E402
+from crud import MessageCRUD  # noqa: E402
+
+
+async def _bench_single(db, rows: int) -> float:
+    crud = MessageCRUD(db)
+    sid = str(uuid.uuid4())
+    t0 = time.perf_counter()
+    for i in range(rows):
+        await crud.create(sid, "user" if i % 2 == 0 else "agent", f"message {i}")
+    return time.perf_counter() - t0
+
+
+async def _bench_batch(db, rows: int, batch: int) -> float:
+    crud = MessageCRUD(db)
+    sid = str(uuid.uuid4())
+    t0 = time.perf_counter()
+    for start in range(0, rows, batch):
+        await crud.create_many(sid, [
+            {"id": str(uuid.uuid4()), "role": "user" if i % 2 == 0 else "agent",
+             "content": f"message {i}"}
+            for i in range(start, min(start + batch, rows))
+        ])
+    return time.perf_counter() - t0
+
+
+async def _run(url: str, rows: int, batch: int):
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with Session() as db:
+            single = await _bench_single(db, rows)
+        async with Session() as db:
+            batched = await _bench_batch(db, rows, batch)
+    finally:
+        await engine.dispose()
+    return engine.dialect.name, single, batched
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--url",   default=None, help="SQLAlchemy URL (default: temp SQLite file)")
+    ap.add_argument("--rows",  type=int, default=2000)
+    ap.add_argument("--batch", type=int, default=32, help="rows per batch (WB_MAX_BATCH)")
+    args = ap.parse_args()
+
+    tmp = None
+    url = args.url
+    if url is None:
+        tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        tmp.close()
+        url = f"sqlite+aiosqlite:///{tmp.name}"
+
+    try:
+        backend, single, batch = asyncio.run(_run(url, args.rows, args.batch))
+    finally:
+        if tmp is not None:
+            os.unlink(tmp.name)
+
+    print(f"backend : {backend}")
+    print(f"rows    : {args.rows}   batch size: {args.batch}")
+    print(f"single  : {single:8.3f}s  {args.rows / single:10.0f} rows/s")
+    print(f"batch   : {batch:8.3f}s  {args.rows / batch:10.0f} rows/s")
+    print(f"speedup : {single / batch:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
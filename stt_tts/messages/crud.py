@@ -1,14 +1,45 @@
+import base64
 import uuid
-from typing import Optional, List
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import AsyncIterator, Optional, List, Tuple
+from sqlalchemy import select, delete, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects import postgresql, sqlite
 from models import ChatMessage, VALID_ROLES
 
 
+def _dialect_insert(db: AsyncSession):
+    """INSERT construct with ON CONFLICT support for the bound database."""
+    name = db.bind.dialect.name
+    if name == "postgresql":
+        return postgresql.insert
+    if name == "sqlite":
+        return sqlite.insert
+    raise NotImplementedError(f"bulk insert not supported on {name}")
+
+
+# ── Keyset cursors ────────────────────────────────────────────────────────────
+# Opaque token for the last row of a page: "<created_at iso>|<id>", base64url.
+
+def encode_cursor(msg: ChatMessage) -> str:
+    raw = f"{msg.created_at.isoformat()}|{msg.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, mid = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(mid)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
 class MessageCRUD:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def create(self, session_id: str, role: str, content: str) -> ChatMessage:
+    async def create(self, session_id: str, role: str, content: str) -> ChatMessage:
         if role not in VALID_ROLES:
             raise ValueError(f"role must be 'user' or 'agent', got '{role}'")
         msg = ChatMessage(
@@ -17,36 +48,113 @@ class MessageCRUD:
             content=content,
         )
         self.db.add(msg)
-        self.db.commit()
-        self.db.refresh(msg)
+        await self.db.commit()
+        await self.db.refresh(msg)
         return msg
 
-    def get_by_id(self, message_id: str) -> Optional[ChatMessage]:
-        return self.db.query(ChatMessage).filter(
-            ChatMessage.id == uuid.UUID(message_id)
-        ).first()
-
-    def list_by_session(self, session_id: str, limit: int = 100, offset: int = 0) -> List[ChatMessage]:
-        return (
-            self.db.query(ChatMessage)
-            .filter(ChatMessage.session_id == uuid.UUID(session_id))
-            .order_by(ChatMessage.created_at.asc())
-            .offset(offset)
+    async def create_many(self, session_id: str, items: List[dict]) -> List[ChatMessage]:
+        """
+        Insert a batch of messages with one multi-row INSERT ... RETURNING.
+
+        Each item is {"role", "content", optional "id", optional "created_at"}.
+        A client-supplied id is the idempotency key: rows whose id already
+        exists are skipped by ON CONFLICT DO NOTHING, so a retried batch never
+        creates duplicates.  Returns only the rows actually inserted.
+        """
+        sid = uuid.UUID(session_id)
+        rows, seen = [], set()
+        for item in items:
+            role = item["role"]
+            if role not in VALID_ROLES:
+                raise ValueError(f"role must be 'user' or 'agent', got '{role}'")
+            mid = uuid.UUID(item["id"]) if item.get("id") else uuid.uuid4()
+            if mid in seen:
+                continue
+            seen.add(mid)
+            rows.append({
+                "id":         mid,
+                "session_id": sid,
+                "role":       role,
+                "content":    item["content"],
+                "created_at": item.get("created_at") or datetime.utcnow(),
+            })
+        if not rows:
+            return []
+
+        table = ChatMessage.__table__
+        stmt = (
+            _dialect_insert(self.db)(table)
+            .values(rows)
+            .on_conflict_do_nothing(index_elements=[table.c.id])
+            .returning(*table.c)
+        )
+        inserted = (await self.db.execute(stmt)).mappings().all()
+        await self.db.commit()
+        # RETURNING order is not guaranteed — restore the request order.
+        order = {r["id"]: i for i, r in enumerate(rows)}
+        return sorted((ChatMessage(**r) for r in inserted), key=lambda m: order[m.id])
+
+    async def get_by_id(self, message_id: str) -> Optional[ChatMessage]:
+        result = await self.db.execute(
+            select(ChatMessage).where(ChatMessage.id == uuid.UUID(message_id))
+        )
+        return result.scalar_one_or_none()
+
+    async def list_by_session(
+        self,
+        session_id: str,
+        limit: int = 100,
+        offset: int = 0,
+        after: Optional[str] = None,
+    ) -> List[ChatMessage]:
+        """
+        Messages in (created_at, id) order.
+
+        `after` is a cursor from encode_cursor(); when given, the page starts
+        right after that row via the (session_id, created_at, id) index, so
+        deep pages cost the same as the first.  `offset` is kept for old
+        callers and ignored when a cursor is supplied.
+        """
+        stmt = (
+            select(ChatMessage)
+            .where(ChatMessage.session_id == uuid.UUID(session_id))
+            .order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc())
             .limit(limit)
-            .all()
         )
+        if after:
+            created_at, mid = decode_cursor(after)
+            stmt = stmt.where(or_(
+                ChatMessage.created_at > created_at,
+                and_(ChatMessage.created_at == created_at, ChatMessage.id > mid),
+            ))
+        elif offset:
+            stmt = stmt.offset(offset)
+        result = await self.db.execute(stmt)
+        return list(result.scalars().all())
 
-    def delete(self, message_id: str) -> bool:
-        msg = self.get_by_id(message_id)
+    async def iter_session(self, session_id: str, page_size: int = 500) -> AsyncIterator[ChatMessage]:
+        """Walk a whole session page by page — memory bounded by page_size."""
+        after = None
+        while True:
+            page = await self.list_by_session(session_id, limit=page_size, after=after)
+            for msg in page:
+                yield msg
+            if len(page) < page_size:
+                return
+            after = encode_cursor(page[-1])
+            self.db.expunge_all()
+
+    async def delete(self, message_id: str) -> bool:
+        msg = await self.get_by_id(message_id)
         if not msg:
             return False
-        self.db.delete(msg)
-        self.db.commit()
+        await self.db.delete(msg)
+        await self.db.commit()
         return True
 
-    def delete_by_session(self, session_id: str) -> int:
-        count = self.db.query(ChatMessage).filter(
-            ChatMessage.session_id == uuid.UUID(session_id)
-        ).delete(synchronize_session=False)
-        self.db.commit()
-        return count
\ No newline at end of file
+    async def delete_by_session(self, session_id: str) -> int:
+        result = await self.db.execute(
+            delete(ChatMessage).where(ChatMessage.session_id == uuid.UUID(session_id))
+        )
+        await self.db.commit()
+        return result.rowcount
@@ -1,30 +1,37 @@
 import os
+import sys as _sys
 from pathlib import Path
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import DeclarativeBase
 
 load_dotenv(Path(__file__).resolve().parent.parent / ".env")
 
+# monitoring/ lives next to the service directories
+_sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from monitoring.db_pool import create_pooled_engine  # noqa: E402
+
 _user = os.getenv("DATABASE_USER", "postgres")
 _pass = os.getenv("DATABASE_PASSWORD", "")
 _host = os.getenv("DATABASE_HOST", "localhost")
 _port = os.getenv("DATABASE_PORT", "5432")
-DATABASE_URL = f"postgresql+psycopg2://{_user}:{_pass}@{_host}:{_port}/message_db"
+DATABASE_URL = f"postgresql+asyncpg://{_user}:{_pass}@{_host}:{_port}/message_db"
 
-engine = create_engine(DATABASE_URL, echo=False, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_pooled_engine(DATABASE_URL, "messages", is_async=True, echo=False)
+AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 class Base(DeclarativeBase):
     pass
 
-def init_db():
+async def init_db():
     from models import Base as ModelBase
-    ModelBase.metadata.create_all(bind=engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(ModelBase.metadata.create_all)
+        # create_all skips indexes on tables that already exist — add new ones.
+        for table in ModelBase.metadata.sorted_tables:
+            for index in table.indexes:
+                await conn.run_sync(index.create, checkfirst=True)
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
+async def get_db():
+    async with AsyncSessionLocal() as session:
+        yield session
\ No newline at end of file
@@ -2,24 +2,34 @@
 Message Microservice  →  port 8003
 
 POST   /sessions/{session_id}/messages      add message  (validates session via HTTP)
-GET    /sessions/{session_id}/messages      list messages
+POST   /sessions/{session_id}/messages:batch  add many messages in one transaction (idempotent)
+GET    /sessions/{session_id}/messages      list messages (keyset: ?cursor=, next page in X-Next-Cursor)
+GET    /sessions/{session_id}/messages/export  stream the whole session as NDJSON
 GET    /messages/{message_id}               get one message
 DELETE /messages/{message_id}               delete one message
 DELETE /sessions/{session_id}/messages      clear all messages in session
 """
+import json
 import os
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
 import httpx
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db, init_db
-from crud import MessageCRUD
+from database import engine, get_db, init_db, AsyncSessionLocal
+from crud import MessageCRUD, encode_cursor
+from session_cache import SessionExistenceCache, SessionInvalidationListener
 
 import sys as _sys
 _sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 from monitoring.metrics import instrument_app
+from monitoring.db_pool import pool_status
 
 SESSION_SERVICE_URL = os.getenv("SESSION_SERVICE_URL", "http://localhost:8005")
 
@@ -27,25 +37,45 @@ app = FastAPI(title="Message Service", version="1.0.0")
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 instrument_app(app, service_name="messages", version="1.0.0")
 
+session_cache = SessionExistenceCache()
+_invalidation = SessionInvalidationListener(session_cache)
+
 
 @app.on_event("startup")
-def startup():
-    init_db()
+async def startup():
+    await init_db()
+    _invalidation.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await _invalidation.stop()
 
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
 
 async def verify_session(session_id: str):
     """Confirm session exists in session-service before saving a message."""
+    cached = session_cache.get(session_id)
+    if cached is not None:
+        if not cached:
+            raise HTTPException(404, f"Session {session_id} not found.")
+        return
+
+    epoch = session_cache.epoch
     async with httpx.AsyncClient() as client:
         try:
             resp = await client.get(
                 f"{SESSION_SERVICE_URL}/sessions/{session_id}/exists", timeout=5
             )
-            if resp.status_code != 200 or not resp.json().get("exists"):
-                raise HTTPException(404, f"Session {session_id} not found.")
         except httpx.RequestError:
             raise HTTPException(503, "Session service unreachable.")
+    if resp.status_code >= 500:
+        raise HTTPException(503, "Session service unavailable.")
+    exists = resp.status_code == 200 and bool(resp.json().get("exists"))
+    session_cache.put(session_id, exists, epoch=epoch)
+    if not exists:
+        raise HTTPException(404, f"Session {session_id} not found.")
 
 async def touch_session(session_id: str):
     """Tell session-service to bump updated_at after a new message."""
@@ -65,53 +95,112 @@ class CreateMessageBody(BaseModel):
     content: str
 
 
+class BatchMessageItem(BaseModel):
+    id:         Optional[str]      = None   # client id — idempotency key
+    role:       str
+    content:    str
+    created_at: Optional[datetime] = None   # client timestamp keeps turn order
+
+
+class CreateMessagesBatchBody(BaseModel):
+    messages: List[BatchMessageItem] = Field(..., min_length=1, max_length=500)
+
+
 # ── Routes ────────────────────────────────────────────────────────────────────
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "service": "message-service", "port": 8003}
+    return {"status": "ok", "service": "message-service", "port": 8003,
+            "session_cache": session_cache.stats(),
+            "db_pool": pool_status(engine)}
 
 
 @app.post("/sessions/{session_id}/messages", status_code=201)
 async def create_message(
-    session_id: str, body: CreateMessageBody, db: Session = Depends(get_db)
+    session_id: str, body: CreateMessageBody, db: AsyncSession = Depends(get_db)
 ):
     await verify_session(session_id)
     try:
-        msg = MessageCRUD(db).create(session_id, body.role, body.content)
+        msg = await MessageCRUD(db).create(session_id, body.role, body.content)
     except ValueError as e:
         raise HTTPException(400, str(e))
     await touch_session(session_id)
     return msg.to_dict()
 
 
+@app.post("/sessions/{session_id}/messages:batch", status_code=201)
+async def create_messages_batch(
+    session_id: str, body: CreateMessagesBatchBody, db: AsyncSession = Depends(get_db)
+):
+    """Write-behind target: one session check, one transaction, one touch per batch."""
+    await verify_session(session_id)
+    try:
+        created = await MessageCRUD(db).create_many(
+            session_id, [m.model_dump() for m in body.messages]
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if created:
+        await touch_session(session_id)
+    return {
+        "inserted": len(created),
+        "skipped":  len(body.messages) - len(created),
+        "ids":      [str(m.id) for m in created],
+    }
+
+
 @app.get("/sessions/{session_id}/messages")
-def list_messages(
+async def list_messages(
     session_id: str,
+    response: Response,
     limit:  int = Query(100, ge=1, le=500),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    db: AsyncSession = Depends(get_db),
 ):
-    return [m.to_dict() for m in MessageCRUD(db).list_by_session(session_id, limit, offset)]
+    try:
+        msgs = await MessageCRUD(db).list_by_session(session_id, limit, offset, after=cursor)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if len(msgs) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(msgs[-1])
+    return [m.to_dict() for m in msgs]
+
+
+@app.get("/sessions/{session_id}/messages/export")
+async def export_messages(session_id: str):
+    """Whole session as NDJSON, read page by page so memory stays bounded."""
+    try:
+        uuid.UUID(session_id)
+    except ValueError:
+        raise HTTPException(400, "Invalid session id.")
+
+    async def _lines():
+        # Own DB session — request dependencies are torn down before streaming.
+        async with AsyncSessionLocal() as db:
+            async for msg in MessageCRUD(db).iter_session(session_id):
+                yield json.dumps(msg.to_dict()) + "\n"
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
 
 
 @app.get("/messages/{message_id}")
-def get_message(message_id: str, db: Session = Depends(get_db)):
-    msg = MessageCRUD(db).get_by_id(message_id)
+async def get_message(message_id: str, db: AsyncSession = Depends(get_db)):
+    msg = await MessageCRUD(db).get_by_id(message_id)
     if not msg:
         raise HTTPException(404, "Message not found.")
     return msg.to_dict()
 
 
 @app.delete("/messages/{message_id}", status_code=204)
-def delete_message(message_id: str, db: Session = Depends(get_db)):
-    if not MessageCRUD(db).delete(message_id):
+async def delete_message(message_id: str, db: AsyncSession = Depends(get_db)):
+    if not await MessageCRUD(db).delete(message_id):
         raise HTTPException(404, "Message not found.")
 
 
 @app.delete("/sessions/{session_id}/messages")
-def clear_messages(session_id: str, db: Session = Depends(get_db)):
-    deleted = MessageCRUD(db).delete_by_session(session_id)
+async def clear_messages(session_id: str, db: AsyncSession = Depends(get_db)):
+    deleted = await MessageCRUD(db).delete_by_session(session_id)
     return {"deleted": deleted}
 
 
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Text
+from sqlalchemy import Column, String, DateTime, Text, Index
 from sqlalchemy.dialects.postgresql import UUID as PGUUID
 from sqlalchemy.orm import declarative_base
 
@@ -11,9 +11,13 @@ VALID_ROLES = {"user", "agent"}
 
 class ChatMessage(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Keyset pagination / export walk (session_id, created_at, id) in order.
+        Index("ix_messages_session_created_id", "session_id", "created_at", "id"),
+    )
 
     id         = Column(PGUUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    session_id = Column(PGUUID(as_uuid=True), nullable=False, index=True)  # no DB FK — validated via HTTP
+    session_id = Column(PGUUID(as_uuid=True), nullable=False)  # no DB FK — validated via HTTP
     role       = Column(String(10), nullable=False)   # "user" | "agent"
     content    = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
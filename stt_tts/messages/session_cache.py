@@ -0,0 +1,158 @@
+"""
+session_cache.py — Local session-existence cache for the message service
+
+Every message write used to ask the session service "does this session
+exist?" over HTTP.  Answers are now cached in-process:
+
+    exists   → kept SESSION_CACHE_POSITIVE_TTL seconds (hot sessions re-checked
+               once per TTL instead of once per write)
+    missing  → kept SESSION_CACHE_NEGATIVE_TTL seconds (short — a session may be
+               created a moment later)
+
+The session service publishes the session id on the Redis channel
+SESSION_EVENTS_CHANNEL when a session is created or deleted; the listener
+drops that id from the cache so deletes take effect immediately.  While the
+subscription is down the whole cache is cleared on reconnect (events may have
+been missed) and the TTLs bound staleness.  Without Redis the cache still
+works — invalidation is then by TTL alone.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+log = logging.getLogger("messages")
+
+SESSION_CACHE_POSITIVE_TTL = float(os.getenv("SESSION_CACHE_POSITIVE_TTL", "300"))
+SESSION_CACHE_NEGATIVE_TTL = float(os.getenv("SESSION_CACHE_NEGATIVE_TTL", "5"))
+SESSION_CACHE_MAX_ENTRIES  = int(os.getenv("SESSION_CACHE_MAX_ENTRIES",    "10000"))
+SESSION_EVENTS_CHANNEL     = os.getenv("SESSION_EVENTS_CHANNEL", "sessions:invalidate")
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+
+class SessionExistenceCache:
+    """TTL + LRU map of session_id → exists (True/False)."""
+
+    def __init__(self,
+                 positive_ttl: float = SESSION_CACHE_POSITIVE_TTL,
+                 negative_ttl: float = SESSION_CACHE_NEGATIVE_TTL,
+                 max_entries: int = SESSION_CACHE_MAX_ENTRIES,
+                 clock=time.monotonic):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries  = max(1, max_entries)
+        self._clock       = clock
+        self._entries: "OrderedDict[str, tuple[bool, float]]" = OrderedDict()
+        # Bumped on every invalidation — lets a lookup that raced with a
+        # delete event avoid caching its (now stale) answer.
+        self.epoch         = 0
+        self.hits          = 0
+        self.misses        = 0
+        self.invalidations = 0
+
+    def get(self, session_id: str) -> Optional[bool]:
+        """Cached answer, or None when unknown / expired."""
+        entry = self._entries.get(session_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        exists, expires_at = entry
+        if self._clock() >= expires_at:
+            del self._entries[session_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(session_id)
+        self.hits += 1
+        return exists
+
+    def put(self, session_id: str, exists: bool, epoch: Optional[int] = None):
+        """Cache an answer; pass the `epoch` read before the lookup started."""
+        if epoch is not None and epoch != self.epoch:
+            return
+        ttl = self.positive_ttl if exists else self.negative_ttl
+        if ttl <= 0:
+            return
+        self._entries[session_id] = (exists, self._clock() + ttl)
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, session_id: str):
+        self.epoch += 1
+        if self._entries.pop(session_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self.epoch += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries":       len(self._entries),
+            "hits":          self.hits,
+            "misses":        self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+class SessionInvalidationListener:
+    """Background Redis subscriber feeding invalidations into a cache."""
+
+    def __init__(self, cache: SessionExistenceCache,
+                 channel: str = SESSION_EVENTS_CHANNEL,
+                 reconnect_s: float = 2.0):
+        self.cache       = cache
+        self.channel     = channel
+        self.reconnect_s = reconnect_s
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if aioredis is None:
+            log.info("[session-cache] redis not installed — TTL-only invalidation")
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="session_invalidation")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        delay = self.reconnect_s
+        while True:
+            client = aioredis.Redis(
+                host=os.getenv("REDIS_HOST", "localhost"),
+                port=int(os.getenv("REDIS_PORT", "6379")),
+                db=int(os.getenv("REDIS_DB", "0")),
+                decode_responses=True,
+            )
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    # Anything published while we were away is lost.
+                    self.cache.clear()
+                    log.info(f"[session-cache] subscribed to {self.channel}")
+                    delay = self.reconnect_s
+                    async for msg in pubsub.listen():
+                        if msg.get("type") == "message" and msg.get("data"):
+                            self.cache.invalidate(msg["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if delay == self.reconnect_s:
+                    log.warning(f"[session-cache] subscription lost ({e}) — retrying")
+            finally:
+                await client.aclose()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
@@ -0,0 +1,164 @@
+"""
+db_pool.py — Shared SQLAlchemy engine factory with pool tuning + metrics
+
+Usage in any service's database.py:
+    from monitoring.db_pool import create_pooled_engine
+    engine = create_pooled_engine(DATABASE_URL, "messages", is_async=True)
+
+Pool settings come from the environment; a service-prefixed variable wins
+over the shared one (MESSAGES_DB_POOL_SIZE over DB_POOL_SIZE):
+
+    DB_POOL_SIZE          5      connections kept open
+    DB_MAX_OVERFLOW       10     extra connections allowed under burst
+    DB_POOL_TIMEOUT_S     30     wait for a free connection before erroring
+    DB_POOL_RECYCLE_S     1800   replace connections older than this (-1 = never)
+    DB_PRE_PING           idle   always | idle | never
+    DB_PRE_PING_IDLE_S    30     "idle": ping only connections idle this long
+
+pool_pre_ping=True costs a round trip on every checkout.  "idle" pings only
+a connection that sat in the pool for DB_PRE_PING_IDLE_S or more — the ones a
+server restart or a NAT timeout may have killed — so busy services skip it.
+
+Every engine is instrumented through monitoring.metrics.instrument_db_pool:
+connections in use / idle / overflow, pool size, checkout wait histogram,
+checkout timeouts and pre-ping failures, all labelled by service.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import time
+from typing import Optional
+
+from prometheus_client import CollectorRegistry
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from monitoring.metrics import instrument_db_pool
+
+log = logging.getLogger(__name__)
+
+PRE_PING_MODES = ("always", "idle", "never")
+
+_DEFAULTS = {
+    "DB_POOL_SIZE":       "5",
+    "DB_MAX_OVERFLOW":    "10",
+    "DB_POOL_TIMEOUT_S":  "30",
+    "DB_POOL_RECYCLE_S":  "1800",
+    "DB_PRE_PING":        "idle",
+    "DB_PRE_PING_IDLE_S": "30",
+}
+
+
+def pool_settings(service: str, **overrides) -> dict:
+    """Resolved pool settings for `service`; keyword overrides win over the env."""
+    prefix = service.upper().replace("-", "_") + "_"
+
+    def env(name):
+        return os.getenv(prefix + name, os.getenv(name, _DEFAULTS[name]))
+
+    settings = {
+        "pool_size":       int(env("DB_POOL_SIZE")),
+        "max_overflow":    int(env("DB_MAX_OVERFLOW")),
+        "pool_timeout":    float(env("DB_POOL_TIMEOUT_S")),
+        "pool_recycle":    int(env("DB_POOL_RECYCLE_S")),
+        "pre_ping":        env("DB_PRE_PING").strip().lower(),
+        "pre_ping_idle_s": float(env("DB_PRE_PING_IDLE_S")),
+    }
+    settings.update(overrides)
+    if settings["pre_ping"] not in PRE_PING_MODES:
+        log.warning(f"DB_PRE_PING={settings['pre_ping']!r} not in {PRE_PING_MODES} — using 'always'")
+        settings["pre_ping"] = "always"
+    return settings
+
+
+def _timed_pool(base):
+    """Pool class whose checkouts feed the wait histogram and timeout counter."""
+
+    class TimedPool(base):
+        metrics: Optional[dict] = None
+
+        def _do_get(self):
+            t0 = time.perf_counter()
+            try:
+                conn = super()._do_get()
+            except exc.TimeoutError:
+                if self.metrics:
+                    self.metrics["checkout_timeouts"].inc()
+                raise
+            if self.metrics:
+                self.metrics["checkout_wait"].observe(time.perf_counter() - t0)
+            return conn
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+def _install_idle_ping(sync_engine, idle_s: float, metrics: dict):
+    @event.listens_for(sync_engine, "checkin")
+    def _checkin(dbapi_conn, record):
+        record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(sync_engine, "checkout")
+    def _checkout(dbapi_conn, record, proxy):
+        last = record.info.get("checked_in_at")
+        if last is None or time.monotonic() - last < idle_s:
+            return
+        try:
+            sync_engine.dialect.do_ping(dbapi_conn)
+        except Exception as e:
+            metrics["pre_ping_failures"].inc()
+            # The pool invalidates this connection and retries the checkout.
+            raise exc.DisconnectionError(f"idle connection failed pre-ping: {e}")
+
+
+def create_pooled_engine(url: str, service: str, *, is_async: bool = False,
+                         registry: Optional[CollectorRegistry] = None, **kwargs):
+    """
+    Engine (AsyncEngine when is_async) with a tuned, instrumented QueuePool.
+
+    Pool keys from pool_settings() may be passed as keyword overrides; any
+    other keyword goes to create_engine (e.g. echo=True).
+    """
+    overrides = {k: kwargs.pop(k) for k in list(kwargs) if k in
+                 ("pool_size", "max_overflow", "pool_timeout", "pool_recycle",
+                  "pre_ping", "pre_ping_idle_s")}
+    cfg = pool_settings(service, **overrides)
+    poolclass = _timed_pool(AsyncAdaptedQueuePool if is_async else QueuePool)
+
+    engine_kw = dict(
+        poolclass=poolclass,
+        pool_size=cfg["pool_size"],
+        max_overflow=cfg["max_overflow"],
+        pool_timeout=cfg["pool_timeout"],
+        pool_recycle=cfg["pool_recycle"],
+        pool_pre_ping=cfg["pre_ping"] == "always",
+        **kwargs,
+    )
+    if is_async:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        engine = create_async_engine(url, **engine_kw)
+    else:
+        engine = create_engine(url, **engine_kw)
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+    metrics = instrument_db_pool(engine, service, registry=registry)
+    poolclass.metrics = metrics
+    if cfg["pre_ping"] == "idle":
+        _install_idle_ping(sync_engine, cfg["pre_ping_idle_s"], metrics)
+
+    log.info(f"[{service}] DB pool size={cfg['pool_size']} overflow={cfg['max_overflow']} "
+             f"timeout={cfg['pool_timeout']}s recycle={cfg['pool_recycle']}s "
+             f"pre_ping={cfg['pre_ping']}")
+    return engine
+
+
+def pool_status(engine) -> dict:
+    """Snapshot of the engine's pool for /health."""
+    pool = getattr(engine, "sync_engine", engine).pool
+    return {
+        "size":      pool.size(),
+        "in_use":    pool.checkedout(),
+        "idle":      pool.checkedin(),
+        "overflow":  max(0, pool.overflow()),
+    }
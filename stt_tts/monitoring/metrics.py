@@ -9,6 +9,9 @@ This adds:
   - /metrics endpoint (Prometheus format)
   - Request count, latency histogram, in-flight gauge per endpoint
   - Service info gauge with version label
+
+SQLAlchemy pools are instrumented by instrument_db_pool(), which
+monitoring/db_pool.create_pooled_engine() calls for every engine it builds.
 """
 from __future__ import annotations
 
@@ -123,3 +126,58 @@ def instrument_app(
         "in_flight": IN_FLIGHT,
         "up": UP,
     }
+
+
+def instrument_db_pool(
+    engine,
+    service_name: str,
+    registry: Optional[CollectorRegistry] = None,
+):
+    """
+    Pool gauges for a SQLAlchemy engine (sync or async), labelled by service.
+
+    Gauges read the live pool at scrape time, so they follow the pool across
+    engine.dispose().  Returns the checkout-wait histogram and the counters;
+    the pool class from create_pooled_engine() feeds them.
+    """
+    reg = registry or REGISTRY
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    def _pool():
+        return sync_engine.pool
+
+    in_use = _safe_metric(Gauge, "db_pool_connections_in_use",
+                          "Connections checked out of the pool", reg,
+                          labelnames=["service"])
+    idle = _safe_metric(Gauge, "db_pool_connections_idle",
+                        "Connections idle in the pool", reg,
+                        labelnames=["service"])
+    overflow = _safe_metric(Gauge, "db_pool_overflow_in_use",
+                            "Connections open beyond pool_size (max_overflow headroom used)", reg,
+                            labelnames=["service"])
+    size = _safe_metric(Gauge, "db_pool_size",
+                        "Configured pool_size", reg,
+                        labelnames=["service"])
+    in_use.labels(service=service_name).set_function(lambda: _pool().checkedout())
+    idle.labels(service=service_name).set_function(lambda: _pool().checkedin())
+    overflow.labels(service=service_name).set_function(lambda: max(0, _pool().overflow()))
+    size.labels(service=service_name).set_function(lambda: _pool().size())
+
+    return {
+        "checkout_wait": _safe_metric(
+            Histogram, "db_pool_checkout_wait_seconds",
+            "Time to get a connection from the pool (queueing + connect)", reg,
+            labelnames=["service"],
+            buckets=[0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0],
+        ).labels(service=service_name),
+        "checkout_timeouts": _safe_metric(
+            Counter, "db_pool_checkout_timeouts_total",
+            "Checkouts that gave up after pool_timeout", reg,
+            labelnames=["service"],
+        ).labels(service=service_name),
+        "pre_ping_failures": _safe_metric(
+            Counter, "db_pool_pre_ping_failures_total",
+            "Pooled connections found dead by the pre-ping and replaced", reg,
+            labelnames=["service"],
+        ).labels(service=service_name),
+    }
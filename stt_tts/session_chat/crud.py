@@ -2,69 +2,270 @@
 crud.py - Session Service CRUD + Redis Session Manager
 
 Redis keys:
-    session:{session_id}          →  JSON session metadata  (TTL = SESSION_TTL)
-    session:{session_id}:active   →  "1" flag, means session is live in Redis
+    session:{session_id}          →  JSON session metadata  (TTL = SESSION_TTL,
+                                     slid forward on every cache read)
+    user_sessions:{user_id}       →  sorted set session_id → updated_at (µs),
+                                     the user's most recent sessions
+    user_sessions:{user_id}:complete
+                                  →  "1" the set holds every session of the user,
+                                     "0" only the newest SESSION_INDEX_MAX of them
+
+Redis channel:
+    SESSION_EVENTS_CHANNEL        →  session_id published on create / delete so
+                                     the message service drops its cached
+                                     existence answer for that session
+
+Every RedisSessionManager call is one round trip — multi-key work goes out as
+one pipeline.  Reads are read-through: a miss loads the row from Postgres and
+writes it back, so the next GET /sessions/{id} is answered from Redis alone.
+
+Redis round trips per operation, before → after (DB work unchanged):
+    GET /sessions/{id}  hit      1    → 1  (TTL refresh rides along)
+    GET /sessions/{id}  miss     6    → 2
+    POST /sessions               3    → 1
+    PATCH title                  5–7  → 1
+    touch                        2    → 0  (coalesced — one pipeline per flush batch)
+    DELETE                       5–7  → 1
+    GET /users/{id}/sessions     0    → 2  (index page + MGET, no DB inside the index)
+
+The DB layer is still the sync SQLAlchemy session; the async CRUD methods
+run those calls in the threadpool so the event loop is never blocked.
+
+Listing is keyset-paginated on (user_id, updated_at, id), newest first.  The
+per-user sorted set is built from the DB on first use (SESSION_INDEX_TTL) and
+kept current by every metadata write (create / title / touch flush) and
+delete.  It always holds a newest-first prefix of the user's sessions, so a
+page that falls inside it is answered from Redis; pages past its end go to
+the DB.
 """
+import base64
 import json
+import logging
 import os
+import time
 import uuid
-from datetime import datetime
-from typing import Optional, List
+from datetime import datetime, timedelta
+from typing import Dict, Optional, List, Tuple
 
+from sqlalchemy import select, delete, update, case, and_, or_
 from sqlalchemy.orm import Session as DBSession
+from starlette.concurrency import run_in_threadpool
 from models import ChatSession
+from touch_coalescer import TouchCoalescer, touch_coalescer
+
+log = logging.getLogger("sessions")
 
 # ── Redis ─────────────────────────────────────────────────────────────────────
 
-SESSION_TTL = int(os.getenv("SESSION_TTL", 86400))
+SESSION_TTL            = int(os.getenv("SESSION_TTL", 86400))
+SESSION_EVENTS_CHANNEL = os.getenv("SESSION_EVENTS_CHANNEL", "sessions:invalidate")
+REDIS_RETRY_S          = float(os.getenv("REDIS_RETRY_S", "5"))
+SESSION_INDEX          = os.getenv("SESSION_INDEX", "1").strip() in ("1", "true", "yes")
+SESSION_INDEX_TTL      = int(os.getenv("SESSION_INDEX_TTL", 3600))
+SESSION_INDEX_MAX      = int(os.getenv("SESSION_INDEX_MAX", 200))
 
 try:
-    import redis
-    _redis = redis.Redis(
-        host=os.getenv("REDIS_HOST", "localhost"),
-        port=int(os.getenv("REDIS_PORT", "6379")),
-        db=int(os.getenv("REDIS_DB", "0")),
-        decode_responses=True,
-    )
-    _redis.ping()
-    _redis_ok = True
-except Exception:
-    _redis = None
-    _redis_ok = False
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+
+def _key(session_id) -> str:
+    return f"session:{session_id}"
+
+
+def _index_key(user_id) -> str:
+    return f"user_sessions:{user_id}"
+
+
+def _complete_key(user_id) -> str:
+    return f"user_sessions:{user_id}:complete"
+
+
+# ── Keyset cursors ────────────────────────────────────────────────────────────
+# Opaque token for the last row of a page: "<updated_at iso>|<id>", base64url.
+# Sorted-set scores are integer microseconds since the epoch — exact in a double.
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _score(updated_at: datetime) -> int:
+    return (updated_at - _EPOCH) // timedelta(microseconds=1)
+
+
+def encode_cursor(item: dict) -> str:
+    raw = f"{item['updated_at']}|{item['id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        updated_at, sid = raw.split("|", 1)
+        return datetime.fromisoformat(updated_at), uuid.UUID(sid)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+def _summary(data: dict) -> dict:
+    return {"id": data["id"], "title": data["title"], "updated_at": data["updated_at"]}
 
 
 class RedisSessionManager:
-    """Redis-backed session cache. Falls back to no-op if Redis is unavailable."""
+    """Async Redis session cache. Falls back to no-op if Redis is unavailable."""
 
-    def set(self, session):
-        if not _redis_ok:
-            return
-        key = f"session:{session.id}"
-        _redis.setex(key, SESSION_TTL, json.dumps(session.to_dict()))
-        _redis.setex(f"{key}:active", SESSION_TTL, "1")
+    def __init__(self, client=None, clock=time.monotonic):
+        self._client     = client
+        self._clock      = clock
+        self._down_until = 0.0
+        self.round_trips = 0
+        self.hits        = 0
+        self.misses      = 0
+
+    @property
+    def client(self):
+        if self._client is None and aioredis is not None:
+            self._client = aioredis.Redis(
+                host=os.getenv("REDIS_HOST", "localhost"),
+                port=int(os.getenv("REDIS_PORT", "6379")),
+                db=int(os.getenv("REDIS_DB", "0")),
+                decode_responses=True,
+                socket_connect_timeout=0.5,
+            )
+        return self._client
 
-    def get(self, session_id) -> Optional[dict]:
-        if not _redis_ok:
+    @property
+    def available(self) -> bool:
+        return self.client is not None and self._clock() >= self._down_until
+
+    def _failed(self, op: str, e: Exception):
+        if self._clock() >= self._down_until:
+            log.warning(f"Redis {op} failed ({e}) — serving from DB for {REDIS_RETRY_S:.0f}s")
+        self._down_until = self._clock() + REDIS_RETRY_S
+
+    async def _execute(self, op: str, build) -> Optional[list]:
+        """Run the commands queued by build(pipe) in one round trip; None on error."""
+        if not self.available:
+            return None
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                build(pipe)
+                self.round_trips += 1
+                return await pipe.execute()
+        except Exception as e:
+            self._failed(op, e)
             return None
-        raw = _redis.get(f"session:{session_id}")
-        return json.loads(raw) if raw else None
 
-    def delete(self, session_id):
-        if not _redis_ok:
-            return
-        _redis.delete(f"session:{session_id}", f"session:{session_id}:active")
+    async def set(self, data: dict, publish: bool = False):
+        """Cache session metadata (a ChatSession.to_dict()) and index it; optionally announce it."""
+        await self.set_many([data], publish=publish)
 
-    def refresh_ttl(self, session_id):
-        if not _redis_ok:
+    async def set_many(self, items: List[dict], publish: bool = False):
+        if not items:
             return
-        key = f"session:{session_id}"
-        _redis.expire(key, SESSION_TTL)
-        _redis.expire(f"{key}:active", SESSION_TTL)
 
-    def exists(self, session_id) -> bool:
-        if not _redis_ok:
-            return False
-        return _redis.exists(f"session:{session_id}:active") > 0
+        def build(pipe):
+            for data in items:
+                pipe.setex(_key(data["id"]), SESSION_TTL, json.dumps(data))
+                if SESSION_INDEX:
+                    index = _index_key(data["user_id"])
+                    score = _score(datetime.fromisoformat(data["updated_at"]))
+                    pipe.zadd(index, {data["id"]: score})
+                    # An index nobody has listed yet has no :complete flag and
+                    # is never read — just make sure it expires.
+                    pipe.expire(index, SESSION_INDEX_TTL, nx=True)
+                if publish:
+                    pipe.publish(SESSION_EVENTS_CHANNEL, data["id"])
+        await self._execute("set", build)
+
+    async def get(self, session_id) -> Optional[dict]:
+        """Cached metadata, sliding its TTL forward in the same round trip."""
+        res = await self._execute("get", lambda pipe: pipe.getex(_key(session_id), ex=SESSION_TTL))
+        raw = res[0] if res else None
+        if raw:
+            self.hits += 1
+            return json.loads(raw)
+        self.misses += 1
+        return None
+
+    async def delete(self, session_id, user_id=None, publish: bool = True):
+        def build(pipe):
+            pipe.delete(_key(session_id))
+            if SESSION_INDEX and user_id is not None:
+                pipe.zrem(_index_key(user_id), str(session_id))
+            if publish:
+                pipe.publish(SESSION_EVENTS_CHANNEL, str(session_id))
+        await self._execute("delete", build)
+
+    async def get_many(self, session_ids: List[str]) -> Optional[List[Optional[dict]]]:
+        """Cached metadata for each id (None where not cached); None if Redis is down."""
+        res = await self._execute("mget",
+                                  lambda pipe: pipe.mget([_key(sid) for sid in session_ids]))
+        if res is None:
+            return None
+        return [json.loads(raw) if raw else None for raw in res[0]]
+
+    # ── Per-user index ───────────────────────────────────────────
+    async def index_page(self, user_id, limit: int,
+                         before: Optional[Tuple[datetime, uuid.UUID]] = None):
+        """
+        (page, built): the next `limit` (session_id, updated_at) pairs older
+        than `before`, newest first — page is None when the index cannot
+        answer (not built, Redis down, or the page runs past the end of a
+        truncated index).
+        """
+        if before is None:
+            high, after_id, extra = "+inf", None, 0
+        else:
+            high, after_id, extra = _score(before[0]), str(before[1]), 16
+        fetch = limit + extra
+
+        def build(pipe):
+            pipe.get(_complete_key(user_id))
+            pipe.zrevrangebyscore(_index_key(user_id), high, "-inf",
+                                  start=0, num=fetch, withscores=True)
+        res = await self._execute("index_page", build)
+        if res is None or res[0] is None:
+            return None, False
+        complete, members = res[0] == "1", res[1]
+
+        # Ties on updated_at are broken by id (descending), as in the DB query.
+        page = [(sid, int(score)) for sid, score in members
+                if after_id is None or int(score) < high or sid < after_id]
+        page = [(sid, _EPOCH + timedelta(microseconds=sc)) for sid, sc in page]
+        if len(page) >= limit:
+            return page[:limit], True
+        if complete and len(members) < fetch:
+            return page, True
+        return None, True
+
+    async def index_build(self, user_id, rows: List[Tuple[str, datetime]], complete: bool):
+        """Replace the user's index with `rows` — the newest sessions from the DB."""
+        def build(pipe):
+            pipe.delete(_index_key(user_id))
+            if rows:
+                pipe.zadd(_index_key(user_id), {sid: _score(ts) for sid, ts in rows})
+                pipe.expire(_index_key(user_id), SESSION_INDEX_TTL)
+            pipe.setex(_complete_key(user_id), SESSION_INDEX_TTL, "1" if complete else "0")
+        await self._execute("index_build", build)
+
+    async def exists(self, session_id) -> bool:
+        res = await self._execute("exists", lambda pipe: pipe.exists(_key(session_id)))
+        return bool(res and res[0])
+
+    async def publish_invalidation(self, session_id):
+        """Tell subscribers (message service) their cached view of this session is stale."""
+        await self._execute("publish",
+                            lambda pipe: pipe.publish(SESSION_EVENTS_CHANNEL, str(session_id)))
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {"available": self.available, "round_trips": self.round_trips,
+                "hits": self.hits, "misses": self.misses}
 
 
 # Singleton
@@ -74,78 +275,224 @@ redis_session_manager = RedisSessionManager()
 # ── CRUD ──────────────────────────────────────────────────────────────────────
 
 class SessionCRUD:
-    def __init__(self, db: DBSession):
-        self.db  = db
-        self.rsm = redis_session_manager
+    def __init__(self, db: DBSession, rsm: Optional[RedisSessionManager] = None,
+                 touches: Optional[TouchCoalescer] = None):
+        self.db      = db
+        self.rsm     = rsm or redis_session_manager
+        self.touches = touches or touch_coalescer
 
-    # ── Create ───────────────────────────────────────────────────
-    def create(self, user_id: str, title: str = None) -> ChatSession:
+    # ── DB (sync — run in the threadpool by the async methods) ───
+    def _load(self, session_id: str) -> Optional[ChatSession]:
+        return self.db.query(ChatSession).filter(
+            ChatSession.id == uuid.UUID(session_id)
+        ).first()
+
+    def _insert(self, user_id: str, title: Optional[str]) -> ChatSession:
         session = ChatSession(user_id=uuid.UUID(user_id), title=title)
         self.db.add(session)
         self.db.commit()
         self.db.refresh(session)
-        self.rsm.set(session)
         return session
 
-    # ── Read ─────────────────────────────────────────────────────
-    def get_by_id(self, session_id: str) -> Optional[ChatSession]:
-        self.rsm.refresh_ttl(session_id)
-        session = self.db.query(ChatSession).filter(
-            ChatSession.id == uuid.UUID(session_id)
-        ).first()
-        if session and not self.rsm.exists(session_id):
-            self.rsm.set(session)
+    def _set_title(self, session_id: str, title: str) -> Optional[ChatSession]:
+        session = self._load(session_id)
+        if not session:
+            return None
+        session.title      = title
+        session.updated_at = datetime.utcnow()
+        self.db.commit()
+        self.db.refresh(session)
         return session
 
-    def get_cached(self, session_id: str) -> Optional[dict]:
-        """Return metadata from Redis only — no DB hit."""
-        return self.rsm.get(session_id)
+    def _bump(self, session_id: str) -> Optional[ChatSession]:
+        session = self._load(session_id)
+        if session:
+            session.updated_at = datetime.utcnow()
+            self.db.commit()
+            self.db.refresh(session)
+        return session
+
+    def _touch_many(self, batch: Dict[str, datetime]) -> List[dict]:
+        """One UPDATE for the whole batch; updated_at never moves backwards."""
+        table = ChatSession.__table__
+        new_ts = case({uuid.UUID(sid): ts for sid, ts in batch.items()}, value=table.c.id)
+        rows = self.db.execute(
+            update(table)
+            .where(table.c.id.in_([uuid.UUID(sid) for sid in batch]))
+            .values(updated_at=case((table.c.updated_at < new_ts, new_ts),
+                                    else_=table.c.updated_at))
+            .returning(*table.c)
+        ).mappings().all()
+        self.db.commit()
+        return [ChatSession(**row).to_dict() for row in rows]
 
-    def list_by_user(self, user_id: str) -> List[ChatSession]:
+    def _remove(self, session_id: str) -> Optional[str]:
+        """Delete the row; its user_id (for the index), or None if there was none."""
+        user_id = self.db.execute(
+            delete(ChatSession)
+            .where(ChatSession.id == uuid.UUID(session_id))
+            .returning(ChatSession.user_id)
+        ).scalar_one_or_none()
+        self.db.commit()
+        return str(user_id) if user_id is not None else None
+
+    def _page(self, user_id: str, limit: int,
+              before: Optional[Tuple[datetime, uuid.UUID]], summary: bool) -> List[dict]:
+        cols = ((ChatSession.id, ChatSession.title, ChatSession.updated_at)
+                if summary else (ChatSession,))
+        stmt = (
+            select(*cols)
+            .where(ChatSession.user_id == uuid.UUID(user_id))
+            .order_by(ChatSession.updated_at.desc(), ChatSession.id.desc())
+            .limit(limit)
+        )
+        if before:
+            updated_at, sid = before
+            stmt = stmt.where(or_(
+                ChatSession.updated_at < updated_at,
+                and_(ChatSession.updated_at == updated_at, ChatSession.id < sid),
+            ))
+        if summary:
+            # Plain tuples — no ORM objects built for the sidebar listing.
+            return [{"id": str(sid), "title": title, "updated_at": ts.isoformat()}
+                    for sid, title, ts in self.db.execute(stmt)]
+        return [s.to_dict() for s in self.db.execute(stmt).scalars()]
+
+    def _recent(self, user_id: str, n: int) -> List[Tuple[str, datetime]]:
+        stmt = (
+            select(ChatSession.id, ChatSession.updated_at)
+            .where(ChatSession.user_id == uuid.UUID(user_id))
+            .order_by(ChatSession.updated_at.desc(), ChatSession.id.desc())
+            .limit(n)
+        )
+        return [(str(sid), ts) for sid, ts in self.db.execute(stmt)]
+
+    def _load_many(self, session_ids: List[str]) -> List[ChatSession]:
         return (
             self.db.query(ChatSession)
-            .filter(ChatSession.user_id == uuid.UUID(user_id))
-            .order_by(ChatSession.updated_at.desc())
+            .filter(ChatSession.id.in_([uuid.UUID(sid) for sid in session_ids]))
             .all()
         )
 
-    def exists(self, session_id: str) -> bool:
-        if self.rsm.exists(session_id):
-            return True
+    def _row_exists(self, session_id: str) -> bool:
         return (
             self.db.query(ChatSession.id)
             .filter(ChatSession.id == uuid.UUID(session_id))
             .scalar() is not None
         )
 
-    # ── Update ───────────────────────────────────────────────────
-    def update_title(self, session_id: str, title: str) -> Optional[ChatSession]:
-        session = self.get_by_id(session_id)
+    # ── Create ───────────────────────────────────────────────────
+    async def create(self, user_id: str, title: str = None) -> ChatSession:
+        session = await run_in_threadpool(self._insert, user_id, title)
+        await self.rsm.set(session.to_dict(), publish=True)
+        return session
+
+    # ── Read ─────────────────────────────────────────────────────
+    async def get(self, session_id: str) -> tuple[Optional[dict], str]:
+        """Read-through: (metadata, "cache" | "db"); metadata is None if missing."""
+        cached = await self.rsm.get(session_id)
+        if cached:
+            return self.touches.overlay(cached), "cache"
+        session = await run_in_threadpool(self._load, session_id)
         if not session:
+            return None, "db"
+        data = session.to_dict()
+        await self.rsm.set(data)
+        return self.touches.overlay(data), "db"
+
+    async def get_cached(self, session_id: str) -> Optional[dict]:
+        """Return metadata from Redis only — no DB hit."""
+        return await self.rsm.get(session_id)
+
+    async def list_by_user(self, user_id: str, limit: int = 100,
+                           after: Optional[str] = None, summary: bool = False) -> List[dict]:
+        """A page of the user's sessions, newest first — see list_page()."""
+        return (await self.list_page(user_id, limit, after, summary))[0]
+
+    async def list_page(self, user_id: str, limit: int = 100, after: Optional[str] = None,
+                        summary: bool = False) -> Tuple[List[dict], Optional[str]]:
+        """
+        (page of the user's sessions newest first, cursor of the next page —
+        None after a short page).
+
+        `after` is a cursor from the previous page.  `summary` returns only
+        id, title and updated_at.  Pages inside the per-user Redis index are
+        served from Redis; the rest from the DB via the (user_id, updated_at,
+        id) index.  The cursor is taken from the stored updated_at the page
+        is ordered by, before pending touches are overlaid.
+        """
+        uuid.UUID(user_id)
+        before = decode_cursor(after) if after else None
+        items = None
+        if SESSION_INDEX:
+            page = await self._index_page(user_id, limit, before)
+            if page is not None:
+                items = await self._hydrate(page)
+                if items is not None and summary:
+                    items = [_summary(d) for d in items]
+        if items is None:
+            items = await run_in_threadpool(self._page, user_id, limit, before, summary)
+        cursor = encode_cursor(items[-1]) if len(items) == limit else None
+        # Touches not yet flushed: fresher updated_at, order as of the last flush.
+        return [self.touches.overlay(d) for d in items], cursor
+
+    async def _index_page(self, user_id: str, limit: int, before):
+        page, built = await self.rsm.index_page(user_id, limit, before)
+        if page is not None or built or not self.rsm.available or before is not None:
+            return page
+        # Not built yet — build it from the newest rows, answer the first page too.
+        rows = await run_in_threadpool(self._recent, user_id, SESSION_INDEX_MAX)
+        await self.rsm.index_build(user_id, rows, complete=len(rows) < SESSION_INDEX_MAX)
+        return rows[:limit]
+
+    async def _hydrate(self, page: List[Tuple[str, datetime]]) -> Optional[List[dict]]:
+        """Metadata for indexed ids: Redis first, the DB for any not cached."""
+        ids = [sid for sid, _ in page]
+        cached = await self.rsm.get_many(ids) if ids else []
+        if cached is None:
             return None
-        session.title      = title
-        session.updated_at = datetime.utcnow()
-        self.db.commit()
-        self.db.refresh(session)
-        self.rsm.set(session)
+        missing = [sid for sid, data in zip(ids, cached) if data is None]
+        if missing:
+            loaded = {str(s.id): s.to_dict()
+                      for s in await run_in_threadpool(self._load_many, missing)}
+            await self.rsm.set_many(list(loaded.values()))
+            if len(loaded) < len(missing):
+                return None     # index outlived a missed delete — let the DB answer
+            cached = [data or loaded[sid] for sid, data in zip(ids, cached)]
+        return cached
+
+    async def exists(self, session_id: str) -> bool:
+        if await self.rsm.exists(session_id):
+            return True
+        return await run_in_threadpool(self._row_exists, session_id)
+
+    # ── Update ───────────────────────────────────────────────────
+    async def update_title(self, session_id: str, title: str) -> Optional[ChatSession]:
+        session = await run_in_threadpool(self._set_title, session_id, title)
+        if session:
+            await self.rsm.set(session.to_dict())
         return session
 
-    def touch(self, session_id: str):
+    async def touch(self, session_id: str):
         """Bump updated_at — called by history-service after each message."""
-        session = self.db.query(ChatSession).filter(
-            ChatSession.id == uuid.UUID(session_id)
-        ).first()
+        if self.touches.enabled:
+            uuid.UUID(session_id)           # keep malformed ids out of the batch
+            self.touches.touch(session_id)
+            return
+        session = await run_in_threadpool(self._bump, session_id)
         if session:
-            session.updated_at = datetime.utcnow()
-            self.db.commit()
-            self.rsm.set(session)
+            await self.rsm.set(session.to_dict())
+
+    async def apply_touches(self, batch: Dict[str, datetime]):
+        """Flush target for the coalescer: one UPDATE, one Redis pipeline."""
+        items = await run_in_threadpool(self._touch_many, batch)
+        await self.rsm.set_many(items)
 
     # ── Delete ───────────────────────────────────────────────────
-    def delete(self, session_id: str) -> bool:
-        session = self.get_by_id(session_id)
-        if not session:
+    async def delete(self, session_id: str) -> bool:
+        self.touches.discard(session_id)
+        user_id = await run_in_threadpool(self._remove, session_id)
+        if user_id is None:
             return False
-        self.db.delete(session)
-        self.db.commit()
-        self.rsm.delete(session_id)
-        return True
\ No newline at end of file
+        await self.rsm.delete(session_id, user_id=user_id)
+        return True
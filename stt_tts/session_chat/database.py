@@ -1,18 +1,22 @@
 import os
+import sys as _sys
 from pathlib import Path
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
 load_dotenv(Path(__file__).resolve().parent.parent / ".env")
 
+# monitoring/ lives next to the service directories
+_sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from monitoring.db_pool import create_pooled_engine  # noqa: E402
+
 _user = os.getenv("DATABASE_USER", "postgres")
 _pass = os.getenv("DATABASE_PASSWORD", "")
 _host = os.getenv("DATABASE_HOST", "localhost")
 _port = os.getenv("DATABASE_PORT", "5432")
 DATABASE_URL = f"postgresql+psycopg2://{_user}:{_pass}@{_host}:{_port}/session_chat"
 
-engine = create_engine(DATABASE_URL, echo=False, pool_pre_ping=True)
+engine = create_pooled_engine(DATABASE_URL, "session_chat", echo=False)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 class Base(DeclarativeBase):
@@ -21,6 +25,10 @@ class Base(DeclarativeBase):
 def init_db():
     from models import Base as ModelBase
     ModelBase.metadata.create_all(bind=engine)
+    # create_all skips indexes on tables that already exist — add new ones.
+    for table in ModelBase.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
 def get_db():
     db = SessionLocal()
@@ -3,29 +3,47 @@ main.py - Session Microservice  →  port 8002
 """
 import os
 import httpx
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional
 from sqlalchemy.orm import Session
 
-from database import get_db, init_db
-from crud import SessionCRUD
+from database import SessionLocal, engine, get_db, init_db
+from crud import SessionCRUD, redis_session_manager
+from touch_coalescer import touch_coalescer
 
 import sys as _sys
 _sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 from monitoring.metrics import instrument_app
+from monitoring.db_pool import pool_status
 
 USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://localhost:8006")
 
 app = FastAPI(title="Session Service", version="1.0.0")
-app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],
+                   expose_headers=["X-Next-Cursor"])
 instrument_app(app, service_name="sessions", version="1.0.0")
 
 
+async def _flush_touches(batch):
+    db = SessionLocal()
+    try:
+        await SessionCRUD(db).apply_touches(batch)
+    finally:
+        db.close()
+
+
 @app.on_event("startup")
-def startup():
+async def startup():
     init_db()
+    await touch_coalescer.start(_flush_touches)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await touch_coalescer.stop()
+    await redis_session_manager.close()
 
 
 # ── Helpers ──────────────────────────────────────────────────────────────────
@@ -55,64 +73,81 @@ class UpdateTitleBody(BaseModel):
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "service": "session-service", "port": 8005}
+    return {"status": "ok", "service": "session-service", "port": 8005,
+            "redis": redis_session_manager.stats(),
+            "touch": touch_coalescer.stats(),
+            "db_pool": pool_status(engine)}
 
 
 @app.post("/sessions", status_code=201)
 async def create_session(body: CreateSessionBody, db: Session = Depends(get_db)):
     await verify_user(body.user_id)
-    session = SessionCRUD(db).create(body.user_id, body.title)
+    session = await SessionCRUD(db).create(body.user_id, body.title)
     return session.to_dict()
 
 
 @app.get("/sessions/{session_id}")
-def get_session(session_id: str, db: Session = Depends(get_db)):
-    # Try Redis hot cache first
-    cached = SessionCRUD(db).get_cached(session_id)
-    if cached:
-        return {**cached, "source": "cache"}
-    session = SessionCRUD(db).get_by_id(session_id)
-    if not session:
+async def get_session(session_id: str, db: Session = Depends(get_db)):
+    # Read-through: Redis alone on a hit, DB + cache fill on a miss
+    data, source = await SessionCRUD(db).get(session_id)
+    if not data:
         raise HTTPException(404, "Session not found.")
-    return {**session.to_dict(), "source": "db"}
+    return {**data, "source": source}
 
 
 @app.get("/users/{user_id}/sessions")
-def list_sessions(user_id: str, db: Session = Depends(get_db)):
-    sessions = SessionCRUD(db).list_by_user(user_id)
-    return [s.to_dict() for s in sessions]
+async def list_sessions(
+    user_id: str,
+    response: Response,
+    limit:  int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    fields: str = Query("full", pattern="^(full|summary)$",
+                        description="summary → id, title, updated_at only"),
+    db: Session = Depends(get_db),
+):
+    try:
+        items, next_cursor = await SessionCRUD(db).list_page(user_id, limit, after=cursor,
+                                                             summary=fields == "summary")
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
 
 
 @app.patch("/sessions/{session_id}/title")
-def update_title(session_id: str, body: UpdateTitleBody, db: Session = Depends(get_db)):
-    session = SessionCRUD(db).update_title(session_id, body.title)
+async def update_title(session_id: str, body: UpdateTitleBody, db: Session = Depends(get_db)):
+    session = await SessionCRUD(db).update_title(session_id, body.title)
     if not session:
         raise HTTPException(404, "Session not found.")
     return session.to_dict()
 
 
 @app.post("/sessions/{session_id}/touch", status_code=204)
-def touch_session(session_id: str, db: Session = Depends(get_db)):
-    """Called by history-service after saving a message to bump updated_at."""
-    SessionCRUD(db).touch(session_id)
+async def touch_session(session_id: str, db: Session = Depends(get_db)):
+    """Called by history-service after saving a message to bump updated_at (coalesced)."""
+    try:
+        await SessionCRUD(db).touch(session_id)
+    except ValueError:
+        raise HTTPException(400, "Invalid session id.")
 
 
 @app.delete("/sessions/{session_id}", status_code=204)
-def delete_session(session_id: str, db: Session = Depends(get_db)):
-    if not SessionCRUD(db).delete(session_id):
+async def delete_session(session_id: str, db: Session = Depends(get_db)):
+    if not await SessionCRUD(db).delete(session_id):
         raise HTTPException(404, "Session not found.")
 
 
 @app.get("/sessions/{session_id}/exists")
-def session_exists(session_id: str, db: Session = Depends(get_db)):
+async def session_exists(session_id: str, db: Session = Depends(get_db)):
     """Called by message-service to verify a session exists before saving a message."""
-    return {"exists": SessionCRUD(db).exists(session_id)}
+    return {"exists": await SessionCRUD(db).exists(session_id)}
 
 
 # Internal — called by history-service before saving messages
 @app.get("/sessions/{session_id}/exists")
-def session_exists(session_id: str, db: Session = Depends(get_db)):
-    return {"exists": SessionCRUD(db).exists(session_id)}
+async def session_exists(session_id: str, db: Session = Depends(get_db)):
+    return {"exists": await SessionCRUD(db).exists(session_id)}
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8005, reload=False)
\ No newline at end of file
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime
+from sqlalchemy import Column, String, DateTime, Index
 from sqlalchemy.dialects.postgresql import UUID as PGUUID
 from sqlalchemy.orm import declarative_base
 
@@ -9,9 +9,13 @@ Base = declarative_base()
 
 class ChatSession(Base):
     __tablename__ = "sessions"
+    __table_args__ = (
+        # Keyset listing per user, newest first: (user_id, updated_at, id).
+        Index("ix_sessions_user_updated_id", "user_id", "updated_at", "id"),
+    )
 
     id         = Column(PGUUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id    = Column(PGUUID(as_uuid=True), nullable=False, index=True)
+    user_id    = Column(PGUUID(as_uuid=True), nullable=False)
     title      = Column(String(255), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,148 @@
+"""
+touch_coalescer.py — Batched updated_at writes for POST /sessions/{id}/touch
+
+The message service touches a session after every message write.  Done
+inline, each touch is a SELECT, an UPDATE on the same hot row, a commit and a
+Redis write.  Instead the latest touch time per session is kept in memory:
+
+  touch(session_id) ──► pending {session_id: latest time}
+                              │  every TOUCH_FLUSH_S seconds
+                              ▼
+                  flush_fn({session_id: time, …})   one UPDATE … CASE for the
+                                                     whole batch (SessionCRUD)
+
+Reads overlay the pending time (`pending_at`), so GET /sessions/{id} and the
+listing see the fresh updated_at before it reaches Postgres.  A failed flush
+puts its batch back (newer touches win) and is retried on the next tick; stop()
+makes a final flush.  Up to TOUCH_FLUSH_S of touches are lost if the process
+dies — updated_at only orders the sidebar, so that is an acceptable trade.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+log = logging.getLogger("sessions")
+
+# ─── Configuration ────────────────────────────────────────────────────────────
+
+TOUCH_FLUSH_S     = float(os.getenv("TOUCH_FLUSH_S",     "5.0"))   # 0 = write every touch
+TOUCH_FLUSH_BATCH = int(os.getenv("TOUCH_FLUSH_BATCH",   "500"))
+
+# flush_fn({session_id: updated_at}) — raises on failure
+FlushFn = Callable[[Dict[str, datetime]], Awaitable[None]]
+
+
+class TouchCoalescer:
+    """Latest touch time per session, flushed to the DB in batches."""
+
+    def __init__(self, interval_s: float = TOUCH_FLUSH_S,
+                 batch_size: int = TOUCH_FLUSH_BATCH, clock=datetime.utcnow):
+        self._interval  = interval_s
+        self.batch_size = max(1, batch_size)
+        self._clock     = clock
+        self._flush_fn: Optional[FlushFn] = None
+        self._pending: Dict[str, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._running   = False
+        self.touches    = 0
+        self.flushes    = 0
+        self.written    = 0
+        self.failures   = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Coalescing only while the flush loop runs; otherwise callers write through."""
+        return self._running and self._interval > 0
+
+    def touch(self, session_id: str) -> datetime:
+        now = self._clock()
+        self._pending[session_id] = now
+        self.touches += 1
+        return now
+
+    def pending_at(self, session_id: str) -> Optional[datetime]:
+        return self._pending.get(session_id)
+
+    def discard(self, session_id: str):
+        self._pending.pop(session_id, None)
+
+    def overlay(self, data: dict) -> dict:
+        """Session dict with updated_at replaced by a newer pending touch, if any."""
+        ts = self._pending.get(data["id"])
+        if ts is not None and ts > datetime.fromisoformat(data["updated_at"]):
+            return {**data, "updated_at": ts.isoformat()}
+        return data
+
+    async def flush(self) -> bool:
+        """Write everything pending; False if a batch failed (it stays pending)."""
+        ok = True
+        while self._pending and self._flush_fn is not None:
+            ids = list(self._pending)[:self.batch_size]
+            batch = {sid: self._pending.pop(sid) for sid in ids}
+            try:
+                await self._flush_fn(batch)
+            except Exception as e:
+                self.failures += 1
+                log.warning(f"[touch] flush of {len(batch)} sessions failed: {e}")
+                for sid, ts in batch.items():
+                    if sid not in self._pending or self._pending[sid] < ts:
+                        self._pending[sid] = ts
+                ok = False
+                break
+            self.flushes += 1
+            self.written += len(batch)
+        return ok
+
+    # ── Background loop ───────────────────────────────────────────────────────
+
+    async def start(self, flush_fn: FlushFn):
+        self._flush_fn = flush_fn
+        if self._interval > 0 and (self._task is None or self._task.done()):
+            self._running = True
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="touch_coalescer")
+
+    async def stop(self):
+        """Stop the loop and make a final attempt to flush everything."""
+        self._running = False
+        if self._task is not None:
+            self._wake.set()
+            try:
+                await self._task
+            except Exception:
+                pass
+            self._task = None
+        if not await self.flush():
+            log.warning(f"[touch] shutdown with {len(self._pending)} unflushed touches")
+
+    async def _run(self):
+        while self._running:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self._interval)
+            except asyncio.TimeoutError:
+                pass
+            if not self._running:
+                break
+            try:
+                await self.flush()
+            except Exception as e:
+                log.error(f"[touch] flush loop error: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled":  self.enabled,
+            "pending":  len(self._pending),
+            "touches":  self.touches,
+            "flushes":  self.flushes,
+            "written":  self.written,
+            "failures": self.failures,
+        }
+
+
+# Singleton — started with the flush function in main.startup
+touch_coalescer = TouchCoalescer()
@@ -0,0 +1 @@
+"""shared package — text helpers used by both the gateway and the CAG service"""
@@ -0,0 +1,15 @@
+"""
+conftest.py — helpers shared by the unit tests
+  • FakeClock: an injectable clock whose time only moves when a test sets
+    or advances it (float seconds or a datetime)
+"""
+
+from datetime import datetime, timedelta
+
+
+class FakeClock:
+    def __init__(self, t=0.0): self.t = t
+    def __call__(self): return self.t
+
+    def advance(self, seconds):
+        self.t += timedelta(seconds=seconds) if isinstance(self.t, datetime) else seconds
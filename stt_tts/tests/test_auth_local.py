@@ -0,0 +1,210 @@
+"""
+test_auth_local.py — Unit tests for gateway/auth_local.py
+  • LocalTokenVerifier: signature, type, expiry, revoked jti, inactive user
+  • enabled: needs a key, and a live revocation feed unless require_feed=False
+  • UserStatusCache: TTL, single-flight fetch, errors not cached
+  • RevocationFeed: token / user events, expired jtis pruned
+
+Run:
+    pytest tests/test_auth_local.py -v
+"""
+
+import sys
+import os
+import asyncio
+import uuid
+import pytest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "gateway"))
+
+from jose import jwt  # noqa
+from auth_local import LocalTokenVerifier, UserStatusCache, RevocationFeed  # noqa
+from conftest import FakeClock  # noqa
+
+SECRET = "test-secret-key-for-unit-tests-only"
+
+
+def _token(sub="user-1", kind="access", minutes=30, secret=SECRET, jti=None):
+    now = datetime.now(timezone.utc)
+    return jwt.encode({
+        "sub": sub, "email": "a@b.com", "roles": ["user"], "type": kind,
+        "jti": jti or str(uuid.uuid4()), "iat": now,
+        "exp": now + timedelta(minutes=minutes),
+    }, secret, algorithm="HS256")
+
+
+class FakeStatus:
+    """fetch_status stand-in: counts calls, configurable answers / failures."""
+
+    def __init__(self, active=True, fail=False, delay=0.0):
+        self.active = active
+        self.fail   = fail
+        self.delay  = delay
+        self.calls  = 0
+
+    async def __call__(self, user_id):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("auth down")
+        return self.active
+
+
+def _verifier(status=None, **kw):
+    kw.setdefault("require_feed", False)
+    return LocalTokenVerifier(status or FakeStatus(), secret=SECRET, **kw)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  LocalTokenVerifier Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.asyncio
+class TestLocalTokenVerifier:
+
+    async def test_valid_token_returns_user(self):
+        user = await _verifier().verify(_token())
+        assert user["id"] == "user-1"
+        assert user["email"] == "a@b.com"
+        assert user["is_active"] is True
+
+    async def test_wrong_secret_rejected(self):
+        assert await _verifier().verify(_token(secret="other")) is None
+
+    async def test_garbage_rejected(self):
+        assert await _verifier().verify("not.a.jwt") is None
+
+    async def test_refresh_token_rejected(self):
+        assert await _verifier().verify(_token(kind="refresh")) is None
+
+    async def test_expired_rejected(self):
+        assert await _verifier().verify(_token(minutes=-1)) is None
+
+    async def test_revoked_jti_rejected(self):
+        v = _verifier()
+        jti = str(uuid.uuid4())
+        v.feed.apply({"type": "token", "jti": jti,
+                      "exp": (datetime.now(timezone.utc) + timedelta(minutes=30)).timestamp()})
+        assert await v.verify(_token(jti=jti)) is None
+        assert await v.verify(_token()) is not None
+
+    async def test_inactive_user_rejected(self):
+        assert await _verifier(FakeStatus(active=False)).verify(_token()) is None
+
+    async def test_status_fetched_once_per_ttl(self):
+        status = FakeStatus()
+        v = _verifier(status)
+        for _ in range(5):
+            assert await v.verify(_token()) is not None
+        assert status.calls == 1
+
+    async def test_user_event_forces_refetch(self):
+        status = FakeStatus()
+        v = _verifier(status)
+        await v.verify(_token())
+        status.active = False
+        v.feed.apply({"type": "user", "user_id": "user-1"})
+        assert await v.verify(_token()) is None
+        assert status.calls == 2
+
+    async def test_status_error_propagates(self):
+        with pytest.raises(RuntimeError):
+            await _verifier(FakeStatus(fail=True)).verify(_token())
+
+
+class TestEnabled:
+
+    def test_disabled_without_secret(self):
+        assert LocalTokenVerifier(FakeStatus(), secret="", require_feed=False).enabled is False
+
+    def test_enabled_without_feed_when_not_required(self):
+        assert _verifier().enabled is True
+
+    def test_requires_live_feed_by_default(self):
+        v = _verifier(require_feed=True)
+        assert v.enabled is False
+        v.feed.live = True
+        assert v.enabled is True
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  UserStatusCache Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.asyncio
+class TestUserStatusCache:
+
+    async def test_ttl_expiry_refetches(self):
+        status, clock = FakeStatus(), FakeClock()
+        cache = UserStatusCache(status, ttl_s=10.0, clock=clock)
+        await cache.is_active("u")
+        clock.t = 9.9
+        await cache.is_active("u")
+        assert status.calls == 1
+        clock.t = 10.0
+        await cache.is_active("u")
+        assert status.calls == 2
+
+    async def test_concurrent_misses_share_one_fetch(self):
+        status = FakeStatus(delay=0.02)
+        cache = UserStatusCache(status)
+        results = await asyncio.gather(*(cache.is_active("u") for _ in range(10)))
+        assert results == [True] * 10
+        assert status.calls == 1
+
+    async def test_errors_are_not_cached(self):
+        status = FakeStatus(fail=True)
+        cache = UserStatusCache(status)
+        with pytest.raises(RuntimeError):
+            await cache.is_active("u")
+        status.fail = False
+        assert await cache.is_active("u") is True
+        assert status.calls == 2
+
+    async def test_concurrent_waiters_see_error(self):
+        status = FakeStatus(fail=True, delay=0.02)
+        cache = UserStatusCache(status)
+        results = await asyncio.gather(*(cache.is_active("u") for _ in range(3)),
+                                       return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert status.calls == 1
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  RevocationFeed Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestRevocationFeed:
+
+    def _feed(self, t=1000.0):
+        clock = FakeClock(t)
+        return RevocationFeed(UserStatusCache(FakeStatus()), clock=clock), clock
+
+    def test_unknown_jti_not_revoked(self):
+        feed, _ = self._feed()
+        assert feed.is_revoked("x") is False
+        assert feed.is_revoked(None) is False
+
+    def test_revoked_until_exp(self):
+        feed, clock = self._feed()
+        feed.apply({"type": "token", "jti": "j1", "exp": 1060.0})
+        assert feed.is_revoked("j1") is True
+        clock.t = 1060.0
+        assert feed.is_revoked("j1") is False
+        assert "j1" not in feed._revoked
+
+    def test_prune_drops_expired(self):
+        feed, clock = self._feed()
+        feed.apply({"type": "token", "jti": "old", "exp": 1001.0})
+        feed.apply({"type": "token", "jti": "new", "exp": 2000.0})
+        clock.t = 1500.0
+        feed._prune()
+        assert set(feed._revoked) == {"new"}
+
+    def test_malformed_events_ignored(self):
+        feed, _ = self._feed()
+        feed.apply({"type": "token"})
+        feed.apply({"type": "other", "jti": "x"})
+        assert feed._revoked == {}
@@ -1,6 +1,10 @@
 """
 test_cag_config.py — Unit tests for cag/cag_config.py
   • CAGConfig defaults, presets, validation
+  • KV quantization: generate() kwargs, memory estimate, per-preset choice
+  • Speculative decoding: validation, prompt-lookup kwargs, draft memory,
+    CAG_PRESET + CAG_SPECULATIVE
+  • Per-prefix system prompts: CAG_TENANT_PROMPTS parsing, unknown prefixes
 
 Run:
     pytest tests/test_cag_config.py -v
@@ -12,7 +16,7 @@ import pytest
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "cag"))
 
-from cag_config import CAGConfig, COMPRESSED_SYSTEM_PROMPT  # noqa
+from cag_config import CAGConfig, COMPRESSED_SYSTEM_PROMPT, get_config_preset  # noqa
 
 
 class TestCompressedSystemPrompt:
@@ -85,6 +89,15 @@ class TestCAGConfig:
         cfg = CAGConfig()
         assert cfg.max_knowledge_entries == 50_000
 
+    def test_rebuild_limits(self):
+        cfg = CAGConfig()
+        assert cfg.rebuild_chunk_tokens == 512
+        assert cfg.rebuild_min_free_mb == 768
+        with pytest.raises(ValueError):
+            CAGConfig(rebuild_chunk_tokens=0)
+        with pytest.raises(ValueError):
+            CAGConfig(rebuild_min_free_mb=-1)
+
     def test_custom_values(self):
         cfg = CAGConfig(
             max_new_tokens=256,
@@ -94,3 +107,112 @@ class TestCAGConfig:
         assert cfg.max_new_tokens == 256
         assert cfg.max_context_tokens == 2048
         assert cfg.use_4bit is False
+
+
+class TestKVQuant:
+
+    def test_default_off(self):
+        cfg = CAGConfig()
+        assert cfg.kv_cache_quant == "none"
+        assert cfg.get_kv_cache_kwargs() == {}
+        assert "cache_implementation" not in cfg.get_generation_config_dict()
+
+    def test_invalid_mode(self):
+        with pytest.raises(ValueError):
+            CAGConfig(kv_cache_quant="int3")
+
+    def test_generation_kwargs(self):
+        kw = CAGConfig(kv_cache_quant="int4", kv_quant_residual_tokens=64).get_kv_cache_kwargs()
+        assert kw["cache_implementation"] == "quantized"
+        assert kw["cache_config"] == {"backend": "quanto", "nbits": 4, "residual_length": 64}
+        assert CAGConfig(kv_cache_quant="int8").get_kv_cache_kwargs()["cache_config"]["nbits"] == 8
+
+    def test_memory_estimate(self):
+        fp16 = CAGConfig().kv_cache_mb()
+        assert 400 < fp16 < 500            # 4096 tokens × ~112 KB
+        assert CAGConfig(kv_cache_quant="int8").kv_cache_mb() < fp16 * 0.55
+        assert CAGConfig(kv_cache_quant="int4").kv_cache_mb() < fp16 * 0.3
+
+    def test_presets(self):
+        assert get_config_preset("default").kv_cache_quant == "int8"
+        assert get_config_preset("fast").kv_cache_quant == "none"
+        for name in ("default", "large", "fast", "safe"):
+            get_config_preset(name).validate_for_gpu()
+
+    def test_preset_override(self):
+        cfg = get_config_preset("safe", kv_cache_quant="int4")
+        assert cfg.kv_cache_quant == "int4"
+        assert cfg.max_context_tokens == 4_000
+
+    def test_unknown_preset(self):
+        with pytest.raises(ValueError):
+            get_config_preset("huge")
+
+
+class TestSpeculative:
+
+    def test_default_off(self):
+        cfg = CAGConfig()
+        assert cfg.speculative_mode == "none"
+        assert cfg.draft_model_mb() == 0.0
+        assert "prompt_lookup_num_tokens" not in cfg.get_generation_config_dict()
+
+    def test_invalid_mode(self):
+        with pytest.raises(ValueError):
+            CAGConfig(speculative_mode="medusa")
+        with pytest.raises(ValueError):
+            CAGConfig(speculative_mode="draft", num_draft_tokens=0)
+
+    def test_needs_fp16_kv(self):
+        with pytest.raises(ValueError, match="kv_cache_quant"):
+            CAGConfig(speculative_mode="prompt_lookup", kv_cache_quant="int8")
+
+    def test_prompt_lookup_kwargs(self):
+        cfg = CAGConfig(speculative_mode="prompt_lookup", num_draft_tokens=8, prompt_lookup_max_ngram=2)
+        assert cfg.get_prompt_lookup_kwargs() == {"prompt_lookup_num_tokens": 8, "max_matching_ngram_size": 2}
+        assert cfg.get_generation_config_dict()["prompt_lookup_num_tokens"] == 8
+
+    def test_draft_memory(self):
+        cfg = CAGConfig(speculative_mode="draft")
+        assert 900 < cfg.draft_model_mb() < 1100
+        assert CAGConfig(speculative_mode="prompt_lookup").draft_model_mb() == 0.0
+        assert CAGConfig(speculative_mode="ngram").draft_model_mb() == 0.0
+        get_config_preset("default", kv_cache_quant="none", speculative_mode="draft").validate_for_gpu()
+
+    def test_preset_from_env(self, monkeypatch):
+        monkeypatch.setenv("CAG_PRESET", "default")       # int8 KV on its own
+        monkeypatch.setenv("CAG_SPECULATIVE", "ngram")
+        monkeypatch.setenv("CAG_DRAFT_MODEL_ID", "org/tiny-draft")
+        monkeypatch.delenv("CAG_KV_QUANT", raising=False)
+        cfg = CAGConfig.from_env()
+        assert cfg.speculative_mode == "ngram"
+        assert cfg.kv_cache_quant == "none"
+        assert cfg.draft_model_id == "org/tiny-draft"
+
+    def test_preset_from_env_explicit_kv_quant(self, monkeypatch):
+        monkeypatch.setenv("CAG_PRESET", "default")
+        monkeypatch.setenv("CAG_SPECULATIVE", "ngram")
+        monkeypatch.setenv("CAG_KV_QUANT", "int8")
+        with pytest.raises(ValueError, match="kv_cache_quant"):
+            CAGConfig.from_env()
+
+
+class TestTenantPrompts:
+
+    def test_from_env(self, monkeypatch):
+        monkeypatch.delenv("CAG_PRESET", raising=False)
+        monkeypatch.setenv("CAG_TENANTS", "acme=/data/acme.json")
+        monkeypatch.setenv("CAG_TENANT_PROMPTS", "acme=/data/acme_prompt.txt, default=/data/nova.txt")
+        cfg = CAGConfig.from_env()
+        assert cfg.tenant_system_prompts == {"acme": "/data/acme_prompt.txt", "default": "/data/nova.txt"}
+
+    def test_unknown_prefix(self):
+        with pytest.raises(ValueError, match="globex"):
+            CAGConfig(tenant_knowledge_paths={"acme": "a.json"},
+                      tenant_system_prompts={"globex": "g.txt"})
+
+    def test_invalid_entry_names_variable(self, monkeypatch):
+        monkeypatch.delenv("CAG_PRESET", raising=False)
+        monkeypatch.setenv("CAG_TENANT_PROMPTS", "acme")
+        with pytest.raises(ValueError, match="CAG_TENANT_PROMPTS"):
+            CAGConfig.from_env()
@@ -0,0 +1,167 @@
+"""
+test_db_pool.py — Unit tests for monitoring/db_pool.py
+  • pool_settings: defaults, shared env, service-prefixed override, kwargs
+  • gauges follow checked-out / idle / overflow connections
+  • checkout wait histogram observed, timeout counter on an exhausted pool
+  • "idle" pre-ping replaces a dead connection; "never" leaves it alone
+  • async engines get the same instrumented pool
+
+Run:
+    pytest tests/test_db_pool.py -v
+"""
+
+import sys
+import os
+import time
+import pytest
+from prometheus_client import CollectorRegistry
+from sqlalchemy import exc, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from monitoring.db_pool import (  # noqa
+    create_pooled_engine, pool_settings, pool_status,
+)
+
+
+@pytest.fixture
+def registry():
+    return CollectorRegistry()
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'pool.db'}"
+
+
+def _value(registry, name, service="test"):
+    return registry.get_sample_value(name, {"service": service})
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Settings Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestPoolSettings:
+
+    def test_defaults(self, monkeypatch):
+        for k in ("DB_POOL_SIZE", "DB_PRE_PING", "SVC_DB_POOL_SIZE"):
+            monkeypatch.delenv(k, raising=False)
+        cfg = pool_settings("svc")
+        assert cfg["pool_size"] == 5
+        assert cfg["max_overflow"] == 10
+        assert cfg["pre_ping"] == "idle"
+
+    def test_service_prefix_wins(self, monkeypatch):
+        monkeypatch.setenv("DB_POOL_SIZE", "8")
+        monkeypatch.setenv("SESSION_CHAT_DB_POOL_SIZE", "20")
+        assert pool_settings("session_chat")["pool_size"] == 20
+        assert pool_settings("messages")["pool_size"] == 8
+
+    def test_kwargs_win_over_env(self, monkeypatch):
+        monkeypatch.setenv("DB_MAX_OVERFLOW", "3")
+        assert pool_settings("svc", max_overflow=0)["max_overflow"] == 0
+
+    def test_unknown_pre_ping_falls_back_to_always(self, monkeypatch):
+        monkeypatch.setenv("DB_PRE_PING", "sometimes")
+        assert pool_settings("svc")["pre_ping"] == "always"
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Metrics Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestPoolMetrics:
+
+    def test_gauges_track_checkouts(self, db_url, registry):
+        engine = create_pooled_engine(db_url, "test", registry=registry,
+                                      pool_size=1, max_overflow=2)
+        assert _value(registry, "db_pool_size") == 1
+        a, b = engine.connect(), engine.connect()
+        assert _value(registry, "db_pool_connections_in_use") == 2
+        assert _value(registry, "db_pool_overflow_in_use") == 1
+        assert pool_status(engine)["in_use"] == 2
+        a.close(); b.close()
+        assert _value(registry, "db_pool_connections_in_use") == 0
+        assert _value(registry, "db_pool_overflow_in_use") == 0
+        engine.dispose()
+
+    def test_checkout_wait_observed(self, db_url, registry):
+        engine = create_pooled_engine(db_url, "test", registry=registry)
+        for _ in range(3):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        assert _value(registry, "db_pool_checkout_wait_seconds_count") == 3
+        engine.dispose()
+
+    def test_timeout_counted(self, db_url, registry):
+        engine = create_pooled_engine(db_url, "test", registry=registry,
+                                      pool_size=1, max_overflow=0, pool_timeout=0.05)
+        held = engine.connect()
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        assert _value(registry, "db_pool_checkout_timeouts_total") == 1
+        held.close()
+        engine.dispose()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Pre-ping Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _kill_pooled_connection(engine):
+    """Close the DBAPI connection under the pool's only idle record."""
+    with engine.connect() as conn:
+        raw = conn.connection.dbapi_connection
+    raw.close()
+    return raw
+
+
+class TestPrePing:
+
+    def test_idle_ping_replaces_dead_connection(self, db_url, registry):
+        engine = create_pooled_engine(db_url, "test", registry=registry,
+                                      pool_size=1, pre_ping="idle", pre_ping_idle_s=0)
+        dead = _kill_pooled_connection(engine)
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT 1")).scalar() == 1
+            assert conn.connection.dbapi_connection is not dead
+        assert _value(registry, "db_pool_pre_ping_failures_total") == 1
+        engine.dispose()
+
+    def test_recently_used_connection_not_pinged(self, db_url, registry):
+        engine = create_pooled_engine(db_url, "test", registry=registry,
+                                      pool_size=1, pre_ping="idle", pre_ping_idle_s=60)
+        _kill_pooled_connection(engine)
+        with pytest.raises(exc.DBAPIError):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        assert _value(registry, "db_pool_pre_ping_failures_total") == 0
+        engine.dispose()
+
+    def test_never_mode_installs_no_ping(self, db_url, registry):
+        engine = create_pooled_engine(db_url, "test", registry=registry,
+                                      pool_size=1, pre_ping="never", pre_ping_idle_s=0)
+        _kill_pooled_connection(engine)
+        time.sleep(0.01)
+        with pytest.raises(exc.DBAPIError):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        engine.dispose()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Async Engine Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.asyncio
+class TestAsyncEngine:
+
+    async def test_async_pool_instrumented(self, tmp_path, registry):
+        engine = create_pooled_engine(f"sqlite+aiosqlite:///{tmp_path / 'a.db'}", "test",
+                                      is_async=True, registry=registry, pool_size=2)
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("SELECT 1"))).scalar() == 1
+            assert _value(registry, "db_pool_connections_in_use") == 1
+        assert _value(registry, "db_pool_checkout_wait_seconds_count") == 1
+        await engine.dispose()
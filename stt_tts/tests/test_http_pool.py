@@ -0,0 +1,252 @@
+"""
+test_http_pool.py — Unit tests for gateway/http_pool.py
+  • CircuitBreaker: open after N failures, half-open probe, close on success
+  • ServiceClient: breaker integration, 5xx accounting, connect-vs-reuse counts
+  • HTTPPool: register, stats
+
+Run:
+    pytest tests/test_http_pool.py -v
+"""
+
+import sys
+import os
+import asyncio
+import pytest
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "gateway"))
+
+from http_pool import CircuitBreaker, CircuitOpenError, ServiceClient, HTTPPool  # noqa
+from conftest import FakeClock  # noqa
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  CircuitBreaker Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestCircuitBreaker:
+
+    def test_starts_closed(self):
+        b = CircuitBreaker("x")
+        assert b.state == CircuitBreaker.CLOSED
+        assert b.allow() is True
+
+    def test_opens_after_threshold(self):
+        b = CircuitBreaker("x", failure_threshold=3)
+        for _ in range(3):
+            b.record_failure()
+        assert b.state == CircuitBreaker.OPEN
+        assert b.allow() is False
+
+    def test_success_resets_failure_count(self):
+        b = CircuitBreaker("x", failure_threshold=3)
+        b.record_failure(); b.record_failure()
+        b.record_success()
+        b.record_failure(); b.record_failure()
+        assert b.state == CircuitBreaker.CLOSED
+
+    def test_half_open_allows_single_probe(self):
+        clock = FakeClock()
+        b = CircuitBreaker("x", failure_threshold=1, reset_timeout_s=5.0, clock=clock)
+        b.record_failure()
+        assert b.allow() is False
+        clock.t = 5.0
+        assert b.state == CircuitBreaker.HALF_OPEN
+        assert b.allow() is True
+        assert b.allow() is False      # second caller rejected while probe runs
+
+    def test_probe_success_closes(self):
+        clock = FakeClock()
+        b = CircuitBreaker("x", failure_threshold=1, reset_timeout_s=1.0, clock=clock)
+        b.record_failure()
+        clock.t = 1.0
+        assert b.allow()
+        b.record_success()
+        assert b.state == CircuitBreaker.CLOSED
+
+    def test_probe_failure_reopens(self):
+        clock = FakeClock()
+        b = CircuitBreaker("x", failure_threshold=1, reset_timeout_s=1.0, clock=clock)
+        b.record_failure()
+        clock.t = 1.0
+        assert b.allow()
+        b.record_failure()
+        assert b.state == CircuitBreaker.OPEN
+        assert b.allow() is False
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  ServiceClient Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _mock_client(handler, **kw):
+    return ServiceClient("svc", "http://svc", transport=httpx.MockTransport(handler), **kw)
+
+
+@pytest.mark.asyncio
+class TestServiceClient:
+
+    async def test_request_returns_response(self):
+        svc = _mock_client(lambda req: httpx.Response(200, json={"ok": True}))
+        resp = await svc.get("/x")
+        assert resp.json() == {"ok": True}
+        await svc.close()
+
+    async def test_client_is_reused_across_calls(self):
+        svc = _mock_client(lambda req: httpx.Response(200))
+        first = svc.client
+        await svc.get("/a")
+        await svc.get("/b")
+        assert svc.client is first
+        await svc.close()
+
+    async def test_5xx_counts_as_failure_and_opens_breaker(self):
+        svc = _mock_client(lambda req: httpx.Response(503),
+                           breaker=CircuitBreaker("svc", failure_threshold=2))
+        await svc.get("/x")
+        await svc.get("/x")
+        with pytest.raises(CircuitOpenError):
+            await svc.get("/x")
+        assert svc.stats()["breaker"] == CircuitBreaker.OPEN
+        await svc.close()
+
+    async def test_circuit_open_is_request_error(self):
+        """Existing `except httpx.RequestError` handlers must catch breaker rejections."""
+        assert issubclass(CircuitOpenError, httpx.RequestError)
+
+    async def test_transport_error_records_failure(self):
+        def handler(req):
+            raise httpx.ConnectError("refused", request=req)
+        svc = _mock_client(handler, breaker=CircuitBreaker("svc", failure_threshold=1))
+        with pytest.raises(httpx.ConnectError):
+            await svc.post("/x")
+        assert svc.failures == 1
+        with pytest.raises(CircuitOpenError):
+            await svc.post("/x")
+        await svc.close()
+
+    async def test_4xx_is_not_a_failure(self):
+        svc = _mock_client(lambda req: httpx.Response(404),
+                           breaker=CircuitBreaker("svc", failure_threshold=1))
+        await svc.get("/x")
+        await svc.get("/x")
+        assert svc.failures == 0
+        await svc.close()
+
+    async def _half_open_svc(self, handler):
+        clock = FakeClock()
+        svc = _mock_client(handler, breaker=CircuitBreaker("svc", failure_threshold=1,
+                                                           reset_timeout_s=1.0, clock=clock))
+        svc.breaker.record_failure()
+        clock.t = 1.0
+        assert svc.breaker.state == CircuitBreaker.HALF_OPEN
+        return svc
+
+    async def test_cancelled_probe_releases_half_open(self):
+        hang = asyncio.Event()
+
+        async def handler(req):
+            if req.url.path == "/slow":
+                await hang.wait()
+            return httpx.Response(200)
+
+        svc = await self._half_open_svc(handler)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(svc.get("/slow"), 0.05)
+        assert svc.breaker.state == CircuitBreaker.HALF_OPEN
+        await svc.get("/ok")                # next call is allowed to probe
+        assert svc.breaker.state == CircuitBreaker.CLOSED
+        await svc.close()
+
+    async def test_cancelled_stream_probe_releases_half_open(self):
+        hang = asyncio.Event()
+
+        async def handler(req):
+            await hang.wait()
+            return httpx.Response(200)
+
+        svc = await self._half_open_svc(handler)
+
+        async def _open():
+            async with svc.stream("POST", "/chat/stream"):
+                pass
+
+        task = asyncio.create_task(_open())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert svc.breaker.allow() is True
+        await svc.close()
+
+    async def test_stream_yields_response(self):
+        svc = _mock_client(lambda req: httpx.Response(200, text="data: a\n\ndata: b\n\n"))
+        async with svc.stream("POST", "/chat/stream") as resp:
+            lines = [l async for l in resp.aiter_lines() if l]
+        assert lines == ["data: a", "data: b"]
+        await svc.close()
+
+    async def test_keepalive_connect_then_reuse(self):
+        """Against a real socket: first call connects, later calls reuse it."""
+        async def _serve(reader, writer):
+            try:
+                while True:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                    if not head:
+                        break
+                    writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n"
+                                 b"Connection: keep-alive\r\n\r\nok")
+                    await writer.drain()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(_serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        svc = ServiceClient("local", f"http://127.0.0.1:{port}")
+        try:
+            for _ in range(5):
+                resp = await svc.get("/")
+                assert resp.status_code == 200
+            assert svc.connects == 1
+            assert svc.reuses == 4
+        finally:
+            await svc.close()
+            server.close()
+            await server.wait_closed()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  HTTPPool Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.asyncio
+class TestHTTPPool:
+
+    async def test_register_and_lookup(self):
+        pool = HTTPPool()
+        svc = pool.register("auth", "http://auth")
+        assert pool["auth"] is svc
+        assert "auth" in pool
+        assert "cag" not in pool
+
+    async def test_register_same_url_is_idempotent(self):
+        pool = HTTPPool()
+        a = pool.register("auth", "http://auth")
+        b = pool.register("auth", "http://auth")
+        assert a is b
+
+    async def test_stats_shape(self):
+        pool = HTTPPool()
+        pool.register("auth", "http://auth")
+        stats = pool.stats()
+        assert set(stats["auth"]) == {"base_url", "connects", "reuses", "failures", "breaker"}
+
+    async def test_start_and_close(self):
+        pool = HTTPPool()
+        svc = pool.register("auth", "http://auth")
+        await pool.start()
+        assert svc._client is not None
+        await pool.close()
+        assert svc._client is None
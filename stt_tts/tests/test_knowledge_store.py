@@ -2,6 +2,9 @@
 test_knowledge_store.py — Unit tests for cag/knowledge_store.py
   • SolutionEntry: to_compact_string
   • SolutionKnowledgeStore: load, build, dedup (without requiring real tokenizer)
+  • Streaming loader: byte offsets, chunk boundaries, JSONL, truncated input
+  • KnowledgeIndex: packing matches the old selection, on-disk reuse/invalidation
+  • Exact packing: fills the budget, counts cached per tokenizer and entry hash
 
 Run:
     pytest tests/test_knowledge_store.py -v
@@ -197,3 +200,208 @@ class TestSolutionKnowledgeStore:
                 store.load_from_sources()
         finally:
             os.unlink(path)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Streaming Loader / Index Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _entry(i, keyword=None, problem=None):
+    return {
+        "user_problem": problem or f"Problem {i} " + "x" * (i % 7),
+        "problem_keywords": [keyword or f"kw{i}"],
+        "solution_name": f"Solution {i}",
+        "solution_description": f"Description for solution {i}",
+        "key_benefits": [f"Benefit {i}a", f"Benefit {i}b"],
+        "pricing_model": f"${i}0/month",
+        "implementation_time": f"{i} weeks",
+        "target_industries": [f"Industry{i % 3}"],
+    }
+
+
+def _legacy_build(entries, available_tokens, max_entries=50000):
+    """The pre-index packing: dedup by category, shortest-first greedy."""
+    seen = {}
+    for e in entries:
+        seen.setdefault(e.category(), e)
+    parts, current = [], 0
+    for e in sorted(seen.values(), key=lambda e: len(e.user_problem) + len(e.solution_description)):
+        formatted = e.to_compact_string()
+        est = (len(formatted) + 1) / 4.0
+        if current + est > available_tokens:
+            break
+        parts.append(formatted)
+        current += est
+        if len(parts) >= max_entries:
+            break
+    return "\n\n".join(parts)
+
+
+class TestStreamingLoader:
+
+    def _store(self, path, **cfg):
+        config = FakeConfig(str(path))
+        config.max_context_tokens = cfg.pop("max_context_tokens", 4096)
+        for k, v in cfg.items():
+            setattr(config, k, v)
+        return SolutionKnowledgeStore(FakeTokenizer(), config)
+
+    def test_json_offsets_read_back_exact_entries(self, tmp_path):
+        path = tmp_path / "s.json"
+        items = [_entry(i) for i in range(20)]
+        items[3]["solution_description"] = "Ünïcødé — multi-byte ✓"
+        path.write_text(json.dumps(items, ensure_ascii=False, indent=2), encoding="utf-8")
+        store = self._store(path)
+        assert store.load_from_sources() == 20
+        entries = store.entries
+        assert [e.solution_name for e in entries] == [f"Solution {i}" for i in range(20)]
+        assert entries[3].solution_description == "Ünïcødé — multi-byte ✓"
+        assert entries[5].metadata == {"source": "json", "index": 5}
+
+    def test_small_chunks_cross_entry_boundaries(self, tmp_path):
+        import knowledge_store
+        path = tmp_path / "s.json"
+        items = [_entry(i) for i in range(10)]
+        path.write_text(json.dumps({"version": 2, "solutions": items}), encoding="utf-8")
+        with open(path, encoding="utf-8", newline="") as f:
+            parsed = [item for _, _, item in knowledge_store._JsonArrayStream(f, chunk_chars=7)]
+        assert parsed == items
+
+    def test_solutions_wrapper_loaded(self, tmp_path):
+        path = tmp_path / "s.json"
+        path.write_text(json.dumps({"meta": {"n": [1, 2]}, "solutions": [_entry(0), _entry(1)]}))
+        assert self._store(path).load_from_sources() == 2
+
+    def test_jsonl_skips_bad_lines(self, tmp_path):
+        path = tmp_path / "s.jsonl"
+        lines = [json.dumps(_entry(0)), "{not json", "", json.dumps(_entry(1))]
+        path.write_text("\r\n".join(lines) + "\n", encoding="utf-8")
+        store = self._store(path)
+        assert store.load_from_sources() == 2
+        assert store.index.skipped == 1
+        assert [e.metadata["line_number"] for e in store.entries] == [1, 4]
+
+    def test_truncated_json_raises(self, tmp_path):
+        path = tmp_path / "s.json"
+        path.write_text(json.dumps([_entry(0), _entry(1)])[:-20])
+        with pytest.raises(ValueError, match="Invalid JSON"):
+            self._store(path).load_from_sources()
+
+    def test_pack_matches_legacy_selection(self, tmp_path):
+        items = [_entry(i, keyword=f"kw{i % 40}") for i in range(200)]
+        path = tmp_path / "s.json"
+        path.write_text(json.dumps(items))
+        store = self._store(path, max_context_tokens=1200, cache_truncation_buffer=50,
+                            exact_token_packing=False)
+        store.load_from_sources()
+        text = store.build_knowledge_text()
+        assert text == _legacy_build(store.entries, 1200 - 500)
+        assert store.get_coverage_stats()["unique_industries"] == 3
+
+    def test_index_reused_until_source_changes(self, tmp_path):
+        path = tmp_path / "s.json"
+        path.write_text(json.dumps([_entry(i) for i in range(5)]))
+        first = self._store(path)
+        first.load_from_sources()
+        assert os.path.exists(f"{path}.idx")
+
+        second = self._store(path)
+        second._load_from_json = None          # would fail if parsing ran
+        assert second.load_from_sources() == 5
+        assert list(second.index.columns["offset"]) == list(first.index.columns["offset"])
+        assert second.index.categories == first.index.categories
+
+        path.write_text(json.dumps([_entry(i) for i in range(7)]))
+        assert self._store(path).load_from_sources() == 7
+
+    def test_index_persistence_disabled(self, tmp_path):
+        path = tmp_path / "s.json"
+        path.write_text(json.dumps([_entry(0)]))
+        self._store(path, persist_knowledge_index=False).load_from_sources()
+        assert not os.path.exists(f"{path}.idx")
+
+    def test_corrupt_index_rebuilt(self, tmp_path):
+        path = tmp_path / "s.json"
+        path.write_text(json.dumps([_entry(0), _entry(1)]))
+        idx = tmp_path / "custom.idx"
+        idx.write_bytes(b"garbage")
+        store = self._store(path, knowledge_index_path=str(idx))
+        assert store.load_from_sources() == 2
+        assert idx.read_bytes().startswith(b"{")
+
+
+class CountingTokenizer(FakeTokenizer):
+    """FakeTokenizer with a batch __call__ that records how many texts it saw."""
+    name_or_path = "fake/counting"
+
+    def __init__(self):
+        self.batched = 0
+
+    def __len__(self):
+        return 32000
+
+    def __call__(self, texts, add_special_tokens=True, return_attention_mask=True):
+        self.batched += len(texts)
+        return {"input_ids": [self.encode(t, add_special_tokens) for t in texts]}
+
+
+class TestExactPacking:
+
+    def _store(self, path, tokenizer=None, **cfg):
+        config = FakeConfig(str(path))
+        config.max_context_tokens = cfg.pop("max_context_tokens", 1200)
+        config.cache_truncation_buffer = 50
+        for k, v in cfg.items():
+            setattr(config, k, v)
+        store = SolutionKnowledgeStore(tokenizer or CountingTokenizer(), config)
+        store.load_from_sources()
+        return store
+
+    def _catalog(self, tmp_path, n=200):
+        path = tmp_path / "s.json"
+        path.write_text(json.dumps([_entry(i, keyword=f"kw{i % 60}",
+                                           problem=f"Problem {i} " + "y" * (i * 7 % 90))
+                                    for i in range(n)]))
+        return path
+
+    def test_exact_fits_budget_and_beats_estimate(self, tmp_path):
+        path = self._catalog(tmp_path)
+        estimated = self._store(path, exact_token_packing=False)
+        estimated.build_knowledge_text()
+        exact = self._store(path)
+        exact.build_knowledge_text()
+        budget = 1200 - 500
+        assert exact.token_count <= budget
+        assert exact.token_count >= estimated.token_count
+        assert exact.get_coverage_stats()["included_solutions"] >= \
+            estimated.get_coverage_stats()["included_solutions"]
+
+    def test_counts_cached_per_tokenizer(self, tmp_path):
+        path = self._catalog(tmp_path)
+        first = CountingTokenizer()
+        self._store(path, tokenizer=first).build_knowledge_text()
+        assert first.batched == 60                     # one per category
+
+        second = CountingTokenizer()
+        self._store(path, tokenizer=second).build_knowledge_text()
+        assert second.batched == 0
+
+        other = CountingTokenizer()
+        other.name_or_path = "fake/other"
+        self._store(path, tokenizer=other).build_knowledge_text()
+        assert other.batched == 60
+
+    def test_edited_entry_retokenized(self, tmp_path):
+        path = self._catalog(tmp_path, n=60)
+        self._store(path).build_knowledge_text()
+        items = json.loads(path.read_text())
+        items[5]["solution_description"] += " now with more words"
+        path.write_text(json.dumps(items))
+        tok = CountingTokenizer()
+        self._store(path, tokenizer=tok).build_knowledge_text()
+        assert tok.batched == 1
+
+    def test_encode_only_tokenizer_supported(self, tmp_path):
+        store = self._store(self._catalog(tmp_path), tokenizer=FakeTokenizer())
+        assert store.build_knowledge_text()
+        assert store.token_count <= 700
@@ -0,0 +1,156 @@
+"""
+test_knowledge_watcher.py — Unit tests for cag/knowledge_watcher.py
+  • poll(): a change fires once the file has settled (same stat on two polls),
+    never while it is still changing, never for a missing file
+  • watch(): adding a file mid-run does not fire for its current contents
+  • on_change errors are caught so the watcher keeps polling
+  • a "busy" on_change result keeps the change pending and retries it
+  • start() / stop(): background thread picks up a change
+
+Run:
+    pytest tests/test_knowledge_watcher.py -v
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "cag"))
+
+from knowledge_watcher import KnowledgeWatcher  # noqa
+
+
+def _write(path, text):
+    path.write_text(text)
+    st = os.stat(path)
+    # Bump the mtime explicitly — some filesystems have coarse timestamps
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+class _Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, name):
+        self.calls.append(name)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Poll Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestPoll:
+
+    def _watcher(self, tmp_path):
+        path = tmp_path / "kb.jsonl"
+        _write(path, "a\n")
+        rec = _Recorder()
+        return KnowledgeWatcher({"default": str(path)}, rec), path, rec
+
+    def test_unchanged_never_fires(self, tmp_path):
+        watcher, _, rec = self._watcher(tmp_path)
+        for _ in range(3):
+            watcher.poll()
+        assert rec.calls == []
+
+    def test_fires_once_after_settling(self, tmp_path):
+        watcher, path, rec = self._watcher(tmp_path)
+        _write(path, "a\nb\n")
+        watcher.poll()
+        assert rec.calls == []              # first sighting — wait for it to settle
+        watcher.poll()
+        assert rec.calls == ["default"]
+        watcher.poll()
+        assert rec.calls == ["default"]
+
+    def test_still_changing_waits(self, tmp_path):
+        watcher, path, rec = self._watcher(tmp_path)
+        _write(path, "a\nb\n")
+        watcher.poll()
+        _write(path, "a\nb\nc\n")
+        watcher.poll()
+        assert rec.calls == []
+        watcher.poll()
+        assert rec.calls == ["default"]
+
+    def test_missing_file_does_not_fire(self, tmp_path):
+        watcher, path, rec = self._watcher(tmp_path)
+        path.unlink()
+        for _ in range(3):
+            watcher.poll()
+        assert rec.calls == []
+        _write(path, "a\nb\n")
+        watcher.poll()
+        watcher.poll()
+        assert rec.calls == ["default"]
+
+    def test_watch_added_file(self, tmp_path):
+        watcher, _, rec = self._watcher(tmp_path)
+        other = tmp_path / "acme.jsonl"
+        _write(other, "x\n")
+        watcher.watch("acme", str(other))
+        watcher.poll()
+        watcher.poll()
+        assert rec.calls == []
+        _write(other, "x\ny\n")
+        watcher.poll()
+        watcher.poll()
+        assert rec.calls == ["acme"]
+
+    def test_callback_error_is_caught(self, tmp_path, capsys):
+        path = tmp_path / "kb.jsonl"
+        _write(path, "a\n")
+
+        def boom(name):
+            raise ValueError("busy")
+
+        watcher = KnowledgeWatcher({"default": str(path)}, boom)
+        _write(path, "a\nb\n")
+        watcher.poll()
+        watcher.poll()
+        assert "failed to start" in capsys.readouterr().out
+        watcher.poll()                      # already handled — no second attempt
+
+    def test_busy_is_retried(self, tmp_path):
+        path = tmp_path / "kb.jsonl"
+        _write(path, "a\n")
+        states = ["busy", "busy", "running"]
+        calls = []
+
+        def reload(name):
+            calls.append(name)
+            return {"state": states.pop(0)}
+
+        watcher = KnowledgeWatcher({"default": str(path)}, reload)
+        _write(path, "a\nb\n")
+        watcher.poll()
+        watcher.poll()
+        assert calls == ["default"]         # rebuild already running
+        watcher.poll()
+        watcher.poll()
+        assert calls == ["default"] * 3     # retried until the reload started
+        watcher.poll()
+        assert calls == ["default"] * 3
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Thread Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestThread:
+
+    def test_start_stop(self, tmp_path):
+        path = tmp_path / "kb.jsonl"
+        _write(path, "a\n")
+        rec = _Recorder()
+        watcher = KnowledgeWatcher({"default": str(path)}, rec, interval_s=0.02)
+        watcher.start()
+        try:
+            _write(path, "a\nb\n")
+            deadline = time.monotonic() + 2.0
+            while not rec.calls and time.monotonic() < deadline:
+                time.sleep(0.02)
+        finally:
+            watcher.stop()
+        assert rec.calls == ["default"]
+        assert watcher._thread is None
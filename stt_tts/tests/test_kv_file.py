@@ -0,0 +1,119 @@
+"""
+test_kv_file.py — Unit tests for the .kvf layout in cag/kv_file.py
+  • write_raw / read_header: header round trip, 64-byte aligned tensors,
+    raw bytes readable at the recorded offsets, no temp file left behind
+  • read_header rejects short, truncated, foreign and mis-sized files
+  • check_fingerprint: model / tokenizer / prompt mismatch
+
+The torch save / load path is exercised by cag/bench_kv_load.py.
+
+Run:
+    pytest tests/test_kv_file.py -v
+"""
+
+import sys
+import os
+import json
+import struct
+import pytest
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "cag"))
+
+from kv_file import ALIGN, KVFileError, check_fingerprint, read_header, write_raw  # noqa
+
+FINGERPRINT = {"model_id": "m", "tokenizer_id": "t", "prompt_hash": "abc"}
+
+
+def _write(path, extra_meta=None):
+    ids = array('q', [1, 2, 3])
+    k = array('h', range(2 * 5))
+    write_raw(str(path), dict({"fingerprint": FINGERPRINT, "layers": 1}, **(extra_meta or {})), [
+        ("input_ids", "int64", [1, 3], ids),
+        ("0.k", "float16", [1, 1, 5, 2], k),
+        ("0.k.scale", "float32", [1, 1, 1, 2], array('f', [0.5, 0.25])),
+    ])
+    return ids, k
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Layout Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestLayout:
+
+    def test_round_trip(self, tmp_path):
+        path = tmp_path / "kv.kvf"
+        ids, k = _write(path, {"storage": "int8"})
+        with open(path, "rb") as f:
+            header, data_start = read_header(f)
+            assert header["fingerprint"] == FINGERPRINT
+            assert header["storage"] == "int8"
+            assert header["tensors"]["0.k"]["shape"] == [1, 1, 5, 2]
+            t = header["tensors"]["0.k"]
+            f.seek(data_start + t["offset"])
+            assert f.read(t["nbytes"]) == k.tobytes()
+            t = header["tensors"]["input_ids"]
+            f.seek(data_start + t["offset"])
+            assert f.read(t["nbytes"]) == ids.tobytes()
+
+    def test_aligned(self, tmp_path):
+        path = tmp_path / "kv.kvf"
+        _write(path)
+        with open(path, "rb") as f:
+            header, data_start = read_header(f)
+        assert data_start % ALIGN == 0
+        assert all(t["offset"] % ALIGN == 0 for t in header["tensors"].values())
+
+    def test_no_temp_file_left(self, tmp_path):
+        _write(tmp_path / "kv.kvf")
+        assert os.listdir(tmp_path) == ["kv.kvf"]
+
+    def test_size_mismatch_on_write(self, tmp_path):
+        with pytest.raises(KVFileError):
+            write_raw(str(tmp_path / "kv.kvf"), {}, [("x", "float16", [4], array('h', [1, 2]))])
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Validation Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestValidation:
+
+    def _read(self, path):
+        with open(path, "rb") as f:
+            return read_header(f)
+
+    def test_short_file(self, tmp_path):
+        path = tmp_path / "kv.kvf"
+        path.write_bytes(b"\x01")
+        with pytest.raises(KVFileError):
+            self._read(path)
+
+    def test_truncated_data(self, tmp_path):
+        path = tmp_path / "kv.kvf"
+        _write(path)
+        path.write_bytes(path.read_bytes()[:-4])
+        with pytest.raises(KVFileError, match="truncated"):
+            self._read(path)
+
+    def test_foreign_file(self, tmp_path):
+        path = tmp_path / "kv.kvf"
+        header = json.dumps({"format": "other"}).encode()
+        path.write_bytes(struct.pack("<Q", len(header)) + header)
+        with pytest.raises(KVFileError, match="not a"):
+            self._read(path)
+
+    def test_legacy_pickle_rejected(self, tmp_path):
+        path = tmp_path / "kv.kvf"
+        path.write_bytes(b"PK\x03\x04" + b"\0" * 64)
+        with pytest.raises(KVFileError):
+            self._read(path)
+
+    def test_fingerprint(self):
+        header = {"fingerprint": FINGERPRINT}
+        check_fingerprint(header, None)
+        check_fingerprint(header, FINGERPRINT)
+        check_fingerprint(header, {"model_id": "m", "tokenizer_id": "t"})
+        with pytest.raises(KVFileError, match="prompt_hash"):
+            check_fingerprint(header, dict(FINGERPRINT, prompt_hash="new"))
@@ -0,0 +1,198 @@
+"""
+test_message_batch.py — MessageCRUD (async) against in-memory SQLite
+  • create_many: single multi-row insert, request order preserved
+  • create_many: client ids skip duplicates (across batches and within one batch)
+  • create_many: client created_at honoured, role validation
+  • list_by_session: keyset cursors, ties on created_at, bad cursor
+  • iter_session: full walk in order, page by page
+
+Run:
+    pytest tests/test_message_batch.py -v
+"""
+
+import sys
+import os
+import uuid
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+
+# messages/ uses flat `models` / `crud` names that other services share —
+# import them, then drop them from sys.modules so later test files are unaffected.
+_MSG_DIR = os.path.join(os.path.dirname(__file__), "..", "messages")
+sys.path.insert(0, _MSG_DIR)
+from models import Base       # noqa
+from crud import MessageCRUD, encode_cursor, decode_cursor  # noqa
+sys.path.remove(_MSG_DIR)
+for _name in ("models", "crud"):
+    sys.modules.pop(_name, None)
+
+
+@pytest_asyncio.fixture
+async def engine():
+    eng = create_async_engine("sqlite+aiosqlite://")
+    async with eng.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield eng
+    await eng.dispose()
+
+
+@pytest_asyncio.fixture
+async def crud(engine):
+    async with async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)() as db:
+        yield MessageCRUD(db)
+
+
+def _items(n, **kw):
+    return [{"role": "user" if i % 2 == 0 else "agent", "content": f"m{i}", **kw}
+            for i in range(n)]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  create_many Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.asyncio
+class TestCreateMany:
+
+    async def test_inserts_all_rows_in_order(self, crud):
+        sid = str(uuid.uuid4())
+        created = await crud.create_many(sid, _items(5))
+        assert [m.content for m in created] == [f"m{i}" for i in range(5)]
+        assert len(await crud.list_by_session(sid)) == 5
+
+    async def test_single_insert_statement(self, crud, engine):
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute",
+                     lambda conn, cur, stmt, *a: statements.append(stmt))
+        await crud.create_many(str(uuid.uuid4()), _items(10))
+        inserts = [s for s in statements if s.lstrip().upper().startswith("INSERT")]
+        assert len(inserts) == 1
+        assert "RETURNING" in inserts[0].upper()
+
+    async def test_retried_batch_is_skipped(self, crud):
+        sid = str(uuid.uuid4())
+        items = [dict(i, id=str(uuid.uuid4())) for i in _items(3)]
+        assert len(await crud.create_many(sid, items)) == 3
+        assert await crud.create_many(sid, items) == []
+        assert len(await crud.list_by_session(sid)) == 3
+
+    async def test_partial_overlap_inserts_only_new(self, crud):
+        sid = str(uuid.uuid4())
+        items = [dict(i, id=str(uuid.uuid4())) for i in _items(4)]
+        await crud.create_many(sid, items[:2])
+        created = await crud.create_many(sid, items)
+        assert [m.content for m in created] == ["m2", "m3"]
+
+    async def test_duplicate_ids_within_batch(self, crud):
+        sid, mid = str(uuid.uuid4()), str(uuid.uuid4())
+        created = await crud.create_many(sid, [
+            {"id": mid, "role": "user", "content": "a"},
+            {"id": mid, "role": "user", "content": "a"},
+        ])
+        assert len(created) == 1
+
+    async def test_client_id_and_timestamp_kept(self, crud):
+        sid, mid = str(uuid.uuid4()), str(uuid.uuid4())
+        ts = datetime(2024, 1, 2, 3, 4, 5)
+        [m] = await crud.create_many(sid, [{"id": mid, "role": "agent", "content": "x",
+                                      "created_at": ts}])
+        assert str(m.id) == mid
+        assert m.created_at == ts
+        assert m.to_dict()["session_id"] == sid
+
+    async def test_invalid_role_raises_before_insert(self, crud):
+        sid = str(uuid.uuid4())
+        with pytest.raises(ValueError, match="role must be"):
+            await crud.create_many(sid, [{"role": "user", "content": "ok"},
+                                   {"role": "admin", "content": "bad"}])
+        assert await crud.list_by_session(sid) == []
+
+    async def test_empty_batch(self, crud):
+        assert await crud.create_many(str(uuid.uuid4()), []) == []
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Keyset Pagination Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+async def _seed(crud, n, same_ts=False):
+    sid = str(uuid.uuid4())
+    t0 = datetime(2024, 1, 1)
+    await crud.create_many(sid, [
+        {"role": "user", "content": f"m{i}",
+         "created_at": t0 if same_ts else t0 + timedelta(seconds=i)}
+        for i in range(n)
+    ])
+    return sid
+
+
+async def _walk(crud, sid, limit):
+    seen, after = [], None
+    while True:
+        page = await crud.list_by_session(sid, limit=limit, after=after)
+        seen += page
+        if len(page) < limit:
+            return seen
+        after = encode_cursor(page[-1])
+
+
+@pytest.mark.asyncio
+class TestKeysetPagination:
+
+    async def test_cursor_round_trip(self, crud):
+        sid = await _seed(crud, 1)
+        [m] = await crud.list_by_session(sid)
+        assert decode_cursor(encode_cursor(m)) == (m.created_at, m.id)
+
+    async def test_pages_cover_session_in_order(self, crud):
+        sid = await _seed(crud, 23)
+        seen = await _walk(crud, sid, limit=5)
+        assert [m.content for m in seen] == [f"m{i}" for i in range(23)]
+
+    async def test_ties_on_created_at_broken_by_id(self, crud):
+        sid = await _seed(crud, 12, same_ts=True)
+        seen = await _walk(crud, sid, limit=5)
+        assert len(seen) == 12
+        assert len({m.id for m in seen}) == 12
+        assert [m.id for m in seen] == sorted(m.id for m in seen)
+
+    async def test_cursor_matches_offset_page(self, crud):
+        sid = await _seed(crud, 10)
+        first = await crud.list_by_session(sid, limit=4)
+        by_cursor = await crud.list_by_session(sid, limit=4, after=encode_cursor(first[-1]))
+        by_offset = await crud.list_by_session(sid, limit=4, offset=4)
+        assert [m.id for m in by_cursor] == [m.id for m in by_offset]
+
+    async def test_bad_cursor_raises_value_error(self, crud):
+        with pytest.raises(ValueError, match="invalid cursor"):
+            await crud.list_by_session(str(uuid.uuid4()), after="not-a-cursor")
+
+    async def test_iter_session_streams_everything(self, crud):
+        sid = await _seed(crud, 11)
+        out = [m.content async for m in crud.iter_session(sid, page_size=3)]
+        assert out == [f"m{i}" for i in range(11)]
+
+    async def test_iter_session_empty(self, crud):
+        out = [m async for m in crud.iter_session(str(uuid.uuid4()))]
+        assert out == []
+
+
+@pytest.mark.asyncio
+class TestDeletes:
+
+    async def test_delete_by_session_counts_rows(self, crud):
+        sid = await _seed(crud, 4)
+        assert await crud.delete_by_session(sid) == 4
+        assert await crud.list_by_session(sid) == []
+
+    async def test_delete_one(self, crud):
+        sid = await _seed(crud, 2)
+        [a, b] = await crud.list_by_session(sid)
+        assert await crud.delete(str(a.id)) is True
+        assert await crud.get_by_id(str(a.id)) is None
+        assert (await crud.get_by_id(str(b.id))).content == "m1"
+        assert await crud.delete(str(a.id)) is False
@@ -0,0 +1,79 @@
+"""
+test_ngram_lookup.py — Unit tests for cag/ngram_lookup.py (NgramIndex)
+  • propose(): longest n-gram first, latest occurrence wins, continuation
+    capped at k, nothing proposed without a match
+  • The sequence tail never matches itself; extend() makes it matchable
+    once a token follows
+  • overlay(): per-turn index looked up before its base
+  • proposed counter
+
+lookup_generate() needs torch + a model — see bench_speculative.py.
+
+Run:
+    pytest tests/test_ngram_lookup.py -v
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "cag"))
+
+from ngram_lookup import NgramIndex  # noqa
+
+# "Smart Invoice Hub costs 49 dollars" as token ids
+KNOWLEDGE = [10, 11, 12, 13, 14, 15, 99, 20, 11, 21, 22]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Index Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestNgramIndex:
+
+    def test_propose_continuation(self):
+        index = NgramIndex(KNOWLEDGE).overlay([5, 10, 11])
+        assert index.propose(3) == [12, 13, 14]
+        assert index.proposed == 3
+
+    def test_capped_at_k_and_sequence_end(self):
+        index = NgramIndex(KNOWLEDGE).overlay([21])
+        assert index.propose(5) == [22]
+        assert index.overlay([10]).propose(2) == [11, 12]
+
+    def test_longest_ngram_wins(self):
+        # 11 alone last appears before 21; "10 11" pins the earlier match
+        index = NgramIndex(KNOWLEDGE)
+        assert index.overlay([7, 11]).propose(1) == [21]
+        assert index.overlay([10, 11]).propose(1) == [12]
+
+    def test_latest_occurrence_wins(self):
+        index = NgramIndex([1, 2, 3, 1, 2, 4])
+        assert index.overlay([1, 2]).propose(1) == [4]
+
+    def test_no_match(self):
+        index = NgramIndex(KNOWLEDGE).overlay([42])
+        assert index.propose(4) == []
+        assert index.proposed == 0
+        assert index.propose(0) == []
+
+    def test_tail_never_matches_itself(self):
+        index = NgramIndex([7, 8, 9])
+        assert index.propose(2) == []
+        index.extend([7, 8])
+        assert index.propose(2) == [9, 7]
+
+    def test_overlay_before_base(self):
+        base = NgramIndex(KNOWLEDGE)
+        turn = base.overlay([11, 30, 31])           # the conversation said "11 30 31"
+        turn.extend([11])
+        assert turn.propose(2) == [30, 31]
+        assert len(base) == len(KNOWLEDGE)          # base untouched
+
+    def test_answer_extends_overlay(self):
+        turn = NgramIndex(KNOWLEDGE, max_ngram=2).overlay()
+        for token in (10, 11):
+            turn.extend([token])
+        assert turn.propose(2) == [12, 13]
+        turn.extend([12, 13])
+        assert turn.ids == [10, 11, 12, 13]
+        assert turn.propose(2) == [14, 15]
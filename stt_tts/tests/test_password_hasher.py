@@ -0,0 +1,105 @@
+"""
+test_password_hasher.py — Unit tests for user_auth/password_hasher.py
+  • hash / verify round trip through the process pool
+  • malformed and erased hashes verify False instead of raising
+  • DUMMY_HASH is a valid bcrypt hash (timing equaliser for unknown emails)
+  • backpressure: PasswordHasherBusy once workers + queue are in flight
+  • event loop stays responsive while bcrypt runs
+
+Run:
+    pytest tests/test_password_hasher.py -v
+"""
+
+import sys
+import os
+import asyncio
+import time
+import pytest
+import pytest_asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "user_auth"))
+
+from password_hasher import (  # noqa
+    DUMMY_HASH, PasswordHasher, PasswordHasherBusy, pwd_context,
+)
+
+
+@pytest_asyncio.fixture
+async def hasher():
+    h = PasswordHasher(workers=1, max_queue=1)
+    await h.start()
+    yield h
+    await h.stop()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Hash / Verify Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.asyncio
+class TestHashVerify:
+
+    async def test_round_trip(self, hasher):
+        h = await hasher.hash("MyPass123!")
+        assert h != "MyPass123!"
+        assert await hasher.verify("MyPass123!", h) is True
+        assert await hasher.verify("wrong", h) is False
+
+    async def test_pool_hash_readable_inline(self, hasher):
+        h = await hasher.hash("same")
+        assert pwd_context.verify("same", h)
+
+    async def test_erased_hash_is_false(self, hasher):
+        assert await hasher.verify("anything", "DELETED") is False
+
+    async def test_dummy_hash_is_valid_bcrypt(self, hasher):
+        assert pwd_context.identify(DUMMY_HASH) == "bcrypt"
+        assert await hasher.verify("guess", DUMMY_HASH) is False
+
+    async def test_stats_count_completed(self, hasher):
+        await hasher.verify("x", DUMMY_HASH)
+        assert hasher.stats()["completed"] == 1
+        assert hasher.stats()["in_flight"] == 0
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Backpressure Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.asyncio
+class TestBackpressure:
+
+    async def test_rejects_beyond_capacity(self, hasher):
+        results = await asyncio.gather(
+            *(hasher.verify("x", DUMMY_HASH) for _ in range(4)), return_exceptions=True
+        )
+        assert results[:2] == [False, False]
+        assert all(isinstance(r, PasswordHasherBusy) for r in results[2:])
+        assert hasher.stats()["rejected"] == 2
+
+    async def test_capacity_frees_up(self, hasher):
+        await asyncio.gather(*(hasher.verify("x", DUMMY_HASH) for _ in range(2)))
+        assert await hasher.verify("x", DUMMY_HASH) is False
+
+    async def test_queued_counts_waiting_calls(self):
+        h = PasswordHasher(workers=2, max_queue=4)
+        h.in_flight = 5
+        assert h.queued == 3
+        assert h.capacity == 6
+
+    async def test_loop_not_blocked(self, hasher):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        t0 = time.perf_counter()
+        await hasher.verify("x", DUMMY_HASH)
+        elapsed = time.perf_counter() - t0
+        task.cancel()
+        # Inline bcrypt would leave the ticker at 0 for the whole call.
+        assert ticks >= int(elapsed / 0.005 / 4)
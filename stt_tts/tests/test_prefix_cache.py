@@ -0,0 +1,236 @@
+"""
+test_prefix_cache.py — Unit tests for cag/prefix_cache.py
+  • PrefixCacheStore: put / get / peek, LRU order, spill past the GPU
+    budget, promotion on get, eviction past the CPU budget, oversize entries
+  • CPU-only device: no host tier, LRU entries are evicted directly
+  • QuantizedKV entries: budgets count the compressed size, spill / promote
+    move q and scale together
+  • parse_tenants: CAG_TENANTS parsing
+
+Tensors are stand-ins with the handful of methods the store uses, so the
+tests run without torch.
+
+Run:
+    pytest tests/test_prefix_cache.py -v
+"""
+
+import sys
+import os
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "cag"))
+
+from prefix_cache import MB, PrefixCacheStore, PrefixKey, prompt_hash  # noqa
+from kv_file import QuantizedKV  # noqa
+from cag_config import parse_tenants  # noqa
+
+
+class FakeTensor:
+    def __init__(self, nbytes, device="cuda:0", pinned=False):
+        self.nbytes = nbytes
+        self.device = device
+        self.pinned = pinned
+
+    def numel(self):
+        return self.nbytes
+
+    def element_size(self):
+        return 1
+
+    def to(self, device, non_blocking=False):
+        return FakeTensor(self.nbytes, str(device), pinned=False)
+
+    def pin_memory(self):
+        return FakeTensor(self.nbytes, self.device, pinned=True)
+
+
+def _key(name):
+    return PrefixKey("model", "tok", prompt_hash(name))
+
+
+def _put(store, name, mb=1):
+    layers = [(FakeTensor(mb * MB // 2), FakeTensor(mb * MB // 2))]
+    return store.put(_key(name), FakeTensor(8), layers, knowledge_token_count=10, label=name)
+
+
+def _tier(store, name):
+    return store.stats()["entries"][[e["label"] for e in store.stats()["entries"]].index(name)]["tier"]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Store Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestPrefixCacheStore:
+
+    def _store(self, gpu_mb=2, cpu_mb=2):
+        return PrefixCacheStore("cuda:0", gpu_mb * MB, cpu_mb * MB)
+
+    def test_put_get(self):
+        store = self._store()
+        _put(store, "a")
+        entry = store.get(_key("a"))
+        assert entry.label == "a"
+        assert entry.nbytes == MB
+        assert entry.knowledge_token_count == 10
+        assert store.get(_key("missing")) is None
+        stats = store.stats()
+        assert (stats["hits"], stats["misses"]) == (1, 1)
+
+    def test_key_includes_model_and_tokenizer(self):
+        store = self._store()
+        _put(store, "a")
+        assert PrefixKey("other-model", "tok", prompt_hash("a")) not in store
+        assert PrefixKey("model", "other-tok", prompt_hash("a")) not in store
+
+    def test_spill_lru_past_gpu_budget(self):
+        store = self._store(gpu_mb=2)
+        _put(store, "a")
+        _put(store, "b")
+        _put(store, "c")
+        assert _tier(store, "a") == "host"
+        assert _tier(store, "b") == "device"
+        assert _tier(store, "c") == "device"
+        assert store.device_bytes == 2 * MB
+        assert store.host_bytes == MB
+        spilled = store._entries[_key("a")]
+        assert all(k.pinned and k.device == "cpu" for k, _ in spilled.layers)
+
+    def test_get_promotes_and_spills_next_lru(self):
+        store = self._store(gpu_mb=2)
+        for name in "abc":
+            _put(store, name)
+        entry = store.get(_key("a"))
+        assert not entry.on_host
+        assert entry.layers[0][0].device == "cuda:0"
+        assert _tier(store, "b") == "host"
+        assert store.stats()["promotions"] == 1
+        assert store.stats()["spills"] == 2
+
+    def test_recent_use_protects_from_spill(self):
+        store = self._store(gpu_mb=2)
+        _put(store, "a")
+        _put(store, "b")
+        store.get(_key("a"))
+        _put(store, "c")
+        assert _tier(store, "a") == "device"
+        assert _tier(store, "b") == "host"
+
+    def test_evict_past_cpu_budget(self):
+        store = self._store(gpu_mb=1, cpu_mb=1)
+        for name in "abc":
+            _put(store, name)
+        assert _key("a") not in store
+        assert _tier(store, "b") == "host"
+        assert _tier(store, "c") == "device"
+        assert store.stats()["evictions"] == 1
+        assert store.host_bytes == MB
+
+    def test_oversize_entry_stays_on_device(self, capsys):
+        store = self._store(gpu_mb=1)
+        _put(store, "small")
+        _put(store, "big", mb=3)
+        assert _tier(store, "big") == "device"
+        assert _tier(store, "small") == "host"
+        assert "exceeds" in capsys.readouterr().out
+
+    def test_peek_leaves_lru_and_tier_alone(self):
+        store = self._store(gpu_mb=2)
+        for name in "abc":
+            _put(store, name)
+        entry = store.peek(_key("a"))
+        assert entry.on_host
+        assert store.keys()[0] == _key("a")
+        assert store.stats()["hits"] == 0
+        assert store.peek(_key("missing")) is None
+
+    def test_put_replaces_same_key(self):
+        store = self._store()
+        _put(store, "a")
+        _put(store, "a")
+        assert len(store) == 1
+        assert store.device_bytes == MB
+
+    def test_discard_and_clear(self):
+        store = self._store(gpu_mb=1)
+        _put(store, "a")
+        _put(store, "b")
+        assert store.discard(_key("a"))
+        assert not store.discard(_key("a"))
+        assert store.host_bytes == 0
+        store.clear()
+        assert len(store) == 0 and store.device_bytes == 0
+
+    def test_pin_failure_falls_back_to_pageable(self):
+        class Unpinnable(FakeTensor):
+            def to(self, device, non_blocking=False):
+                return Unpinnable(self.nbytes, str(device))
+
+            def pin_memory(self):
+                raise RuntimeError("no CUDA driver")
+
+        store = self._store(gpu_mb=1)
+        for name in "ab":
+            store.put(_key(name), FakeTensor(8), [(Unpinnable(MB // 2), Unpinnable(MB // 2))],
+                      knowledge_token_count=1, label=name)
+        assert _tier(store, "a") == "host"
+
+    def test_cpu_device_evicts_instead_of_spilling(self):
+        store = PrefixCacheStore("cpu", 1 * MB, 4 * MB)
+        _put(store, "a")
+        _put(store, "b")
+        assert _key("a") not in store
+        assert store.host_bytes == 0
+        assert store.stats()["spills"] == 0
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Quantized Entry Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestQuantizedEntries:
+
+    def _qkv(self, nbytes):
+        # int8 payload plus a 1/32-sized fp32 scale, like a per-token V scale
+        return QuantizedKV(FakeTensor(nbytes), FakeTensor(nbytes // 32), "float16")
+
+    def _put(self, store, name, nbytes=MB // 2):
+        layers = [(self._qkv(nbytes), self._qkv(nbytes))]
+        return store.put(_key(name), FakeTensor(8), layers, knowledge_token_count=10, label=name)
+
+    def test_budget_counts_compressed_size(self):
+        store = PrefixCacheStore("cuda:0", 2 * MB, 2 * MB)
+        entry = self._put(store, "a")
+        assert entry.nbytes == 2 * (MB // 2 + MB // 64)
+        assert store.device_bytes == entry.nbytes
+
+    def test_spill_and_promote_move_scales(self):
+        store = PrefixCacheStore("cuda:0", 2 * MB, 4 * MB)
+        for name in "abc":
+            self._put(store, name)
+        spilled = store.peek(_key("a")).layers[0][0]
+        assert isinstance(spilled, QuantizedKV)
+        assert spilled.q.device == "cpu" and spilled.q.pinned
+        assert spilled.scale.device == "cpu" and spilled.scale.pinned
+        assert spilled.dtype == "float16"
+        promoted = store.get(_key("a")).layers[0][1]
+        assert promoted.q.device == "cuda:0" and promoted.scale.device == "cuda:0"
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Config Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestParseTenants:
+
+    def test_parse(self):
+        assert parse_tenants(" acme=/data/a.json , globex=/data/g.jsonl,") == {
+            "acme": "/data/a.json", "globex": "/data/g.jsonl",
+        }
+
+    def test_empty(self):
+        assert parse_tenants("") == {}
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            parse_tenants("acme")
@@ -0,0 +1,144 @@
+"""
+test_retriever.py — Unit tests for cag/retriever.py and hybrid retrieval in
+cag/knowledge_store.py
+  • tokenize: lower-case, stopwords, single characters dropped
+  • BM25Retriever: ranking, keyword boost, exclusion, very common terms skipped
+  • SolutionKnowledgeStore: core budget, retrieve_rows skips the core and
+    duplicate categories, respects top_k and the token budget
+
+Run:
+    pytest tests/test_retriever.py -v
+"""
+
+import sys
+import os
+import json
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "cag"))
+
+from knowledge_store import SolutionEntry, SolutionKnowledgeStore  # noqa
+from retriever import BM25Retriever, tokenize  # noqa
+
+
+class FakeTokenizer:
+    def encode(self, text, add_special_tokens=True):
+        return list(range(len(text) // 4))
+
+
+def _entry(problem, keywords, name="S"):
+    return SolutionEntry(
+        user_problem=problem, problem_keywords=keywords, solution_name=name,
+        solution_description="d", key_benefits=[], pricing_model="p",
+        implementation_time="t", target_industries=[],
+    )
+
+
+CATALOG = [
+    _entry("Invoices get lost between finance teams", ["invoicing"]),
+    _entry("Payroll reconciliation takes hours", ["payroll"]),
+    _entry("Sales never sees website leads in time", ["leads", "crm"]),
+    _entry("Our warehouse stock counts drift", ["inventory"]),
+    _entry("Lost leads after trade shows", ["events"]),
+]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  BM25 Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestBM25:
+
+    def _retriever(self):
+        return BM25Retriever.build(enumerate(CATALOG))
+
+    def test_tokenize(self):
+        assert tokenize("How do I fix MY CRM, v2?") == ["fix", "crm", "v2"]
+
+    def test_best_match_first(self):
+        hits = self._retriever().search("payroll takes forever", k=3)
+        assert hits[0][0] == 1
+
+    def test_keywords_outweigh_problem_text(self):
+        # "leads" is a keyword of row 2 but only problem text in row 4
+        hits = self._retriever().search("leads", k=2)
+        assert [row for row, _ in hits] == [2, 4]
+
+    def test_exclude(self):
+        hits = self._retriever().search("leads", k=5, exclude={2})
+        assert [row for row, _ in hits] == [4]
+
+    def test_no_match(self):
+        assert self._retriever().search("quantum teleportation") == []
+
+    def test_very_common_terms_skipped(self):
+        docs = [_entry(f"common thing {i}", []) for i in range(6)] + [_entry("rare common", [])]
+        retriever = BM25Retriever.build(enumerate(docs))
+        assert retriever.search("common", k=10) == []
+        assert retriever.search("rare common", k=10)[0][0] == 6
+
+    def test_stats(self):
+        stats = self._retriever().stats()
+        assert stats["documents"] == 5
+        assert stats["terms"] > 10
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Store Retrieval Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestStoreRetrieval:
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        items = [
+            {
+                "user_problem": f"{topic} problem number {i} " + "pad " * (i % 5),
+                "problem_keywords": [f"{topic}{i % 4}"],
+                "solution_name": f"{topic} fix {i}",
+                "solution_description": f"Solves {topic} issue {i}",
+            }
+            for topic in ("billing", "shipping", "hiring")
+            for i in range(12)
+        ]
+        path = tmp_path / "kb.json"
+        path.write_text(json.dumps(items))
+
+        class Config:
+            solutions_json_path = str(path)
+            max_context_tokens = 4096
+            max_knowledge_entries = 1000
+
+        store = SolutionKnowledgeStore(FakeTokenizer(), Config())
+        store.load_from_sources()
+        store.build_knowledge_text(budget=40)
+        store.build_retriever()
+        return store
+
+    def test_core_budget_honoured(self, store):
+        assert 0 < store.get_token_count() <= 40
+        assert len(store.core_rows) < store.get_entry_count()
+
+    def test_retrieved_rows_outside_core(self, store):
+        rows = store.retrieve_rows("shipping problem", top_k=4, max_tokens=1000)
+        assert rows
+        assert not set(rows) & store.core_rows
+
+    def test_one_row_per_category(self, store):
+        cats = store.index.columns["category"]
+        rows = store.retrieve_rows("hiring problem number", top_k=12, max_tokens=10_000)
+        assert len({cats[r] for r in rows}) == len(rows)
+        assert not {cats[r] for r in rows} & {cats[r] for r in store.core_rows}
+
+    def test_top_k_and_budget(self, store):
+        assert len(store.retrieve_rows("billing problem", top_k=1, max_tokens=1000)) == 1
+        assert store.retrieve_rows("billing problem", top_k=5, max_tokens=1) == []
+
+    def test_retrieve_text_formats_matches(self, store):
+        text = store.retrieve_text("hiring problem", top_k=2, max_tokens=1000)
+        assert text.count("PROBLEM:") == 2
+        assert "hiring" in text
+
+    def test_no_retriever_no_rows(self, store):
+        store.retriever = None
+        assert store.retrieve_text("billing", top_k=3, max_tokens=100) == ""
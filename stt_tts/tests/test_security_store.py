@@ -0,0 +1,201 @@
+"""
+test_security_store.py — Unit tests for user_auth/security_store.py
+  • MemorySecurityStore: revocation until exp, sliding-window counter
+  • build_security_store: backend selection / fallback without redis
+  • security.check_rate_limit enforces limits through the store
+  • user_service publishes the "user" revocation only after the commit
+
+Run:
+    pytest tests/test_security_store.py -v
+"""
+
+import sys
+import os
+import pytest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "user_auth"))
+
+import security_store  # noqa
+from security_store import MemorySecurityStore, build_security_store  # noqa
+from conftest import FakeClock  # noqa
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Revocation Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.asyncio
+class TestMemoryRevocation:
+
+    async def test_revoked_until_exp(self):
+        store = MemorySecurityStore()
+        await store.revoke("j1", datetime.now(timezone.utc) + timedelta(minutes=5))
+        assert await store.is_revoked("j1") is True
+        assert await store.is_revoked("j2") is False
+
+    async def test_expired_entry_dropped(self):
+        store = MemorySecurityStore()
+        await store.revoke("j1", datetime.now(timezone.utc) - timedelta(seconds=1))
+        assert await store.is_revoked("j1") is False
+        assert "j1" not in store.revoked
+
+    async def test_shares_dict_passed_in(self):
+        shared = {}
+        store = MemorySecurityStore(shared)
+        await store.revoke("j1", datetime.now(timezone.utc) + timedelta(minutes=5))
+        assert "j1" in shared
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Sliding Window Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.asyncio
+class TestMemorySlidingWindow:
+
+    async def test_allows_up_to_limit(self):
+        store = MemorySecurityStore(clock=FakeClock(0.0))
+        results = [await store.hit("k", 3, 60) for _ in range(4)]
+        assert results == [True, True, True, False]
+
+    async def test_keys_are_independent(self):
+        store = MemorySecurityStore(clock=FakeClock(0.0))
+        for _ in range(3):
+            await store.hit("a", 3, 60)
+        assert await store.hit("b", 3, 60) is True
+
+    async def test_rejected_hits_are_not_counted(self):
+        clock = FakeClock(0.0)
+        store = MemorySecurityStore(clock=clock)
+        for _ in range(10):
+            await store.hit("k", 2, 60)
+        clock.t = 120.0                     # two windows later — all forgotten
+        assert await store.hit("k", 2, 60) is True
+
+    async def test_previous_window_weighted_by_overlap(self):
+        clock = FakeClock(0.0)
+        store = MemorySecurityStore(clock=clock)
+        for _ in range(4):
+            assert await store.hit("k", 4, 60)
+        # 45 s into the next window: 4 * (1 - 45/60) = 1 still counted → 3 left
+        clock.t = 105.0
+        results = [await store.hit("k", 4, 60) for _ in range(4)]
+        assert results == [True, True, True, False]
+
+    async def test_no_burst_at_window_edge(self):
+        """Fixed windows would allow 2×limit across the boundary; sliding must not."""
+        clock = FakeClock(59.0)
+        store = MemorySecurityStore(clock=clock)
+        for _ in range(5):
+            await store.hit("k", 5, 60)
+        clock.t = 61.0
+        # prev weighted 5 * 59/60 ≈ 4.9 → one more hit fits, not another five
+        results = [await store.hit("k", 5, 60) for _ in range(5)]
+        assert results == [True, False, False, False, False]
+
+    async def test_old_buckets_pruned(self):
+        clock = FakeClock(0.0)
+        store = MemorySecurityStore(clock=clock)
+        for t in (0.0, 60.0, 120.0, 180.0):
+            clock.t = t
+            await store.hit("k", 5, 60)
+        assert len(store._counters["k"]) <= 2
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Backend Selection Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestBuildSecurityStore:
+
+    def test_memory_backend(self):
+        assert isinstance(build_security_store("memory", "redis://x", {}), MemorySecurityStore)
+
+    def test_falls_back_without_redis_client(self, monkeypatch):
+        monkeypatch.setattr(security_store, "aioredis", None)
+        for backend in ("auto", "redis"):
+            assert isinstance(build_security_store(backend, "redis://x", {}), MemorySecurityStore)
+
+
+@pytest.mark.asyncio
+class TestCheckRateLimit:
+
+    async def test_limit_enforced(self, monkeypatch):
+        import security
+        monkeypatch.setattr(security, "_store", MemorySecurityStore())
+        results = [await security.check_rate_limit("login:9.9.9.9", 2, 60) for _ in range(3)]
+        assert results == [True, True, False]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Revocation Ordering Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class _RecordingStore(MemorySecurityStore):
+    def __init__(self, calls):
+        super().__init__()
+        self.calls = calls
+
+    async def publish(self, event: dict) -> None:
+        self.calls.append(("publish", event["user_id"]))
+
+
+class _RecordingDB:
+    """AsyncSession stand-in — records flush / commit, optionally failing the commit"""
+    def __init__(self, calls, fail_commit=False):
+        self.calls = calls
+        self.fail_commit = fail_commit
+
+    async def flush(self):
+        self.calls.append("flush")
+
+    async def commit(self):
+        if self.fail_commit:
+            raise RuntimeError("commit failed")
+        self.calls.append("commit")
+
+
+def _import_user_service():
+    """user_auth's user_service — its flat `database` / `user` names are shared
+    with other services, so import them fresh and drop them again afterwards"""
+    auth_dir = os.path.join(os.path.dirname(__file__), "..", "user_auth")
+    names = ("user_service", "user", "database")
+    sys.path.insert(0, auth_dir)
+    for name in names:
+        sys.modules.pop(name, None)
+    try:
+        import user_service
+    finally:
+        sys.path.remove(auth_dir)
+        for name in names:
+            sys.modules.pop(name, None)
+    return user_service
+
+
+@pytest.mark.asyncio
+class TestRevokeAfterCommit:
+
+    @pytest.fixture
+    def calls(self, monkeypatch):
+        import security
+        calls = []
+        self.service = _import_user_service()
+        monkeypatch.setattr(security, "_store", _RecordingStore(calls))
+        return calls
+
+    @pytest.mark.parametrize("action", ["deactivate_user", "delete_user_data"])
+    async def test_publish_follows_commit(self, calls, action):
+        from types import SimpleNamespace
+        user = SimpleNamespace(id="u1", is_active=True)
+        await getattr(self.service, action)(_RecordingDB(calls), user)
+        assert not user.is_active
+        assert calls[-2:] == ["commit", ("publish", "u1")]
+
+    @pytest.mark.parametrize("action", ["deactivate_user", "delete_user_data"])
+    async def test_no_publish_when_commit_fails(self, calls, action):
+        from types import SimpleNamespace
+        with pytest.raises(RuntimeError):
+            await getattr(self.service, action)(_RecordingDB(calls, fail_commit=True),
+                                                SimpleNamespace(id="u1", is_active=True))
+        assert not any(isinstance(c, tuple) for c in calls)
@@ -0,0 +1,127 @@
+"""
+test_session_cache.py — Unit tests for messages/session_cache.py
+  • SessionExistenceCache: positive / negative TTLs, LRU bound
+  • invalidate / clear, epoch guard against racing lookups
+  • SessionInvalidationListener: no-op without redis
+
+Run:
+    pytest tests/test_session_cache.py -v
+"""
+
+import sys
+import os
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "messages"))
+
+import session_cache as sc  # noqa
+from session_cache import SessionExistenceCache, SessionInvalidationListener  # noqa
+from conftest import FakeClock  # noqa
+
+
+def _cache(**kw):
+    clock = FakeClock()
+    kw.setdefault("positive_ttl", 60.0)
+    kw.setdefault("negative_ttl", 5.0)
+    return SessionExistenceCache(clock=clock, **kw), clock
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  SessionExistenceCache Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestSessionExistenceCache:
+
+    def test_unknown_is_none(self):
+        cache, _ = _cache()
+        assert cache.get("s1") is None
+        assert cache.misses == 1
+
+    def test_positive_hit(self):
+        cache, _ = _cache()
+        cache.put("s1", True)
+        assert cache.get("s1") is True
+        assert cache.hits == 1
+
+    def test_negative_hit(self):
+        cache, _ = _cache()
+        cache.put("s1", False)
+        assert cache.get("s1") is False
+
+    def test_positive_ttl_expiry(self):
+        cache, clock = _cache()
+        cache.put("s1", True)
+        clock.t = 59.9
+        assert cache.get("s1") is True
+        clock.t = 60.0
+        assert cache.get("s1") is None
+
+    def test_negative_ttl_is_shorter(self):
+        cache, clock = _cache()
+        cache.put("s1", False)
+        cache.put("s2", True)
+        clock.t = 5.0
+        assert cache.get("s1") is None
+        assert cache.get("s2") is True
+
+    def test_zero_ttl_disables_caching(self):
+        cache, _ = _cache(negative_ttl=0)
+        cache.put("s1", False)
+        assert cache.get("s1") is None
+
+    def test_lru_bound(self):
+        cache, _ = _cache(max_entries=2)
+        cache.put("a", True)
+        cache.put("b", True)
+        cache.get("a")              # a is now most recent
+        cache.put("c", True)
+        assert cache.get("b") is None
+        assert cache.get("a") is True
+        assert cache.get("c") is True
+
+    def test_invalidate(self):
+        cache, _ = _cache()
+        cache.put("s1", True)
+        cache.invalidate("s1")
+        assert cache.get("s1") is None
+        assert cache.invalidations == 1
+
+    def test_invalidate_unknown_is_noop(self):
+        cache, _ = _cache()
+        cache.invalidate("nope")
+        assert cache.invalidations == 0
+
+    def test_clear(self):
+        cache, _ = _cache()
+        cache.put("a", True)
+        cache.put("b", False)
+        cache.clear()
+        assert cache.stats()["entries"] == 0
+
+    def test_put_after_racing_invalidation_is_dropped(self):
+        """Lookup starts, delete event arrives, lookup finishes → don't cache."""
+        cache, _ = _cache()
+        epoch = cache.epoch
+        cache.invalidate("s1")
+        cache.put("s1", True, epoch=epoch)
+        assert cache.get("s1") is None
+
+    def test_put_with_current_epoch_is_kept(self):
+        cache, _ = _cache()
+        cache.put("s1", True, epoch=cache.epoch)
+        assert cache.get("s1") is True
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  SessionInvalidationListener Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.asyncio
+class TestInvalidationListener:
+
+    async def test_start_without_redis_is_noop(self, monkeypatch):
+        monkeypatch.setattr(sc, "aioredis", None)
+        listener = SessionInvalidationListener(SessionExistenceCache())
+        listener.start()
+        assert listener._task is None
+        await listener.stop()
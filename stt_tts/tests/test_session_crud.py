@@ -0,0 +1,474 @@
+"""
+test_session_crud.py — SessionCRUD + async RedisSessionManager (session_chat/crud.py)
+  • read-through: miss loads from DB and fills Redis, hit never touches the DB
+  • round trips per operation (one pipeline each)
+  • create / delete publish the invalidation in the same pipeline
+  • Redis errors degrade to DB-only for REDIS_RETRY_S seconds
+  • list_by_user: keyset pages, ties on updated_at, summary projection
+  • per-user sorted-set index: built on first list, maintained on
+    create / touch / delete, pages past a truncated index go to the DB
+  • coalesced touch: no DB write per touch, reads overlay the pending time,
+    one UPDATE per flush that never moves updated_at backwards, list cursors
+    follow the stored order while a touch is pending
+
+Run:
+    pytest tests/test_session_crud.py -v
+"""
+
+import sys
+import os
+import uuid
+import pytest
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from conftest import FakeClock  # noqa
+
+# session_chat/ uses flat `models` / `crud` names that other services share —
+# import them, then drop them from sys.modules so later test files are unaffected.
+_SESS_DIR = os.path.join(os.path.dirname(__file__), "..", "session_chat")
+sys.path.insert(0, _SESS_DIR)
+for _name in ("models", "crud"):
+    sys.modules.pop(_name, None)
+from models import Base, ChatSession                     # noqa
+import crud as crud_module                               # noqa
+from crud import SessionCRUD, RedisSessionManager, SESSION_EVENTS_CHANNEL  # noqa
+from crud import encode_cursor, decode_cursor            # noqa
+from touch_coalescer import TouchCoalescer               # noqa
+sys.path.remove(_SESS_DIR)
+for _name in ("models", "crud"):
+    sys.modules.pop(_name, None)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    async def __aenter__(self): return self
+    async def __aexit__(self, *exc): return False
+
+    def __getattr__(self, name):
+        def queue(*args, **kw):
+            self.ops.append((name, args, kw))
+            return self
+        return queue
+
+    async def execute(self):
+        if self.redis.fail:
+            raise ConnectionError("redis down")
+        self.redis.executed.append([op[0] for op in self.ops])
+        return [getattr(self.redis, name)(*args, **kw) for name, args, kw in self.ops]
+
+
+class FakeRedis:
+    """Just the commands RedisSessionManager pipelines; TTLs are recorded, not enforced."""
+
+    def __init__(self):
+        self.data, self.ttl, self.published = {}, {}, []
+        self.zsets = {}
+        self.executed = []
+        self.fail = False
+
+    def pipeline(self, transaction=True): return FakePipeline(self)
+
+    def setex(self, key, ttl, value):
+        self.data[key], self.ttl[key] = value, ttl
+        return True
+
+    def getex(self, key, ex=None):
+        if key in self.data and ex:
+            self.ttl[key] = ex
+        return self.data.get(key)
+
+    def get(self, key): return self.data.get(key)
+    def mget(self, keys): return [self.data.get(k) for k in keys]
+
+    def delete(self, *keys):
+        return sum((self.data.pop(k, None), self.zsets.pop(k, None)) != (None, None) for k in keys)
+
+    def exists(self, key): return int(key in self.data or key in self.zsets)
+
+    def expire(self, key, ttl, nx=False):
+        if nx and key in self.ttl:
+            return 0
+        self.ttl[key] = ttl
+        return 1
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    def zrem(self, key, *members):
+        return sum(self.zsets.get(key, {}).pop(m, None) is not None for m in members)
+
+    def zrevrangebyscore(self, key, high, low, start=0, num=None, withscores=False):
+        high = float(high)
+        items = sorted(((m, sc) for m, sc in self.zsets.get(key, {}).items() if sc <= high),
+                       key=lambda x: (x[1], x[0]), reverse=True)
+        items = items[start:start + num] if num is not None else items[start:]
+        return [(m, float(sc)) for m, sc in items] if withscores else [m for m, _ in items]
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+        return 1
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False},
+                           poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cur, stmt, *a: statements.append(stmt))
+    session = sessionmaker(bind=engine)()
+    session.statements = statements
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
+
+
+@pytest.fixture
+def crud(db, redis):
+    return SessionCRUD(db, RedisSessionManager(client=redis))
+
+
+USER = str(uuid.uuid4())
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Read-through Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.asyncio
+class TestReadThrough:
+
+    async def test_hit_served_from_redis_alone(self, crud, db, redis):
+        s = await crud.create(USER, "hello")
+        db.statements.clear()
+        redis.executed.clear()
+        data, source = await crud.get(str(s.id))
+        assert source == "cache"
+        assert data["title"] == "hello"
+        assert db.statements == []
+        assert redis.executed == [["getex"]]
+
+    async def test_miss_loads_and_fills(self, crud, redis):
+        s = await crud.create(USER, "t")
+        redis.data.clear()                          # evicted / expired
+        redis.executed.clear()
+        data, source = await crud.get(str(s.id))
+        assert (data["id"], source) == (str(s.id), "db")
+        assert redis.executed == [["getex"], ["setex", "zadd", "expire"]]
+        assert (await crud.get(str(s.id)))[1] == "cache"
+
+    async def test_missing_session(self, crud, redis):
+        data, source = await crud.get(str(uuid.uuid4()))
+        assert data is None
+        assert not redis.data
+
+    async def test_read_slides_ttl(self, crud, redis):
+        s = await crud.create(USER)
+        key = f"session:{s.id}"
+        redis.ttl[key] = 1
+        await crud.get(str(s.id))
+        assert redis.ttl[key] > 1
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Round-trip Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.asyncio
+class TestRoundTrips:
+
+    async def test_create_is_one_pipeline_with_publish(self, crud, redis):
+        s = await crud.create(USER, "t")
+        assert redis.executed == [["setex", "zadd", "expire", "publish"]]
+        assert redis.published == [(SESSION_EVENTS_CHANNEL, str(s.id))]
+
+    async def test_update_title_one_round_trip(self, crud, redis):
+        s = await crud.create(USER, "old")
+        redis.executed.clear()
+        await crud.update_title(str(s.id), "new")
+        assert redis.executed == [["setex", "zadd", "expire"]]
+        assert (await crud.get(str(s.id)))[0]["title"] == "new"
+
+    async def test_touch_one_round_trip(self, crud, redis):
+        s = await crud.create(USER)
+        redis.executed.clear()
+        await crud.touch(str(s.id))
+        assert redis.executed == [["setex", "zadd", "expire"]]
+
+    async def test_delete_one_round_trip(self, crud, redis):
+        sid = str((await crud.create(USER)).id)
+        redis.executed.clear()
+        assert await crud.delete(sid) is True
+        assert redis.executed == [["delete", "zrem", "publish"]]
+        assert f"session:{sid}" not in redis.data
+        assert await crud.delete(sid) is False
+
+    async def test_exists_checks_redis_then_db(self, crud, redis):
+        s = await crud.create(USER)
+        assert await crud.exists(str(s.id)) is True
+        redis.data.clear()
+        assert await crud.exists(str(s.id)) is True
+        assert await crud.exists(str(uuid.uuid4())) is False
+
+    async def test_round_trips_counted(self, crud):
+        s = await crud.create(USER)
+        await crud.get(str(s.id))
+        assert crud.rsm.stats()["round_trips"] == 2
+        assert crud.rsm.stats()["hits"] == 1
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Degradation Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.asyncio
+class TestRedisDown:
+
+    async def test_falls_back_to_db(self, db, redis):
+        clock = FakeClock()
+        crud = SessionCRUD(db, RedisSessionManager(client=redis, clock=clock))
+        s = await crud.create(USER, "t")
+        redis.fail = True
+        data, source = await crud.get(str(s.id))
+        assert (data["title"], source) == ("t", "db")
+
+    async def test_skips_redis_until_retry(self, db, redis):
+        clock = FakeClock()
+        rsm = RedisSessionManager(client=redis, clock=clock)
+        crud = SessionCRUD(db, rsm)
+        s = await crud.create(USER)
+        redis.fail = True
+        await crud.get(str(s.id))
+        redis.fail = False
+        redis.executed.clear()
+        await crud.get(str(s.id))
+        assert redis.executed == []                 # still backing off
+        clock.t = 60.0
+        assert (await crud.get(str(s.id)))[1] == "cache"
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Listing Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _seed(db, user_id, n, same_time=False):
+    """n sessions for user_id, updated_at one minute apart (or all equal)."""
+    base = datetime(2026, 1, 1)
+    for i in range(n):
+        ts = base if same_time else base + timedelta(minutes=i)
+        db.add(ChatSession(user_id=uuid.UUID(user_id), title=f"s{i}",
+                           created_at=ts, updated_at=ts))
+    db.commit()
+
+
+async def _walk(crud, user_id, limit, **kw):
+    pages, after = [], None
+    while True:
+        page, after = await crud.list_page(user_id, limit, after=after, **kw)
+        pages.append(page)
+        if after is None:
+            return pages
+        assert len(pages) < 50, "cursor does not advance"
+
+
+@pytest.mark.asyncio
+class TestListByUserDB:
+
+    @pytest.fixture(autouse=True)
+    def no_index(self, monkeypatch):
+        monkeypatch.setattr(crud_module, "SESSION_INDEX", False)
+
+    async def test_pages_newest_first(self, crud, db):
+        user = str(uuid.uuid4())
+        _seed(db, user, 7)
+        pages = await _walk(crud, user, 3)
+        titles = [d["title"] for p in pages for d in p]
+        assert titles == [f"s{i}" for i in range(6, -1, -1)]
+        assert [len(p) for p in pages] == [3, 3, 1]
+
+    async def test_ties_broken_by_id(self, crud, db):
+        user = str(uuid.uuid4())
+        _seed(db, user, 5, same_time=True)
+        ids = [d["id"] for p in await _walk(crud, user, 2) for d in p]
+        assert len(ids) == len(set(ids)) == 5
+        assert ids == sorted(ids, reverse=True)
+
+    async def test_other_users_excluded(self, crud, db):
+        a, b = str(uuid.uuid4()), str(uuid.uuid4())
+        _seed(db, a, 2)
+        _seed(db, b, 3)
+        assert len(await crud.list_by_user(a, 10)) == 2
+
+    async def test_summary_projection(self, crud, db):
+        user = str(uuid.uuid4())
+        _seed(db, user, 2)
+        page = await crud.list_by_user(user, 10, summary=True)
+        assert set(page[0]) == {"id", "title", "updated_at"}
+
+    async def test_bad_cursor(self, crud):
+        with pytest.raises(ValueError):
+            await crud.list_by_user(str(uuid.uuid4()), 10, after="not-a-cursor")
+
+
+class TestCursor:
+
+    def test_round_trip(self):
+        item = {"id": str(uuid.uuid4()), "updated_at": "2026-01-01T10:00:00.123456"}
+        ts, sid = decode_cursor(encode_cursor(item))
+        assert (ts.isoformat(), str(sid)) == (item["updated_at"], item["id"])
+
+
+@pytest.mark.asyncio
+class TestListByUserIndex:
+
+    async def test_first_list_builds_index_then_served_from_redis(self, crud, db, redis):
+        user = str(uuid.uuid4())
+        _seed(db, user, 4)
+        first = await crud.list_by_user(user, 10)
+        assert redis.data[f"user_sessions:{user}:complete"] == "1"
+        assert len(redis.zsets[f"user_sessions:{user}"]) == 4
+        db.statements.clear()
+        assert await crud.list_by_user(user, 10) == first
+        assert db.statements == []
+
+    async def test_summary_from_cache(self, crud, db, redis):
+        user = str(uuid.uuid4())
+        _seed(db, user, 3)
+        await crud.list_by_user(user, 10)
+        db.statements.clear()
+        page = await crud.list_by_user(user, 10, summary=True)
+        assert [d["title"] for d in page] == ["s2", "s1", "s0"]
+        assert set(page[0]) == {"id", "title", "updated_at"}
+        assert db.statements == []
+
+    async def test_create_touch_delete_maintain_index(self, crud, db, redis):
+        user = str(uuid.uuid4())
+        _seed(db, user, 3)
+        await crud.list_by_user(user, 10)
+        new = str((await crud.create(user, "new")).id)
+        assert (await crud.list_by_user(user, 10))[0]["id"] == new
+
+        oldest = (await crud.list_by_user(user, 10))[-1]["id"]
+        await crud.touch(oldest)
+        assert (await crud.list_by_user(user, 10))[0]["id"] == oldest
+
+        await crud.delete(new)
+        ids = [d["id"] for d in await crud.list_by_user(user, 10)]
+        assert new not in ids and len(ids) == 3
+
+    async def test_truncated_index_falls_back_past_its_end(self, crud, db, redis, monkeypatch):
+        monkeypatch.setattr(crud_module, "SESSION_INDEX_MAX", 4)
+        user = str(uuid.uuid4())
+        _seed(db, user, 9)
+        pages = await _walk(crud, user, 3)
+        assert redis.data[f"user_sessions:{user}:complete"] == "0"
+        titles = [d["title"] for p in pages for d in p]
+        assert titles == [f"s{i}" for i in range(8, -1, -1)]
+
+    async def test_redis_down_uses_db(self, crud, db, redis):
+        user = str(uuid.uuid4())
+        _seed(db, user, 3)
+        redis.fail = True
+        assert len(await crud.list_by_user(user, 10)) == 3
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Coalesced Touch Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.asyncio
+class TestCoalescedTouch:
+
+    @pytest.fixture
+    def touches(self):
+        c = TouchCoalescer(interval_s=60)
+        c._running = True                           # as if start() had run
+        return c
+
+    @pytest.fixture
+    def ccrud(self, db, redis, touches):
+        c = SessionCRUD(db, RedisSessionManager(client=redis), touches)
+        touches._flush_fn = c.apply_touches
+        return c
+
+    async def test_touch_writes_nothing(self, ccrud, db, redis):
+        sid = str((await ccrud.create(USER)).id)
+        db.statements.clear()
+        redis.executed.clear()
+        for _ in range(10):
+            await ccrud.touch(sid)
+        assert db.statements == []
+        assert redis.executed == []
+
+    async def test_reads_see_pending_touch(self, ccrud, touches):
+        s = await ccrud.create(USER)
+        sid, created = str(s.id), s.updated_at
+        await ccrud.touch(sid)
+        data, _ = await ccrud.get(sid)
+        assert datetime.fromisoformat(data["updated_at"]) == touches.pending_at(sid) > created
+        listed = await ccrud.list_by_user(USER, 500)
+        assert next(d for d in listed if d["id"] == sid)["updated_at"] == data["updated_at"]
+
+    @pytest.mark.parametrize("index", [False, True])
+    async def test_pages_with_pending_touch(self, ccrud, db, monkeypatch, index):
+        # The cursor follows the stored order, not the pending touch time
+        monkeypatch.setattr(crud_module, "SESSION_INDEX", index)
+        user = str(uuid.uuid4())
+        _seed(db, user, 6)
+        first, _ = await ccrud.list_page(user, 3)
+        await ccrud.touch(first[-1]["id"])
+        pages = await _walk(ccrud, user, 3)
+        assert [[d["title"] for d in p] for p in pages] == [["s5", "s4", "s3"], ["s2", "s1", "s0"], []]
+
+    async def test_flush_is_one_update(self, ccrud, db, redis, touches):
+        sids = [str((await ccrud.create(USER)).id) for _ in range(3)]
+        for sid in sids:
+            await ccrud.touch(sid)
+        db.statements.clear()
+        redis.executed.clear()
+        assert await touches.flush() is True
+        assert sum(st.lstrip().upper().startswith("UPDATE") for st in db.statements) == 1
+        assert len(redis.executed) == 1
+        assert touches.stats()["pending"] == 0
+
+    async def test_flush_persists_and_updates_cache(self, ccrud, db, redis, touches):
+        sid = str((await ccrud.create(USER)).id)
+        ts = touches.touch(sid)
+        await touches.flush()
+        db.expire_all()
+        assert ccrud._load(sid).updated_at == ts
+        cached = await ccrud.rsm.get(sid)
+        assert cached["updated_at"] == ts.isoformat()
+
+    async def test_flush_never_moves_backwards(self, ccrud, db, touches):
+        sid = str((await ccrud.create(USER)).id)
+        touches.touch(sid)
+        stale = touches.pending_at(sid) - timedelta(hours=1)
+        touches._pending[sid] = stale
+        before = ccrud._load(sid).updated_at
+        await touches.flush()
+        db.expire_all()
+        assert ccrud._load(sid).updated_at == before
+
+    async def test_malformed_id_rejected(self, ccrud):
+        with pytest.raises(ValueError):
+            await ccrud.touch("not-a-uuid")
+
+    async def test_delete_drops_pending(self, ccrud, touches):
+        sid = str((await ccrud.create(USER)).id)
+        await ccrud.touch(sid)
+        await ccrud.delete(sid)
+        assert touches.pending_at(sid) is None
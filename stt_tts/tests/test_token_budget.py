@@ -0,0 +1,152 @@
+"""
+test_token_budget.py — Unit tests for cag/token_budget.py
+  • pack_by_tokens: maximal count, leftover budget filled by swaps, cap, ties
+  • count_tokens: batch __call__ when available, encode() fallback
+  • TokenCountCache: round trip, tokenizer mismatch, pruning to used keys
+
+Run:
+    pytest tests/test_token_budget.py -v
+"""
+
+import sys
+import os
+import itertools
+import random
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "cag"))
+
+from token_budget import (  # noqa
+    TokenCountCache, cache_path_for, count_tokens, pack_by_tokens, tokenizer_id,
+)
+
+
+class EncodeOnly:
+    def encode(self, text, add_special_tokens=True):
+        return list(range(len(text.split()) + (1 if add_special_tokens else 0)))
+
+
+class Batched(EncodeOnly):
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, texts, add_special_tokens=True, return_attention_mask=True):
+        self.calls += 1
+        return {"input_ids": [self.encode(t, add_special_tokens) for t in texts]}
+
+
+def _best_count(weights, budget):
+    """Brute force: the largest number of rows that fits."""
+    rows = list(weights)
+    for k in range(len(rows), -1, -1):
+        if any(sum(weights[r] for r in c) <= budget for c in itertools.combinations(rows, k)):
+            return k
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Packer Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestPackByTokens:
+
+    def test_count_is_optimal(self):
+        rnd = random.Random(3)
+        for _ in range(50):
+            weights = {r: rnd.randint(1, 30) for r in range(9)}
+            budget = rnd.randint(10, 120)
+            chosen = pack_by_tokens(weights, weights, budget)
+            assert sum(weights[r] for r in chosen) <= budget
+            assert len(chosen) == _best_count(weights, budget)
+
+    def test_leftover_budget_filled(self):
+        weights = {0: 2, 1: 3, 2: 9}
+        # Lightest-first takes 0 and 1 (5 of 11); swapping 0 for 2 uses 12 > 11,
+        # swapping 1 for 2 uses 11.
+        assert pack_by_tokens([0, 1, 2], weights, 11) == [0, 2]
+
+    def test_max_items_then_heavier_rows(self):
+        weights = {0: 1, 1: 1, 2: 5, 3: 6}
+        assert pack_by_tokens([0, 1, 2, 3], weights, 100, max_items=2) == [2, 3]
+
+    def test_ties_keep_input_order(self):
+        weights = {5: 3, 2: 3, 9: 3}
+        assert pack_by_tokens([5, 2, 9], weights, 6) == [5, 2]
+
+    def test_nothing_fits(self):
+        assert pack_by_tokens([0], {0: 10}, 5) == []
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Counting Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestCountTokens:
+
+    def test_batched_call(self):
+        tok = Batched()
+        assert count_tokens(tok, ["a b", "c", "d e f"], batch_size=2) == [2, 1, 3]
+        assert tok.calls == 2
+
+    def test_encode_fallback_excludes_special_tokens(self):
+        assert count_tokens(EncodeOnly(), ["a b", "c"]) == [2, 1]
+
+    def test_tokenizer_id_includes_vocab(self):
+        class Named(Batched):
+            name_or_path = "org/model"
+
+            def __len__(self):
+                return 128
+
+        assert tokenizer_id(Named()) == "Named|org/model|128"
+        assert tokenizer_id(EncodeOnly()) == "EncodeOnly||"
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Cache Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestTokenCountCache:
+
+    def test_round_trip(self, tmp_path):
+        path = cache_path_for(str(tmp_path / "kb.json"), "tok-a")
+        cache = TokenCountCache.open(path, "tok-a")
+        cache.put(2**63 + 5, 17)
+        cache.save()
+        again = TokenCountCache.open(path, "tok-a")
+        assert again.get(2**63 + 5) == 17
+        assert again.hits == 1
+
+    def test_other_tokenizer_ignored(self, tmp_path):
+        path = str(tmp_path / "counts")
+        cache = TokenCountCache.open(path, "tok-a")
+        cache.put(1, 3)
+        cache.save()
+        assert len(TokenCountCache.open(path, "tok-b")) == 0
+
+    def test_save_prunes_unused(self, tmp_path):
+        path = str(tmp_path / "counts")
+        cache = TokenCountCache.open(path, "t")
+        cache.put(1, 3)
+        cache.put(2, 4)
+        cache.save()
+        reopened = TokenCountCache.open(path, "t")
+        reopened.get(2)
+        reopened.save()
+        final = TokenCountCache.open(path, "t")
+        assert final.get(1) is None
+        assert final.get(2) == 4
+
+    def test_corrupt_file_ignored(self, tmp_path):
+        path = tmp_path / "counts"
+        path.write_bytes(b'{"version": 1, "tokenizer_id": "t", "n": 9}\n\x00')
+        assert len(TokenCountCache.open(str(path), "t")) == 0
+
+    def test_no_path_is_memory_only(self):
+        cache = TokenCountCache.open(None, "t")
+        cache.put(1, 1)
+        cache.save()
+        assert cache.get(1) == 1
+
+
+def test_cache_path_differs_per_tokenizer():
+    assert cache_path_for("kb.json", "a") != cache_path_for("kb.json", "b")
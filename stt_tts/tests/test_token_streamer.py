@@ -0,0 +1,278 @@
+"""
+test_token_streamer.py — Unit tests for cag/token_streamer.py
+  • Incremental decoding: prompt skipped, text matches a one-shot decode,
+    split multi-byte characters held back until complete, tail flushed
+  • Coalescing: tokens put while the loop is busy leave as one frame,
+    the first frame is never held back
+  • cancel() drops pending text, close(error) surfaces the error,
+    frames(timeout=...) raises when generation stalls
+  • stats(): token / frame counts
+  • CancelCriteria: stops the generate() loop at the next step once the
+    cancel event is set; streamer.cancel() sets the same event
+  • DecodeMeter: steps, tokens per step, acceptance rate, decode tokens/s
+
+Tokens are byte strings decoded as UTF-8, so a multi-byte character can be
+split across tokens the way BPE vocabularies split them.
+
+Run:
+    pytest tests/test_token_streamer.py -v
+"""
+
+import sys
+import os
+import asyncio
+import threading
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "cag"))
+
+from token_streamer import AsyncTokenStreamer, CancelCriteria, DecodeMeter, decode_summary  # noqa
+
+VOCAB = {0: b"", 1: b"Hel", 2: b"lo", 3: b" caf", 4: b"\xc3", 5: b"\xa9", 6: b"!", 7: b" ok"}
+EOS = 0
+
+
+class ByteTokenizer:
+    def decode(self, ids, skip_special_tokens=False):
+        return b"".join(VOCAB[i] for i in ids if not (skip_special_tokens and i == EOS)) \
+            .decode("utf-8", errors="replace")
+
+
+async def _collect(streamer, timeout=1.0):
+    return [frame async for frame in streamer.frames(timeout=timeout)]
+
+
+def _run_generation(streamer, ids, prompt=(1, 2), delay=None, error=None):
+    """What the CAG generation thread does: prompt, one put per step, end, close"""
+    def run():
+        streamer.put([list(prompt)])
+        for i in ids:
+            if delay:
+                delay.wait(0.01)
+            streamer.put([i])
+        streamer.end()
+        streamer.close(error)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Decoding Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestDecoding:
+
+    @pytest.mark.asyncio
+    async def test_text_matches_full_decode(self):
+        streamer = AsyncTokenStreamer(ByteTokenizer(), asyncio.get_running_loop(), coalesce_ms=0)
+        ids = [1, 2, 3, 4, 5, 6, 7, EOS]
+        _run_generation(streamer, ids, delay=threading.Event()).join()
+        frames = await _collect(streamer)
+        assert "".join(t for t, _ in frames) == "Hello café! ok"
+        assert streamer.text == "Hello café! ok"
+        assert streamer.generated_text() == "Hello café! ok"
+        assert sum(n for _, n in frames) == streamer.tokens
+
+    @pytest.mark.asyncio
+    async def test_split_character_held_back(self):
+        streamer = AsyncTokenStreamer(ByteTokenizer(), asyncio.get_running_loop())
+        streamer.put([[9]])                     # prompt — never decoded
+        streamer.put([3])
+        streamer.put([4])                       # first byte of "é"
+        assert streamer._pending == [" caf"]
+        streamer.put([5])
+        assert streamer._pending == [" caf", "é"]
+        assert streamer._pending_tokens == 3
+
+    @pytest.mark.asyncio
+    async def test_tail_flushed_on_end(self):
+        streamer = AsyncTokenStreamer(ByteTokenizer(), asyncio.get_running_loop())
+        streamer.put([[1]])
+        streamer.put([3])
+        streamer.put([4])                       # stream ends mid-character
+        streamer.end()
+        assert "".join(streamer._pending) == " caf\ufffd"
+
+    @pytest.mark.asyncio
+    async def test_tensor_like_values(self):
+        class Ids(list):
+            def tolist(self):
+                return list(self)
+
+        streamer = AsyncTokenStreamer(ByteTokenizer(), asyncio.get_running_loop(), skip_prompt=False)
+        streamer.put(Ids([1, 2]))
+        assert streamer._pending == ["Hello"]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Delivery Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestDelivery:
+
+    @pytest.mark.asyncio
+    async def test_burst_is_one_frame(self):
+        streamer = AsyncTokenStreamer(ByteTokenizer(), asyncio.get_running_loop())
+        _run_generation(streamer, [1, 2, 3, 7]).join()      # loop busy the whole time
+        frames = await _collect(streamer)
+        assert frames == [("Hello caf ok", 4)]
+        assert streamer.stats()["tokens_per_frame"] == 4
+
+    @pytest.mark.asyncio
+    async def test_first_frame_not_held(self):
+        loop = asyncio.get_running_loop()
+        streamer = AsyncTokenStreamer(ByteTokenizer(), loop, coalesce_ms=10_000)
+        streamer.put([[1]])
+        streamer.put([1])
+        frames = streamer.frames(timeout=1.0)
+        assert await asyncio.wait_for(frames.__anext__(), 0.5) == ("Hel", 1)
+        streamer.close()
+
+    @pytest.mark.asyncio
+    async def test_coalesce_window(self):
+        loop = asyncio.get_running_loop()
+        streamer = AsyncTokenStreamer(ByteTokenizer(), loop, coalesce_ms=200)
+        thread = _run_generation(streamer, [1, 2, 3, 7], delay=threading.Event())
+        frames = await _collect(streamer)
+        thread.join()
+        assert frames[0] == ("Hel", 1)
+        assert len(frames) < 4
+        assert "".join(t for t, _ in frames) == "Hello caf ok"
+
+    @pytest.mark.asyncio
+    async def test_cancel_drops_pending(self):
+        streamer = AsyncTokenStreamer(ByteTokenizer(), asyncio.get_running_loop())
+        streamer.put([[1]])
+        streamer.put([1])
+        streamer.cancel()
+        streamer.put([2])
+        streamer.close()
+        assert await _collect(streamer) == []
+        assert await streamer.wait_finished(timeout=0.1)
+
+    @pytest.mark.asyncio
+    async def test_error_surfaces(self):
+        streamer = AsyncTokenStreamer(ByteTokenizer(), asyncio.get_running_loop())
+        _run_generation(streamer, [1], error="CUDA out of memory").join()
+        frames = await _collect(streamer)
+        assert frames == [("Hel", 1)]
+        assert streamer.error == "CUDA out of memory"
+
+    @pytest.mark.asyncio
+    async def test_timeout(self):
+        streamer = AsyncTokenStreamer(ByteTokenizer(), asyncio.get_running_loop())
+        with pytest.raises(asyncio.TimeoutError):
+            await _collect(streamer, timeout=0.05)
+        assert not await streamer.wait_finished(timeout=0.05)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Cancellation Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _generate_until_stopped(streamer, criteria, max_new_tokens=1000, on_step=None):
+    """generate()'s decode loop: one token per step, stopping criteria after each"""
+    streamer.put([[1]])
+    steps = 0
+    for steps in range(1, max_new_tokens + 1):
+        streamer.put([7])
+        if on_step:
+            on_step(steps)
+        if criteria(None, None):
+            break
+    streamer.end()
+    streamer.close()
+    return steps
+
+
+class TestCancellation:
+
+    def test_criteria_idle(self):
+        event = threading.Event()
+        criteria = CancelCriteria(event)
+        assert criteria(None, None) is False
+        assert criteria.steps == 1
+        assert criteria.stopped_at is None
+
+    @pytest.mark.asyncio
+    async def test_cancel_stops_generation_next_step(self):
+        streamer = AsyncTokenStreamer(ByteTokenizer(), asyncio.get_running_loop())
+        criteria = CancelCriteria(streamer.cancel_event)
+
+        def on_step(step):
+            if step == 3:
+                streamer.cancel()           # barge-in from another thread
+
+        steps = _generate_until_stopped(streamer, criteria, on_step=on_step)
+        assert steps == 3
+        assert criteria.stopped_at is not None
+        assert streamer.closed_at >= criteria.stopped_at
+        assert await streamer.wait_finished(timeout=0.1)
+
+    @pytest.mark.asyncio
+    async def test_shared_event_from_caller(self):
+        event = threading.Event()
+        streamer = AsyncTokenStreamer(ByteTokenizer(), asyncio.get_running_loop(), cancel_event=event)
+        criteria = CancelCriteria(streamer.cancel_event)
+        event.set()                         # what the WebSocket receiver does
+        assert _generate_until_stopped(streamer, criteria) == 1
+        assert streamer.generated_text() == " ok"
+
+    @pytest.mark.asyncio
+    async def test_cancel_from_loop_while_generating(self):
+        streamer = AsyncTokenStreamer(ByteTokenizer(), asyncio.get_running_loop(), coalesce_ms=0)
+        criteria = CancelCriteria(streamer.cancel_event)
+        pace = threading.Event()
+        thread = threading.Thread(
+            target=_generate_until_stopped, args=(streamer, criteria),
+            kwargs={"on_step": lambda _: pace.wait(0.005)})
+        thread.start()
+        async for _ in streamer.frames(timeout=1.0):
+            streamer.cancel()
+        thread.join(timeout=1.0)
+        assert not thread.is_alive()
+        assert criteria.steps < 1000
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Decode Meter Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class _Ids:
+    """input_ids stand-in — DecodeMeter only reads shape[-1]"""
+    def __init__(self, length):
+        self.shape = (1, length)
+
+
+class TestDecodeMeter:
+
+    def test_greedy(self):
+        meter = DecodeMeter(prompt_tokens=100)
+        for length in range(101, 111):      # one token per step
+            assert meter(_Ids(length), None) is False
+        stats = meter.stats()
+        assert stats["steps"] == 10
+        assert stats["tokens"] == 10
+        assert stats["tokens_per_step"] == 1.0
+        assert "acceptance_rate" not in stats
+
+    def test_assisted(self):
+        meter = DecodeMeter(prompt_tokens=100)
+        for length in (104, 106, 107, 111):     # 1 own token + 3, 1, 0, 3 accepted
+            meter(_Ids(length), None)
+        stats = meter.stats(proposed=16)
+        assert stats["tokens"] == 11
+        assert stats["tokens_per_step"] == 2.75
+        assert stats["acceptance_rate"] == round(7 / 16, 3)
+        assert stats["decode_tok_s"] > 0
+
+    def test_no_steps(self):
+        stats = DecodeMeter(prompt_tokens=5).stats(proposed=0)
+        assert stats == {"steps": 0, "tokens": 0, "tokens_per_step": 0.0,
+                         "decode_tok_s": 0.0, "acceptance_rate": 0.0}
+
+    def test_summary_totals(self):
+        stats = decode_summary(steps=20, tokens=50, decode_tokens=45, decode_s=0.5, proposed=100)
+        assert stats["decode_tok_s"] == 90.0
+        assert stats["acceptance_rate"] == 0.3
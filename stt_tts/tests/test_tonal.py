@@ -1,7 +1,10 @@
 """
-test_tonal.py — Unit tests for gateway/tonal.py
+test_tonal.py — Unit tests for gateway/tonal.py (shared/speech_chunker.py)
   • ChunkTone classification
   • TonalAccumulator: feed, flush, sentence splitting, clause breaks, first-chunk
+  • exact=True: sub-word decoder deltas joined verbatim
+  • Boundary tags: provisional first clause, sentence, clause, end;
+    chunk frame fields rebuild the same TonalChunk
 
 Run:
     pytest tests/test_tonal.py -v
@@ -11,6 +14,7 @@ import sys
 import os
 import pytest
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "gateway"))
 
 from tonal import (  # noqa
@@ -168,3 +172,51 @@ class TestTonalAccumulator:
         chunk = acc.flush()
         # Comma should attach to Hello without space
         assert chunk.text == "Hello,"
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Exact Deltas / Boundary Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestExactDeltas:
+
+    def _chunks(self, deltas):
+        acc = TonalAccumulator()
+        results = []
+        for d in deltas:
+            results.extend(acc.feed(d, exact=True))
+        tail = acc.flush()
+        return results + ([tail] if tail else [])
+
+    def test_subword_pieces_not_split(self):
+        chunks = self._chunks(["Our Smart In", "voice Hub costs $4", "9.99 a mon", "th."])
+        text = " ".join(c.text for c in chunks)
+        assert text == "Our Smart Invoice Hub costs $49.99 a month."
+
+    def test_same_text_as_word_tokens(self):
+        answer = "Sure, I can help with that. Our plans start at forty nine dollars a month!"
+        words = [(" " if i else "") + w for i, w in enumerate(answer.split())]
+        deltas = [answer[i:i + 3] for i in range(0, len(answer), 3)]
+        by_word = [c.text for c in self._chunks(words)]
+        by_delta = [c.text for c in self._chunks(deltas)]
+        assert " ".join(by_word) == " ".join(by_delta) == answer
+
+    def test_boundaries(self):
+        chunks = self._chunks([
+            "Hello", " there", " my friend.", " When you look at the whole architecture of it,",
+            " the rest follows",
+        ])
+        assert chunks[0].text == "Hello"
+        assert chunks[0].boundary == "first"
+        assert chunks[0].provisional
+        assert [c.boundary for c in chunks[1:]] == ["sentence", "clause", "end"]
+        assert not any(c.provisional for c in chunks[1:])
+
+    def test_chunk_frame_round_trip(self):
+        # CAG "chunk" frame fields → the TonalChunk the gateway rebuilds
+        for c in self._chunks(["Absolutely", " — here", " is the plan?", " Yes"]):
+            frame = {"text": c.text, "tone": c.tone.value, "boundary": c.boundary}
+            rebuilt = TonalChunk(text=frame["text"], tone=ChunkTone(frame["tone"]),
+                                 boundary=frame["boundary"])
+            assert rebuilt == c
+            assert rebuilt.provisional == c.provisional
@@ -0,0 +1,160 @@
+"""
+test_touch_coalescer.py — Unit tests for session_chat/touch_coalescer.py
+  • latest touch per session wins, flushed as one batch (split by batch_size)
+  • failed flush re-queues the batch without clobbering newer touches
+  • overlay: only a newer pending time replaces updated_at
+  • lifecycle: enabled only while running, stop() flushes what is left
+
+Run:
+    pytest tests/test_touch_coalescer.py -v
+"""
+
+import sys
+import os
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "session_chat"))
+
+from touch_coalescer import TouchCoalescer  # noqa
+from conftest import FakeClock  # noqa
+
+T0 = datetime(2026, 1, 1)
+
+
+class FakeFlush:
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    async def __call__(self, batch):
+        if self.fail:
+            raise RuntimeError("db down")
+        self.batches.append(dict(batch))
+
+
+def _coalescer(flush=None, **kw):
+    c = TouchCoalescer(clock=kw.pop("clock", FakeClock(T0)), **kw)
+    c._flush_fn = flush or FakeFlush()
+    return c
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Coalescing Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.asyncio
+class TestCoalescing:
+
+    async def test_latest_touch_wins(self):
+        clock, flush = FakeClock(T0), FakeFlush()
+        c = _coalescer(flush, clock=clock)
+        for _ in range(5):
+            clock.advance(1)
+            c.touch("a")
+        c.touch("b")
+        assert c.pending_at("a") == clock.t
+        assert await c.flush() is True
+        assert flush.batches == [{"a": clock.t, "b": clock.t}]
+        assert c.stats()["pending"] == 0
+        assert c.stats()["touches"] == 6
+
+    async def test_batches_split(self):
+        flush = FakeFlush()
+        c = _coalescer(flush, batch_size=2)
+        for sid in "abcde":
+            c.touch(sid)
+        await c.flush()
+        assert [len(b) for b in flush.batches] == [2, 2, 1]
+        assert c.stats()["written"] == 5
+
+    async def test_failure_requeues(self):
+        flush = FakeFlush(fail=True)
+        c = _coalescer(flush)
+        c.touch("a")
+        assert await c.flush() is False
+        assert c.pending_at("a") is not None
+        flush.fail = False
+        assert await c.flush() is True
+        assert list(flush.batches[0]) == ["a"]
+
+    async def test_newer_touch_during_failed_flush_kept(self):
+        clock = FakeClock(T0)
+        c = _coalescer(clock=clock)
+        c.touch("a")
+        old = clock.t
+
+        async def failing(batch):
+            clock.advance(3)
+            c.touch("a")                     # arrives while the flush is in flight
+            raise RuntimeError("db down")
+
+        c._flush_fn = failing
+        await c.flush()
+        assert c.pending_at("a") == old + timedelta(seconds=3)
+
+    async def test_discard(self):
+        c = _coalescer()
+        c.touch("a")
+        c.discard("a")
+        assert c.pending_at("a") is None
+
+
+class TestOverlay:
+
+    def test_newer_pending_replaces(self):
+        clock = FakeClock(T0)
+        c = _coalescer(clock=clock)
+        c.touch("a")
+        data = {"id": "a", "updated_at": (clock.t - timedelta(seconds=1)).isoformat()}
+        assert c.overlay(data)["updated_at"] == clock.t.isoformat()
+
+    def test_older_pending_ignored(self):
+        clock = FakeClock(T0)
+        c = _coalescer(clock=clock)
+        c.touch("a")
+        data = {"id": "a", "updated_at": (clock.t + timedelta(seconds=1)).isoformat()}
+        assert c.overlay(data) is data
+
+    def test_no_pending(self):
+        data = {"id": "x", "updated_at": "2026-01-01T00:00:00"}
+        assert _coalescer().overlay(data) is data
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Lifecycle Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.asyncio
+class TestLifecycle:
+
+    async def test_enabled_only_while_running(self):
+        c = TouchCoalescer(interval_s=60)
+        assert c.enabled is False
+        await c.start(FakeFlush())
+        assert c.enabled is True
+        await c.stop()
+        assert c.enabled is False
+
+    async def test_zero_interval_never_enabled(self):
+        c = TouchCoalescer(interval_s=0)
+        await c.start(FakeFlush())
+        assert c.enabled is False
+
+    async def test_stop_flushes_remaining(self):
+        flush = FakeFlush()
+        c = TouchCoalescer(interval_s=60)
+        await c.start(flush)
+        c.touch("a")
+        await c.stop()
+        assert list(flush.batches[0]) == ["a"]
+
+    async def test_loop_flushes_on_interval(self):
+        flush = FakeFlush()
+        c = TouchCoalescer(interval_s=0.02)
+        await c.start(flush)
+        c.touch("a")
+        await asyncio.sleep(0.1)
+        assert flush.batches and "a" in flush.batches[0]
+        await c.stop()
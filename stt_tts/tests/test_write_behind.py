@@ -0,0 +1,220 @@
+"""
+test_write_behind.py — Unit tests for gateway/write_behind.py
+  • enqueue: ids, per-session buffers, max_pending drop
+  • flush: batching by max_batch, order preserved, retry on failure
+  • only delivered ids are removed from the buffer
+  • concurrent flushes of a session share one lock and never resend a batch
+  • background loop: size-triggered flush, final flush on stop
+
+Run:
+    pytest tests/test_write_behind.py -v
+"""
+
+import sys
+import os
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "gateway"))
+
+from write_behind import MessageWriteBehind  # noqa
+
+
+class FakeSink:
+    """Records batches; fails the next `fail` calls."""
+
+    def __init__(self, fail: int = 0):
+        self.batches = []
+        self.fail    = fail
+
+    async def __call__(self, session_id, items):
+        if self.fail:
+            self.fail -= 1
+            return False
+        self.batches.append((session_id, list(items)))
+        return True
+
+    def contents(self, session_id=None):
+        return [i["content"] for sid, b in self.batches for i in b
+                if session_id is None or sid == session_id]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Enqueue Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TestEnqueue:
+
+    def test_returns_unique_ids(self):
+        wb = MessageWriteBehind(FakeSink())
+        a = wb.enqueue("s1", "user", "hi")
+        b = wb.enqueue("s1", "agent", "hello")
+        assert a != b
+
+    def test_pending_counts_per_session(self):
+        wb = MessageWriteBehind(FakeSink())
+        wb.enqueue("s1", "user", "a")
+        wb.enqueue("s1", "agent", "b")
+        wb.enqueue("s2", "user", "c")
+        assert wb.pending_count("s1") == 2
+        assert wb.pending_count("s2") == 1
+        assert wb.pending_count() == 3
+
+    def test_max_pending_drops_oldest(self):
+        wb = MessageWriteBehind(FakeSink(), max_pending=2)
+        for c in ("a", "b", "c"):
+            wb.enqueue("s1", "user", c)
+        assert wb.pending_count("s1") == 2
+        assert wb.dropped == 1
+        assert [m.content for m in wb._pending["s1"]] == ["b", "c"]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Flush Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.asyncio
+class TestFlush:
+
+    async def test_flush_sends_in_batches_of_max_batch(self):
+        sink = FakeSink()
+        wb = MessageWriteBehind(sink, max_batch=2)
+        for c in "abcde":
+            wb.enqueue("s1", "user", c)
+        assert await wb.flush("s1") is True
+        assert [len(b) for _, b in sink.batches] == [2, 2, 1]
+        assert sink.contents() == list("abcde")
+        assert wb.pending_count() == 0
+
+    async def test_items_carry_id_and_timestamp(self):
+        sink = FakeSink()
+        wb = MessageWriteBehind(sink)
+        mid = wb.enqueue("s1", "agent", "x")
+        await wb.flush("s1")
+        item = sink.batches[0][1][0]
+        assert item["id"] == mid
+        assert item["role"] == "agent"
+        assert item["created_at"]
+
+    async def test_failure_keeps_messages_for_retry(self):
+        sink = FakeSink(fail=1)
+        wb = MessageWriteBehind(sink)
+        wb.enqueue("s1", "user", "a")
+        wb.enqueue("s1", "agent", "b")
+        assert await wb.flush("s1") is False
+        assert wb.pending_count("s1") == 2
+        assert wb.failures == 1
+        assert await wb.flush("s1") is True
+        assert sink.contents() == ["a", "b"]
+
+    async def test_retry_resends_same_ids(self):
+        sent = []
+
+        async def flaky(sid, items):
+            sent.append([i["id"] for i in items])
+            return len(sent) > 1
+
+        wb = MessageWriteBehind(flaky)
+        wb.enqueue("s1", "user", "a")
+        await wb.flush("s1")
+        await wb.flush("s1")
+        assert sent[0] == sent[1]
+
+    async def test_exception_in_sender_counts_as_failure(self):
+        async def boom(sid, items):
+            raise RuntimeError("down")
+
+        wb = MessageWriteBehind(boom)
+        wb.enqueue("s1", "user", "a")
+        assert await wb.flush("s1") is False
+        assert wb.pending_count("s1") == 1
+
+    async def test_messages_enqueued_during_send_are_kept(self):
+        sent = []
+
+        async def slow(sid, items):
+            sent.append([i["content"] for i in items])
+            if len(sent) == 1:
+                wb.enqueue(sid, "agent", "late")   # arrives mid-request
+            return True
+
+        wb = MessageWriteBehind(slow, max_batch=10)
+        wb.enqueue("s1", "user", "a")
+        await wb.flush("s1")
+        assert sent == [["a"], ["late"]]
+        assert wb.pending_count("s1") == 0
+
+    async def test_waiting_flush_keeps_the_session_lock(self):
+        # A flush still waiting on the lock when the buffer empties must not
+        # run beside a later flush holding a new lock
+        sent, release, first_done = [], asyncio.Event(), asyncio.Event()
+
+        async def sink(sid, items):
+            sent.append([i["content"] for i in items])
+            if len(sent) == 1:
+                await release.wait()
+                first_done.set()
+                return True
+            await asyncio.sleep(0.01)
+            return True
+
+        wb = MessageWriteBehind(sink, max_batch=1)
+        wb.enqueue("s1", "user", "m1")
+        first = asyncio.create_task(wb.flush("s1"))
+        waiting = asyncio.create_task(wb.flush("s1"))
+        await asyncio.sleep(0)
+        release.set()
+        await first_done.wait()
+        wb.enqueue("s1", "user", "m2")
+        late = asyncio.create_task(wb.flush("s1"))
+        await asyncio.gather(first, waiting, late)
+        assert sent == [["m1"], ["m2"]]
+        assert wb._locks == {}
+
+    async def test_flush_one_session_leaves_others(self):
+        sink = FakeSink()
+        wb = MessageWriteBehind(sink)
+        wb.enqueue("s1", "user", "a")
+        wb.enqueue("s2", "user", "b")
+        await wb.flush("s1")
+        assert sink.contents() == ["a"]
+        assert wb.pending_count("s2") == 1
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  Background Loop Tests
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@pytest.mark.asyncio
+class TestBackgroundLoop:
+
+    async def test_size_trigger_flushes_without_waiting_for_interval(self):
+        sink = FakeSink()
+        wb = MessageWriteBehind(sink, max_batch=2, flush_interval_s=60.0)
+        await wb.start()
+        wb.enqueue("s1", "user", "a")
+        wb.enqueue("s1", "agent", "b")
+        for _ in range(50):
+            if sink.batches:
+                break
+            await asyncio.sleep(0.01)
+        assert sink.contents() == ["a", "b"]
+        await wb.stop()
+
+    async def test_interval_flushes_partial_batch(self):
+        sink = FakeSink()
+        wb = MessageWriteBehind(sink, max_batch=100, flush_interval_s=0.02)
+        await wb.start()
+        wb.enqueue("s1", "user", "a")
+        await asyncio.sleep(0.1)
+        assert sink.contents() == ["a"]
+        await wb.stop()
+
+    async def test_stop_flushes_remaining(self):
+        sink = FakeSink()
+        wb = MessageWriteBehind(sink, max_batch=100, flush_interval_s=60.0)
+        await wb.start()
+        wb.enqueue("s1", "user", "a")
+        await wb.stop()
+        assert sink.contents() == ["a"]
+        assert wb.stats()["pending"] == 0
@@ -0,0 +1,169 @@
+"""
+bench_login_storm.py — /auth/verify-token latency during a login storm
+
+Starts a stand-in auth server in a child process with two routes:
+
+  POST /auth/login         bcrypt verify of the password, then a JWT
+  POST /auth/verify-token  JWT decode + --db-ms simulated user lookup
+
+and probes /auth/verify-token at a fixed rate, first idle and then while
+--logins concurrent clients hammer /auth/login.  Run once per mode:
+
+  inline : pwd_context.verify() inside the async route (the old behaviour)
+  pool   : PasswordHasher — bounded process pool, 429 when the queue is full
+
+Usage (from stt_tts/user_auth/):
+    python bench_login_storm.py
+    python bench_login_storm.py --logins 32 --seconds 5 --workers 2 --max-queue 16
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SECRET = "bench-secret"
+
+
+def _serve(mode: str, port: int, workers: int, max_queue: int, db_ms: float):
+    import uvicorn
+    from contextlib import asynccontextmanager
+    from fastapi import FastAPI, Header, HTTPException
+    from fastapi.responses import JSONResponse
+    from jose import jwt
+    from password_hasher import PasswordHasher, PasswordHasherBusy, pwd_context
+
+    stored = pwd_context.hash("correct horse")
+    hasher = PasswordHasher(workers=workers, max_queue=max_queue)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        if mode == "pool":
+            await hasher.start()
+        yield
+        await hasher.stop()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.exception_handler(PasswordHasherBusy)
+    async def busy(request, exc):
+        return JSONResponse(status_code=429, content={"detail": "busy"},
+                            headers={"Retry-After": str(exc.retry_after)})
+
+    @app.post("/auth/login")
+    async def login(body: dict):
+        if mode == "pool":
+            ok = await hasher.verify(body["password"], stored)
+        else:
+            ok = pwd_context.verify(body["password"], stored)
+        if not ok:
+            raise HTTPException(401)
+        now = datetime.now(timezone.utc)
+        return {"access_token": jwt.encode({"sub": "u1", "type": "access", "jti": str(uuid.uuid4()),
+                                            "iat": now, "exp": now + timedelta(minutes=30)},
+                                           SECRET, algorithm="HS256")}
+
+    @app.post("/auth/verify-token")
+    async def verify_token(authorization: str = Header(...)):
+        try:
+            payload = jwt.decode(authorization[7:], SECRET, algorithms=["HS256"])
+        except Exception:
+            raise HTTPException(401)
+        await asyncio.sleep(db_ms / 1000)
+        return {"id": payload["sub"], "is_active": True}
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _summary(name: str, samples: list) -> str:
+    ms = sorted(s * 1000 for s in samples)
+    p99 = ms[min(len(ms) - 1, int(len(ms) * 0.99))]
+    return (f"{name:<14} n={len(ms):5d}  p50={statistics.median(ms):8.2f} ms  "
+            f"p99={p99:8.2f} ms  max={ms[-1]:8.2f} ms")
+
+
+async def _probe(client, token: str, seconds: float, interval: float) -> list:
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        resp = await client.post("/auth/verify-token", headers={"Authorization": f"Bearer {token}"})
+        samples.append(time.perf_counter() - t0)
+        assert resp.status_code == 200
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - t0)))
+    return samples
+
+
+async def _storm(client, stop: asyncio.Event, counts: dict):
+    while not stop.is_set():
+        resp = await client.post("/auth/login", json={"password": "correct horse"})
+        counts[resp.status_code] = counts.get(resp.status_code, 0) + 1
+        if resp.status_code == 429:
+            await asyncio.sleep(0.05)
+
+
+async def _run(mode: str, port: int, args):
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.logins + 4, max_keepalive_connections=args.logins + 4)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60, limits=limits) as client:
+        for _ in range(200):
+            try:
+                resp = await client.post("/auth/login", json={"password": "correct horse"})
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.05)
+        token = resp.json()["access_token"]
+
+        idle = await _probe(client, token, args.seconds, args.interval)
+
+        stop, counts = asyncio.Event(), {}
+        storm = [asyncio.create_task(_storm(client, stop, counts)) for _ in range(args.logins)]
+        await asyncio.sleep(0.2)                      # let the storm build up
+        busy = await _probe(client, token, args.seconds, args.interval)
+        stop.set()
+        await asyncio.gather(*storm)
+
+    print(f"── {mode} " + "─" * 60)
+    print(_summary("idle", idle))
+    print(_summary("login storm", busy))
+    print(f"{'logins':<14} " + "  ".join(f"{code}: {n}" for code, n in sorted(counts.items())))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--logins",    type=int,   default=16, help="concurrent login clients")
+    ap.add_argument("--seconds",   type=float, default=3.0, help="probe duration per phase")
+    ap.add_argument("--interval",  type=float, default=0.01, help="probe interval (s)")
+    ap.add_argument("--workers",   type=int,   default=0, help="pool size, 0 = one per CPU")
+    ap.add_argument("--max-queue", type=int,   default=8)
+    ap.add_argument("--db-ms",     type=float, default=1.0)
+    ap.add_argument("--modes",     default="inline,pool")
+    args = ap.parse_args()
+
+    print(f"CPUs: {os.cpu_count()}   login clients: {args.logins}   "
+          f"pool: {args.workers or os.cpu_count()} workers + {args.max_queue} queued")
+    for mode in args.modes.split(","):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        server = multiprocessing.Process(
+            target=_serve, args=(mode, port, args.workers, args.max_queue, args.db_ms)
+        )
+        server.start()
+        try:
+            asyncio.run(_run(mode, port, args))
+        finally:
+            server.terminate()
+            server.join()
+
+
+if __name__ == "__main__":
+    main()
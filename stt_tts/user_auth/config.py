@@ -23,6 +23,7 @@ class Settings(BaseSettings):
     DATABASE_URL: str = ""  # set via env vars in database.py
 
     REDIS_URL: str = "redis://localhost:6379/0"
+    SECURITY_BACKEND: str = "auto"   # token blacklist + rate limits: auto | redis | memory
 
     ALLOWED_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:8080"]
 
@@ -30,6 +31,9 @@ class Settings(BaseSettings):
     RATE_LIMIT_REGISTER: int = 5
     RATE_LIMIT_REFRESH: int = 30
 
+    PASSWORD_HASH_WORKERS: int = 0      # bcrypt process pool size, 0 = one per CPU
+    PASSWORD_HASH_MAX_QUEUE: int = 64   # calls waiting for a worker before 429
+
     PASSWORD_MIN_LENGTH: int = 8
     PASSWORD_REQUIRE_UPPERCASE: bool = True
     PASSWORD_REQUIRE_DIGIT: bool = True
@@ -1,17 +1,22 @@
 import os
+import sys as _sys
 from pathlib import Path
 from dotenv import load_dotenv
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 
 load_dotenv(Path(__file__).resolve().parent.parent / ".env")
 
+# monitoring/ lives next to the service directories
+_sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from monitoring.db_pool import create_pooled_engine  # noqa: E402
+
 _user = os.getenv("DATABASE_USER", "postgres")
 _pass = os.getenv("DATABASE_PASSWORD", "")
 _host = os.getenv("DATABASE_HOST", "localhost")
 _port = os.getenv("DATABASE_PORT", "5432")
 DATABASE_URL = f"postgresql+asyncpg://{_user}:{_pass}@{_host}:{_port}/users"
-engine = create_async_engine(DATABASE_URL, echo=True)
+engine = create_pooled_engine(DATABASE_URL, "user_auth", is_async=True, echo=True)
 AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
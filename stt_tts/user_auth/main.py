@@ -1,20 +1,42 @@
 import logging
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from database import engine, Base, get_db
+from password_hasher import PasswordHasherBusy
+from security import get_password_hasher
 from user_service import get_all_users
 
 import sys as _sys, os as _os
 _sys.path.insert(0, _os.path.join(_os.path.dirname(__file__), ".."))
-from monitoring.metrics import instrument_app
+from monitoring.metrics import instrument_app, _safe_metric
+from monitoring.db_pool import pool_status
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# ─── Password hashing pool metrics (updated by password_hasher.py) ───────────
+
+_HASH_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+_safe_metric(Gauge, "auth_password_hash_in_flight",
+             "bcrypt calls submitted to the pool and not finished", REGISTRY)
+_safe_metric(Gauge, "auth_password_hash_queued",
+             "bcrypt calls waiting for a free pool worker", REGISTRY)
+_safe_metric(Histogram, "auth_password_hash_wait_seconds",
+             "Time a bcrypt call waited for a pool worker", REGISTRY,
+             labelnames=["op"], buckets=_HASH_BUCKETS)
+_safe_metric(Histogram, "auth_password_hash_seconds",
+             "bcrypt run time inside a pool worker", REGISTRY,
+             labelnames=["op"], buckets=_HASH_BUCKETS)
+_safe_metric(Counter, "auth_password_hash_rejected_total",
+             "bcrypt calls rejected because the pool queue was full", REGISTRY,
+             labelnames=["op"])
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -22,8 +44,10 @@ async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     logger.info("Database tables ready.")
+    await get_password_hasher().start()
     yield
     logger.info("Shutting down...")
+    await get_password_hasher().stop()
 
 
 app = FastAPI(title="Auth Microservice", version="1.0.0", lifespan=lifespan)
@@ -37,6 +61,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many concurrent authentication requests. Please retry."},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 try:
     from auth import router as auth_router
     app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
@@ -46,7 +80,9 @@ except ImportError:
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "service": "auth-service", "port": 8001}
+    return {"status": "ok", "service": "auth-service", "port": 8001,
+            "password_hasher": get_password_hasher().stats(),
+            "db_pool": pool_status(engine)}
 
 
 @app.get("/users", tags=["Users"])
@@ -70,7 +106,19 @@ async def user_exists(user_id: str, db: AsyncSession = Depends(get_db)):
     from user_service import get_user_by_id
     user = await get_user_by_id(db, user_id)
     return {"exists": user is not None}
-    
+
+
+@app.get("/users/{user_id}/status", tags=["Users"])
+async def user_status(user_id: str, db: AsyncSession = Depends(get_db)):
+    """Active flag for gateways that verify JWTs locally and cache the answer."""
+    from user_service import get_user_by_id
+    try:
+        user = await get_user_by_id(db, user_id)
+    except ValueError:
+        user = None
+    return {"exists": user is not None, "is_active": bool(user and user.is_active)}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8006, reload=False)
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""
+password_hasher.py — bcrypt off the event loop, in a bounded process pool
+
+passlib bcrypt costs ~100–300 ms of CPU per call.  Run inline in an async
+endpoint it blocks the worker's event loop for that long, so a burst of
+logins stalls every other request (token verification, health checks…).
+
+PasswordHasher sends hash / verify to a ProcessPoolExecutor:
+
+  workers      PASSWORD_HASH_WORKERS processes (0 → one per CPU)
+  queue        at most PASSWORD_HASH_MAX_QUEUE calls wait for a free worker;
+               beyond that hash()/verify() raise PasswordHasherBusy at once
+               and main.py answers 429 with Retry-After
+  metrics      in-flight / queued gauges, queue-wait and run-time histograms,
+               rejections — registered in main.py, looked up lazily here
+
+Workers are started through a forkserver (spawn where unavailable), so they
+do not inherit the parent's event loop, DB connections or Redis sockets.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Valid bcrypt hash (same cost) of a random string — verified against when the
+# user does not exist, so unknown and known emails take the same time.
+DUMMY_HASH = "$2b$12$oF4WzxV0ti2jmbsT2jrEbeLn8rankMgt17rSdWukeU5T5jTDLyAD6"
+
+
+class PasswordHasherBusy(Exception):
+    """Pool and queue are full — the caller should answer 429."""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("password hashing capacity exhausted")
+        self.retry_after = retry_after
+
+
+# ─── Prometheus (safe lookup — metrics registered in main.py) ────────────────
+
+class _Noop:
+    def labels(self, *a, **kw): return self
+    def inc(self, *a, **kw): pass
+    def set(self, *a, **kw): pass
+    def observe(self, *a, **kw): pass
+
+
+def _get(name):
+    try:
+        from prometheus_client import REGISTRY
+        return REGISTRY._names_to_collectors.get(name) or _Noop()
+    except Exception:
+        return _Noop()
+
+
+# ─── Worker side (runs in the pool processes) ────────────────────────────────
+
+def _hash_worker(plain: str) -> tuple[str, float]:
+    started = time.time()
+    return pwd_context.hash(plain), started
+
+
+def _verify_worker(plain: str, hashed: str) -> tuple[bool, float]:
+    started = time.time()
+    try:
+        return pwd_context.verify(plain, hashed), started
+    except (ValueError, TypeError):       # malformed / erased hash ("DELETED")
+        return False, started
+
+
+def _warm_worker() -> int:
+    return os.getpid()
+
+
+# ─── Async front end ─────────────────────────────────────────────────────────
+
+class PasswordHasher:
+    """Bounded process pool for bcrypt with backpressure."""
+
+    def __init__(self, workers: int = 0, max_queue: int = 64):
+        self.workers   = workers or os.cpu_count() or 1
+        self.max_queue = max(0, max_queue)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected  = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    @property
+    def queued(self) -> int:
+        return max(0, self.in_flight - self.workers)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            if "forkserver" in methods:
+                ctx = multiprocessing.get_context("forkserver")
+                ctx.set_forkserver_preload([__name__])
+            else:
+                ctx = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+        return self._pool
+
+    async def start(self):
+        """Spawn the workers up front so the first logins do not pay for it."""
+        loop = asyncio.get_running_loop()
+        pool = self._executor()
+        pids = await asyncio.gather(*(loop.run_in_executor(pool, _warm_worker)
+                                      for _ in range(self.workers)))
+        logger.info(f"Password hasher ready: {len(set(pids))} workers, queue {self.max_queue}")
+
+    async def stop(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await asyncio.get_running_loop().run_in_executor(None, pool.shutdown)
+
+    async def _submit(self, op: str, fn, *args):
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            _get("auth_password_hash_rejected_total").labels(op=op).inc()
+            raise PasswordHasherBusy()
+
+        self.in_flight += 1
+        self._report()
+        submitted = time.time()
+        try:
+            result, started = await asyncio.get_running_loop().run_in_executor(
+                self._executor(), fn, *args
+            )
+        finally:
+            self.in_flight -= 1
+            self._report()
+        done = time.time()
+        self.completed += 1
+        _get("auth_password_hash_wait_seconds").labels(op=op).observe(max(0.0, started - submitted))
+        _get("auth_password_hash_seconds").labels(op=op).observe(max(0.0, done - started))
+        return result
+
+    def _report(self):
+        _get("auth_password_hash_in_flight").set(self.in_flight)
+        _get("auth_password_hash_queued").set(self.queued)
+
+    async def hash(self, plain: str) -> str:
+        return await self._submit("hash", _hash_worker, plain)
+
+    async def verify(self, plain: str, hashed: str) -> bool:
+        return await self._submit("verify", _verify_worker, plain, hashed)
+
+    def stats(self) -> dict:
+        return {
+            "workers":   self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued":    self.queued,
+            "completed": self.completed,
+            "rejected":  self.rejected,
+        }
@@ -3,17 +3,40 @@ import uuid
 from datetime import datetime, timedelta, timezone
 
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 
 from config import settings
+from password_hasher import PasswordHasher, pwd_context
+from security_store import build_security_store
 
 logger = logging.getLogger(__name__)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# In-memory token blacklist (lost on restart, fine for dev/testing)
+# Process-local revocations — the whole blacklist with the memory backend,
+# a write-through copy with Redis (still enforced if Redis drops out).
 _blacklisted_tokens: dict = {}
 
+_store = None
+_hasher = None
+
+
+def get_security_store():
+    """Revocation + rate-limit backend, built on first use from settings."""
+    global _store
+    if _store is None:
+        backend = getattr(settings, "SECURITY_BACKEND", "auto")
+        backend = backend if backend in ("auto", "redis", "memory") else "auto"
+        _store = build_security_store(backend, getattr(settings, "REDIS_URL", ""),
+                                      _blacklisted_tokens)
+    return _store
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Process pool for bcrypt, sized from settings; started in main.lifespan."""
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher(workers=getattr(settings, "PASSWORD_HASH_WORKERS", 0),
+                                 max_queue=getattr(settings, "PASSWORD_HASH_MAX_QUEUE", 64))
+    return _hasher
+
 
 def hash_password(plain: str) -> str:
     return pwd_context.hash(plain)
@@ -60,18 +83,25 @@ async def decode_token(token: str, expected_type: str = "access") -> dict:
         raise JWTError(f"Invalid token type: expected {expected_type}")
 
     jti = payload.get("jti")
-    if jti and is_token_blacklisted(jti):
+    if jti and await get_security_store().is_revoked(jti):
         raise JWTError("Token has been revoked")
 
     return payload
 
 
 async def blacklist_token(jti: str, exp: datetime) -> None:
-    _blacklisted_tokens[jti] = exp
+    """Revoke until `exp` — shared across workers, entries expire with the token."""
+    await get_security_store().revoke(jti, exp)
     logger.info(f"Token {jti} blacklisted")
 
 
+async def revoke_user(user_id: str) -> None:
+    """Tell local verifiers (gateway) to drop cached status for a deactivated / erased user."""
+    await get_security_store().publish({"type": "user", "user_id": user_id})
+
+
 def is_token_blacklisted(jti: str) -> bool:
+    """Process-local check only; decode_token also consults the shared store."""
     if jti not in _blacklisted_tokens:
         return False
     if datetime.now(timezone.utc) > _blacklisted_tokens[jti]:
@@ -81,5 +111,5 @@ def is_token_blacklisted(jti: str) -> bool:
 
 
 async def check_rate_limit(key: str, limit: int, window_seconds: int = 60) -> bool:
-    # No Redis — always allow in dev mode
-    return True
\ No newline at end of file
+    """Sliding-window limit: True if this hit is within `limit` per `window_seconds`."""
+    return await get_security_store().hit(key, limit, window_seconds)
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""
+security_store.py — Shared token-revocation + rate-limit backend
+
+Two implementations behind one async interface:
+
+  RedisSecurityStore     — shared by every worker / replica
+      revoke(jti, exp)   SET auth:revoked:{jti} EXAT exp, plus the
+                         auth:revoked_jtis snapshot set and a publish on
+                         auth:revocations — one pipelined round trip
+      is_revoked(jti)    EXISTS — one round trip
+      hit(key, …)        sliding-window counter in a Lua script — one round trip
+  MemorySecurityStore    — process-local fallback (dev, tests, Redis outage)
+
+Sliding-window counter: two fixed-window counters (current + previous);
+the previous one is weighted by how much of it still overlaps the window:
+
+    estimate = prev * (1 - elapsed / window) + curr
+
+O(1) memory per key, no 2× burst at window edges.  Keys expire on their own.
+"""
+import json
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_CHANNEL = "auth:revocations"
+REVOKED_JTI_ZSET   = "auth:revoked_jtis"
+REVOKED_KEY_PREFIX = "auth:revoked:"
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+
+# KEYS[1] = counter prefix   ARGV = now_ms, window_ms, limit
+# Returns 1 (allowed, counted) or 0 (rejected, not counted).
+_SLIDING_WINDOW_LUA = """
+local now    = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit  = tonumber(ARGV[3])
+local bucket = math.floor(now / window)
+local curr_key = KEYS[1] .. ':' .. bucket
+local prev_key = KEYS[1] .. ':' .. (bucket - 1)
+local curr = tonumber(redis.call('GET', curr_key) or '0')
+local prev = tonumber(redis.call('GET', prev_key) or '0')
+local elapsed = now - bucket * window
+local estimate = prev * (1 - elapsed / window) + curr
+if estimate >= limit then
+  return 0
+end
+redis.call('INCR', curr_key)
+redis.call('PEXPIRE', curr_key, window * 2)
+return 1
+"""
+
+
+class MemorySecurityStore:
+    """Process-local revocations and sliding-window counters."""
+
+    MAX_KEYS = 10_000   # idle keys are swept once this many are tracked
+
+    def __init__(self, revoked: Optional[dict] = None, clock=time.time):
+        # jti → exp (aware datetime); shared with security._blacklisted_tokens
+        self.revoked = revoked if revoked is not None else {}
+        self._counters: dict[str, dict[int, int]] = {}
+        self._clock = clock
+
+    async def revoke(self, jti: str, exp: datetime) -> None:
+        self.revoked[jti] = exp
+
+    def is_revoked_local(self, jti: str) -> bool:
+        exp = self.revoked.get(jti)
+        if exp is None:
+            return False
+        if datetime.now(timezone.utc) > exp:
+            del self.revoked[jti]
+            return False
+        return True
+
+    async def is_revoked(self, jti: str) -> bool:
+        return self.is_revoked_local(jti)
+
+    async def publish(self, event: dict) -> None:
+        pass
+
+    async def hit(self, key: str, limit: int, window_seconds: int) -> bool:
+        now_ms = self._clock() * 1000
+        window_ms = window_seconds * 1000
+        bucket = math.floor(now_ms / window_ms)
+        if len(self._counters) > self.MAX_KEYS:
+            self._sweep(bucket)
+        buckets = self._counters.setdefault(key, {})
+        for b in [b for b in buckets if b < bucket - 1]:
+            del buckets[b]
+        curr = buckets.get(bucket, 0)
+        prev = buckets.get(bucket - 1, 0)
+        elapsed = now_ms - bucket * window_ms
+        if prev * (1 - elapsed / window_ms) + curr >= limit:
+            return False
+        buckets[bucket] = curr + 1
+        return True
+
+    def _sweep(self, bucket: int):
+        for key in [k for k, b in self._counters.items() if not b or max(b) < bucket - 1]:
+            del self._counters[key]
+
+
+class RedisSecurityStore:
+    """Redis-backed store; any Redis error falls back to the local store."""
+
+    def __init__(self, url: str, fallback: MemorySecurityStore, clock=time.time):
+        self.client   = aioredis.from_url(url, decode_responses=True)
+        self.fallback = fallback
+        self._clock   = clock
+        self._window  = self.client.register_script(_SLIDING_WINDOW_LUA)
+        self._degraded = False
+
+    def _degrade(self, op: str, e: Exception):
+        if not self._degraded:
+            logger.warning(f"Redis security store unavailable ({op}: {e}) — using in-process fallback")
+        self._degraded = True
+
+    def _recover(self):
+        if self._degraded:
+            logger.info("Redis security store recovered")
+        self._degraded = False
+
+    async def revoke(self, jti: str, exp: datetime) -> None:
+        # Always keep a local copy — this worker keeps rejecting the token
+        # even if Redis drops out later.
+        await self.fallback.revoke(jti, exp)
+        exp_ts = exp.timestamp()
+        if exp_ts <= self._clock():
+            return
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.set(f"{REVOKED_KEY_PREFIX}{jti}", "1", exat=math.ceil(exp_ts))
+                pipe.zadd(REVOKED_JTI_ZSET, {jti: exp_ts})
+                pipe.zremrangebyscore(REVOKED_JTI_ZSET, "-inf", self._clock())
+                pipe.publish(REVOCATION_CHANNEL,
+                             json.dumps({"type": "token", "jti": jti, "exp": exp_ts}))
+                await pipe.execute()
+            self._recover()
+        except Exception as e:
+            self._degrade("revoke", e)
+
+    async def is_revoked(self, jti: str) -> bool:
+        if self.fallback.is_revoked_local(jti):
+            return True
+        try:
+            revoked = await self.client.exists(f"{REVOKED_KEY_PREFIX}{jti}") > 0
+            self._recover()
+            return revoked
+        except Exception as e:
+            self._degrade("is_revoked", e)
+            return False
+
+    async def publish(self, event: dict) -> None:
+        try:
+            await self.client.publish(REVOCATION_CHANNEL, json.dumps(event))
+            self._recover()
+        except Exception as e:
+            self._degrade("publish", e)
+
+    async def hit(self, key: str, limit: int, window_seconds: int) -> bool:
+        try:
+            allowed = await self._window(
+                keys=[key], args=[int(self._clock() * 1000), window_seconds * 1000, limit]
+            )
+            self._recover()
+            return bool(allowed)
+        except Exception as e:
+            self._degrade("rate_limit", e)
+            return await self.fallback.hit(key, limit, window_seconds)
+
+
+def build_security_store(backend: str, redis_url: str, revoked: dict):
+    """backend: "redis", "memory" or "auto" (Redis when the client is installed)."""
+    memory = MemorySecurityStore(revoked)
+    if backend == "memory":
+        return memory
+    if aioredis is None:
+        if backend == "redis":
+            logger.warning("SECURITY_BACKEND=redis but redis is not installed — using in-process store")
+        return memory
+    return RedisSecurityStore(redis_url, memory)
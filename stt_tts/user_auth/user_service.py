@@ -6,7 +6,8 @@ from typing import Optional
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from security import hash_password, verify_password
+from password_hasher import DUMMY_HASH
+from security import get_password_hasher, revoke_user
 from user import User
 
 logger = logging.getLogger(__name__)
@@ -46,7 +47,7 @@ async def create_user(
     user = User(
         email=email.lower(),
         username=username.lower(),
-        hashed_password=hash_password(password),
+        hashed_password=await get_password_hasher().hash(password),
         full_name=full_name,
         roles=roles or ["user"],
     )
@@ -62,14 +63,14 @@ async def authenticate_user(
 ) -> Optional[User]:
     user = await get_user_by_email(db, email)
     if not user:
-        verify_password(password, "$2b$12$fakehashfakehashfakehashfakehashfakehash")
+        await get_password_hasher().verify(password, DUMMY_HASH)
         return None
 
     if user.is_locked:
         logger.warning(f"Login attempt on locked account {user.email}")
         return None
 
-    if not verify_password(password, user.hashed_password):
+    if not await get_password_hasher().verify(password, user.hashed_password):
         user.failed_login_attempts += 1
         if user.failed_login_attempts >= MAX_FAILED_ATTEMPTS:
             user.locked_until = datetime.now(timezone.utc) + timedelta(
@@ -107,9 +108,9 @@ async def update_user(
 async def change_password(
     db: AsyncSession, user: User, current_password: str, new_password: str
 ) -> bool:
-    if not verify_password(current_password, user.hashed_password):
+    if not await get_password_hasher().verify(current_password, user.hashed_password):
         return False
-    user.hashed_password = hash_password(new_password)
+    user.hashed_password = await get_password_hasher().hash(new_password)
     user.updated_at = datetime.now(timezone.utc)
     await db.flush()
     logger.info(f"Password changed for user {user.id}")
@@ -119,7 +120,10 @@ async def change_password(
 async def deactivate_user(db: AsyncSession, user: User) -> User:
     user.is_active = False
     user.updated_at = datetime.now(timezone.utc)
-    await db.flush()
+    # Publish only once the change is durable — the gateway refetches the
+    # user's status on the event and would otherwise cache is_active=True
+    await db.commit()
+    await revoke_user(str(user.id))
     logger.info(f"User {user.id} deactivated (GDPR)")
     return user
 
@@ -131,5 +135,6 @@ async def delete_user_data(db: AsyncSession, user: User) -> None:
     user.is_active = False
     user.hashed_password = "DELETED"
     user.updated_at = datetime.now(timezone.utc)
-    await db.flush()
+    await db.commit()       # before the revocation event, as in deactivate_user
+    await revoke_user(str(user.id))
     logger.info(f"User {user.id} data erased (GDPR erasure)")
\ No newline at end of file